@@ -31,7 +31,10 @@
 # A Simple Shell Script To Kill All Child Instances of the ATS service
 # 08/05/2020
 
-# Kill all django servers
-pkill -f runserver
-# Kill all celery instances
-kill -9 $(ps aux | grep celery | grep -v grep | awk '{print $2}' | tr '\n' ' ') > /dev/null 2>&1
\ No newline at end of file
+# Activate virtual environment
+source segint_venv/bin/activate
+cd segint_research_django/
+
+# Gracefully stop the web server and the Celery workers started by segint_run: open requests
+# and running segmentation jobs finish first
+python manage.py segint_serve --stop
@@ -35,7 +35,9 @@
 source segint_venv/bin/activate
 cd segint_research_django/
 
-# Run server using local ip, with necessary celery threads
-python manage.py runserver 0.0.0.0:8000 &
-celery -A segint_research_django worker -l info &
-celery -A segint_research_django beat -l info
\ No newline at end of file
+# Bring the database schema up to date
+python manage.py migrate --noinput
+
+# Run the web server, one Celery worker pool per queue defined in SEGINT_QUEUES and Celery
+# beat, configured by SEGINT_SERVER (settings.py).  Stop them with segint_kill.
+python manage.py segint_serve
@@ -21,7 +21,7 @@ DESCRIPTOR = _descriptor.FileDescriptor(
   syntax='proto3',
   serialized_options=b'\252\002+Microsoft.Radiomics.Segmentation.API.Proto3',
   create_key=_descriptor._internal_create_key,
-  serialized_pb=b'\n\x0bModel.proto\x12\tRadiomics\x1a\x12Primitives3D.proto\x1a\x1fgoogle/protobuf/timestamp.proto\"\xc5\x03\n\x17ModelChannelConstraints\x12L\n\x12\x41\x63\x63\x65ptedModalities\x18\x01 \x03(\x0e\x32\x30.Radiomics.ModelChannelConstraints.ModalityTypes\x12\x34\n\x17SpacingMinInMillimeters\x18\x02 \x01(\x0b\x32\x13.Radiomics.Vector3D\x12\x34\n\x17SpacingMaxInMillimeters\x18\x03 \x01(\x0b\x32\x13.Radiomics.Vector3D\x12\x32\n\x15\x44imensionsMinInPixels\x18\x04 \x01(\x0b\x32\x13.Radiomics.Vector3D\x12\x32\n\x15\x44imensionsMaxInPixels\x18\x05 \x01(\x0b\x32\x13.Radiomics.Vector3D\x12\x1c\n\x14OriginalDataRequired\x18\x06 \x01(\x08\x12\x0f\n\x07IsAxial\x18\x07 \x01(\x08\"Y\n\rModalityTypes\x12\x06\n\x02\x43T\x10\x00\x12\x07\n\x03\x43TA\x10\x01\x12\t\n\x05MR_T1\x10\x02\x12\t\n\x05MR_T2\x10\x03\x12\n\n\x06MR_GAD\x10\x04\x12\x0c\n\x08MR_FLAIR\x10\x05\x12\x07\n\x03PET\x10\x06\"\xd6\x0c\n\x10ModelConstraints\x12K\n\x11\x42odyPartsExamined\x18\x01 \x03(\x0e\x32\x30.Radiomics.ModelConstraints.BodyPartExaminedType\x12\x36\n\x06Gender\x18\x02 \x01(\x0e\x32&.Radiomics.ModelConstraints.GenderType\"\x8f\x0b\n\x14\x42odyPartExaminedType\x12\x0b\n\x07\x41\x62\x64omen\x10\x00\x12\x11\n\rAbdomenPelvis\x10\x01\x12\x0b\n\x07\x41\x64renal\x10\x02\x12\t\n\x05\x41nkle\x10\x03\x12\t\n\x05\x41orta\x10\x04\x12\n\n\x06\x41xilla\x10\x05\x12\x08\n\x04\x42\x61\x63k\x10\x06\x12\x0b\n\x07\x42ladder\x10\x07\x12\t\n\x05\x42rain\x10\x08\x12\n\n\x06\x42reast\x10\t\x12\x0c\n\x08\x42ronchus\x10\n\x12\x0b\n\x07\x42uttock\x10\x0b\x12\r\n\tCalcaneus\x10\x0c\x12\x08\n\x04\x43\x61lf\x10\r\x12\x0b\n\x07\x43\x61rotid\x10\x0e\x12\x0e\n\nCerebellum\x10\x0f\x12\n\n\x06\x43spine\x10\x10\x12\x0b\n\x07\x43tSpine\x10\x11\x12\n\n\x06\x43\x65rvix\x10\x12\x12\t\n\x05\x43heek\x10\x13\x12\t\n\x05\x43hest\x10\x14\x12\x10\n\x0c\x43hestAbdomen\x10\x15\x12\x16\n\x12\x43hestAbdomenPelvis\x10\x16\x12\x12\n\x0e\x43ircleOfWillis\x10\x17\x12\x0c\n\x08\x43lavicle\x10\x18\x12\n\n\x06\x43occyx\x10\x19\x12\t\n\x05\x43olon\x10\x1a\x12\n\n\x06\x43ornea\x10\x1b\x12\x12\n\x0e\x43oronaryArtery\x10\x1c\x12\x0c\n\x08\x44uodenum\x10\x1d\x12\x07\n\x03\x45\x61r\x10\x1e\x12\t\n\x05\x45lbow\x10\x1f\x12\r\n\tWholeBody\x10 \x12\r\n\tEsophagus\x10!\x12\r\n\tExtremity\x10\"\x12\x07\n\x03\x45ye\x10#\x12\n\n\x06\x45yelid\x10$\x12\x08\n\x04\x46\x61\x63\x65\x10%\x12\t\n\x05\x46\x65mur\x10&\x12\n\n\x06\x46inger\x10\'\x12\x08\n\x04\x46oot\x10(\x12\x0f\n\x0bGallbladder\x10)\x12\x08\n\x04Hand\x10*\x12\x08\n\x04Head\x10+\x12\x0c\n\x08HeadNeck\x10,\x12\t\n\x05Heart\x10-\x12\x07\n\x03Hip\x10.\x12\x0b\n\x07Humerus\x10/\x12\t\n\x05Ileum\x10\x30\x12\t\n\x05Ilium\x10\x31\x12\x07\n\x03IAC\x10\x32\x12\x07\n\x03Jaw\x10\x33\x12\x0b\n\x07Jejunum\x10\x34\x12\n\n\x06Kidney\x10\x35\x12\x08\n\x04Knee\x10\x36\x12\n\n\x06Larynx\x10\x37\x12\t\n\x05Liver\x10\x38\x12\x07\n\x03Leg\x10\x39\x12\n\n\x06LSpine\x10:\x12\x0b\n\x07LSSpine\x10;\x12\x08\n\x04Lung\x10<\x12\x0b\n\x07Maxilla\x10=\x12\x0f\n\x0bMediastinum\x10>\x12\t\n\x05Mouth\x10?\x12\x08\n\x04Neck\x10@\x12\r\n\tNeckChest\x10\x41\x12\x14\n\x10NeckChestAbdomen\x10\x42\x12\x1a\n\x16NeckChestAbdomenPelvis\x10\x43\x12\x08\n\x04Nose\x10\x44\x12\t\n\x05Orbit\x10\x45\x12\t\n\x05Ovary\x10\x46\x12\x0c\n\x08Pancreas\x10G\x12\x0b\n\x07Parotid\x10H\x12\x0b\n\x07Patella\x10I\x12\n\n\x06Pelvis\x10J\x12\t\n\x05Penis\x10K\x12\x0b\n\x07Pharynx\x10L\x12\x0c\n\x08Prostate\x10M\x12\n\n\x06Rectum\x10N\x12\x07\n\x03Rib\x10O\x12\n\n\x06SSPine\x10P\x12\t\n\x05Scalp\x10Q\x12\x0b\n\x07Scapula\x10R\x12\n\n\x06Sclera\x10S\x12\x0b\n\x07Scrotum\x10T\x12\x0c\n\x08Shoulder\x10U\x12\t\n\x05Skull\x10V\x12\t\n\x05Spine\x10W\x12\n\n\x06Spleen\x10X\x12\x0b\n\x07Sternum\x10Y\x12\x0b\n\x07Stomach\x10Z\x12\x11\n\rSumMandibular\x10[\x12\x0b\n\x07TMJoint\x10\\\x12\n\n\x06Testis\x10]\x12\t\n\x05Thigh\x10^\x12\n\n\x06TSpine\x10_\x12\x0b\n\x07TLSpine\x10`\x12\t\n\x05Thumb\x10\x61\x12\n\n\x06Thymus\x10\x62\x12\x0b\n\x07Thyroid\x10\x63\x12\x07\n\x03Toe\x10\x64\x12\n\n\x06Tongue\x10\x65\x12\x0b\n\x07Trachea\x10\x66\x12\x07\n\x03\x41rm\x10g\x12\n\n\x06Ureter\x10h\x12\x0b\n\x07Urethra\x10i\x12\n\n\x06Uterus\x10j\x12\n\n\x06Vagina\x10k\x12\t\n\x05Vulva\x10l\x12\t\n\x05Wrist\x10m\x12\n\n\x06Zygoma\x10n\"+\n\nGenderType\x12\x08\n\x04Male\x10\x00\x12\n\n\x06\x46\x65male\x10\x01\x12\x07\n\x03\x41ny\x10\x02\"e\n\x17ModelChannelDescription\x12\x11\n\tChannelID\x18\x01 \x01(\t\x12\x37\n\x0b\x43onstraints\x18\x02 \x01(\x0b\x32\".Radiomics.ModelChannelConstraints\"+\n\x08\x43olorRGB\x12\t\n\x01R\x18\x01 \x01(\r\x12\t\n\x01G\x18\x02 \x01(\r\x12\t\n\x01\x42\x18\x03 \x01(\r\"\xe4\x01\n\tStructure\x12\x0c\n\x04Name\x18\x01 \x01(\t\x12\"\n\x05\x43olor\x18\x02 \x01(\x0b\x32\x13.Radiomics.ColorRGB\x12\x30\n\x04Type\x18\x03 \x01(\x0e\x32\".Radiomics.Structure.StructureType\x12\x0f\n\x07\x46MACode\x18\x04 \x01(\r\x12\x16\n\x0eInputChannelID\x18\x05 \x01(\t\x12\x13\n\x0bStructureID\x18\x06 \x01(\t\"5\n\rStructureType\x12\x0c\n\x08\x45xternal\x10\x00\x12\t\n\x05Organ\x10\x01\x12\x0b\n\x07Unknown\x10\x02\"\x99\x02\n\x13RegulatoryFramework\x12\x11\n\tFramework\x18\x01 \x01(\t\x12\x39\n\x06Status\x18\x04 \x01(\x0e\x32).Radiomics.RegulatoryFramework.StatusEnum\x12\x0b\n\x03UDI\x18\x05 \x01(\t\x12\x14\n\x0cManufacturer\x18\x06 \x01(\t\x12\x12\n\nDetailsURL\x18\x07 \x01(\t\x12/\n\x0bReleaseDate\x18\x08 \x01(\x0b\x32\x1a.google.protobuf.Timestamp\"L\n\nStatusEnum\x12\x0c\n\x08\x43linical\x10\x00\x12\x13\n\x0fInvestigational\x10\x01\x12\x0c\n\x08Recalled\x10\x02\x12\r\n\tWithdrawn\x10\x03\"\xb0\x02\n\x0cModelVersion\x12\n\n\x02ID\x18\x01 \x01(\t\x12\x1a\n\x12VersionDescription\x18\x02 \x01(\t\x12-\n\tCreatedOn\x18\x03 \x01(\x0b\x32\x1a.google.protobuf.Timestamp\x12(\n\nStructures\x18\x05 \x03(\x0b\x32\x14.Radiomics.Structure\x12\x1f\n\x17NumberOfCreditsRequired\x18\x06 \x01(\x01\x12\x14\n\x0cMajorVersion\x18\x07 \x01(\r\x12\x14\n\x0cMinorVersion\x18\x08 \x01(\r\x12<\n\x14RegulatoryFrameworks\x18\t \x03(\x0b\x32\x1e.Radiomics.RegulatoryFramework\x12\x14\n\x0cLanguageCode\x18\n \x01(\t\"\xa8\x01\n\x0bModelFamily\x12\x15\n\rCanonicalName\x18\x01 \x01(\t\x12<\n\x11\x46\x61milyDescription\x18\x02 \x01(\x0b\x32!.Radiomics.ModelFamilyDescription\x12.\n\rModelVersions\x18\x03 \x03(\x0b\x32\x17.Radiomics.ModelVersion\x12\x14\n\x0cLanguageCode\x18\x04 \x01(\t\"\x88\x02\n\x16ModelFamilyDescription\x12\x0c\n\x04Name\x18\x02 \x01(\t\x12\x13\n\x0b\x44\x65scription\x18\x03 \x01(\t\x12\x16\n\x0e\x43linicalDomain\x18\x04 \x01(\t\x12\x18\n\x10\x41natomicalRegion\x18\x05 \x01(\t\x12\x18\n\x10PrimaryStructure\x18\x06 \x01(\t\x12\x12\n\nModalities\x18\x07 \x01(\t\x12\x39\n\rInputChannels\x18\x08 \x03(\x0b\x32\".Radiomics.ModelChannelDescription\x12\x30\n\x0b\x43onstraints\x18\t \x01(\x0b\x32\x1b.Radiomics.ModelConstraints\":\n\x10ModelsCollection\x12&\n\x06Models\x18\x01 \x03(\x0b\x32\x16.Radiomics.ModelFamily\"q\n\x11ModelInputChannel\x12\x11\n\tChannelID\x18\x01 \x01(\t\x12\x37\n\x10\x43\x61libratedVolume\x18\x02 \x01(\x0b\x32\x1d.Radiomics.CalibratedVolume3D\x12\x10\n\x08VolumeID\x18\x03 \x01(\t\"u\n\nModelInput\x12\x37\n\x11\x43lientInformation\x18\x01 \x01(\x0b\x32\x1c.Radiomics.ClientInformation\x12.\n\x08\x43hannels\x18\x02 \x03(\x0b\x32\x1c.Radiomics.ModelInputChannel\"f\n\x12ModelOutputChannel\x12\'\n\tStructure\x18\x01 \x01(\x0b\x32\x14.Radiomics.Structure\x12\'\n\x06Volume\x18\x02 \x01(\x0b\x32\x17.Radiomics.VolumeData3D\"\x7f\n\x0bModelOutput\x12/\n\x08\x43hannels\x18\x01 \x03(\x0b\x32\x1d.Radiomics.ModelOutputChannel\x12\x0f\n\x07ModelID\x18\x02 \x01(\t\x12\x18\n\x10ProcesserVersion\x18\x03 \x01(\t\x12\x14\n\x0cLanguageCode\x18\x04 \x01(\t\"\xf7\x01\n\x14SegmentationProgress\x12\x10\n\x08Progress\x18\x01 \x01(\r\x12\x0e\n\x06\x45rrors\x18\x02 \x01(\t\x12=\n\tErrorCode\x18\x03 \x01(\x0e\x32*.Radiomics.SegmentationProgress.ErrorCodes\"~\n\nErrorCodes\x12\x08\n\x04None\x10\x00\x12\x11\n\rInternalError\x10\x01\x12\x16\n\x12UnknownClientError\x10\x02\x12\x16\n\x12\x44\x65\x63ompressionError\x10\x03\x12#\n\x1f\x44\x65\x63ompressionBufferSizeMismatch\x10\x04\"Y\n\x10SegmentationTask\x12\x16\n\x0eSegmentationID\x18\x01 \x01(\t\x12-\n\tStartTime\x18\x02 \x01(\x0b\x32\x1a.google.protobuf.Timestamp\",\n\x11\x43lientInformation\x12\x17\n\x0fSoftwareVersion\x18\x01 \x01(\t\"`\n\x10StructureComment\x12\x13\n\x0bStructureID\x18\x01 \x01(\t\x12\x10\n\x08\x43omments\x18\x02 \x01(\t\x12%\n\x05Score\x18\x03 \x01(\x0b\x32\x16.Radiomics.DoubleValue\"\x84\x02\n\x14SegmentationFeedback\x12\x37\n\x11\x43lientInformation\x18\x01 \x01(\x0b\x32\x1c.Radiomics.ClientInformation\x12\x16\n\x0eSegmentationID\x18\x02 \x01(\t\x12\x1c\n\x14SegmentationAccepted\x18\x03 \x01(\x08\x12\x17\n\x0fGeneralComments\x18\x04 \x01(\t\x12,\n\x0cGeneralScore\x18\x05 \x01(\x0b\x32\x16.Radiomics.DoubleValue\x12\x36\n\x11StructureComments\x18\x06 \x03(\x0b\x32\x1b.Radiomics.StructureComment\"s\n\x07\x43redits\x12\x14\n\x0cTotalCredits\x18\x01 \x01(\x01\x12\x1d\n\x15\x44isplayCreditsWarning\x18\x02 \x01(\x08\x12\x1d\n\x15\x43reditsWarningMessage\x18\x03 \x01(\t\x12\x14\n\x0cLanguageCode\x18\x04 \x01(\t\"\xcf\x03\n\x15SegmentationTelemetry\x12\x37\n\x11\x43lientInformation\x18\x01 \x01(\x0b\x32\x1c.Radiomics.ClientInformation\x12 \n\x18UploadTimeInMilliseconds\x18\x02 \x01(\r\x12&\n\x1eSegmentationWaitInMilliseconds\x18\x03 \x01(\r\x12*\n\"SegmentationDownloadInMilliseconds\x18\x04 \x01(\r\x12\x17\n\x0fNumberOfRetries\x18\x05 \x01(\r\x12\x0f\n\x07ModelID\x18\x06 \x01(\t\x12\x16\n\x0eSegmentationID\x18\x07 \x01(\t\x12\x45\n\x0b\x43lientError\x18\x08 \x01(\x0e\x32\x30.Radiomics.SegmentationTelemetry.ClientErrorType\x12\x1e\n\x16\x43lientErrorInformation\x18\t \x01(\t\"^\n\x0f\x43lientErrorType\x12\x08\n\x04None\x10\x00\x12\x13\n\x0f\x43onnectionError\x10\x01\x12\x17\n\x13InternalClientError\x10\x02\x12\x13\n\x0fProgressTimeout\x10\x03\"D\n\x12\x42\x61\x64RequestResponse\x12\x14\n\x0c\x45rrorMessage\x18\x01 \x01(\t\x12\x18\n\x10\x45xceptionDetails\x18\x02 \x01(\t\"!\n\x0e\x41piInformation\x12\x0f\n\x07Version\x18\x01 \x01(\t\"\x93\x03\n\x0cVendorStatus\x12\x14\n\x0cTotalCredits\x18\x01 \x01(\x01\x12 \n\x18LowCreditsWarningMessage\x18\x02 \x01(\t\x12\x19\n\x11\x43lientCountryCode\x18\x03 \x01(\t\x12N\n\x19SegmentationServiceStatus\x18\x04 \x01(\x0e\x32+.Radiomics.VendorStatus.VendorServiceStatus\x12\x1e\n\x16SegmentationServiceUrl\x18\x05 \x01(\t\x12-\n%AvailableSegmentationServiceLocations\x18\x06 \x03(\t\x12\x12\n\nVendorName\x18\x07 \x01(\t\x12\x1d\n\x15VendorDescriptionHtml\x18\x08 \x01(\t\x12\x14\n\x0cLanguageCode\x18\t \x01(\t\"H\n\x13VendorServiceStatus\x12\"\n\x1eNotAvailableInCountrySpecified\x10\x00\x12\r\n\tAvailable\x10\x01\x42.\xaa\x02+Microsoft.Radiomics.Segmentation.API.Proto3b\x06proto3'
+  serialized_pb=b'\n\x0bModel.proto\x12\tRadiomics\x1a\x12Primitives3D.proto\x1a\x1fgoogle/protobuf/timestamp.proto"\xc5\x03\n\x17ModelChannelConstraints\x12L\n\x12AcceptedModalities\x18\x01 \x03(\x0e20.Radiomics.ModelChannelConstraints.ModalityTypes\x124\n\x17SpacingMinInMillimeters\x18\x02 \x01(\x0b2\x13.Radiomics.Vector3D\x124\n\x17SpacingMaxInMillimeters\x18\x03 \x01(\x0b2\x13.Radiomics.Vector3D\x122\n\x15DimensionsMinInPixels\x18\x04 \x01(\x0b2\x13.Radiomics.Vector3D\x122\n\x15DimensionsMaxInPixels\x18\x05 \x01(\x0b2\x13.Radiomics.Vector3D\x12\x1c\n\x14OriginalDataRequired\x18\x06 \x01(\x08\x12\x0f\n\x07IsAxial\x18\x07 \x01(\x08"Y\n\rModalityTypes\x12\x06\n\x02CT\x10\x00\x12\x07\n\x03CTA\x10\x01\x12\t\n\x05MR_T1\x10\x02\x12\t\n\x05MR_T2\x10\x03\x12\n\n\x06MR_GAD\x10\x04\x12\x0c\n\x08MR_FLAIR\x10\x05\x12\x07\n\x03PET\x10\x06"\xd6\x0c\n\x10ModelConstraints\x12K\n\x11BodyPartsExamined\x18\x01 \x03(\x0e20.Radiomics.ModelConstraints.BodyPartExaminedType\x126\n\x06Gender\x18\x02 \x01(\x0e2&.Radiomics.ModelConstraints.GenderType"\x8f\x0b\n\x14BodyPartExaminedType\x12\x0b\n\x07Abdomen\x10\x00\x12\x11\n\rAbdomenPelvis\x10\x01\x12\x0b\n\x07Adrenal\x10\x02\x12\t\n\x05Ankle\x10\x03\x12\t\n\x05Aorta\x10\x04\x12\n\n\x06Axilla\x10\x05\x12\x08\n\x04Back\x10\x06\x12\x0b\n\x07Bladder\x10\x07\x12\t\n\x05Brain\x10\x08\x12\n\n\x06Breast\x10\t\x12\x0c\n\x08Bronchus\x10\n\x12\x0b\n\x07Buttock\x10\x0b\x12\r\n\tCalcaneus\x10\x0c\x12\x08\n\x04Calf\x10\r\x12\x0b\n\x07Carotid\x10\x0e\x12\x0e\n\nCerebellum\x10\x0f\x12\n\n\x06Cspine\x10\x10\x12\x0b\n\x07CtSpine\x10\x11\x12\n\n\x06Cervix\x10\x12\x12\t\n\x05Cheek\x10\x13\x12\t\n\x05Chest\x10\x14\x12\x10\n\x0cChestAbdomen\x10\x15\x12\x16\n\x12ChestAbdomenPelvis\x10\x16\x12\x12\n\x0eCircleOfWillis\x10\x17\x12\x0c\n\x08Clavicle\x10\x18\x12\n\n\x06Coccyx\x10\x19\x12\t\n\x05Colon\x10\x1a\x12\n\n\x06Cornea\x10\x1b\x12\x12\n\x0eCoronaryArtery\x10\x1c\x12\x0c\n\x08Duodenum\x10\x1d\x12\x07\n\x03Ear\x10\x1e\x12\t\n\x05Elbow\x10\x1f\x12\r\n\tWholeBody\x10 \x12\r\n\tEsophagus\x10!\x12\r\n\tExtremity\x10"\x12\x07\n\x03Eye\x10#\x12\n\n\x06Eyelid\x10$\x12\x08\n\x04Face\x10%\x12\t\n\x05Femur\x10&\x12\n\n\x06Finger\x10\'\x12\x08\n\x04Foot\x10(\x12\x0f\n\x0bGallbladder\x10)\x12\x08\n\x04Hand\x10*\x12\x08\n\x04Head\x10+\x12\x0c\n\x08HeadNeck\x10,\x12\t\n\x05Heart\x10-\x12\x07\n\x03Hip\x10.\x12\x0b\n\x07Humerus\x10/\x12\t\n\x05Ileum\x100\x12\t\n\x05Ilium\x101\x12\x07\n\x03IAC\x102\x12\x07\n\x03Jaw\x103\x12\x0b\n\x07Jejunum\x104\x12\n\n\x06Kidney\x105\x12\x08\n\x04Knee\x106\x12\n\n\x06Larynx\x107\x12\t\n\x05Liver\x108\x12\x07\n\x03Leg\x109\x12\n\n\x06LSpine\x10:\x12\x0b\n\x07LSSpine\x10;\x12\x08\n\x04Lung\x10<\x12\x0b\n\x07Maxilla\x10=\x12\x0f\n\x0bMediastinum\x10>\x12\t\n\x05Mouth\x10?\x12\x08\n\x04Neck\x10@\x12\r\n\tNeckChest\x10A\x12\x14\n\x10NeckChestAbdomen\x10B\x12\x1a\n\x16NeckChestAbdomenPelvis\x10C\x12\x08\n\x04Nose\x10D\x12\t\n\x05Orbit\x10E\x12\t\n\x05Ovary\x10F\x12\x0c\n\x08Pancreas\x10G\x12\x0b\n\x07Parotid\x10H\x12\x0b\n\x07Patella\x10I\x12\n\n\x06Pelvis\x10J\x12\t\n\x05Penis\x10K\x12\x0b\n\x07Pharynx\x10L\x12\x0c\n\x08Prostate\x10M\x12\n\n\x06Rectum\x10N\x12\x07\n\x03Rib\x10O\x12\n\n\x06SSPine\x10P\x12\t\n\x05Scalp\x10Q\x12\x0b\n\x07Scapula\x10R\x12\n\n\x06Sclera\x10S\x12\x0b\n\x07Scrotum\x10T\x12\x0c\n\x08Shoulder\x10U\x12\t\n\x05Skull\x10V\x12\t\n\x05Spine\x10W\x12\n\n\x06Spleen\x10X\x12\x0b\n\x07Sternum\x10Y\x12\x0b\n\x07Stomach\x10Z\x12\x11\n\rSumMandibular\x10[\x12\x0b\n\x07TMJoint\x10\\\x12\n\n\x06Testis\x10]\x12\t\n\x05Thigh\x10^\x12\n\n\x06TSpine\x10_\x12\x0b\n\x07TLSpine\x10`\x12\t\n\x05Thumb\x10a\x12\n\n\x06Thymus\x10b\x12\x0b\n\x07Thyroid\x10c\x12\x07\n\x03Toe\x10d\x12\n\n\x06Tongue\x10e\x12\x0b\n\x07Trachea\x10f\x12\x07\n\x03Arm\x10g\x12\n\n\x06Ureter\x10h\x12\x0b\n\x07Urethra\x10i\x12\n\n\x06Uterus\x10j\x12\n\n\x06Vagina\x10k\x12\t\n\x05Vulva\x10l\x12\t\n\x05Wrist\x10m\x12\n\n\x06Zygoma\x10n"+\n\nGenderType\x12\x08\n\x04Male\x10\x00\x12\n\n\x06Female\x10\x01\x12\x07\n\x03Any\x10\x02"e\n\x17ModelChannelDescription\x12\x11\n\tChannelID\x18\x01 \x01(\t\x127\n\x0bConstraints\x18\x02 \x01(\x0b2".Radiomics.ModelChannelConstraints"+\n\x08ColorRGB\x12\t\n\x01R\x18\x01 \x01(\r\x12\t\n\x01G\x18\x02 \x01(\r\x12\t\n\x01B\x18\x03 \x01(\r"\xe4\x01\n\tStructure\x12\x0c\n\x04Name\x18\x01 \x01(\t\x12"\n\x05Color\x18\x02 \x01(\x0b2\x13.Radiomics.ColorRGB\x120\n\x04Type\x18\x03 \x01(\x0e2".Radiomics.Structure.StructureType\x12\x0f\n\x07FMACode\x18\x04 \x01(\r\x12\x16\n\x0eInputChannelID\x18\x05 \x01(\t\x12\x13\n\x0bStructureID\x18\x06 \x01(\t"5\n\rStructureType\x12\x0c\n\x08External\x10\x00\x12\t\n\x05Organ\x10\x01\x12\x0b\n\x07Unknown\x10\x02"\x99\x02\n\x13RegulatoryFramework\x12\x11\n\tFramework\x18\x01 \x01(\t\x129\n\x06Status\x18\x04 \x01(\x0e2).Radiomics.RegulatoryFramework.StatusEnum\x12\x0b\n\x03UDI\x18\x05 \x01(\t\x12\x14\n\x0cManufacturer\x18\x06 \x01(\t\x12\x12\n\nDetailsURL\x18\x07 \x01(\t\x12/\n\x0bReleaseDate\x18\x08 \x01(\x0b2\x1a.google.protobuf.Timestamp"L\n\nStatusEnum\x12\x0c\n\x08Clinical\x10\x00\x12\x13\n\x0fInvestigational\x10\x01\x12\x0c\n\x08Recalled\x10\x02\x12\r\n\tWithdrawn\x10\x03"\xb0\x02\n\x0cModelVersion\x12\n\n\x02ID\x18\x01 \x01(\t\x12\x1a\n\x12VersionDescription\x18\x02 \x01(\t\x12-\n\tCreatedOn\x18\x03 \x01(\x0b2\x1a.google.protobuf.Timestamp\x12(\n\nStructures\x18\x05 \x03(\x0b2\x14.Radiomics.Structure\x12\x1f\n\x17NumberOfCreditsRequired\x18\x06 \x01(\x01\x12\x14\n\x0cMajorVersion\x18\x07 \x01(\r\x12\x14\n\x0cMinorVersion\x18\x08 \x01(\r\x12<\n\x14RegulatoryFrameworks\x18\t \x03(\x0b2\x1e.Radiomics.RegulatoryFramework\x12\x14\n\x0cLanguageCode\x18\n \x01(\t"\xa8\x01\n\x0bModelFamily\x12\x15\n\rCanonicalName\x18\x01 \x01(\t\x12<\n\x11FamilyDescription\x18\x02 \x01(\x0b2!.Radiomics.ModelFamilyDescription\x12.\n\rModelVersions\x18\x03 \x03(\x0b2\x17.Radiomics.ModelVersion\x12\x14\n\x0cLanguageCode\x18\x04 \x01(\t"\x88\x02\n\x16ModelFamilyDescription\x12\x0c\n\x04Name\x18\x02 \x01(\t\x12\x13\n\x0bDescription\x18\x03 \x01(\t\x12\x16\n\x0eClinicalDomain\x18\x04 \x01(\t\x12\x18\n\x10AnatomicalRegion\x18\x05 \x01(\t\x12\x18\n\x10PrimaryStructure\x18\x06 \x01(\t\x12\x12\n\nModalities\x18\x07 \x01(\t\x129\n\rInputChannels\x18\x08 \x03(\x0b2".Radiomics.ModelChannelDescription\x120\n\x0bConstraints\x18\t \x01(\x0b2\x1b.Radiomics.ModelConstraints":\n\x10ModelsCollection\x12&\n\x06Models\x18\x01 \x03(\x0b2\x16.Radiomics.ModelFamily"q\n\x11ModelInputChannel\x12\x11\n\tChannelID\x18\x01 \x01(\t\x127\n\x10CalibratedVolume\x18\x02 \x01(\x0b2\x1d.Radiomics.CalibratedVolume3D\x12\x10\n\x08VolumeID\x18\x03 \x01(\t"u\n\nModelInput\x127\n\x11ClientInformation\x18\x01 \x01(\x0b2\x1c.Radiomics.ClientInformation\x12.\n\x08Channels\x18\x02 \x03(\x0b2\x1c.Radiomics.ModelInputChannel"\xbf\x01\n\x12ModelOutputChannel\x12\'\n\tStructure\x18\x01 \x01(\x0b2\x14.Radiomics.Structure\x12\'\n\x06Volume\x18\x02 \x01(\x0b2\x17.Radiomics.VolumeData3D\x12-\n\rDataTransform\x18\x03 \x01(\x0b2\x16.Radiomics.Transform3D\x12(\n\x0bVoxelOffset\x18\x04 \x01(\x0b2\x13.Radiomics.Vector3D"\x7f\n\x0bModelOutput\x12/\n\x08Channels\x18\x01 \x03(\x0b2\x1d.Radiomics.ModelOutputChannel\x12\x0f\n\x07ModelID\x18\x02 \x01(\t\x12\x18\n\x10ProcesserVersion\x18\x03 \x01(\t\x12\x14\n\x0cLanguageCode\x18\x04 \x01(\t"\xf7\x01\n\x14SegmentationProgress\x12\x10\n\x08Progress\x18\x01 \x01(\r\x12\x0e\n\x06Errors\x18\x02 \x01(\t\x12=\n\tErrorCode\x18\x03 \x01(\x0e2*.Radiomics.SegmentationProgress.ErrorCodes"~\n\nErrorCodes\x12\x08\n\x04None\x10\x00\x12\x11\n\rInternalError\x10\x01\x12\x16\n\x12UnknownClientError\x10\x02\x12\x16\n\x12DecompressionError\x10\x03\x12#\n\x1fDecompressionBufferSizeMismatch\x10\x04"Y\n\x10SegmentationTask\x12\x16\n\x0eSegmentationID\x18\x01 \x01(\t\x12-\n\tStartTime\x18\x02 \x01(\x0b2\x1a.google.protobuf.Timestamp",\n\x11ClientInformation\x12\x17\n\x0fSoftwareVersion\x18\x01 \x01(\t"`\n\x10StructureComment\x12\x13\n\x0bStructureID\x18\x01 \x01(\t\x12\x10\n\x08Comments\x18\x02 \x01(\t\x12%\n\x05Score\x18\x03 \x01(\x0b2\x16.Radiomics.DoubleValue"\x84\x02\n\x14SegmentationFeedback\x127\n\x11ClientInformation\x18\x01 \x01(\x0b2\x1c.Radiomics.ClientInformation\x12\x16\n\x0eSegmentationID\x18\x02 \x01(\t\x12\x1c\n\x14SegmentationAccepted\x18\x03 \x01(\x08\x12\x17\n\x0fGeneralComments\x18\x04 \x01(\t\x12,\n\x0cGeneralScore\x18\x05 \x01(\x0b2\x16.Radiomics.DoubleValue\x126\n\x11StructureComments\x18\x06 \x03(\x0b2\x1b.Radiomics.StructureComment"s\n\x07Credits\x12\x14\n\x0cTotalCredits\x18\x01 \x01(\x01\x12\x1d\n\x15DisplayCreditsWarning\x18\x02 \x01(\x08\x12\x1d\n\x15CreditsWarningMessage\x18\x03 \x01(\t\x12\x14\n\x0cLanguageCode\x18\x04 \x01(\t"\xcf\x03\n\x15SegmentationTelemetry\x127\n\x11ClientInformation\x18\x01 \x01(\x0b2\x1c.Radiomics.ClientInformation\x12 \n\x18UploadTimeInMilliseconds\x18\x02 \x01(\r\x12&\n\x1eSegmentationWaitInMilliseconds\x18\x03 \x01(\r\x12*\n"SegmentationDownloadInMilliseconds\x18\x04 \x01(\r\x12\x17\n\x0fNumberOfRetries\x18\x05 \x01(\r\x12\x0f\n\x07ModelID\x18\x06 \x01(\t\x12\x16\n\x0eSegmentationID\x18\x07 \x01(\t\x12E\n\x0bClientError\x18\x08 \x01(\x0e20.Radiomics.SegmentationTelemetry.ClientErrorType\x12\x1e\n\x16ClientErrorInformation\x18\t \x01(\t"^\n\x0fClientErrorType\x12\x08\n\x04None\x10\x00\x12\x13\n\x0fConnectionError\x10\x01\x12\x17\n\x13InternalClientError\x10\x02\x12\x13\n\x0fProgressTimeout\x10\x03"D\n\x12BadRequestResponse\x12\x14\n\x0cErrorMessage\x18\x01 \x01(\t\x12\x18\n\x10ExceptionDetails\x18\x02 \x01(\t"!\n\x0eApiInformation\x12\x0f\n\x07Version\x18\x01 \x01(\t"\x93\x03\n\x0cVendorStatus\x12\x14\n\x0cTotalCredits\x18\x01 \x01(\x01\x12 \n\x18LowCreditsWarningMessage\x18\x02 \x01(\t\x12\x19\n\x11ClientCountryCode\x18\x03 \x01(\t\x12N\n\x19SegmentationServiceStatus\x18\x04 \x01(\x0e2+.Radiomics.VendorStatus.VendorServiceStatus\x12\x1e\n\x16SegmentationServiceUrl\x18\x05 \x01(\t\x12-\n%AvailableSegmentationServiceLocations\x18\x06 \x03(\t\x12\x12\n\nVendorName\x18\x07 \x01(\t\x12\x1d\n\x15VendorDescriptionHtml\x18\x08 \x01(\t\x12\x14\n\x0cLanguageCode\x18\t \x01(\t"H\n\x13VendorServiceStatus\x12"\n\x1eNotAvailableInCountrySpecified\x10\x00\x12\r\n\tAvailable\x10\x01B.\xaa\x02+Microsoft.Radiomics.Segmentation.API.Proto3b\x06proto3'
   ,
   dependencies=[Primitives3D__pb2.DESCRIPTOR,google_dot_protobuf_dot_timestamp__pb2.DESCRIPTOR,])
 
@@ -777,8 +777,8 @@ _SEGMENTATIONPROGRESS_ERRORCODES = _descriptor.EnumDescriptor(
   ],
   containing_type=None,
   serialized_options=None,
-  serialized_start=4217,
-  serialized_end=4343,
+  serialized_start=4307,
+  serialized_end=4433,
 )
 _sym_db.RegisterEnumDescriptor(_SEGMENTATIONPROGRESS_ERRORCODES)
 
@@ -812,8 +812,8 @@ _SEGMENTATIONTELEMETRY_CLIENTERRORTYPE = _descriptor.EnumDescriptor(
   ],
   containing_type=None,
   serialized_options=None,
-  serialized_start=5330,
-  serialized_end=5424,
+  serialized_start=5420,
+  serialized_end=5514,
 )
 _sym_db.RegisterEnumDescriptor(_SEGMENTATIONTELEMETRY_CLIENTERRORTYPE)
 
@@ -837,8 +837,8 @@ _VENDORSTATUS_VENDORSERVICESTATUS = _descriptor.EnumDescriptor(
   ],
   containing_type=None,
   serialized_options=None,
-  serialized_start=5863,
-  serialized_end=5935,
+  serialized_start=5953,
+  serialized_end=6025,
 )
 _sym_db.RegisterEnumDescriptor(_VENDORSTATUS_VENDORSERVICESTATUS)
 
@@ -1541,6 +1541,20 @@ _MODELOUTPUTCHANNEL = _descriptor.Descriptor(
       message_type=None, enum_type=None, containing_type=None,
       is_extension=False, extension_scope=None,
       serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='DataTransform', full_name='Radiomics.ModelOutputChannel.DataTransform', index=2,
+      number=3, type=11, cpp_type=10, label=1,
+      has_default_value=False, default_value=None,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='VoxelOffset', full_name='Radiomics.ModelOutputChannel.VoxelOffset', index=3,
+      number=4, type=11, cpp_type=10, label=1,
+      has_default_value=False, default_value=None,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
   ],
   extensions=[
   ],
@@ -1553,8 +1567,8 @@ _MODELOUTPUTCHANNEL = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=3862,
-  serialized_end=3964,
+  serialized_start=3863,
+  serialized_end=4054,
 )
 
 
@@ -1606,8 +1620,8 @@ _MODELOUTPUT = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=3966,
-  serialized_end=4093,
+  serialized_start=4056,
+  serialized_end=4183,
 )
 
 
@@ -1653,8 +1667,8 @@ _SEGMENTATIONPROGRESS = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=4096,
-  serialized_end=4343,
+  serialized_start=4186,
+  serialized_end=4433,
 )
 
 
@@ -1692,8 +1706,8 @@ _SEGMENTATIONTASK = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=4345,
-  serialized_end=4434,
+  serialized_start=4435,
+  serialized_end=4524,
 )
 
 
@@ -1724,8 +1738,8 @@ _CLIENTINFORMATION = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=4436,
-  serialized_end=4480,
+  serialized_start=4526,
+  serialized_end=4570,
 )
 
 
@@ -1770,8 +1784,8 @@ _STRUCTURECOMMENT = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=4482,
-  serialized_end=4578,
+  serialized_start=4572,
+  serialized_end=4668,
 )
 
 
@@ -1837,8 +1851,8 @@ _SEGMENTATIONFEEDBACK = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=4581,
-  serialized_end=4841,
+  serialized_start=4671,
+  serialized_end=4931,
 )
 
 
@@ -1890,8 +1904,8 @@ _CREDITS = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=4843,
-  serialized_end=4958,
+  serialized_start=4933,
+  serialized_end=5048,
 )
 
 
@@ -1979,8 +1993,8 @@ _SEGMENTATIONTELEMETRY = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=4961,
-  serialized_end=5424,
+  serialized_start=5051,
+  serialized_end=5514,
 )
 
 
@@ -2018,8 +2032,8 @@ _BADREQUESTRESPONSE = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=5426,
-  serialized_end=5494,
+  serialized_start=5516,
+  serialized_end=5584,
 )
 
 
@@ -2050,8 +2064,8 @@ _APIINFORMATION = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=5496,
-  serialized_end=5529,
+  serialized_start=5586,
+  serialized_end=5619,
 )
 
 
@@ -2139,8 +2153,8 @@ _VENDORSTATUS = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=5532,
-  serialized_end=5935,
+  serialized_start=5622,
+  serialized_end=6025,
 )
 
 _MODELCHANNELCONSTRAINTS.fields_by_name['AcceptedModalities'].enum_type = _MODELCHANNELCONSTRAINTS_MODALITYTYPES
@@ -2173,6 +2187,8 @@ _MODELINPUT.fields_by_name['ClientInformation'].message_type = _CLIENTINFORMATIO
 _MODELINPUT.fields_by_name['Channels'].message_type = _MODELINPUTCHANNEL
 _MODELOUTPUTCHANNEL.fields_by_name['Structure'].message_type = _STRUCTURE
 _MODELOUTPUTCHANNEL.fields_by_name['Volume'].message_type = Primitives3D__pb2._VOLUMEDATA3D
+_MODELOUTPUTCHANNEL.fields_by_name['DataTransform'].message_type = Primitives3D__pb2._TRANSFORM3D
+_MODELOUTPUTCHANNEL.fields_by_name['VoxelOffset'].message_type = Primitives3D__pb2._VECTOR3D
 _MODELOUTPUT.fields_by_name['Channels'].message_type = _MODELOUTPUTCHANNEL
 _SEGMENTATIONPROGRESS.fields_by_name['ErrorCode'].enum_type = _SEGMENTATIONPROGRESS_ERRORCODES
 _SEGMENTATIONPROGRESS_ERRORCODES.containing_type = _SEGMENTATIONPROGRESS
@@ -19,7 +19,7 @@ DESCRIPTOR = _descriptor.FileDescriptor(
   syntax='proto3',
   serialized_options=b'\252\002+Microsoft.Radiomics.Segmentation.API.Proto3',
   create_key=_descriptor._internal_create_key,
-  serialized_pb=b'\n\x12Primitives3D.proto\x12\tRadiomics\"+\n\x08Vector3D\x12\t\n\x01X\x18\x01 \x01(\x01\x12\t\n\x01Y\x18\x02 \x01(\x01\x12\t\n\x01Z\x18\x03 \x01(\x01\"\xe8\x01\n\x0bTransform3D\x12+\n\x0eXAxisDirection\x18\x01 \x01(\x0b\x32\x13.Radiomics.Vector3D\x12+\n\x0eYAxisDirection\x18\x02 \x01(\x0b\x32\x13.Radiomics.Vector3D\x12+\n\x0eZAxisDirection\x18\x03 \x01(\x0b\x32\x13.Radiomics.Vector3D\x12-\n\x10VoxelScalingInMM\x18\x04 \x01(\x0b\x32\x13.Radiomics.Vector3D\x12#\n\x06Origin\x18\x05 \x01(\x0b\x32\x13.Radiomics.Vector3D\"l\n\x12\x43\x61libratedVolume3D\x12-\n\rDataTransform\x18\x04 \x01(\x0b\x32\x16.Radiomics.Transform3D\x12\'\n\x06Volume\x18\x02 \x01(\x0b\x32\x17.Radiomics.VolumeData3D\"\x9a\x02\n\x0cVolumeData3D\x12\r\n\x05Width\x18\x01 \x01(\r\x12\x0e\n\x06Height\x18\x02 \x01(\r\x12\r\n\x05\x44\x65pth\x18\x03 \x01(\r\x12\x0c\n\x04\x44\x61ta\x18\x04 \x01(\x0c\x12\x33\n\x08\x44\x61taType\x18\x05 \x01(\x0e\x32!.Radiomics.VolumeData3D.DataTypes\x12\x45\n\x11\x43ompressionMethod\x18\x06 \x01(\x0e\x32*.Radiomics.VolumeData3D.CompressionMethods\"2\n\tDataTypes\x12\x1b\n\x17LittleEndianSignedInt16\x10\x00\x12\x08\n\x04\x42yte\x10\x01\"\x1e\n\x12\x43ompressionMethods\x12\x08\n\x04Gzip\x10\x00\"\x1c\n\x0b\x44oubleValue\x12\r\n\x05Value\x18\x01 \x01(\x01\x42.\xaa\x02+Microsoft.Radiomics.Segmentation.API.Proto3b\x06proto3'
+  serialized_pb=b'\n\x12Primitives3D.proto\x12\tRadiomics"+\n\x08Vector3D\x12\t\n\x01X\x18\x01 \x01(\x01\x12\t\n\x01Y\x18\x02 \x01(\x01\x12\t\n\x01Z\x18\x03 \x01(\x01"\xe8\x01\n\x0bTransform3D\x12+\n\x0eXAxisDirection\x18\x01 \x01(\x0b2\x13.Radiomics.Vector3D\x12+\n\x0eYAxisDirection\x18\x02 \x01(\x0b2\x13.Radiomics.Vector3D\x12+\n\x0eZAxisDirection\x18\x03 \x01(\x0b2\x13.Radiomics.Vector3D\x12-\n\x10VoxelScalingInMM\x18\x04 \x01(\x0b2\x13.Radiomics.Vector3D\x12#\n\x06Origin\x18\x05 \x01(\x0b2\x13.Radiomics.Vector3D"l\n\x12CalibratedVolume3D\x12-\n\rDataTransform\x18\x04 \x01(\x0b2\x16.Radiomics.Transform3D\x12\'\n\x06Volume\x18\x02 \x01(\x0b2\x17.Radiomics.VolumeData3D"\xb8\x02\n\x0cVolumeData3D\x12\r\n\x05Width\x18\x01 \x01(\r\x12\x0e\n\x06Height\x18\x02 \x01(\r\x12\r\n\x05Depth\x18\x03 \x01(\r\x12\x0c\n\x04Data\x18\x04 \x01(\x0c\x123\n\x08DataType\x18\x05 \x01(\x0e2!.Radiomics.VolumeData3D.DataTypes\x12E\n\x11CompressionMethod\x18\x06 \x01(\x0e2*.Radiomics.VolumeData3D.CompressionMethods"2\n\tDataTypes\x12\x1b\n\x17LittleEndianSignedInt16\x10\x00\x12\x08\n\x04Byte\x10\x01"<\n\x12CompressionMethods\x12\x08\n\x04Gzip\x10\x00\x12\r\n\tRunLength\x10\x01\x12\r\n\tBitPacked\x10\x02"\x1c\n\x0bDoubleValue\x12\r\n\x05Value\x18\x01 \x01(\x01B.\xaa\x02+Microsoft.Radiomics.Segmentation.API.Proto3b\x06proto3'
 )
 
 
@@ -61,11 +61,21 @@ _VOLUMEDATA3D_COMPRESSIONMETHODS = _descriptor.EnumDescriptor(
       serialized_options=None,
       type=None,
       create_key=_descriptor._internal_create_key),
+    _descriptor.EnumValueDescriptor(
+      name='RunLength', index=1, number=1,
+      serialized_options=None,
+      type=None,
+      create_key=_descriptor._internal_create_key),
+    _descriptor.EnumValueDescriptor(
+      name='BitPacked', index=2, number=2,
+      serialized_options=None,
+      type=None,
+      create_key=_descriptor._internal_create_key),
   ],
   containing_type=None,
   serialized_options=None,
   serialized_start=676,
-  serialized_end=706,
+  serialized_end=736,
 )
 _sym_db.RegisterEnumDescriptor(_VOLUMEDATA3D_COMPRESSIONMETHODS)
 
@@ -280,7 +290,7 @@ _VOLUMEDATA3D = _descriptor.Descriptor(
   oneofs=[
   ],
   serialized_start=424,
-  serialized_end=706,
+  serialized_end=736,
 )
 
 
@@ -311,8 +321,8 @@ _DOUBLEVALUE = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=708,
-  serialized_end=736,
+  serialized_start=738,
+  serialized_end=766,
 )
 
 _TRANSFORM3D.fields_by_name['XAxisDirection'].message_type = _VECTOR3D
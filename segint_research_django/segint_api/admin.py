@@ -30,19 +30,79 @@ COST OR EXPENSE ARISING FROM OR RELATING TO SUCH NON-CLINICAL OR OFF-LABEL USE O
 """
 
 from django.contrib import admin
+from django.http import FileResponse, Http404
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.html import format_html
 
 # Register your models here.
 from segint_api.models import *
 
 admin.site.register(Feedback)
 admin.site.register(ModelFamily)
-admin.site.register(SegmentationJob)
 admin.site.register(SegmentationTelemetry)
+admin.site.register(TelemetryRollup)
 admin.site.register(BodyPartExamined)
 admin.site.register(ModelChannelDescription)
-admin.site.register(ModelVersion)
 admin.site.register(Structure)
 
+
+@admin.register(ModelVersion)
+class ModelVersionAdmin(admin.ModelAdmin):
+    '''
+    Model versions with their profiling configuration.
+    '''
+    list_display = ('model_version_id', 'model_type', 'celery_queue', 'major_version', \
+        'minor_version', 'profile_sample_rate', 'profile_memory')
+
+
+@admin.register(SegmentationJob)
+class SegmentationJobAdmin(admin.ModelAdmin):
+    '''
+    Segmentation jobs with their scheduling state.  Profiles of profiled jobs are downloaded
+    through the admin, so that only staff can access them.
+    '''
+    list_display = ('segmentation_id', 'model_id', 'status', 'priority', 'client_key', 'queue', \
+        'time_field', 'dispatched_time', 'completed_time', 'profile_download')
+    list_filter = ('status', 'queue', 'client_key')
+    readonly_fields = ('stage_timings', 'profile_download')
+
+    def get_urls(self):
+        urls = [path('<path:object_id>/profile/', \
+            self.admin_site.admin_view(self.download_profile), \
+            name='segint_api_segmentationjob_profile')]
+        return urls + super().get_urls()
+
+    def download_profile(self, request, object_id):
+        '''
+        Admin view sending the profile archive of a segmentation job.
+        '''
+        seg_job = get_object_or_404(SegmentationJob, pk=object_id)
+        if not seg_job.profile:
+            raise Http404("Segmentation job {} was not profiled.".format(object_id))
+        return FileResponse(seg_job.profile.open('rb'), as_attachment=True, \
+            filename="Profile{}.zip".format(seg_job.segmentation_id))
+
+    def profile_download(self, seg_job):
+        '''
+        Link to the profile archive of profiled jobs.
+        '''
+        if not seg_job.profile:
+            return "-"
+        return format_html('<a href="{}">Download</a>', reverse( \
+            'admin:segint_api_segmentationjob_profile', args=[seg_job.pk]))
+    profile_download.short_description = "Profile"
+
+
+@admin.register(ResultCacheEntry)
+class ResultCacheEntryAdmin(admin.ModelAdmin):
+    '''
+    Cached segmentation results with their usage.
+    '''
+    list_display = ('model_version_id', 'major_version', 'minor_version', 'input_hash', \
+        'size_bytes', 'hits', 'created_time', 'last_access_time')
+    list_filter = ('model_version_id',)
+
 # Minimum customization of admin panel
 admin.site.site_header = "Remote Segmentation Interface (SegInt) Server"
 admin.site.site_title = "Remote Segmentation Interface (SegInt) Server"
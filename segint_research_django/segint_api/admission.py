@@ -0,0 +1,166 @@
+"""
+Copyright 2021 Varian Medical Systems, Inc.
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software 
+and associated documentation files (the "Software"), to deal in the Software without 
+restriction, including without limitation the rights to use, copy, modify, merge, publish, 
+distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the 
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or 
+substantial portions of the Software.
+The Software shall be used for non-clinical use only and shall not be used to enable, provide, 
+or support patient treatment. "Non-clinical" or "non-clinical use" means usage not involving: 
+(i) the direct observation of patients; (ii) the diagnoses of disease or other conditions in 
+humans or other animals; or (iii) the cure, mitigation, therapy, treatment, treatment planning,
+or prevention of disease in humans or other animals to affect the structure or function thereof.  
+The Software is NOT U.S. FDA 510(k) cleared for use on humans and shall not be used on humans.
+Any use of the Software outside of its intended use (“off-label”) could lead to physical harm
+or death of patients. 
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING 
+BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND 
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, 
+DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, 
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE. 
+IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY NON-CLINICAL OR OFF-LABEL 
+USE OF THE SOFTWARE AND ANY PERSON THAT USES, COPIES, MODIFIES, MERGES, PUBLISHES, DISTRIBUTES, 
+SUBLICENSES, AND/OR SELLS COPIES OF THE SOFTWARE UNDER THIS PERMISSION NOTICE HEREBY AGREES TO 
+INDEMNIFY AND HOLD HARMLESS THE AUTHORS AND COPYRIGHT HOLDERS FOR ANY LIABILITY, DEMAND, DAMAGE,
+COST OR EXPENSE ARISING FROM OR RELATING TO SUCH NON-CLINICAL OR OFF-LABEL USE OF THE SOFTWARE.
+"""
+
+"""Admission control for segmentation jobs"""
+
+import math
+from datetime import timedelta
+
+from celery.decorators import task
+from celery.utils.log import get_task_logger
+from django.conf import settings
+from django.db.models import Sum
+from django.utils import timezone
+
+from segint_api.models import SegmentationJob
+from segint_api.scheduler import stale_job_filter
+
+logger = get_task_logger(__name__)
+
+# Jobs that have been accepted but whose model output is not available yet.
+OUTSTANDING_STATUSES = [SegmentationJob.JobStatus.Pending, SegmentationJob.JobStatus.Queued, \
+    SegmentationJob.JobStatus.Running]
+# Jobs that count towards the observed throughput.
+FINISHED_STATUSES = [SegmentationJob.JobStatus.Completed, SegmentationJob.JobStatus.Delivered]
+
+
+class AdmissionRejected(Exception):
+    '''
+    Raised when a segmentation job cannot be accepted without exceeding a configured limit.
+
+    Attributes:
+        status - int - HTTP status code of the rejection, 503 for server-wide limits and 429
+            for the backlog of a single model.
+        details - str - Explanation reported to the client.
+        retry_after - int - Seconds after which the client may retry.
+    '''
+    def __init__(self, status, details, retry_after):
+        super().__init__(details)
+        self.status = status
+        self.details = details
+        self.retry_after = retry_after
+
+
+def get_finished_jobs():
+    '''
+    Jobs finished within the throughput window of SEGINT_ADMISSION.
+
+    Parameters: none
+    Returns:
+        finished - QuerySet - SegmentationJob queryset
+    '''
+    window = timedelta(seconds=settings.SEGINT_ADMISSION['THROUGHPUT_WINDOW_SECONDS'])
+    return SegmentationJob.objects.filter(status__in=FINISHED_STATUSES, \
+        completed_time__gte=timezone.now() - window)
+
+
+def estimate_retry_after(excess, finished):
+    '''
+    Estimates how long it takes until an excess of work has been processed, given the amount
+    of work finished during the throughput window.  The estimate is clamped to the configured
+    bounds; without observed throughput the upper bound is used.
+
+    Parameters:
+        excess - float - Amount of work (jobs or bytes) above the limit
+        finished - float - Amount of the same work finished within the throughput window
+    Returns:
+        retry_after - int - Seconds
+    '''
+    config = settings.SEGINT_ADMISSION
+    if finished <= 0:
+        return config['MAX_RETRY_AFTER_SECONDS']
+    rate = finished / config['THROUGHPUT_WINDOW_SECONDS']
+    retry_after = int(math.ceil(max(excess, 1) / rate))
+    return min(max(retry_after, config['MIN_RETRY_AFTER_SECONDS']), \
+        config['MAX_RETRY_AFTER_SECONDS'])
+
+
+def check_admission(model_id, content_length):
+    '''
+    Checks whether a new segmentation job can be accepted.  Limits set to None are not
+    enforced.  Stale jobs, which the scheduler reclaims, do not count towards the limits.
+    Meant to be called before the request body is read.
+
+    Parameters:
+        model_id - str - Model ID of the requested segmentation
+        content_length - int - Size of the posted model input in bytes
+    Returns: None
+    Raises:
+        AdmissionRejected - If a limit of SEGINT_ADMISSION would be exceeded.
+    '''
+    config = settings.SEGINT_ADMISSION
+    outstanding = SegmentationJob.objects.filter(status__in=OUTSTANDING_STATUSES) \
+        .exclude(stale_job_filter())
+
+    max_jobs = config['MAX_QUEUED_JOBS']
+    if max_jobs is not None:
+        jobs = outstanding.count()
+        if jobs >= max_jobs:
+            raise AdmissionRejected(503, "The server has too many queued segmentation jobs.", \
+                estimate_retry_after(jobs - max_jobs + 1, get_finished_jobs().count()))
+
+    max_bytes = config['MAX_PENDING_BYTES']
+    if max_bytes is not None:
+        pending_bytes = outstanding.aggregate(total=Sum('input_bytes'))['total'] or 0
+        if pending_bytes + content_length > max_bytes:
+            finished_bytes = get_finished_jobs().aggregate(total=Sum('input_bytes'))['total']
+            raise AdmissionRejected(503, "The server has too much pending segmentation input.", \
+                estimate_retry_after(pending_bytes + content_length - max_bytes, \
+                finished_bytes or 0))
+
+    max_backlog = config['MAX_MODEL_BACKLOG']
+    if max_backlog is not None:
+        backlog = outstanding.filter(model_id=model_id).count()
+        if backlog >= max_backlog:
+            raise AdmissionRejected(429, "The requested model has too many queued jobs.", \
+                estimate_retry_after(backlog - max_backlog + 1, \
+                get_finished_jobs().filter(model_id=model_id).count()))
+
+
+@task(name="prune_finished_jobs")
+def prune_finished_jobs():
+    '''
+    Deletes delivered segmentation jobs that have left the throughput window, and failed or
+    never downloaded jobs older than RESULT_RETENTION_SECONDS together with their input and
+    output files.  Run by Celery beat.
+
+    Returns: None
+    '''
+    config = settings.SEGINT_ADMISSION
+    now = timezone.now()
+    pruned, _ = SegmentationJob.objects.filter(status=SegmentationJob.JobStatus.Delivered, \
+        completed_time__lt=now - timedelta(seconds=config['THROUGHPUT_WINDOW_SECONDS'])).delete()
+    expired, _ = SegmentationJob.objects.filter(status__in=[SegmentationJob.JobStatus.Failed, \
+        SegmentationJob.JobStatus.Completed], \
+        completed_time__lt=now - timedelta(seconds=config['RESULT_RETENTION_SECONDS'])).delete()
+    if pruned or expired:
+        logger.info("\nPruned {} delivered and {} expired segmentation jobs".format(pruned, \
+            expired))
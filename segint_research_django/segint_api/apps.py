@@ -29,8 +29,46 @@ INDEMNIFY AND HOLD HARMLESS THE AUTHORS AND COPYRIGHT HOLDERS FOR ANY LIABILITY,
 COST OR EXPENSE ARISING FROM OR RELATING TO SUCH NON-CLINICAL OR OFF-LABEL USE OF THE SOFTWARE.
 """
 
+import logging
+
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_save, post_delete
+from google.protobuf.internal import api_implementation
+
+from segint_api.db import configure_sqlite
+
+logger = logging.getLogger(__name__)
+
+
+def check_protobuf_implementation():
+    '''
+    Warns if protobuf runs on its pure-Python implementation, which parses and serializes
+    model inputs and outputs several times slower than the C++ implementation.  See
+    "python manage.py bench_protobuf".
+
+    Parameters: none
+    Returns:
+        implementation - str - Active protobuf implementation, e.g. "cpp" or "python"
+    '''
+    implementation = api_implementation.Type()
+    if implementation == 'python':
+        logger.warning("The pure-Python protobuf implementation is active, segmentation " \
+            "inputs and outputs are parsed and serialized slowly.  Install a protobuf " \
+            "package with the C++ implementation and do not set " \
+            "PROTOCOL_BUFFERS_PYTHON_IMPLEMENTATION=python.")
+    return implementation
 
 
 class SegintApiConfig(AppConfig):
     name = 'segint_api'
+
+    def ready(self):
+        connection_created.connect(configure_sqlite, dispatch_uid='segint_configure_sqlite')
+        check_protobuf_implementation()
+        from segint_api.models import ModelChannelDescription
+        from segint_api.validation import clear_constraint_cache
+        post_save.connect(clear_constraint_cache, sender=ModelChannelDescription, \
+            dispatch_uid='segint_clear_constraints_on_save')
+        post_delete.connect(clear_constraint_cache, sender=ModelChannelDescription, \
+            dispatch_uid='segint_clear_constraints_on_delete')
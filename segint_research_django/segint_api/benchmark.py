@@ -0,0 +1,291 @@
+"""
+Copyright 2021 Varian Medical Systems, Inc.
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software 
+and associated documentation files (the "Software"), to deal in the Software without 
+restriction, including without limitation the rights to use, copy, modify, merge, publish, 
+distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the 
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or 
+substantial portions of the Software.
+The Software shall be used for non-clinical use only and shall not be used to enable, provide, 
+or support patient treatment. "Non-clinical" or "non-clinical use" means usage not involving: 
+(i) the direct observation of patients; (ii) the diagnoses of disease or other conditions in 
+humans or other animals; or (iii) the cure, mitigation, therapy, treatment, treatment planning,
+or prevention of disease in humans or other animals to affect the structure or function thereof.  
+The Software is NOT U.S. FDA 510(k) cleared for use on humans and shall not be used on humans.
+Any use of the Software outside of its intended use (“off-label”) could lead to physical harm
+or death of patients. 
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING 
+BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND 
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, 
+DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, 
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE. 
+IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY NON-CLINICAL OR OFF-LABEL 
+USE OF THE SOFTWARE AND ANY PERSON THAT USES, COPIES, MODIFIES, MERGES, PUBLISHES, DISTRIBUTES, 
+SUBLICENSES, AND/OR SELLS COPIES OF THE SOFTWARE UNDER THIS PERMISSION NOTICE HEREBY AGREES TO 
+INDEMNIFY AND HOLD HARMLESS THE AUTHORS AND COPYRIGHT HOLDERS FOR ANY LIABILITY, DEMAND, DAMAGE,
+COST OR EXPENSE ARISING FROM OR RELATING TO SUCH NON-CLINICAL OR OFF-LABEL USE OF THE SOFTWARE.
+"""
+
+"""Helpers shared by the benchmark management commands"""
+
+import os
+import gzip
+import bisect
+import json
+import time
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+from django.db import connections
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from protobuf import Model_pb2, Primitives3D_pb2
+
+# Volume shapes (depth, height, width) of synthetic CT scans
+VOLUME_SIZES = {
+    'small': (32, 256, 256),
+    'medium': (96, 512, 512),
+    'large': (192, 512, 512),
+}
+
+
+@contextmanager
+def temporary_database():
+    '''
+    Context manager running a benchmark against a freshly migrated temporary database, so that
+    benchmark data never touches the server database.  With SQLite the temporary database is
+    a file, like db.sqlite3, rather than Django's in-memory test database.
+
+    Parameters: none
+    Returns:
+        connection - django.db connection of the temporary database
+    '''
+    setup_test_environment()
+    connection = connections['default']
+    temp_dir = None
+    if connection.vendor == 'sqlite':
+        temp_dir = tempfile.mkdtemp(prefix='segint_bench_')
+        connection.settings_dict['TEST']['NAME'] = os.path.join(temp_dir, 'benchmark.sqlite3')
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, \
+        serialize=False)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+        if temp_dir is not None:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def summarize_latencies(latencies):
+    '''
+    Summary statistics of a list of latencies.
+
+    Parameters:
+        latencies - [float] - Latencies in seconds
+    Returns:
+        summary - dict - count, and mean/p50/p95/p99/max in milliseconds
+    '''
+    latencies_ms = np.asarray(latencies, dtype=np.float64) * 1000.0
+    if latencies_ms.size == 0:
+        return {'count': 0}
+    p50, p95, p99 = np.percentile(latencies_ms, [50, 95, 99])
+    return {
+        'count': int(latencies_ms.size),
+        'mean_ms': round(float(latencies_ms.mean()), 3),
+        'p50_ms': round(float(p50), 3),
+        'p95_ms': round(float(p95), 3),
+        'p99_ms': round(float(p99), 3),
+        'max_ms': round(float(latencies_ms.max()), 3),
+    }
+
+
+def format_summary(name, summary):
+    '''
+    One-line rendering of a latency summary for console output.
+
+    Parameters:
+        name - str - Label of the measurement
+        summary - dict - Output of summarize_latencies
+    Returns:
+        line - str
+    '''
+    if not summary.get('count'):
+        return "{:<28} no samples".format(name)
+    return "{:<28} n={:<7} mean={:>9.3f}ms p50={:>9.3f}ms p95={:>9.3f}ms p99={:>9.3f}ms " \
+        "max={:>9.3f}ms".format(name, summary['count'], summary['mean_ms'], summary['p50_ms'], \
+        summary['p95_ms'], summary['p99_ms'], summary['max_ms'])
+
+
+def write_results(path, results):
+    '''
+    Writes benchmark results as JSON, e.g. for comparison between runs in CI.
+
+    Parameters:
+        path - str - Output file, nothing is written if empty
+        results - dict - JSON-serializable results
+    Returns: None
+    '''
+    if path:
+        with open(path, 'w') as file_out:
+            json.dump(results, file_out, indent=2, sort_keys=True)
+
+
+def synthetic_ct_volume(shape, seed=0):
+    '''
+    Synthetic CT volume in Hounsfield units: air around an elliptic soft tissue body with two
+    lungs and a spine, plus noise, so that it compresses about as well as real scans.
+
+    Parameters:
+        shape - (int, int, int) - Depth, height and width of the volume
+        seed - int - Seed of the noise
+    Returns:
+        volume - ndarray - int16 volume of the given shape
+    '''
+    depth, height, width = shape
+    y, x = np.ogrid[:height, :width]
+    y = (y - height / 2.0) / height
+    x = (x - width / 2.0) / width
+    body = (y / 0.35) ** 2 + (x / 0.45) ** 2 <= 1.0
+    lungs = ((y + 0.05) / 0.2) ** 2 + ((np.abs(x) - 0.18) / 0.12) ** 2 <= 1.0
+    spine = (y - 0.22) ** 2 + x ** 2 <= 0.04 ** 2
+
+    axial = np.full((height, width), -1000, dtype=np.int16)
+    axial[body] = 40
+    axial[lungs & body] = -850
+    axial[spine] = 700
+    volume = np.broadcast_to(axial, shape).copy()
+    volume += np.random.RandomState(seed).randint(-20, 21, size=shape, dtype=np.int16)
+    return volume
+
+
+def build_ct_model_input(shape, seed=0, channels=1):
+    '''
+    ModelInput protobuf message holding synthetic CT volumes, gzip-compressed like client
+    uploads.
+
+    Parameters:
+        shape - (int, int, int) - Depth, height and width of the volume
+        seed - int - Seed of the noise
+        channels - int - Number of channels, all holding the same volume
+    Returns:
+        model_in - ModelInput.pb - Model input message
+    '''
+    model_in = Model_pb2.ModelInput()
+    model_in.ClientInformation.SoftwareVersion = "benchmark"
+    data = gzip.compress(synthetic_ct_volume(shape, seed).tobytes(), compresslevel=6)
+    for index in range(channels):
+        channel = model_in.Channels.add()
+        channel.ChannelID = "CT{}".format(index)
+        volume = channel.CalibratedVolume.Volume
+        volume.Depth, volume.Height, volume.Width = shape
+        volume.Data = data
+    return model_in
+
+
+def build_model_output(shape, channels=1):
+    '''
+    ModelOutput protobuf message with centered box masks, encoded like
+    tasks.construct_model_out.
+
+    Parameters:
+        shape - (int, int, int) - Depth, height and width of the masks
+        channels - int - Number of output channels
+    Returns:
+        model_out - ModelOutput.pb - Model output message
+    '''
+    depth, height, width = shape
+    mask = np.zeros(shape, dtype=np.byte)
+    mask[depth // 4:3 * depth // 4, height // 4:3 * height // 4, width // 4:3 * width // 4] = 1
+    data = gzip.compress(mask.tobytes())
+    model_out = Model_pb2.ModelOutput()
+    model_out.ModelID = "benchmark"
+    for index in range(channels):
+        out_channel = model_out.Channels.add()
+        out_channel.Structure.StructureID = "Structure{}".format(index)
+        out_channel.Volume.Depth, out_channel.Volume.Height, out_channel.Volume.Width = shape
+        out_channel.Volume.Data = data
+        out_channel.Volume.DataType = Primitives3D_pb2.VolumeData3D.DataTypes.Byte
+    return model_out
+
+
+def directory_bytes(path):
+    '''
+    Total size of the files below a directory.
+
+    Parameters:
+        path - str - Directory
+    Returns:
+        size - int - Size in bytes, 0 if the directory does not exist
+    '''
+    size = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            size += os.path.getsize(os.path.join(root, name))
+    return size
+
+
+class RssSampler(threading.Thread):
+    '''
+    Background thread sampling the resident set size of the process, so that peak memory can
+    be attributed to time windows such as the stages of a segmentation job.  Requires
+    /proc/self/statm (Linux); elsewhere no samples are taken.
+    '''
+
+    def __init__(self, interval=0.002):
+        '''
+        Parameters:
+            interval - float - Seconds between samples
+        '''
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.timestamps = []
+        self.values = []
+        self.stopped = threading.Event()
+        self.page_size = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+    def rss(self):
+        '''
+        Returns:
+            rss - int - Current resident set size in bytes, None if unavailable
+        '''
+        try:
+            with open('/proc/self/statm') as statm:
+                return int(statm.read().split()[1]) * self.page_size
+        except (OSError, IndexError, ValueError):
+            return None
+
+    def run(self):
+        while not self.stopped.is_set():
+            rss = self.rss()
+            if rss is None:
+                return
+            self.timestamps.append(time.time())
+            self.values.append(rss)
+            time.sleep(self.interval)
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+    def peak_between(self, start, end):
+        '''
+        Peak sampled RSS within a window of time.time() timestamps.  Windows shorter than the
+        sampling interval use the last sample before their end.
+
+        Parameters:
+            start, end - float - Window bounds
+        Returns:
+            peak - int - Peak RSS in bytes, None without samples
+        '''
+        first = bisect.bisect_left(self.timestamps, start)
+        last = bisect.bisect_right(self.timestamps, end)
+        if first < last:
+            return max(self.values[first:last])
+        return self.values[last - 1] if last > 0 else None
@@ -0,0 +1,181 @@
+"""
+Copyright 2021 Varian Medical Systems, Inc.
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software 
+and associated documentation files (the "Software"), to deal in the Software without 
+restriction, including without limitation the rights to use, copy, modify, merge, publish, 
+distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the 
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or 
+substantial portions of the Software.
+The Software shall be used for non-clinical use only and shall not be used to enable, provide, 
+or support patient treatment. "Non-clinical" or "non-clinical use" means usage not involving: 
+(i) the direct observation of patients; (ii) the diagnoses of disease or other conditions in 
+humans or other animals; or (iii) the cure, mitigation, therapy, treatment, treatment planning,
+or prevention of disease in humans or other animals to affect the structure or function thereof.  
+The Software is NOT U.S. FDA 510(k) cleared for use on humans and shall not be used on humans.
+Any use of the Software outside of its intended use (“off-label”) could lead to physical harm
+or death of patients. 
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING 
+BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND 
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, 
+DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, 
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE. 
+IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY NON-CLINICAL OR OFF-LABEL 
+USE OF THE SOFTWARE AND ANY PERSON THAT USES, COPIES, MODIFIES, MERGES, PUBLISHES, DISTRIBUTES, 
+SUBLICENSES, AND/OR SELLS COPIES OF THE SOFTWARE UNDER THIS PERMISSION NOTICE HEREBY AGREES TO 
+INDEMNIFY AND HOLD HARMLESS THE AUTHORS AND COPYRIGHT HOLDERS FOR ANY LIABILITY, DEMAND, DAMAGE,
+COST OR EXPENSE ARISING FROM OR RELATING TO SUCH NON-CLINICAL OR OFF-LABEL USE OF THE SOFTWARE.
+"""
+
+"""Database connection setup and write coalescing"""
+
+import time
+import threading
+
+from django.conf import settings
+from django.db import transaction
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    '''
+    connection_created signal handler applying SEGINT_SQLITE_PRAGMAS to new SQLite
+    connections.  WAL journaling lets readers proceed while the web server or a Celery worker
+    writes, and busy_timeout makes writers wait for the lock instead of failing with
+    "database is locked".
+
+    Parameters:
+        connection - django.db connection that was opened
+    Returns: None
+    '''
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for pragma, value in settings.SEGINT_SQLITE_PRAGMAS.items():
+            cursor.execute("PRAGMA {} = {}".format(pragma, value))
+
+
+class PendingWrite:
+    '''
+    A database write waiting in a WriteCoalescer, and its outcome.
+    '''
+    def __init__(self, write):
+        self.write = write
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class WriteCoalescer:
+    '''
+    Group commit of small database writes made by concurrent request threads.  The first
+    thread to submit a write becomes the leader: it waits briefly for other threads to submit
+    theirs and commits them all in one transaction, so that N concurrent writes take the
+    database lock once instead of N times.  Every write runs in its own savepoint, a failing
+    write is rolled back and its exception re-raised in the submitting thread only.
+
+    submit() returns once the write is committed, so callers keep their semantics.  Writes
+    are only coalesced across threads of one process, e.g. threaded runserver or gunicorn
+    gthread workers.
+    '''
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = []
+        self._leading = False
+
+    def submit(self, write):
+        '''
+        Runs a write function in a coalesced transaction.
+
+        Parameters:
+            write - callable - Function performing the database write, without arguments
+        Returns:
+            result - Return value of write
+        Raises:
+            Exception - Any exception raised by write, or by the commit.
+        '''
+        config = settings.SEGINT_WRITE_COALESCING
+        if not config['ENABLED'] or transaction.get_connection().in_atomic_block:
+            # Nothing to coalesce with inside an outer transaction.
+            with transaction.atomic():
+                return write()
+
+        pending_write = PendingWrite(write)
+        with self._lock:
+            self._pending.append(pending_write)
+            lead = not self._leading
+            self._leading = True
+        if lead:
+            self._lead(config)
+        pending_write.done.wait()
+        if pending_write.error is not None:
+            raise pending_write.error
+        return pending_write.result
+
+    def _lead(self, config):
+        '''
+        Commits batches of pending writes until none are left, then gives up leadership.  If
+        the leader is interrupted, e.g. by SystemExit, the writes still pending fail and the
+        next submitter becomes the leader.
+        '''
+        try:
+            if config['MAX_DELAY_SECONDS'] > 0:
+                time.sleep(config['MAX_DELAY_SECONDS'])
+            while True:
+                with self._lock:
+                    batch = self._pending[:config['MAX_BATCH']]
+                    del self._pending[:len(batch)]
+                    if not batch:
+                        self._leading = False
+                        return
+                self._commit(batch)
+        except BaseException:
+            with self._lock:
+                batch, self._pending = self._pending, []
+                self._leading = False
+            self._fail(batch, RuntimeError("The coalesced write was interrupted."))
+            raise
+
+    @staticmethod
+    def _fail(batch, error):
+        '''
+        Reports an error to the writes of a batch that have no outcome yet.
+        '''
+        for pending_write in batch:
+            if pending_write.error is None:
+                pending_write.error = error
+            pending_write.done.set()
+
+    @classmethod
+    def _commit(cls, batch):
+        '''
+        Runs a batch of writes in one transaction, each within a savepoint.
+        '''
+        try:
+            with transaction.atomic():
+                for pending_write in batch:
+                    try:
+                        with transaction.atomic():
+                            pending_write.result = pending_write.write()
+                    except Exception as exc:
+                        pending_write.error = exc
+        except Exception as exc:
+            cls._fail(batch, exc)
+        except BaseException:
+            # The transaction was rolled back, including the writes that succeeded.
+            cls._fail(batch, RuntimeError("The coalesced write was interrupted."))
+            raise
+        else:
+            for pending_write in batch:
+                pending_write.done.set()
+
+
+WRITE_COALESCER = WriteCoalescer()
+
+
+def coalesced_write(write):
+    '''
+    Submits a write function to the process-wide WriteCoalescer.  See WriteCoalescer.submit
+    '''
+    return WRITE_COALESCER.submit(write)
@@ -0,0 +1,126 @@
+"""
+Copyright 2021 Varian Medical Systems, Inc.
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software 
+and associated documentation files (the "Software"), to deal in the Software without 
+restriction, including without limitation the rights to use, copy, modify, merge, publish, 
+distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the 
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or 
+substantial portions of the Software.
+The Software shall be used for non-clinical use only and shall not be used to enable, provide, 
+or support patient treatment. "Non-clinical" or "non-clinical use" means usage not involving: 
+(i) the direct observation of patients; (ii) the diagnoses of disease or other conditions in 
+humans or other animals; or (iii) the cure, mitigation, therapy, treatment, treatment planning,
+or prevention of disease in humans or other animals to affect the structure or function thereof.  
+The Software is NOT U.S. FDA 510(k) cleared for use on humans and shall not be used on humans.
+Any use of the Software outside of its intended use (“off-label”) could lead to physical harm
+or death of patients. 
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING 
+BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND 
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, 
+DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, 
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE. 
+IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY NON-CLINICAL OR OFF-LABEL 
+USE OF THE SOFTWARE AND ANY PERSON THAT USES, COPIES, MODIFIES, MERGES, PUBLISHES, DISTRIBUTES, 
+SUBLICENSES, AND/OR SELLS COPIES OF THE SOFTWARE UNDER THIS PERMISSION NOTICE HEREBY AGREES TO 
+INDEMNIFY AND HOLD HARMLESS THE AUTHORS AND COPYRIGHT HOLDERS FOR ANY LIABILITY, DEMAND, DAMAGE,
+COST OR EXPENSE ARISING FROM OR RELATING TO SUCH NON-CLINICAL OR OFF-LABEL USE OF THE SOFTWARE.
+"""
+
+"""Deduplication of segmentation jobs with identical model input"""
+
+import hashlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.utils import timezone
+
+from segint_api.models import SegmentationJob
+from segint_api.admission import OUTSTANDING_STATUSES
+
+
+def hash_model_input(model_id, model_in):
+    '''
+    Content hash of a segmentation request.  Covers the model ID and the serialized input
+    channels, but not the client information, so that retries of an upload hash identically.
+
+    Parameters:
+        model_id - str - Model ID of the requested segmentation
+        model_in - ModelInput.pb - Parsed model input
+    Returns:
+        input_hash - str - Hexadecimal SHA-256 digest
+    '''
+    digest = hashlib.sha256()
+    digest.update(model_id.encode('utf-8'))
+    for channel in model_in.Channels:
+        channel_bytes = channel.SerializeToString(deterministic=True)
+        # Length prefix keeps channel boundaries unambiguous.
+        digest.update(len(channel_bytes).to_bytes(8, 'little'))
+        digest.update(channel_bytes)
+    return digest.hexdigest()
+
+
+def find_outstanding_duplicate(seg_job):
+    '''
+    Finds a job of the same client with identical input that is still pending, queued or
+    running.  Retried uploads are answered with this job instead of creating a new one.
+
+    Parameters:
+        seg_job - django.db.SegmentationJob - Unsaved job with model_id, client_key,
+            input_hash and crop_output set
+    Returns:
+        duplicate - django.db.SegmentationJob - Outstanding job, None if there is none
+    '''
+    return SegmentationJob.objects.filter(model_id=seg_job.model_id, \
+        input_hash=seg_job.input_hash, client_key=seg_job.client_key, \
+        crop_output=seg_job.crop_output, status__in=OUTSTANDING_STATUSES).order_by('time_field').first()
+
+
+def find_completed_duplicate(seg_job):
+    '''
+    Finds a job with identical input that completed within the reuse window of SEGINT_DEDUP
+    and whose model output, cropped the same way, has not been downloaded yet.
+
+    Parameters:
+        seg_job - django.db.SegmentationJob - Unsaved job with model_id, input_hash and
+            crop_output set
+    Returns:
+        duplicate - django.db.SegmentationJob - Completed job, None if there is none
+    '''
+    window = settings.SEGINT_DEDUP['REUSE_WINDOW_SECONDS']
+    if not window:
+        return None
+    return SegmentationJob.objects.filter(model_id=seg_job.model_id, \
+        input_hash=seg_job.input_hash, crop_output=seg_job.crop_output, \
+        status=SegmentationJob.JobStatus.Completed, \
+        completed_time__gte=timezone.now() - timedelta(seconds=window)) \
+        .exclude(model_output='').order_by('-completed_time').first()
+
+
+def reuse_model_output(seg_job, model_output):
+    '''
+    Completes a job with a copy of an existing model output, e.g. of another job with identical
+    input.  The output is copied so that each job can be downloaded, and released,
+    independently.  The output may be deleted concurrently, e.g. when the other job is
+    delivered, in which case the job is left unchanged.
+
+    Parameters:
+        seg_job - django.db.SegmentationJob - Unsaved job to complete
+        model_output - FieldFile - Stored model output to reuse
+    Returns:
+        reused - bool - Whether the job was completed, False if the output no longer exists
+    '''
+    try:
+        file_in = open(model_output.path, 'rb')
+    except FileNotFoundError:
+        return False
+    with file_in:
+        fname = "{}.pb".format("Result{}".format(seg_job.segmentation_id))
+        seg_job.model_output.save(fname, File(file_in), save=False)
+    seg_job.status = SegmentationJob.JobStatus.Completed
+    seg_job.completed_time = timezone.now()
+    seg_job.save()
+    return True
@@ -0,0 +1,276 @@
+"""
+Copyright 2021 Varian Medical Systems, Inc.
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software 
+and associated documentation files (the "Software"), to deal in the Software without 
+restriction, including without limitation the rights to use, copy, modify, merge, publish, 
+distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the 
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or 
+substantial portions of the Software.
+The Software shall be used for non-clinical use only and shall not be used to enable, provide, 
+or support patient treatment. "Non-clinical" or "non-clinical use" means usage not involving: 
+(i) the direct observation of patients; (ii) the diagnoses of disease or other conditions in 
+humans or other animals; or (iii) the cure, mitigation, therapy, treatment, treatment planning,
+or prevention of disease in humans or other animals to affect the structure or function thereof.  
+The Software is NOT U.S. FDA 510(k) cleared for use on humans and shall not be used on humans.
+Any use of the Software outside of its intended use (“off-label”) could lead to physical harm
+or death of patients. 
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING 
+BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND 
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, 
+DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, 
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE. 
+IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY NON-CLINICAL OR OFF-LABEL 
+USE OF THE SOFTWARE AND ANY PERSON THAT USES, COPIES, MODIFIES, MERGES, PUBLISHES, DISTRIBUTES, 
+SUBLICENSES, AND/OR SELLS COPIES OF THE SOFTWARE UNDER THIS PERMISSION NOTICE HEREBY AGREES TO 
+INDEMNIFY AND HOLD HARMLESS THE AUTHORS AND COPYRIGHT HOLDERS FOR ANY LIABILITY, DEMAND, DAMAGE,
+COST OR EXPENSE ARISING FROM OR RELATING TO SUCH NON-CLINICAL OR OFF-LABEL USE OF THE SOFTWARE.
+"""
+
+"""Production launcher of the web server, the Celery worker pools and Celery beat"""
+
+import os
+import sys
+import glob
+import time
+import signal
+import logging
+import threading
+import subprocess
+import multiprocessing
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Application served by the web server per worker class of SEGINT_SERVER
+WEB_APPLICATIONS = {
+    'asgi': 'segint_research_django.asgi:application',
+    'wsgi': 'segint_research_django.wsgi:application',
+}
+
+
+def worker_queues():
+    '''
+    Celery queues with the worker pool settings of SEGINT_QUEUES.  The default queue, used by
+    non-segmentation tasks, is listed first.
+
+    Parameters: none
+    Returns:
+        queues - [(str, int, int)] - Queue name, concurrency and prefetch multiplier
+    '''
+    queues = [(settings.CELERY_DEFAULT_QUEUE, 1, 4)]
+    for queue, definition in settings.SEGINT_QUEUES.items():
+        queues.append((queue, definition['concurrency'], definition['prefetch_multiplier']))
+    return queues
+
+
+def cpu_count():
+    '''
+    CPU cores available to this process.
+    '''
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return multiprocessing.cpu_count()
+
+
+def web_worker_count(worker_class, cpu_count):
+    '''
+    Number of web server processes derived from the CPU cores.  ASGI workers serve many
+    connections on their event loop, so one per core suffices; threaded WSGI workers follow
+    gunicorn's recommendation of 2 * cores + 1.  Capped at SEGINT_SERVER['MAX_WORKERS'].
+
+    Parameters:
+        worker_class - str - 'asgi' or 'wsgi'
+        cpu_count - int - CPU cores of the machine
+    Returns:
+        workers - int - Number of web server processes
+    '''
+    workers = cpu_count if worker_class == 'asgi' else 2 * cpu_count + 1
+    return max(1, min(workers, settings.SEGINT_SERVER['MAX_WORKERS']))
+
+
+def console_script(name):
+    '''
+    Path of a console script installed next to the running interpreter, e.g. in the virtual
+    environment, falling back to a lookup on PATH.
+    '''
+    path = os.path.join(os.path.dirname(sys.executable), name)
+    return path if os.path.exists(path) else name
+
+
+def prepare_metrics_dir(path):
+    '''
+    Creates the directory the server processes share their Prometheus metrics through, see
+    metrics.render_metrics, and removes the metrics of earlier runs.
+
+    Parameters:
+        path - str - Directory exported as prometheus_multiproc_dir
+    Returns:
+        path - str - The directory
+    '''
+    os.makedirs(path, exist_ok=True)
+    for metrics_file in glob.glob(os.path.join(path, '*.db')):
+        os.remove(metrics_file)
+    return path
+
+
+def web_server_command(config, workers):
+    '''
+    Command line of gunicorn serving the API.  The application is preloaded in the gunicorn
+    master, so workers are forked with Django already set up.  The server hooks of
+    gunicorn_config remove the metrics of exited workers.
+
+    Parameters:
+        config - dict - SEGINT_SERVER settings
+        workers - int - Number of web server processes
+    Returns:
+        command - [str] - Command line
+    '''
+    command = [console_script('gunicorn'), WEB_APPLICATIONS[config['WORKER_CLASS']], \
+        '--bind', config['BIND'], '--workers', str(workers), '--preload', \
+        '--graceful-timeout', str(config['SHUTDOWN_TIMEOUT_SECONDS']), \
+        '--config', 'python:segint_api.gunicorn_config']
+    if config['WORKER_CLASS'] == 'asgi':
+        # The views of the ASGI application run on ASGI_THREADS threads per worker.
+        return command + ['--worker-class', 'uvicorn.workers.UvicornWorker']
+    return command + ['--worker-class', 'gthread', '--threads', str(config['THREADS'])]
+
+
+def celery_commands():
+    '''
+    Command lines of one Celery worker pool per queue and of Celery beat.
+
+    Parameters: none
+    Returns:
+        commands - [(str, [str])] - Process name and command line
+    '''
+    celery = [sys.executable, '-m', 'celery', '-A', 'segint_research_django']
+    commands = []
+    for queue, concurrency, prefetch in worker_queues():
+        commands.append(("celery {}".format(queue), celery + ['worker', '-l', 'info', \
+            '-Q', queue, '-n', '{}@%h'.format(queue), '-c', str(concurrency), \
+            '--prefetch-multiplier', str(prefetch)]))
+    commands.append(("celery beat", celery + ['beat', '-l', 'info']))
+    return commands
+
+
+class Launcher:
+    '''
+    Runs the server processes and shuts them down together.  SIGTERM or SIGINT to the
+    launcher, or the exit of any process, sends SIGTERM to all processes: gunicorn finishes
+    open requests and Celery workers finish their running tasks.  Processes still running
+    after the shutdown timeout are killed.  Processes run in their own session, so a Ctrl-C
+    in the terminal only reaches the launcher.
+    '''
+
+    def __init__(self, commands, shutdown_timeout, env=None, cwd=None):
+        '''
+        Parameters:
+            commands - [(str, [str])] - Process name and command line
+            shutdown_timeout - float - Seconds processes get to exit after SIGTERM
+            env - dict - Environment of the processes, the launcher's if None
+            cwd - str - Working directory of the processes
+        '''
+        self.commands = commands
+        self.shutdown_timeout = shutdown_timeout
+        self.env = env
+        self.cwd = cwd
+        self.processes = []
+        self.stopping = threading.Event()
+
+    def request_stop(self, signum, frame):
+        logger.info("Received signal %s, shutting down", signum)
+        self.stopping.set()
+
+    def run(self):
+        '''
+        Starts all processes and supervises them until shutdown.
+
+        Parameters: none
+        Returns:
+            exit_code - int - 0 after a requested shutdown, 1 if a process exited by itself
+        '''
+        handlers = {signum: signal.signal(signum, self.request_stop) \
+            for signum in (signal.SIGTERM, signal.SIGINT)}
+        exit_code = 0
+        try:
+            for name, command in self.commands:
+                logger.info("Starting %s: %s", name, " ".join(command))
+                self.processes.append((name, subprocess.Popen(command, env=self.env, \
+                    cwd=self.cwd, start_new_session=True)))
+            while not self.stopping.wait(0.5):
+                exited = [(name, process) for name, process in self.processes \
+                    if process.poll() is not None]
+                if exited:
+                    for name, process in exited:
+                        logger.error("%s exited with code %s", name, process.returncode)
+                    exit_code = 1
+                    break
+        finally:
+            self.stop()
+            for signum, handler in handlers.items():
+                signal.signal(signum, handler)
+        return exit_code
+
+    def stop(self):
+        '''
+        Sends SIGTERM to the process groups of all running processes and kills the groups not
+        exiting in time.  Children of the processes, such as gunicorn and Celery pool workers,
+        are in the process group of their parent.
+        '''
+        for name, process in self.processes:
+            if process.poll() is None:
+                signal_process_group(process, signal.SIGTERM)
+        deadline = time.monotonic() + self.shutdown_timeout
+        for name, process in self.processes:
+            try:
+                process.wait(max(0.0, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                logger.warning("%s did not shut down in time, killing it", name)
+            # Also kills children left behind by a process that exited.
+            signal_process_group(process, signal.SIGKILL)
+            process.wait()
+
+
+def signal_process_group(process, signum):
+    '''
+    Sends a signal to the process group a process leads, see start_new_session of
+    subprocess.Popen.
+
+    Parameters:
+        process - subprocess.Popen - Process started in its own session
+        signum - int - Signal to send
+    '''
+    try:
+        os.killpg(process.pid, signum)
+    except ProcessLookupError:
+        pass
+
+
+def stop_launcher(pid_file, timeout):
+    '''
+    Sends SIGTERM to the launcher recorded in a PID file and waits for it to exit.
+
+    Parameters:
+        pid_file - str - PID file written by the launcher
+        timeout - float - Seconds to wait
+    Returns:
+        stopped - bool - Whether the launcher exited, or was not running
+    '''
+    try:
+        with open(pid_file) as file_in:
+            pid = int(file_in.read())
+        os.kill(pid, signal.SIGTERM)
+    except (OSError, ValueError):
+        return True
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            os.kill(pid, 0)
+        except OSError:
+            return True
+        time.sleep(0.2)
+    return False
@@ -0,0 +1,162 @@
+"""
+Copyright 2021 Varian Medical Systems, Inc.
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software 
+and associated documentation files (the "Software"), to deal in the Software without 
+restriction, including without limitation the rights to use, copy, modify, merge, publish, 
+distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the 
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or 
+substantial portions of the Software.
+The Software shall be used for non-clinical use only and shall not be used to enable, provide, 
+or support patient treatment. "Non-clinical" or "non-clinical use" means usage not involving: 
+(i) the direct observation of patients; (ii) the diagnoses of disease or other conditions in 
+humans or other animals; or (iii) the cure, mitigation, therapy, treatment, treatment planning,
+or prevention of disease in humans or other animals to affect the structure or function thereof.  
+The Software is NOT U.S. FDA 510(k) cleared for use on humans and shall not be used on humans.
+Any use of the Software outside of its intended use (“off-label”) could lead to physical harm
+or death of patients. 
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING 
+BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND 
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, 
+DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, 
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE. 
+IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY NON-CLINICAL OR OFF-LABEL 
+USE OF THE SOFTWARE AND ANY PERSON THAT USES, COPIES, MODIFIES, MERGES, PUBLISHES, DISTRIBUTES, 
+SUBLICENSES, AND/OR SELLS COPIES OF THE SOFTWARE UNDER THIS PERMISSION NOTICE HEREBY AGREES TO 
+INDEMNIFY AND HOLD HARMLESS THE AUTHORS AND COPYRIGHT HOLDERS FOR ANY LIABILITY, DEMAND, DAMAGE,
+COST OR EXPENSE ARISING FROM OR RELATING TO SUCH NON-CLINICAL OR OFF-LABEL USE OF THE SOFTWARE.
+"""
+
+"""Loading of user-provided model support modules"""
+
+import os
+import sys
+import types
+import pickle
+import hashlib
+import threading
+import importlib.util
+
+# Module names that pickled models commonly reference for their support classes.  Models
+# saved from a training script point at '__main__'; older models on this server were resolved
+# through the segmentation tasks module.
+FALLBACK_MODULE_NAMES = ('__main__', 'segint_api.tasks')
+
+_MODULE_CACHE = {}
+# File hash by path, valid while the modification time and size of the file are unchanged
+_HASH_CACHE = {}
+_MODULE_CACHE_LOCK = threading.Lock()
+
+
+def hash_file(path):
+    '''
+    Computes the SHA-256 digest of a file on disk.
+
+    Parameters:
+        path - str - Path of the file to hash
+    Returns:
+        digest - str - Hexadecimal digest of the file contents
+    '''
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file_in:
+        for block in iter(lambda: file_in.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cached_file_hash(path):
+    '''
+    SHA-256 digest of a file, only recomputed when its modification time or size changed.
+
+    Parameters:
+        path - str - Path of the file to hash
+    Returns:
+        digest - str - Hexadecimal digest of the file contents
+    '''
+    stat = os.stat(path)
+    signature = (stat.st_mtime_ns, stat.st_size)
+    with _MODULE_CACHE_LOCK:
+        cached = _HASH_CACHE.get(path)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+    file_hash = hash_file(path)
+    with _MODULE_CACHE_LOCK:
+        _HASH_CACHE[path] = (signature, file_hash)
+    return file_hash
+
+
+def load_model_module(path):
+    '''
+    Loads a model support module from an arbitrary file location without touching sys.path
+    or the module names of the file.  Modules are cached by the hash of their contents, so
+    repeated jobs reuse the already executed module and an updated upload is picked up on the
+    next job.  The file is only hashed again when its modification time or size changes.
+    Modules are registered in sys.modules under a unique name, which dataclasses, typing and
+    pickle need to resolve the classes defined in them.
+
+    Parameters:
+        path - str - Path to the python source file of the module
+    Returns:
+        module - module - The executed module.  module.__segint_name__ holds the module name
+            the file would have been imported under.
+    '''
+    file_hash = cached_file_hash(path)
+    with _MODULE_CACHE_LOCK:
+        module = _MODULE_CACHE.get(file_hash)
+        if module is not None:
+            return module
+
+        original_name = os.path.splitext(os.path.basename(path))[0]
+        # Unique name so that two model modules with the same file name cannot collide.
+        unique_name = "segint_model_{}_{}".format(original_name, file_hash[:16])
+        spec = importlib.util.spec_from_file_location(unique_name, path)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[unique_name] = module
+        try:
+            spec.loader.exec_module(module)
+        except BaseException:
+            del sys.modules[unique_name]
+            raise
+        module.__segint_name__ = original_name
+        _MODULE_CACHE[file_hash] = module
+        return module
+
+
+def model_pickle_module(model_module):
+    '''
+    Builds a pickle-compatible module whose unpickler resolves classes and functions from the
+    given model support module before falling back to regular imports.  Suitable for the
+    'pickle_module' argument of torch.load.
+
+    Parameters:
+        model_module - module - Module returned by load_model_module
+    Returns:
+        pickle_module - module - Namespace exposing Unpickler and load
+    '''
+    namespace_names = FALLBACK_MODULE_NAMES + \
+        (model_module.__segint_name__, model_module.__name__)
+
+    class ModelUnpickler(pickle.Unpickler):
+        '''
+        Unpickler resolving globals against an isolated model module namespace.
+        '''
+        def find_class(self, module, name):
+            if module in namespace_names and hasattr(model_module, name):
+                return getattr(model_module, name)
+            return super().find_class(module, name)
+
+    def load(file_in, **kwargs):
+        return ModelUnpickler(file_in, **kwargs).load()
+
+    pickle_module = types.ModuleType("segint_model_pickle")
+    pickle_module.Unpickler = ModelUnpickler
+    pickle_module.load = load
+    pickle_module.loads = pickle.loads
+    pickle_module.Pickler = pickle.Pickler
+    pickle_module.dump = pickle.dump
+    pickle_module.dumps = pickle.dumps
+    pickle_module.HIGHEST_PROTOCOL = pickle.HIGHEST_PROTOCOL
+    pickle_module.DEFAULT_PROTOCOL = pickle.DEFAULT_PROTOCOL
+    return pickle_module
@@ -0,0 +1,225 @@
+"""
+Copyright 2021 Varian Medical Systems, Inc.
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software 
+and associated documentation files (the "Software"), to deal in the Software without 
+restriction, including without limitation the rights to use, copy, modify, merge, publish, 
+distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the 
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or 
+substantial portions of the Software.
+The Software shall be used for non-clinical use only and shall not be used to enable, provide, 
+or support patient treatment. "Non-clinical" or "non-clinical use" means usage not involving: 
+(i) the direct observation of patients; (ii) the diagnoses of disease or other conditions in 
+humans or other animals; or (iii) the cure, mitigation, therapy, treatment, treatment planning,
+or prevention of disease in humans or other animals to affect the structure or function thereof.  
+The Software is NOT U.S. FDA 510(k) cleared for use on humans and shall not be used on humans.
+Any use of the Software outside of its intended use (“off-label”) could lead to physical harm
+or death of patients. 
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING 
+BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND 
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, 
+DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, 
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE. 
+IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY NON-CLINICAL OR OFF-LABEL 
+USE OF THE SOFTWARE AND ANY PERSON THAT USES, COPIES, MODIFIES, MERGES, PUBLISHES, DISTRIBUTES, 
+SUBLICENSES, AND/OR SELLS COPIES OF THE SOFTWARE UNDER THIS PERMISSION NOTICE HEREBY AGREES TO 
+INDEMNIFY AND HOLD HARMLESS THE AUTHORS AND COPYRIGHT HOLDERS FOR ANY LIABILITY, DEMAND, DAMAGE,
+COST OR EXPENSE ARISING FROM OR RELATING TO SUCH NON-CLINICAL OR OFF-LABEL USE OF THE SOFTWARE.
+"""
+
+"""Concurrency benchmark of SQLite writes from web requests and Celery workers"""
+
+import time
+import platform
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction, OperationalError
+from django.test import Client, override_settings
+from django.utils import timezone
+
+from protobuf import Model_pb2
+from segint_api.models import SegmentationJob
+from segint_api.benchmark import temporary_database, summarize_latencies, format_summary, \
+    write_results
+
+# Connection setup of each scenario; 'rollback-journal' matches SQLite's defaults.
+SCENARIOS = [
+    ('rollback-journal', {'journal_mode': 'DELETE', 'synchronous': 'FULL', \
+        'busy_timeout': 5000}, False),
+    ('wal', {'journal_mode': 'WAL', 'synchronous': 'NORMAL', 'busy_timeout': 20000}, False),
+    ('wal+coalescing', {'journal_mode': 'WAL', 'synchronous': 'NORMAL', \
+        'busy_timeout': 20000}, True),
+]
+
+
+class Command(BaseCommand):
+    '''
+    Posts telemetry and feedback from concurrent clients while a simulated Celery worker
+    stores segmentation results and a client polls progress, once per SQLite configuration:
+    rollback journal, WAL, and WAL with write coalescing.  Reports latencies and errors such
+    as "database is locked" for each.
+
+    Usage:
+        python manage.py bench_db_writes [--clients 16] [--requests 50] [--json FILE]
+    '''
+    help = "Measures concurrent SQLite write latency with and without WAL and write coalescing."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=16, \
+            help="Concurrent clients posting telemetry and feedback.")
+        parser.add_argument('--requests', type=int, default=50, \
+            help="Requests per client.")
+        parser.add_argument('--worker-updates', type=int, default=200, \
+            help="Result updates of the simulated Celery worker.")
+        parser.add_argument('--json', default='', help="Write results as JSON to this file.")
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError("bench_db_writes measures SQLite; the configured database is " \
+                "{}.".format(connection.vendor))
+        results = {'benchmark': 'db_writes', 'python': platform.python_version(), \
+            'clients': options['clients'], 'requests': options['requests'], 'scenarios': {}}
+        for name, pragmas, coalescing in SCENARIOS:
+            coalescing_config = {'ENABLED': coalescing, 'MAX_BATCH': 64, \
+                'MAX_DELAY_SECONDS': 0.002}
+            with override_settings(SEGINT_SQLITE_PRAGMAS=pragmas, \
+                    SEGINT_WRITE_COALESCING=coalescing_config):
+                connection.close()
+                with temporary_database():
+                    scenario = self.run_scenario(options)
+            results['scenarios'][name] = scenario
+            self.stdout.write("{}: {:.2f}s, {} errors".format(name, scenario['elapsed_s'], \
+                scenario['errors']))
+            for measurement in ('telemetry', 'feedback', 'worker_update', 'poll'):
+                self.stdout.write("  " + format_summary(measurement, scenario[measurement]))
+        write_results(options['json'], results)
+
+    def run_scenario(self, options):
+        '''
+        Runs the concurrent workload against the current temporary database.
+        '''
+        now = timezone.now()
+        seg_jobs = [SegmentationJob.objects.create(model_id="Benchmark Model", \
+            status=SegmentationJob.JobStatus.Running, time_field=now.replace(microsecond=index)) \
+            for index in range(10)]
+        telemetry_pb, feedback_pb = self.build_messages()
+        errors = []
+        stop = threading.Event()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['clients'] + 2) as executor:
+            worker = executor.submit(self.simulate_worker, seg_jobs, options['worker_updates'], \
+                errors)
+            poller = executor.submit(self.poll, seg_jobs, stop, errors)
+            clients = [executor.submit(self.post, telemetry_pb, feedback_pb, \
+                options['requests'], errors) for _ in range(options['clients'])]
+            client_latencies = [client.result() for client in clients]
+            worker_latencies = worker.result()
+            stop.set()
+            poll_latencies = poller.result()
+        elapsed = time.perf_counter() - started
+
+        return {
+            'elapsed_s': round(elapsed, 3),
+            'errors': len(errors),
+            'error_messages': sorted(set(errors))[:5],
+            'telemetry': summarize_latencies(sum([latency[0] for latency in client_latencies], \
+                [])),
+            'feedback': summarize_latencies(sum([latency[1] for latency in client_latencies], \
+                [])),
+            'worker_update': summarize_latencies(worker_latencies),
+            'poll': summarize_latencies(poll_latencies),
+        }
+
+    @staticmethod
+    def build_messages():
+        '''
+        Serialized telemetry and feedback messages as posted by clients.
+        '''
+        telemetry = Model_pb2.SegmentationTelemetry()
+        telemetry.ClientInformation.SoftwareVersion = "benchmark"
+        telemetry.UploadTimeInMilliseconds = 1200
+        telemetry.SegmentationWaitInMilliseconds = 30000
+        telemetry.ModelID = "Benchmark Model"
+        feedback = Model_pb2.SegmentationFeedback()
+        feedback.ClientInformation.SoftwareVersion = "benchmark"
+        feedback.SegmentationAccepted = True
+        feedback.GeneralScore.Value = 0.8
+        for index in range(3):
+            comment = feedback.StructureComments.add()
+            comment.StructureID = "Structure {}".format(index)
+            comment.Score.Value = 0.5
+        return telemetry.SerializeToString(), feedback.SerializeToString()
+
+    @staticmethod
+    def post(telemetry_pb, feedback_pb, requests, errors):
+        '''
+        Client posting alternately telemetry and feedback.
+        '''
+        client = Client()
+        telemetry_latencies, feedback_latencies = [], []
+        try:
+            for index in range(requests):
+                path, body, latencies = ('/api/v2/Telemetry/segmentation', telemetry_pb, \
+                    telemetry_latencies) if index % 2 == 0 else \
+                    ('/api/v2/Feedback/segmentation', feedback_pb, feedback_latencies)
+                started = time.perf_counter()
+                response = client.post(path, body, content_type='application/x-protobuf', \
+                    HTTP_ACCEPT='application/x-protobuf')
+                latencies.append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    errors.append("{} returned {}".format(path, response.status_code))
+        finally:
+            connection.close()
+        return telemetry_latencies, feedback_latencies
+
+    @staticmethod
+    def simulate_worker(seg_jobs, updates, errors):
+        '''
+        Celery worker storing segmentation results, like save_to_disk and mark_completed.
+        '''
+        latencies = []
+        try:
+            for index in range(updates):
+                seg_job = seg_jobs[index % len(seg_jobs)]
+                started = time.perf_counter()
+                try:
+                    with transaction.atomic():
+                        SegmentationJob.objects.filter(pk=seg_job.pk).update( \
+                            model_output="results/Result{}.pb".format(seg_job.pk))
+                        SegmentationJob.objects.filter(pk=seg_job.pk).update( \
+                            completed_time=timezone.now())
+                except OperationalError as exc:
+                    errors.append(str(exc))
+                latencies.append(time.perf_counter() - started)
+                time.sleep(0.001)
+        finally:
+            connection.close()
+        return latencies
+
+    @staticmethod
+    def poll(seg_jobs, stop, errors):
+        '''
+        Client polling job progress until the other clients are done.
+        '''
+        client = Client()
+        latencies = []
+        index = 0
+        try:
+            while not stop.is_set():
+                seg_job = seg_jobs[index % len(seg_jobs)]
+                started = time.perf_counter()
+                response = client.get('/api/v2/Model/{}/segmentation/{}'.format( \
+                    seg_job.model_id.replace(" ", "%20"), seg_job.segmentation_id), \
+                    HTTP_ACCEPT='application/x-protobuf')
+                latencies.append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    errors.append("poll returned {}".format(response.status_code))
+                index += 1
+        finally:
+            connection.close()
+        return latencies
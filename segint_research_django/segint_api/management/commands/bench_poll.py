@@ -0,0 +1,141 @@
+"""
+Copyright 2021 Varian Medical Systems, Inc.
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software 
+and associated documentation files (the "Software"), to deal in the Software without 
+restriction, including without limitation the rights to use, copy, modify, merge, publish, 
+distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the 
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or 
+substantial portions of the Software.
+The Software shall be used for non-clinical use only and shall not be used to enable, provide, 
+or support patient treatment. "Non-clinical" or "non-clinical use" means usage not involving: 
+(i) the direct observation of patients; (ii) the diagnoses of disease or other conditions in 
+humans or other animals; or (iii) the cure, mitigation, therapy, treatment, treatment planning,
+or prevention of disease in humans or other animals to affect the structure or function thereof.  
+The Software is NOT U.S. FDA 510(k) cleared for use on humans and shall not be used on humans.
+Any use of the Software outside of its intended use (“off-label”) could lead to physical harm
+or death of patients. 
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING 
+BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND 
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, 
+DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, 
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE. 
+IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY NON-CLINICAL OR OFF-LABEL 
+USE OF THE SOFTWARE AND ANY PERSON THAT USES, COPIES, MODIFIES, MERGES, PUBLISHES, DISTRIBUTES, 
+SUBLICENSES, AND/OR SELLS COPIES OF THE SOFTWARE UNDER THIS PERMISSION NOTICE HEREBY AGREES TO 
+INDEMNIFY AND HOLD HARMLESS THE AUTHORS AND COPYRIGHT HOLDERS FOR ANY LIABILITY, DEMAND, DAMAGE,
+COST OR EXPENSE ARISING FROM OR RELATING TO SUCH NON-CLINICAL OR OFF-LABEL USE OF THE SOFTWARE.
+"""
+
+"""Load test of segmentation progress polling with many outstanding jobs"""
+
+import time
+import random
+import platform
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.utils import timezone
+
+from segint_api.models import SegmentationJob
+from segint_api.benchmark import temporary_database, summarize_latencies, format_summary, \
+    write_results
+
+
+class Command(BaseCommand):
+    '''
+    Fills a temporary database with outstanding and completed segmentation jobs, then polls
+    job progress from concurrent clients and reports the latency distribution.  The configured
+    database engine is used, so SQLite and PostgreSQL deployments can be compared.
+
+    Usage:
+        python manage.py bench_poll [--jobs 10000] [--clients 16] [--polls 5000] [--json FILE]
+    '''
+    help = "Measures segmentation progress poll latency with many jobs in the database."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--jobs', type=int, default=10000, \
+            help="Segmentation jobs in the database.")
+        parser.add_argument('--models', type=int, default=8, \
+            help="Model IDs the jobs are spread over.")
+        parser.add_argument('--clients', type=int, default=16, \
+            help="Concurrent polling clients.")
+        parser.add_argument('--polls', type=int, default=5000, \
+            help="Total number of progress polls.")
+        parser.add_argument('--json', default='', help="Write results as JSON to this file.")
+
+    def handle(self, *args, **options):
+        with temporary_database():
+            jobs = self.create_jobs(options['jobs'], options['models'])
+            targets = [random.choice(jobs) for _ in range(options['polls'])]
+            sample_job = targets[0]
+            plan = SegmentationJob.objects.filter(model_id=sample_job.model_id, \
+                segmentation_id=sample_job.segmentation_id).explain()
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options['clients']) as executor:
+                chunks = [targets[index::options['clients']] \
+                    for index in range(options['clients'])]
+                latencies = sum(executor.map(self.poll, chunks), [])
+            elapsed = time.perf_counter() - started
+
+        summary = summarize_latencies(latencies)
+        results = {
+            'benchmark': 'poll',
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'jobs': options['jobs'],
+            'clients': options['clients'],
+            'poll': summary,
+            'polls_per_second': round(len(latencies) / elapsed, 1),
+        }
+        self.stdout.write("Database: {}, {} jobs, {} clients".format(connection.vendor, \
+            options['jobs'], options['clients']))
+        self.stdout.write("Query plan: {}".format(plan))
+        self.stdout.write(format_summary("progress poll", summary))
+        self.stdout.write("Throughput: {} polls/s".format(results['polls_per_second']))
+        write_results(options['json'], results)
+
+    def create_jobs(self, count, models):
+        '''
+        Bulk creates segmentation jobs in all scheduling states.  Completed jobs point at a
+        model output name, the file itself is not needed for progress polls.
+        '''
+        now = timezone.now()
+        statuses = [SegmentationJob.JobStatus.Pending, SegmentationJob.JobStatus.Queued, \
+            SegmentationJob.JobStatus.Running, SegmentationJob.JobStatus.Completed]
+        jobs = []
+        for index in range(count):
+            status = statuses[index % len(statuses)]
+            jobs.append(SegmentationJob(model_id="Benchmark Model {}".format(index % models), \
+                status=status, time_field=now + timedelta(microseconds=index), \
+                model_output="results/benchmark.pb" \
+                    if status == SegmentationJob.JobStatus.Completed else ""))
+        SegmentationJob.objects.bulk_create(jobs, batch_size=500)
+        return jobs
+
+    def poll(self, jobs):
+        '''
+        Polls the progress of each job in turn with a test client.
+
+        Returns:
+            latencies - [float] - Latency of each poll in seconds
+        '''
+        client = Client()
+        latencies = []
+        try:
+            for seg_job in jobs:
+                started = time.perf_counter()
+                response = client.get('/api/v2/Model/{}/segmentation/{}'.format( \
+                    seg_job.model_id.replace(" ", "%20"), seg_job.segmentation_id), \
+                    HTTP_ACCEPT='application/x-protobuf')
+                latencies.append(time.perf_counter() - started)
+                assert response.status_code == 200, response.content
+        finally:
+            connection.close()
+        return latencies
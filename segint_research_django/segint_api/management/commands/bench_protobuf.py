@@ -0,0 +1,164 @@
+"""
+Copyright 2021 Varian Medical Systems, Inc.
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software 
+and associated documentation files (the "Software"), to deal in the Software without 
+restriction, including without limitation the rights to use, copy, modify, merge, publish, 
+distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the 
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or 
+substantial portions of the Software.
+The Software shall be used for non-clinical use only and shall not be used to enable, provide, 
+or support patient treatment. "Non-clinical" or "non-clinical use" means usage not involving: 
+(i) the direct observation of patients; (ii) the diagnoses of disease or other conditions in 
+humans or other animals; or (iii) the cure, mitigation, therapy, treatment, treatment planning,
+or prevention of disease in humans or other animals to affect the structure or function thereof.  
+The Software is NOT U.S. FDA 510(k) cleared for use on humans and shall not be used on humans.
+Any use of the Software outside of its intended use (“off-label”) could lead to physical harm
+or death of patients. 
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING 
+BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND 
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, 
+DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, 
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE. 
+IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY NON-CLINICAL OR OFF-LABEL 
+USE OF THE SOFTWARE AND ANY PERSON THAT USES, COPIES, MODIFIES, MERGES, PUBLISHES, DISTRIBUTES, 
+SUBLICENSES, AND/OR SELLS COPIES OF THE SOFTWARE UNDER THIS PERMISSION NOTICE HEREBY AGREES TO 
+INDEMNIFY AND HOLD HARMLESS THE AUTHORS AND COPYRIGHT HOLDERS FOR ANY LIABILITY, DEMAND, DAMAGE,
+COST OR EXPENSE ARISING FROM OR RELATING TO SUCH NON-CLINICAL OR OFF-LABEL USE OF THE SOFTWARE.
+"""
+
+"""Microbenchmark of protobuf encoding and decoding of model inputs and outputs"""
+
+import os
+import sys
+import json
+import time
+import platform
+import subprocess
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from google.protobuf.internal import api_implementation
+
+from protobuf import Model_pb2
+from segint_api.benchmark import summarize_latencies, write_results, build_ct_model_input, \
+    build_model_output, VOLUME_SIZES
+
+IMPLEMENTATIONS = ('python', 'cpp')
+
+
+class Command(BaseCommand):
+    '''
+    Measures ParseFromString and SerializeToString of ModelInput and ModelOutput messages
+    across volume sizes and channel counts, once per protobuf implementation.  protobuf picks
+    its implementation at import time from PROTOCOL_BUFFERS_PYTHON_IMPLEMENTATION, so every
+    implementation is measured in a subprocess running this command with --worker.
+
+    Usage:
+        python manage.py bench_protobuf [--sizes small,medium] [--channels 1,4] [--json FILE]
+    '''
+    help = "Compares protobuf parse/serialize speed of volumes across implementations."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='small,medium', \
+            help="Comma-separated volume sizes: {}.".format(", ".join(VOLUME_SIZES)))
+        parser.add_argument('--channels', default='1,4', \
+            help="Comma-separated channel counts.")
+        parser.add_argument('--repeats', type=int, default=5, \
+            help="Repetitions of each measurement.")
+        parser.add_argument('--implementations', default=",".join(IMPLEMENTATIONS), \
+            help="Comma-separated protobuf implementations to compare.")
+        parser.add_argument('--json', default='', help="Write results as JSON to this file.")
+        parser.add_argument('--worker', action='store_true', \
+            help="Internal: measure the active implementation and print JSON.")
+
+    def handle(self, *args, **options):
+        sizes = options['sizes'].split(',')
+        unknown = [name for name in sizes if name not in VOLUME_SIZES]
+        if unknown:
+            raise CommandError("Unknown sizes: {}".format(", ".join(unknown)))
+        channels = [int(count) for count in options['channels'].split(',')]
+
+        if options['worker']:
+            self.stdout.write(json.dumps(self.measure(sizes, channels, options['repeats'])))
+            return
+
+        results = {'benchmark': 'protobuf', 'python': platform.python_version(), \
+            'default_implementation': api_implementation.Type(), 'implementations': {}}
+        for implementation in options['implementations'].split(','):
+            results['implementations'][implementation] = self.run_worker(implementation, \
+                options)
+        self.report(results)
+        write_results(options['json'], results)
+
+    @staticmethod
+    def run_worker(implementation, options):
+        '''
+        Runs the measurements in a subprocess using the given protobuf implementation.
+        '''
+        command = [sys.executable, os.path.join(settings.BASE_DIR, 'manage.py'), \
+            'bench_protobuf', '--worker', '--sizes', options['sizes'], \
+            '--channels', options['channels'], '--repeats', str(options['repeats'])]
+        env = dict(os.environ, PROTOCOL_BUFFERS_PYTHON_IMPLEMENTATION=implementation)
+        process = subprocess.run(command, env=env, stdout=subprocess.PIPE, \
+            stderr=subprocess.PIPE, universal_newlines=True)
+        if process.returncode != 0:
+            return {'available': False, 'error': process.stderr.strip().splitlines()[-1:]}
+        measured = json.loads(process.stdout.strip().splitlines()[-1])
+        if measured['implementation'] != implementation:
+            return {'available': False, 'error': "protobuf fell back to {}".format( \
+                measured['implementation'])}
+        measured['available'] = True
+        return measured
+
+    @staticmethod
+    def measure(sizes, channels, repeats):
+        '''
+        Measures the active implementation.
+        '''
+        results = []
+        for name in sizes:
+            shape = VOLUME_SIZES[name]
+            for count in channels:
+                messages = (
+                    ('ModelInput', build_ct_model_input(shape, channels=count)),
+                    ('ModelOutput', build_model_output(shape, channels=count)),
+                )
+                for message_name, message in messages:
+                    serialize, parse = [], []
+                    for _ in range(repeats):
+                        started = time.perf_counter()
+                        data = message.SerializeToString()
+                        serialize.append(time.perf_counter() - started)
+                        parsed = getattr(Model_pb2, message_name)()
+                        started = time.perf_counter()
+                        parsed.ParseFromString(data)
+                        parse.append(time.perf_counter() - started)
+                    results.append({'message': message_name, 'size': name, \
+                        'channels': count, 'bytes': len(data), \
+                        'serialize': summarize_latencies(serialize), \
+                        'parse': summarize_latencies(parse)})
+        return {'implementation': api_implementation.Type(), 'results': results}
+
+    def report(self, results):
+        '''
+        Console output comparing the median timings of the implementations.
+        '''
+        available = {name: measured for name, measured in \
+            results['implementations'].items() if measured['available']}
+        for name, measured in results['implementations'].items():
+            if not measured['available']:
+                self.stdout.write("{}: not available ({})".format(name, measured['error']))
+        if not available:
+            return
+        self.stdout.write("{:<12} {:<7} {:>8} {:>12}  ".format('message', 'size', 'channels', \
+            'MB') + "  ".join("{:>22}".format(name + " parse/serialize") for name in available))
+        rows = zip(*[measured['results'] for measured in available.values()])
+        for row in rows:
+            first = row[0]
+            self.stdout.write("{:<12} {:<7} {:>8} {:>12.1f}  ".format(first['message'], \
+                first['size'], first['channels'], first['bytes'] / 1e6) + "  ".join( \
+                "{:>9.3f}ms/{:>9.3f}ms".format(result['parse']['p50_ms'], \
+                result['serialize']['p50_ms']) for result in row))
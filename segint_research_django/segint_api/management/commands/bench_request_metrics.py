@@ -0,0 +1,121 @@
+"""
+Copyright 2021 Varian Medical Systems, Inc.
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software 
+and associated documentation files (the "Software"), to deal in the Software without 
+restriction, including without limitation the rights to use, copy, modify, merge, publish, 
+distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the 
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or 
+substantial portions of the Software.
+The Software shall be used for non-clinical use only and shall not be used to enable, provide, 
+or support patient treatment. "Non-clinical" or "non-clinical use" means usage not involving: 
+(i) the direct observation of patients; (ii) the diagnoses of disease or other conditions in 
+humans or other animals; or (iii) the cure, mitigation, therapy, treatment, treatment planning,
+or prevention of disease in humans or other animals to affect the structure or function thereof.  
+The Software is NOT U.S. FDA 510(k) cleared for use on humans and shall not be used on humans.
+Any use of the Software outside of its intended use (“off-label”) could lead to physical harm
+or death of patients. 
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING 
+BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND 
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, 
+DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, 
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE. 
+IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY NON-CLINICAL OR OFF-LABEL 
+USE OF THE SOFTWARE AND ANY PERSON THAT USES, COPIES, MODIFIES, MERGES, PUBLISHES, DISTRIBUTES, 
+SUBLICENSES, AND/OR SELLS COPIES OF THE SOFTWARE UNDER THIS PERMISSION NOTICE HEREBY AGREES TO 
+INDEMNIFY AND HOLD HARMLESS THE AUTHORS AND COPYRIGHT HOLDERS FOR ANY LIABILITY, DEMAND, DAMAGE,
+COST OR EXPENSE ARISING FROM OR RELATING TO SUCH NON-CLINICAL OR OFF-LABEL USE OF THE SOFTWARE.
+"""
+
+"""Microbenchmark of the request metrics middleware overhead"""
+
+import time
+import platform
+
+from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, override_settings
+from django.urls import resolve
+
+from segint_api.middleware import RequestMetricsMiddleware
+from segint_api.benchmark import summarize_latencies, format_summary, write_results
+
+MIDDLEWARE_PATH = 'segint_api.middleware.RequestMetricsMiddleware'
+
+
+class Command(BaseCommand):
+    '''
+    Measures the overhead of RequestMetricsMiddleware, first in isolation around a view that
+    returns immediately, then end-to-end on /api/ping through the full middleware stack with
+    and without it.
+
+    Usage:
+        python manage.py bench_request_metrics [--requests 20000] [--json FILE]
+    '''
+    help = "Measures the per-request overhead of the request metrics middleware."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20000, \
+            help="Requests per measurement.")
+        parser.add_argument('--json', default='', help="Write results as JSON to this file.")
+
+    def handle(self, *args, **options):
+        requests = options['requests']
+        results = {'benchmark': 'request_metrics', 'python': platform.python_version(), \
+            'requests': requests}
+
+        results['view_only'], results['view_with_middleware'] = self.measure_isolated(requests)
+        stack = [path for path in settings.MIDDLEWARE if path != MIDDLEWARE_PATH]
+        with override_settings(MIDDLEWARE=stack):
+            results['ping'] = self.measure_client(requests)
+        with override_settings(MIDDLEWARE=[MIDDLEWARE_PATH] + stack):
+            results['ping_with_middleware'] = self.measure_client(requests)
+
+        for measurement in ('view_only', 'view_with_middleware', 'ping', \
+                'ping_with_middleware'):
+            self.stdout.write(format_summary(measurement, results[measurement]))
+        results['overhead_us'] = round((results['view_with_middleware']['mean_ms'] - \
+            results['view_only']['mean_ms']) * 1000.0, 2)
+        self.stdout.write("Middleware overhead: {:.2f}us per request".format( \
+            results['overhead_us']))
+        write_results(options['json'], results)
+
+    @staticmethod
+    def measure_isolated(requests):
+        '''
+        Latencies of a resolved request handled by a trivial view, without and with the
+        middleware.
+        '''
+        request = RequestFactory().get('/api/ping')
+        match = resolve('/api/ping')
+        response = HttpResponse(b'{"Version": "2.0"}', content_type='application/json')
+
+        def view(request):
+            request.resolver_match = match
+            return response
+
+        latencies = []
+        for handler in (view, RequestMetricsMiddleware(view)):
+            handler_latencies = []
+            for _ in range(requests):
+                started = time.perf_counter()
+                handler(request)
+                handler_latencies.append(time.perf_counter() - started)
+            latencies.append(summarize_latencies(handler_latencies))
+        return latencies
+
+    @staticmethod
+    def measure_client(requests):
+        '''
+        Latencies of GET /api/ping through the configured middleware stack.
+        '''
+        client = Client()
+        latencies = []
+        for _ in range(requests):
+            started = time.perf_counter()
+            client.get('/api/ping', HTTP_ACCEPT='application/json')
+            latencies.append(time.perf_counter() - started)
+        return summarize_latencies(latencies)
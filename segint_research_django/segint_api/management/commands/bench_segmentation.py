@@ -0,0 +1,295 @@
+"""
+Copyright 2021 Varian Medical Systems, Inc.
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software 
+and associated documentation files (the "Software"), to deal in the Software without 
+restriction, including without limitation the rights to use, copy, modify, merge, publish, 
+distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the 
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or 
+substantial portions of the Software.
+The Software shall be used for non-clinical use only and shall not be used to enable, provide, 
+or support patient treatment. "Non-clinical" or "non-clinical use" means usage not involving: 
+(i) the direct observation of patients; (ii) the diagnoses of disease or other conditions in 
+humans or other animals; or (iii) the cure, mitigation, therapy, treatment, treatment planning,
+or prevention of disease in humans or other animals to affect the structure or function thereof.  
+The Software is NOT U.S. FDA 510(k) cleared for use on humans and shall not be used on humans.
+Any use of the Software outside of its intended use (“off-label”) could lead to physical harm
+or death of patients. 
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING 
+BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND 
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, 
+DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, 
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE. 
+IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY NON-CLINICAL OR OFF-LABEL 
+USE OF THE SOFTWARE AND ANY PERSON THAT USES, COPIES, MODIFIES, MERGES, PUBLISHES, DISTRIBUTES, 
+SUBLICENSES, AND/OR SELLS COPIES OF THE SOFTWARE UNDER THIS PERMISSION NOTICE HEREBY AGREES TO 
+INDEMNIFY AND HOLD HARMLESS THE AUTHORS AND COPYRIGHT HOLDERS FOR ANY LIABILITY, DEMAND, DAMAGE,
+COST OR EXPENSE ARISING FROM OR RELATING TO SUCH NON-CLINICAL OR OFF-LABEL USE OF THE SOFTWARE.
+"""
+
+"""End-to-end throughput and latency benchmark of segmentation jobs"""
+
+import io
+import os
+import json
+import time
+import shutil
+import platform
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from celery.contrib.testing.worker import start_worker
+from django.conf import settings
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+
+from protobuf import Model_pb2
+from segint_api.models import ModelFamily, ModelVersion, SegmentationJob
+from segint_api.phantom import parse_phantom_config
+from segint_api.benchmark import temporary_database, summarize_latencies, format_summary, \
+    write_results, build_ct_model_input, directory_bytes, RssSampler, VOLUME_SIZES
+from segint_research_django.celery import app
+
+STAGES = ('acquire', 'parse', 'preprocess', 'segment', 'postprocess', 'construct', 'save')
+PHANTOM_MODEL = os.path.join(settings.STATIC_ROOT, 'testing', 'Centered_Square.pb')
+
+
+class Command(BaseCommand):
+    '''
+    Drives segmentation jobs of the phantom model end-to-end through the API: concurrent
+    clients post synthetic CT model inputs, poll progress until the job is done and download
+    the results.  Jobs are processed by an in-process Celery worker on an in-memory broker,
+    against a temporary database and media directory, so no Redis or server data is needed.
+
+    Reports per volume size jobs/sec, post/completion/download latencies, stage durations,
+    peak RSS per stage and the bytes stored on disk.  Deduplication, the result cache and
+    admission control are disabled, so that every job is segmented.
+
+    Usage:
+        python manage.py bench_segmentation [--sizes small,medium] [--jobs 20] [--clients 4]
+            [--phantom-config JSON] [--json FILE]
+
+    --phantom-config sets the phantom parameters of the model, e.g. structure shapes, noise
+    and simulated inference time, to model realistic payloads and compute.  See phantom.py
+    '''
+    help = "Measures end-to-end segmentation throughput and latency with the phantom model."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='small,medium', \
+            help="Comma-separated volume sizes: {}.".format(", ".join( \
+            "{} {}x{}x{}".format(name, *shape) for name, shape in VOLUME_SIZES.items())))
+        parser.add_argument('--jobs', type=int, default=20, help="Jobs per size.")
+        parser.add_argument('--clients', type=int, default=4, help="Concurrent clients.")
+        parser.add_argument('--concurrency', type=int, default=1, \
+            help="Celery worker concurrency; above 1 uses the threads pool.")
+        parser.add_argument('--poll-interval', type=float, default=0.05, \
+            help="Seconds between progress polls of a client.")
+        parser.add_argument('--phantom-config', default='', \
+            help="JSON object of phantom parameters, e.g. '{\"noise\": 0.1, " \
+            "\"cpu_seconds\": 1}'.  Default: the fixed centered box.")
+        parser.add_argument('--json', default='', help="Write results as JSON to this file.")
+
+    def handle(self, *args, **options):
+        sizes = options['sizes'].split(',')
+        unknown = [name for name in sizes if name not in VOLUME_SIZES]
+        if unknown:
+            raise CommandError("Unknown sizes: {}".format(", ".join(unknown)))
+        if options['phantom_config']:
+            try:
+                parse_phantom_config(options['phantom_config'])
+            except ValueError as exc:
+                raise CommandError("Invalid phantom configuration: {}".format(exc))
+
+        results = {'benchmark': 'segmentation', 'python': platform.python_version(), \
+            'database': connection.vendor, 'jobs': options['jobs'], \
+            'clients': options['clients'], 'concurrency': options['concurrency'], \
+            'phantom_config': options['phantom_config'], 'sizes': {}}
+        media_root = tempfile.mkdtemp(prefix='segint_bench_media_')
+        admission = {key: None for key in ('MAX_QUEUED_JOBS', 'MAX_PENDING_BYTES', \
+            'MAX_MODEL_BACKLOG')}
+        app.conf.update(broker_url='memory://', result_backend='cache+memory://', \
+            task_always_eager=False)
+        sampler = RssSampler()
+        try:
+            with override_settings(MEDIA_ROOT=media_root, \
+                    SEGINT_ADMISSION=dict(settings.SEGINT_ADMISSION, **admission), \
+                    SEGINT_DEDUP=dict(settings.SEGINT_DEDUP, REUSE_WINDOW_SECONDS=0), \
+                    SEGINT_RESULT_CACHE=dict(settings.SEGINT_RESULT_CACHE, MAX_BYTES=0)), \
+                    temporary_database():
+                model_id = self.create_phantom_model(options['phantom_config'])
+                sampler.start()
+                pool = 'solo' if options['concurrency'] == 1 else 'threads'
+                with start_worker(app, pool=pool, concurrency=options['concurrency'], \
+                        perform_ping_check=False):
+                    for name in sizes:
+                        self.stdout.write("Generating {} input {}x{}x{}".format(name, \
+                            *VOLUME_SIZES[name]))
+                        body = build_ct_model_input(VOLUME_SIZES[name]).SerializeToString()
+                        scenario = self.run_size(model_id, body, media_root, sampler, options)
+                        scenario['shape'] = VOLUME_SIZES[name]
+                        results['sizes'][name] = scenario
+                        self.report(name, scenario)
+        finally:
+            if sampler.is_alive():
+                sampler.stop()
+            shutil.rmtree(media_root, ignore_errors=True)
+        write_results(options['json'], results)
+
+    @staticmethod
+    def create_phantom_model(phantom_config):
+        '''
+        Registers the phantom model family used by the tests with the given phantom
+        configuration and returns its model ID.
+        '''
+        with open(PHANTOM_MODEL, 'rb') as file_in:
+            pb_bytes = file_in.read()
+        model_family = ModelFamily.objects.create()
+        model_family.pb.save(os.path.basename(PHANTOM_MODEL), File(io.BytesIO(pb_bytes)))
+        model_family.pb_to_model(pb_bytes)
+        model_family.save()
+        m_v = model_family.modelversion_set.all()[0]
+        m_v.model_type = ModelVersion.ModelVersionType.Phantom
+        m_v.phantom_config = phantom_config
+        m_v.save()
+        return m_v.model_version_id
+
+    def run_size(self, model_id, body, media_root, sampler, options):
+        '''
+        Runs all jobs of one volume size and collects their measurements.
+        '''
+        clients = options['clients']
+        shares = [options['jobs'] // clients + (index < options['jobs'] % clients) \
+            for index in range(clients)]
+        started = time.perf_counter()
+        rss_start = time.time()
+        with ThreadPoolExecutor(max_workers=clients) as executor:
+            runs = [executor.submit(self.client_jobs, model_id, body, index, share, \
+                options['poll_interval']) for index, share in enumerate(shares) if share]
+            jobs = sum([run.result() for run in runs], [])
+        elapsed = time.perf_counter() - started
+        rss_end = time.time()
+
+        # Delivered jobs release their files, so disk usage is measured before downloading.
+        disk_bytes = {
+            'inputs': directory_bytes(os.path.join(media_root, 'segmentation')),
+            'outputs': directory_bytes(os.path.join(media_root, 'results')),
+        }
+        completed = [job for job in jobs if job['completed']]
+        downloads, result_bytes = self.download(model_id, completed)
+        stage_seconds, stage_rss = self.stage_measurements(completed, sampler)
+
+        return {
+            'input_message_bytes': len(body),
+            'elapsed_s': round(elapsed, 3),
+            'completed': len(completed),
+            'errors': len(jobs) - len(completed),
+            'jobs_per_second': round(len(completed) / elapsed, 3),
+            'post': summarize_latencies([job['post'] for job in jobs]),
+            'completion': summarize_latencies([job['completion'] for job in completed]),
+            'download': summarize_latencies(downloads),
+            'stages': {stage: summarize_latencies(stage_seconds[stage]) for stage in STAGES},
+            'peak_rss_bytes': sampler.peak_between(rss_start, rss_end),
+            'stage_peak_rss_bytes': {stage: max(stage_rss[stage]) if stage_rss[stage] else None \
+                for stage in STAGES},
+            'disk_bytes': disk_bytes,
+            'result_bytes': max(result_bytes) if result_bytes else 0,
+        }
+
+    @staticmethod
+    def client_jobs(model_id, body, client_index, jobs, poll_interval):
+        '''
+        Client posting its jobs one after another and polling each until it is done.
+        '''
+        client = Client()
+        url = '/api/v2/Model/{}/segmentation'.format(model_id)
+        measurements = []
+        try:
+            for job_index in range(jobs):
+                started = time.perf_counter()
+                response = client.post(url, body, content_type='application/x-protobuf', \
+                    HTTP_ACCEPT='application/x-protobuf', \
+                    HTTP_X_SEGINT_CLIENT='bench-{}-{}'.format(client_index, job_index))
+                job = {'post': time.perf_counter() - started, 'completed': False}
+                measurements.append(job)
+                if response.status_code != 200:
+                    continue
+                seg_task = Model_pb2.SegmentationTask()
+                seg_task.ParseFromString(response.content)
+                job['segmentation_id'] = seg_task.SegmentationID
+                progress = Model_pb2.SegmentationProgress()
+                while True:
+                    response = client.get('{}/{}'.format(url, seg_task.SegmentationID), \
+                        HTTP_ACCEPT='application/x-protobuf')
+                    if response.status_code != 200:
+                        break
+                    progress.ParseFromString(response.content)
+                    if progress.ErrorCode != 0:
+                        break
+                    if progress.Progress == 100:
+                        job['completed'] = True
+                        break
+                    time.sleep(poll_interval)
+                job['completion'] = time.perf_counter() - started
+        finally:
+            connection.close()
+        return measurements
+
+    @staticmethod
+    def download(model_id, jobs):
+        '''
+        Downloads the results of completed jobs, returning latencies and response sizes.
+        '''
+        client = Client()
+        latencies, sizes = [], []
+        for job in jobs:
+            started = time.perf_counter()
+            response = client.get('/api/v2/Model/{}/segmentation/{}/result'.format(model_id, \
+                job['segmentation_id']), HTTP_ACCEPT='application/x-protobuf')
+            latencies.append(time.perf_counter() - started)
+            sizes.append(len(response.content))
+        return latencies, sizes
+
+    @staticmethod
+    def stage_measurements(jobs, sampler):
+        '''
+        Stage durations recorded by the jobs and the peak RSS sampled during each stage.
+        Stages run one after another from the job's start, see tasks.track_job_status.
+        '''
+        stage_seconds = {stage: [] for stage in STAGES}
+        stage_rss = {stage: [] for stage in STAGES}
+        seg_jobs = SegmentationJob.objects.filter(segmentation_id__in=[job['segmentation_id'] \
+            for job in jobs])
+        for seg_job in seg_jobs:
+            timings = json.loads(seg_job.stage_timings or '{}')
+            start = seg_job.started_time.timestamp()
+            for stage in STAGES:
+                if stage not in timings:
+                    continue
+                end = start + timings[stage]
+                stage_seconds[stage].append(timings[stage])
+                rss = sampler.peak_between(start, end)
+                if rss is not None:
+                    stage_rss[stage].append(rss)
+                start = end
+        return stage_seconds, stage_rss
+
+    def report(self, name, scenario):
+        '''
+        Console output of one volume size.
+        '''
+        self.stdout.write("{} {}x{}x{}: {} jobs in {:.2f}s, {:.2f} jobs/s, {} errors".format( \
+            name, *scenario['shape'], scenario['completed'], scenario['elapsed_s'], \
+            scenario['jobs_per_second'], scenario['errors']))
+        for measurement in ('post', 'completion', 'download'):
+            self.stdout.write("  " + format_summary(measurement, scenario[measurement]))
+        for stage in STAGES:
+            rss = scenario['stage_peak_rss_bytes'][stage]
+            self.stdout.write("  " + format_summary("stage " + stage, \
+                scenario['stages'][stage]) + (" rss={:.0f}MiB".format(rss / 2 ** 20) \
+                if rss else ""))
+        self.stdout.write("  disk: inputs {} bytes, outputs {} bytes".format( \
+            scenario['disk_bytes']['inputs'], scenario['disk_bytes']['outputs']))
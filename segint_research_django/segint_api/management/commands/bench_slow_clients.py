@@ -0,0 +1,370 @@
+"""
+Copyright 2021 Varian Medical Systems, Inc.
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software 
+and associated documentation files (the "Software"), to deal in the Software without 
+restriction, including without limitation the rights to use, copy, modify, merge, publish, 
+distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the 
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or 
+substantial portions of the Software.
+The Software shall be used for non-clinical use only and shall not be used to enable, provide, 
+or support patient treatment. "Non-clinical" or "non-clinical use" means usage not involving: 
+(i) the direct observation of patients; (ii) the diagnoses of disease or other conditions in 
+humans or other animals; or (iii) the cure, mitigation, therapy, treatment, treatment planning,
+or prevention of disease in humans or other animals to affect the structure or function thereof.  
+The Software is NOT U.S. FDA 510(k) cleared for use on humans and shall not be used on humans.
+Any use of the Software outside of its intended use (“off-label”) could lead to physical harm
+or death of patients. 
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING 
+BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND 
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, 
+DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, 
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE. 
+IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY NON-CLINICAL OR OFF-LABEL 
+USE OF THE SOFTWARE AND ANY PERSON THAT USES, COPIES, MODIFIES, MERGES, PUBLISHES, DISTRIBUTES, 
+SUBLICENSES, AND/OR SELLS COPIES OF THE SOFTWARE UNDER THIS PERMISSION NOTICE HEREBY AGREES TO 
+INDEMNIFY AND HOLD HARMLESS THE AUTHORS AND COPYRIGHT HOLDERS FOR ANY LIABILITY, DEMAND, DAMAGE,
+COST OR EXPENSE ARISING FROM OR RELATING TO SUCH NON-CLINICAL OR OFF-LABEL USE OF THE SOFTWARE.
+"""
+
+"""Capacity of the WSGI and ASGI deployments under slow uploading and downloading clients"""
+
+import os
+import time
+import socket
+import asyncio
+import platform
+import tempfile
+import threading
+import http.client
+import shutil
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
+from wsgiref.simple_server import WSGIServer, WSGIRequestHandler
+
+import uvicorn
+from django.conf import settings
+from django.core.asgi import get_asgi_application
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.db import connection
+from django.test import override_settings
+from django.utils import timezone
+
+from protobuf import Model_pb2
+from segint_api.models import ModelVersion, SegmentationJob
+from segint_api.volumes import STORAGE_COMPRESSION_METHOD
+from segint_api.benchmark import temporary_database, summarize_latencies, format_summary, \
+    write_results, build_ct_model_input, VOLUME_SIZES
+from segint_research_django.celery import app
+
+MODEL_ID = "Slow Client Benchmark"
+MODES = ('upload', 'download')
+
+
+class PooledWSGIServer(WSGIServer):
+    '''
+    WSGI server handling connections on a fixed number of threads, like a threaded gunicorn
+    worker: a connection holds its thread while the request is read and the response written.
+    '''
+
+    def __init__(self, address, threads):
+        super().__init__(address, QuietRequestHandler)
+        self.executor = ThreadPoolExecutor(max_workers=threads)
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self.process_request_thread, request, client_address)
+
+    def process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def handle_error(self, request, client_address):
+        # Slow clients are disconnected at the end of each scenario.
+        pass
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=True)
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class ThreadedUvicorn(uvicorn.Server):
+    '''
+    Uvicorn server running on the event loop of a background thread.  Django runs the views
+    of the ASGI application on the default executor of the loop.
+    '''
+
+    def __init__(self, config, threads):
+        super().__init__(config)
+        self.threads = threads
+
+    def install_signal_handlers(self):
+        pass
+
+    def run(self, sockets=None):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        loop.set_default_executor(ThreadPoolExecutor(max_workers=self.threads))
+        try:
+            loop.run_until_complete(self.serve(sockets=sockets))
+        finally:
+            loop.close()
+
+
+class Command(BaseCommand):
+    '''
+    Serves the API with a WSGI server and with uvicorn, both limited to the same number of
+    view threads, and measures progress polls of a fast client while slow clients upload
+    model inputs or download results at a fixed rate.  A WSGI connection holds a thread until
+    its body is transferred, so polls stall once the slow clients occupy all threads.  Under
+    ASGI, Django receives request bodies and sends responses on the event loop, and slow
+    clients only wait for it.
+
+    Servers run in-process on 127.0.0.1 against a temporary database and media directory.
+    Uploaded jobs are queued on an in-memory broker and never processed.
+
+    Usage:
+        python manage.py bench_slow_clients [--servers wsgi,asgi] [--modes upload,download]
+            [--slow-clients 0,4,16] [--threads 8] [--rate 131072] [--json FILE]
+    '''
+    help = "Measures fast request latency of the WSGI and ASGI deployments under slow clients."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--servers', default='wsgi,asgi', \
+            help="Comma-separated servers: wsgi, asgi.")
+        parser.add_argument('--modes', default='upload,download', \
+            help="Comma-separated slow client modes: upload, download.")
+        parser.add_argument('--slow-clients', default='0,4,16', \
+            help="Comma-separated numbers of concurrent slow clients.")
+        parser.add_argument('--threads', type=int, default=8, \
+            help="View threads of each server.")
+        parser.add_argument('--rate', type=int, default=128 * 1024, \
+            help="Bytes per second transferred by each slow client.")
+        parser.add_argument('--size', default='small', choices=list(VOLUME_SIZES), \
+            help="Volume size of the uploaded model inputs.")
+        parser.add_argument('--result-bytes', type=int, default=16 * 1024 ** 2, \
+            help="Size of the downloaded model outputs.")
+        parser.add_argument('--polls', type=int, default=50, \
+            help="Progress polls of the fast client per scenario.")
+        parser.add_argument('--timeout', type=float, default=5.0, \
+            help="Seconds after which a progress poll counts as failed.")
+        parser.add_argument('--json', default='', help="Write results as JSON to this file.")
+
+    def handle(self, *args, **options):
+        servers = options['servers'].split(',')
+        modes = options['modes'].split(',')
+        if set(servers) - {'wsgi', 'asgi'} or set(modes) - set(MODES):
+            raise CommandError("Unknown servers or modes.")
+        slow_counts = [int(count) for count in options['slow_clients'].split(',')]
+
+        results = {'benchmark': 'slow_clients', 'python': platform.python_version(), \
+            'threads': options['threads'], 'rate': options['rate'], 'scenarios': []}
+        media_root = tempfile.mkdtemp(prefix='segint_bench_media_')
+        admission = {key: None for key in ('MAX_QUEUED_JOBS', 'MAX_PENDING_BYTES', \
+            'MAX_MODEL_BACKLOG')}
+        app.conf.update(broker_url='memory://', result_backend='cache+memory://', \
+            task_always_eager=False)
+        body = build_ct_model_input(VOLUME_SIZES[options['size']]).SerializeToString()
+        try:
+            with override_settings(MEDIA_ROOT=media_root, \
+                    SEGINT_ADMISSION=dict(settings.SEGINT_ADMISSION, **admission), \
+                    SEGINT_DEDUP=dict(settings.SEGINT_DEDUP, REUSE_WINDOW_SECONDS=0), \
+                    SEGINT_RESULT_CACHE=dict(settings.SEGINT_RESULT_CACHE, MAX_BYTES=0)), \
+                    temporary_database():
+                ModelVersion.objects.create(model_version_id=MODEL_ID, \
+                    model_type=ModelVersion.ModelVersionType.Phantom)
+                poll_job = SegmentationJob.objects.create(model_id=MODEL_ID, \
+                    time_field=timezone.now())
+                for server in servers:
+                    for mode in modes:
+                        for count in slow_counts:
+                            scenario = self.run_scenario(server, mode, count, body, \
+                                poll_job, options)
+                            results['scenarios'].append(scenario)
+                            self.report(scenario)
+        finally:
+            connection.close()
+            shutil.rmtree(media_root, ignore_errors=True)
+        write_results(options['json'], results)
+
+    def run_scenario(self, server, mode, count, body, poll_job, options):
+        '''
+        Starts a server, occupies it with slow clients and measures the fast client.
+        '''
+        downloads = self.create_completed_jobs(count, options['result_bytes']) \
+            if mode == 'download' else []
+        address, stop_server = self.start_server(server, options['threads'])
+        stopped = threading.Event()
+        slow_clients = []
+        try:
+            for index in range(count):
+                if mode == 'upload':
+                    target = self.slow_upload
+                    args = (address, body, index, options['rate'], stopped)
+                else:
+                    target = self.slow_download
+                    args = (address, downloads[index], options['rate'], stopped)
+                slow_client = threading.Thread(target=target, args=args, daemon=True)
+                slow_client.start()
+                slow_clients.append(slow_client)
+            # Lets the slow clients connect and start their transfers.
+            time.sleep(1.0 if count else 0.0)
+            latencies, failures = self.fast_polls(address, poll_job, options['polls'], \
+                options['timeout'])
+        finally:
+            stopped.set()
+            for slow_client in slow_clients:
+                slow_client.join()
+            stop_server()
+        return {
+            'server': server,
+            'mode': mode,
+            'slow_clients': count,
+            'poll': summarize_latencies(latencies),
+            'failed_polls': failures,
+        }
+
+    @staticmethod
+    def start_server(server, threads):
+        '''
+        Starts a WSGI or ASGI server on a free port of 127.0.0.1.
+
+        Returns:
+            address - (str, int) - Host and port of the server
+            stop - callable - Stops the server
+        '''
+        if server == 'wsgi':
+            httpd = PooledWSGIServer(('127.0.0.1', 0), threads)
+            httpd.set_app(get_wsgi_application())
+            thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+            thread.start()
+
+            def stop():
+                httpd.shutdown()
+                httpd.server_close()
+                thread.join()
+            return httpd.server_address, stop
+
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.bind(('127.0.0.1', 0))
+        config = uvicorn.Config(get_asgi_application(), loop='asyncio', lifespan='off', \
+            log_level='warning', access_log=False)
+        uvicorn_server = ThreadedUvicorn(config, threads)
+        thread = threading.Thread(target=uvicorn_server.run, kwargs={'sockets': [sock]}, \
+            daemon=True)
+        thread.start()
+        while not uvicorn_server.started:
+            time.sleep(0.01)
+
+        def stop():
+            uvicorn_server.should_exit = True
+            thread.join()
+        return sock.getsockname(), stop
+
+    @staticmethod
+    def create_completed_jobs(count, result_bytes):
+        '''
+        Creates completed jobs whose stored model outputs are served as is, with an
+        incompressible channel of the given size.
+        '''
+        model_out = Model_pb2.ModelOutput()
+        model_out.Channels.add().Volume.Data = os.urandom(result_bytes)
+        data = model_out.SerializeToString()
+        jobs = []
+        for index in range(count):
+            seg_job = SegmentationJob(model_id=MODEL_ID, \
+                status=SegmentationJob.JobStatus.Completed, \
+                time_field=timezone.now() + timedelta(microseconds=index), \
+                compression_method=STORAGE_COMPRESSION_METHOD)
+            seg_job.model_output.save("Segmentation_{}.pb".format(seg_job.segmentation_id), \
+                ContentFile(data))
+            jobs.append(seg_job)
+        return jobs
+
+    @staticmethod
+    def slow_upload(address, body, index, rate, stopped):
+        '''
+        Posts a model input, sending a tenth of the rate every 100 ms until stopped.
+        '''
+        chunk = max(1, rate // 10)
+        with socket.create_connection(address) as sock:
+            sock.sendall("POST /api/v2/Model/{}/segmentation HTTP/1.1\r\nHost: {}:{}\r\n" \
+                "Content-Type: application/x-protobuf\r\nAccept: application/json\r\n" \
+                "X-Segint-Client: slow-{}-{}\r\nContent-Length: {}\r\nConnection: close" \
+                "\r\n\r\n".format(MODEL_ID.replace(" ", "%20"), address[0], address[1], \
+                index, time.monotonic(), len(body)).encode())
+            for offset in range(0, len(body), chunk):
+                if stopped.wait(0.1):
+                    return
+                sock.sendall(body[offset:offset + chunk])
+            stopped.wait()
+
+    @staticmethod
+    def slow_download(address, seg_job, rate, stopped):
+        '''
+        Downloads a result, receiving a tenth of the rate every 100 ms until stopped.
+        '''
+        chunk = max(1, rate // 10)
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            # A small receive buffer makes the server wait for the client.
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, chunk)
+            sock.connect(address)
+            sock.sendall("GET /api/v2/Model/{}/segmentation/{}/result HTTP/1.1\r\nHost: {}:{}" \
+                "\r\nAccept: application/x-protobuf\r\nConnection: close\r\n\r\n".format( \
+                MODEL_ID.replace(" ", "%20"), seg_job.segmentation_id, address[0], \
+                address[1]).encode())
+            while not stopped.wait(0.1):
+                if not sock.recv(chunk):
+                    return
+
+    @staticmethod
+    def fast_polls(address, poll_job, polls, timeout):
+        '''
+        Polls the progress of a job one request after another.
+
+        Returns:
+            latencies - [float] - Latency of each successful poll in seconds
+            failures - int - Polls that failed or timed out
+        '''
+        url = '/api/v2/Model/{}/segmentation/{}'.format(MODEL_ID.replace(" ", "%20"), \
+            poll_job.segmentation_id)
+        latencies = []
+        failures = 0
+        for _ in range(polls):
+            started = time.perf_counter()
+            client = http.client.HTTPConnection(*address, timeout=timeout)
+            try:
+                client.request('GET', url, headers={'Accept': 'application/x-protobuf'})
+                response = client.getresponse()
+                response.read()
+                if response.status == 200:
+                    latencies.append(time.perf_counter() - started)
+                else:
+                    failures += 1
+            except OSError:
+                failures += 1
+            finally:
+                client.close()
+        return latencies, failures
+
+    def report(self, scenario):
+        '''
+        Writes the measurements of one scenario.
+        '''
+        self.stdout.write(format_summary("{} {} slow={}".format(scenario['server'], \
+            scenario['mode'], scenario['slow_clients']), scenario['poll']))
+        if scenario['failed_polls']:
+            self.stdout.write("    {} polls failed or timed out".format( \
+                scenario['failed_polls']))
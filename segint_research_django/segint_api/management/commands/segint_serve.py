@@ -0,0 +1,96 @@
+"""
+Copyright 2021 Varian Medical Systems, Inc.
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software 
+and associated documentation files (the "Software"), to deal in the Software without 
+restriction, including without limitation the rights to use, copy, modify, merge, publish, 
+distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the 
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or 
+substantial portions of the Software.
+The Software shall be used for non-clinical use only and shall not be used to enable, provide, 
+or support patient treatment. "Non-clinical" or "non-clinical use" means usage not involving: 
+(i) the direct observation of patients; (ii) the diagnoses of disease or other conditions in 
+humans or other animals; or (iii) the cure, mitigation, therapy, treatment, treatment planning,
+or prevention of disease in humans or other animals to affect the structure or function thereof.  
+The Software is NOT U.S. FDA 510(k) cleared for use on humans and shall not be used on humans.
+Any use of the Software outside of its intended use (“off-label”) could lead to physical harm
+or death of patients. 
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING 
+BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND 
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, 
+DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, 
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE. 
+IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY NON-CLINICAL OR OFF-LABEL 
+USE OF THE SOFTWARE AND ANY PERSON THAT USES, COPIES, MODIFIES, MERGES, PUBLISHES, DISTRIBUTES, 
+SUBLICENSES, AND/OR SELLS COPIES OF THE SOFTWARE UNDER THIS PERMISSION NOTICE HEREBY AGREES TO 
+INDEMNIFY AND HOLD HARMLESS THE AUTHORS AND COPYRIGHT HOLDERS FOR ANY LIABILITY, DEMAND, DAMAGE,
+COST OR EXPENSE ARISING FROM OR RELATING TO SUCH NON-CLINICAL OR OFF-LABEL USE OF THE SOFTWARE.
+"""
+
+"""Runs the production web server, Celery worker pools and Celery beat"""
+
+import os
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from segint_api.launcher import Launcher, WEB_APPLICATIONS, web_worker_count, \
+    web_server_command, celery_commands, stop_launcher, cpu_count, prepare_metrics_dir
+
+
+class Command(BaseCommand):
+    '''
+    Runs gunicorn serving the API, one Celery worker pool per queue of SEGINT_QUEUES and
+    Celery beat, configured by SEGINT_SERVER.  SIGTERM or Ctrl-C shuts all of them down
+    gracefully; so does "segint_serve --stop" from another shell.
+
+    Usage:
+        python manage.py segint_serve [--bind 0.0.0.0:8000] [--workers N]
+            [--worker-class asgi|wsgi] [--no-celery]
+        python manage.py segint_serve --stop
+    '''
+    help = "Runs the production web server and Celery workers, or stops them with --stop."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bind', default=settings.SEGINT_SERVER['BIND'], \
+            help="Address of the web server.")
+        parser.add_argument('--workers', type=int, default=settings.SEGINT_SERVER['WORKERS'], \
+            help="Web server processes, 0 to derive them from the CPU cores.")
+        parser.add_argument('--worker-class', default=settings.SEGINT_SERVER['WORKER_CLASS'], \
+            choices=list(WEB_APPLICATIONS), help="Serve the ASGI or the WSGI application.")
+        parser.add_argument('--no-celery', action='store_true', \
+            help="Run only the web server, e.g. when the workers run on other machines.")
+        parser.add_argument('--stop', action='store_true', \
+            help="Stop a running launcher and wait for its processes to exit.")
+
+    def handle(self, *args, **options):
+        config = dict(settings.SEGINT_SERVER, BIND=options['bind'], \
+            WORKER_CLASS=options['worker_class'])
+        # Allows for the launcher's own grace period, in which it kills remaining processes.
+        timeout = config['SHUTDOWN_TIMEOUT_SECONDS'] + 30
+        if options['stop']:
+            if not stop_launcher(config['PID_FILE'], timeout):
+                raise CommandError("The launcher did not stop within {} s.".format(timeout))
+            return
+
+        workers = options['workers'] or web_worker_count(config['WORKER_CLASS'], cpu_count())
+        commands = [("web server", web_server_command(config, workers))]
+        if not options['no_celery']:
+            commands += celery_commands()
+        # The web server and the Celery workers share their metrics, see render_metrics.
+        metrics_dir = prepare_metrics_dir(os.environ.get('prometheus_multiproc_dir') or \
+            config['METRICS_DIR'])
+        env = dict(os.environ, ASGI_THREADS=str(config['THREADS']), \
+            prometheus_multiproc_dir=metrics_dir)
+        launcher = Launcher(commands, config['SHUTDOWN_TIMEOUT_SECONDS'], env=env, \
+            cwd=settings.BASE_DIR)
+        with open(config['PID_FILE'], 'w') as file_out:
+            file_out.write(str(os.getpid()))
+        try:
+            exit_code = launcher.run()
+        finally:
+            os.remove(config['PID_FILE'])
+        sys.exit(exit_code)
@@ -0,0 +1,138 @@
+"""
+Copyright 2021 Varian Medical Systems, Inc.
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software 
+and associated documentation files (the "Software"), to deal in the Software without 
+restriction, including without limitation the rights to use, copy, modify, merge, publish, 
+distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the 
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or 
+substantial portions of the Software.
+The Software shall be used for non-clinical use only and shall not be used to enable, provide, 
+or support patient treatment. "Non-clinical" or "non-clinical use" means usage not involving: 
+(i) the direct observation of patients; (ii) the diagnoses of disease or other conditions in 
+humans or other animals; or (iii) the cure, mitigation, therapy, treatment, treatment planning,
+or prevention of disease in humans or other animals to affect the structure or function thereof.  
+The Software is NOT U.S. FDA 510(k) cleared for use on humans and shall not be used on humans.
+Any use of the Software outside of its intended use (“off-label”) could lead to physical harm
+or death of patients. 
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING 
+BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND 
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, 
+DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, 
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE. 
+IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY NON-CLINICAL OR OFF-LABEL 
+USE OF THE SOFTWARE AND ANY PERSON THAT USES, COPIES, MODIFIES, MERGES, PUBLISHES, DISTRIBUTES, 
+SUBLICENSES, AND/OR SELLS COPIES OF THE SOFTWARE UNDER THIS PERMISSION NOTICE HEREBY AGREES TO 
+INDEMNIFY AND HOLD HARMLESS THE AUTHORS AND COPYRIGHT HOLDERS FOR ANY LIABILITY, DEMAND, DAMAGE,
+COST OR EXPENSE ARISING FROM OR RELATING TO SUCH NON-CLINICAL OR OFF-LABEL USE OF THE SOFTWARE.
+"""
+
+"""Prometheus metrics of the segmentation server"""
+
+import os
+import json
+import time
+from contextlib import contextmanager
+
+from prometheus_client import Counter, Histogram, CollectorRegistry, REGISTRY, \
+    CONTENT_TYPE_LATEST, generate_latest, multiprocess
+
+# Segmentation stages range from milliseconds (parsing) to minutes (model evaluation).
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, \
+    120.0, 300.0, 600.0, float('inf'))
+# Bodies range from small progress polls to model inputs of hundreds of megabytes.
+BYTE_BUCKETS = (256, 1024, 16384, 262144, 1048576, 16777216, 67108864, 268435456, float('inf'))
+
+RESULT_CACHE_LOOKUPS = Counter('segint_result_cache_lookups_total', \
+    'Result cache lookups of segmentation uploads', ['result'])
+INVALID_INPUTS = Counter('segint_invalid_inputs_total', \
+    'Segmentation uploads rejected by input validation', ['check'])
+RESULT_CACHE_EVICTIONS = Counter('segint_result_cache_evictions_total', \
+    'Result cache entries evicted to stay within the configured size')
+HTTP_REQUEST_SECONDS = Histogram('segint_http_request_seconds', \
+    'Latency of API requests', ['view', 'method'], \
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, \
+    float('inf')))
+HTTP_REQUESTS = Counter('segint_http_requests_total', \
+    'API requests by response status code', ['view', 'method', 'status'])
+HTTP_REQUEST_BYTES = Histogram('segint_http_request_bytes', \
+    'Body size of API requests', ['view'], buckets=BYTE_BUCKETS)
+HTTP_RESPONSE_BYTES = Histogram('segint_http_response_bytes', \
+    'Body size of API responses', ['view'], buckets=BYTE_BUCKETS)
+
+SEGMENTATION_STAGE_SECONDS = Histogram('segint_segmentation_stage_seconds', \
+    'Duration of the stages of segmentation jobs', ['model_version_id', 'stage'], \
+    buckets=STAGE_BUCKETS)
+SEGMENTATION_QUEUE_WAIT_SECONDS = Histogram('segint_segmentation_queue_wait_seconds', \
+    'Time from the creation of a segmentation job to the start of its task', \
+    ['model_version_id'], buckets=STAGE_BUCKETS)
+
+
+class StageTimer:
+    '''
+    Times the stages of one segmentation job.  Each stage is observed in the stage histogram of
+    the job's model version and kept in self.timings for storage with the job.
+    '''
+
+    def __init__(self, model_version_id):
+        '''
+        Parameters:
+            model_version_id - str - Model ID the job is segmented with
+        '''
+        self.model_version_id = model_version_id
+        self.timings = {}
+
+    @contextmanager
+    def stage(self, name):
+        '''
+        Context manager timing one stage.  Stages that raise are recorded as well.
+
+        Parameters:
+            name - str - Stage name, e.g. "acquire"
+        Returns: None
+        '''
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.timings[name] = round(elapsed, 6)
+            SEGMENTATION_STAGE_SECONDS.labels(self.model_version_id, name).observe(elapsed)
+
+    def record_queue_wait(self, seconds):
+        '''
+        Records the time the job waited before its task started.
+
+        Parameters:
+            seconds - float - Queue wait in seconds
+        Returns: None
+        '''
+        self.timings['queue_wait'] = round(seconds, 6)
+        SEGMENTATION_QUEUE_WAIT_SECONDS.labels(self.model_version_id).observe(seconds)
+
+    def to_json(self):
+        '''
+        Returns:
+            timings - str - JSON object mapping stage names to seconds
+        '''
+        return json.dumps(self.timings)
+
+
+def render_metrics():
+    '''
+    Renders all metrics in the Prometheus text format.  Celery workers run in other processes
+    than the web server; if the prometheus_multiproc_dir environment variable points to a
+    directory shared by all of them, the metrics of every process are merged.
+
+    Returns:
+        body - bytes - Metrics in the Prometheus exposition format
+        content_type - str - Content type of the exposition format
+    '''
+    if 'prometheus_multiproc_dir' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,92 @@
+"""
+Copyright 2021 Varian Medical Systems, Inc.
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software 
+and associated documentation files (the "Software"), to deal in the Software without 
+restriction, including without limitation the rights to use, copy, modify, merge, publish, 
+distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the 
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or 
+substantial portions of the Software.
+The Software shall be used for non-clinical use only and shall not be used to enable, provide, 
+or support patient treatment. "Non-clinical" or "non-clinical use" means usage not involving: 
+(i) the direct observation of patients; (ii) the diagnoses of disease or other conditions in 
+humans or other animals; or (iii) the cure, mitigation, therapy, treatment, treatment planning,
+or prevention of disease in humans or other animals to affect the structure or function thereof.  
+The Software is NOT U.S. FDA 510(k) cleared for use on humans and shall not be used on humans.
+Any use of the Software outside of its intended use (“off-label”) could lead to physical harm
+or death of patients. 
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING 
+BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND 
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, 
+DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, 
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE. 
+IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY NON-CLINICAL OR OFF-LABEL 
+USE OF THE SOFTWARE AND ANY PERSON THAT USES, COPIES, MODIFIES, MERGES, PUBLISHES, DISTRIBUTES, 
+SUBLICENSES, AND/OR SELLS COPIES OF THE SOFTWARE UNDER THIS PERMISSION NOTICE HEREBY AGREES TO 
+INDEMNIFY AND HOLD HARMLESS THE AUTHORS AND COPYRIGHT HOLDERS FOR ANY LIABILITY, DEMAND, DAMAGE,
+COST OR EXPENSE ARISING FROM OR RELATING TO SUCH NON-CLINICAL OR OFF-LABEL USE OF THE SOFTWARE.
+"""
+
+"""Request-level metrics of the Django API"""
+
+import time
+
+from segint_api.metrics import HTTP_REQUEST_SECONDS, HTTP_REQUESTS, HTTP_REQUEST_BYTES, \
+    HTTP_RESPONSE_BYTES
+
+# View label of requests not routed to a view, e.g. 404s and static files served by whitenoise.
+UNRESOLVED_VIEW = 'unresolved'
+
+
+class RequestMetricsMiddleware:
+    '''
+    Records latency, request and response body sizes and status codes of every request,
+    labelled by the URL name of the view (see segint_api/urls.py) and the HTTP method.
+
+    Placed first in MIDDLEWARE so that the latency covers the whole middleware stack.  The
+    labelled metric children are cached per view, so that the hot path does not go through
+    prometheus_client's label lookup on every request.
+    '''
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.children = {}
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        match = request.resolver_match
+        view = match.view_name if match is not None else UNRESOLVED_VIEW
+        key = (view, request.method, response.status_code)
+        children = self.children.get(key)
+        if children is None:
+            children = self.label_children(*key)
+        latency, requests, request_bytes, response_bytes = children
+
+        latency.observe(elapsed)
+        requests.inc()
+        request_bytes.observe(int(request.META.get('CONTENT_LENGTH') or 0))
+        if not response.streaming:
+            response_bytes.observe(len(response.content))
+        return response
+
+    def label_children(self, view, method, status):
+        '''
+        Resolves and caches the metric children of one view, method and status code.
+
+        Parameters:
+            view - str - URL name of the view
+            method - str - HTTP method
+            status - int - Response status code
+        Returns:
+            children - tuple - latency, request count, request and response size children
+        '''
+        children = (HTTP_REQUEST_SECONDS.labels(view, method), \
+            HTTP_REQUESTS.labels(view, method, str(status)), \
+            HTTP_REQUEST_BYTES.labels(view), HTTP_RESPONSE_BYTES.labels(view))
+        self.children[(view, method, status)] = children
+        return children
@@ -0,0 +1,18 @@
+# Generated by Django 3.0.7 on 2026-10-19 18:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('segint_api', '0035_auto_20200812_1546'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='modelversion',
+            name='celery_queue',
+            field=models.CharField(blank=True, default='', help_text='Leave blank to use the queue configured for the model type.', max_length=200),
+        ),
+    ]
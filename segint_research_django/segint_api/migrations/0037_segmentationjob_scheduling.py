@@ -0,0 +1,48 @@
+# Generated by Django 3.0.7 on 2026-10-19 18:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('segint_api', '0036_modelversion_celery_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='segmentationjob',
+            name='client_key',
+            field=models.CharField(blank=True, default='', max_length=200),
+        ),
+        migrations.AddField(
+            model_name='segmentationjob',
+            name='completed_time',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='segmentationjob',
+            name='dispatched_time',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='segmentationjob',
+            name='priority',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='segmentationjob',
+            name='queue',
+            field=models.CharField(blank=True, default='', max_length=200),
+        ),
+        migrations.AddField(
+            model_name='segmentationjob',
+            name='started_time',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='segmentationjob',
+            name='status',
+            field=models.IntegerField(choices=[(0, 'Pending'), (1, 'Queued'), (2, 'Running'), (3, 'Completed'), (4, 'Failed')], default=0),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 3.0.7 on 2026-10-19 18:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('segint_api', '0037_segmentationjob_scheduling'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='segmentationjob',
+            name='input_bytes',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='segmentationjob',
+            name='status',
+            field=models.IntegerField(choices=[(0, 'Pending'), (1, 'Queued'), (2, 'Running'), (3, 'Completed'), (4, 'Failed'), (5, 'Delivered')], default=0),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 3.0.7 on 2026-10-19 18:26
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('segint_api', '0039_segmentationjob_input_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResultCacheEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('input_hash', models.CharField(max_length=64)),
+                ('model_version_id', models.CharField(max_length=200)),
+                ('major_version', models.IntegerField(default=0)),
+                ('minor_version', models.IntegerField(default=0)),
+                ('model_output', models.FileField(upload_to='results/cache/')),
+                ('size_bytes', models.PositiveIntegerField(default=0)),
+                ('created_time', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_access_time', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('hits', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'result cache entries',
+                'unique_together': {('input_hash', 'model_version_id', 'major_version', 'minor_version')},
+            },
+        ),
+    ]
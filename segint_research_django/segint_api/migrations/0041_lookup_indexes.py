@@ -0,0 +1,45 @@
+# Generated by Django 3.0.7 on 2026-10-19 18:28
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def check_duplicate_model_versions(apps, schema_editor):
+    '''
+    Fails with a readable message if model version IDs are not unique yet.
+    '''
+    ModelVersion = apps.get_model('segint_api', 'ModelVersion')
+    duplicates = ModelVersion.objects.exclude(model_version_id=None) \
+        .values_list('model_version_id').annotate(count=Count('pk')).filter(count__gt=1)
+    if duplicates:
+        raise RuntimeError("Model version IDs must be unique.  Remove or rename the duplicate "
+            "model versions in the admin panel first: {}".format(
+                ", ".join(model_id for model_id, _ in duplicates)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('segint_api', '0040_resultcacheentry'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_duplicate_model_versions, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='modelversion',
+            name='model_version_id',
+            field=models.CharField(max_length=200, null=True, unique=True),
+        ),
+        migrations.AddIndex(
+            model_name='segmentationjob',
+            index=models.Index(fields=['model_id', 'status'], name='segjob_model_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='segmentationjob',
+            index=models.Index(fields=['status', 'priority', 'time_field'], name='segjob_status_priority_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='segmentationjob',
+            index=models.Index(fields=['status', 'completed_time'], name='segjob_status_completed_idx'),
+        ),
+    ]
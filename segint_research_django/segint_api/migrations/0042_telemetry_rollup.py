@@ -0,0 +1,50 @@
+# Generated by Django 3.0.7 on 2026-10-19 18:35
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('segint_api', '0041_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TelemetryRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('model_id', models.CharField(max_length=200)),
+                ('client_software_version', models.CharField(max_length=200)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('retries_sum', models.BigIntegerField(default=0)),
+                ('error_count', models.PositiveIntegerField(default=0)),
+                ('upload_ms_sum', models.BigIntegerField(default=0)),
+                ('wait_ms_sum', models.BigIntegerField(default=0)),
+                ('down_ms_sum', models.BigIntegerField(default=0)),
+                ('upload_ms_sketch', models.TextField(blank=True, default='')),
+                ('wait_ms_sketch', models.TextField(blank=True, default='')),
+                ('down_ms_sketch', models.TextField(blank=True, default='')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='segmentationtelemetry',
+            name='received_time',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='segmentationtelemetry',
+            name='rolled_up',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='segmentationtelemetry',
+            index=models.Index(fields=['rolled_up', 'received_time'], name='telemetry_rollup_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='telemetryrollup',
+            unique_together={('hour', 'model_id', 'client_software_version')},
+        ),
+    ]
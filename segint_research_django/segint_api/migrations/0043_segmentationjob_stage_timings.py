@@ -0,0 +1,18 @@
+# Generated by Django 3.0.7 on 2026-10-19 18:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('segint_api', '0042_telemetry_rollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='segmentationjob',
+            name='stage_timings',
+            field=models.TextField(blank=True, default=''),
+        ),
+    ]
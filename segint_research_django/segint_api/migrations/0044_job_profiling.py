@@ -0,0 +1,33 @@
+# Generated by Django 3.0.7 on 2026-10-19 18:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('segint_api', '0043_segmentationjob_stage_timings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='modelversion',
+            name='profile_memory',
+            field=models.BooleanField(default=False, help_text='Also trace memory allocations of profiled jobs (slows them down).'),
+        ),
+        migrations.AddField(
+            model_name='modelversion',
+            name='profile_sample_rate',
+            field=models.FloatField(default=0.0, help_text='Fraction of jobs profiled, e.g. 0.01.  See segint_api/profiling.py.'),
+        ),
+        migrations.AddField(
+            model_name='segmentationjob',
+            name='profile',
+            field=models.FileField(blank=True, upload_to='results/profiles/'),
+        ),
+        migrations.AddField(
+            model_name='segmentationjob',
+            name='profile_requested',
+            field=models.BooleanField(default=False),
+        ),
+    ]
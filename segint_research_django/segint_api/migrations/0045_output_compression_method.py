@@ -0,0 +1,27 @@
+# Generated by Django 3.0.7 on 2026-10-19 18:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('segint_api', '0044_job_profiling'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='resultcacheentry',
+            name='compression_method',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='segmentationjob',
+            name='compression_method',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AlterUniqueTogether(
+            name='resultcacheentry',
+            unique_together={('input_hash', 'model_version_id', 'major_version', 'minor_version', 'compression_method')},
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 3.0.7 on 2026-10-19 18:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('segint_api', '0045_output_compression_method'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='resultcacheentry',
+            name='crop_output',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='segmentationjob',
+            name='crop_output',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AlterUniqueTogether(
+            name='resultcacheentry',
+            unique_together={('input_hash', 'model_version_id', 'major_version', 'minor_version', 'compression_method', 'crop_output')},
+        ),
+    ]
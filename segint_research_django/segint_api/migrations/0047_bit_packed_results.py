@@ -0,0 +1,39 @@
+# Generated by Django 3.0.7 on 2026-10-19 18:55
+
+from django.db import migrations
+
+
+def drop_recoded_cache_entries(apps, schema_editor):
+    '''
+    Cached outputs no longer depend on the compression method.  Keeps one entry per cache key,
+    the gzip encoded one if present, and deletes the others with their files.
+    '''
+    ResultCacheEntry = apps.get_model('segint_api', 'ResultCacheEntry')
+    kept = set()
+    for entry in ResultCacheEntry.objects.order_by('compression_method', 'pk'):
+        key = (entry.input_hash, entry.model_version_id, entry.major_version, \
+            entry.minor_version, entry.crop_output)
+        if key in kept:
+            entry.model_output.delete(save=False)
+            entry.delete()
+        else:
+            kept.add(key)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('segint_api', '0046_cropped_output'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_recoded_cache_entries, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='resultcacheentry',
+            unique_together={('input_hash', 'model_version_id', 'major_version', 'minor_version', 'crop_output')},
+        ),
+        migrations.RemoveField(
+            model_name='resultcacheentry',
+            name='compression_method',
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 3.0.7 on 2026-10-19 18:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('segint_api', '0047_bit_packed_results'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='modelversion',
+            name='multi_structure',
+            field=models.BooleanField(default=False, help_text="The model outputs a label map that is split into one output channel per structure, using the structures' label values."),
+        ),
+        migrations.AddField(
+            model_name='structure',
+            name='label_value',
+            field=models.PositiveIntegerField(default=1, help_text='Value of the structure in the label map of multi structure models.'),
+        ),
+    ]
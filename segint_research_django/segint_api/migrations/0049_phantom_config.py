@@ -0,0 +1,19 @@
+# Generated by Django 3.0.7 on 2026-10-19 19:01
+
+from django.db import migrations, models
+import segint_api.phantom
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('segint_api', '0048_multi_structure_output'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='modelversion',
+            name='phantom_config',
+            field=models.TextField(blank=True, default='', help_text='Phantom models only: JSON object of phantom parameters, e.g. {"shape": "box", "noise": 0.1, "cpu_seconds": 2}.  See segint_api/phantom.py.', validators=[segint_api.phantom.validate_phantom_config]),
+        ),
+    ]
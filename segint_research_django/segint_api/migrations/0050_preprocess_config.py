@@ -0,0 +1,19 @@
+# Generated by Django 3.0.7 on 2026-10-19 19:04
+
+from django.db import migrations, models
+import segint_api.preprocessing
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('segint_api', '0049_phantom_config'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='modelversion',
+            name='preprocess_config',
+            field=models.TextField(blank=True, default='', help_text='JSON object of input preprocessing parameters, e.g. {"resample": true, "clip": [-1000, 1000], "normalize": "window"}.  See segint_api/preprocessing.py.', validators=[segint_api.preprocessing.validate_preprocess_config]),
+        ),
+    ]
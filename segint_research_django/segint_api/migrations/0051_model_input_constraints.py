@@ -0,0 +1,18 @@
+# Generated by Django 3.0.7 on 2026-10-19 19:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('segint_api', '0050_preprocess_config'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='modelversion',
+            name='enforce_constraints',
+            field=models.BooleanField(default=False, help_text='Reject uploads whose channels, dimensions, spacing or orientation do not match the model channel descriptions of the model family.'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 3.0.7 on 2026-10-19 19:22
+
+from django.db import migrations, models
+import segint_api.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('segint_api', '0051_model_input_constraints'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='modelversion',
+            name='celery_queue',
+            field=models.CharField(blank=True, default='', help_text='Leave blank to use the queue configured for the model type, otherwise one of the queues of SEGINT_QUEUES.', max_length=200, validators=[segint_api.models.validate_celery_queue]),
+        ),
+    ]
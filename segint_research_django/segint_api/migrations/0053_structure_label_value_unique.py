@@ -0,0 +1,44 @@
+# Generated by Django 3.0.7 on 2026-10-19 19:32
+
+import django.core.validators
+from django.db import migrations, models
+from django.db.models import Count, F
+
+
+def renumber_label_values(apps, schema_editor):
+    '''
+    Numbers the structures of model versions with duplicate or zero label values 1, 2, ...
+    Label values were added with a default of 1 for all structures.
+    '''
+    Structure = apps.get_model('segint_api', 'Structure')
+    duplicates = Structure.objects.values_list('model_version') \
+        .annotate(count=Count('pk'), distinct=Count('label_value', distinct=True)) \
+        .filter(distinct__lt=F('count'))
+    invalid = set(model_version for model_version, _, _ in duplicates) | set( \
+        Structure.objects.filter(label_value=0).values_list('model_version', flat=True))
+    for model_version in invalid:
+        structures = Structure.objects.filter(model_version=model_version) \
+            .order_by('label_value', 'pk')
+        for label_value, structure in enumerate(structures, 1):
+            structure.label_value = label_value
+            structure.save(update_fields=['label_value'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('segint_api', '0052_celery_queue_validation'),
+    ]
+
+    operations = [
+        migrations.RunPython(renumber_label_values, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='structure',
+            name='label_value',
+            field=models.PositiveIntegerField(default=1, help_text='Value of the structure in the label map of multi structure models, unique per model version.', validators=[django.core.validators.MinValueValidator(1)]),
+        ),
+        migrations.AlterUniqueTogether(
+            name='structure',
+            unique_together={('model_version', 'label_value')},
+        ),
+    ]
@@ -38,7 +38,24 @@ from protobuf import Model_pb2
 from datetime import datetime
 
 
-from django.db import models
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.validators import MinValueValidator
+from django.db import models, transaction
+from django.utils import timezone
+
+from segint_api.phantom import validate_phantom_config
+from segint_api.preprocessing import validate_preprocess_config
+
+
+def validate_celery_queue(queue):
+    '''
+    Model field validator for queue overrides of model versions.  Only the queues of
+    settings.SEGINT_QUEUES are consumed by Celery worker pools.
+    '''
+    if queue and queue not in settings.SEGINT_QUEUES:
+        raise ValidationError("Unknown queue {}, expected one of: {}.".format(queue, \
+            ", ".join(settings.SEGINT_QUEUES)))
 
 MODELS_DIRECTORY = "../files/models/"
 
@@ -80,23 +97,54 @@ class Feedback(models.Model):
         feedback_pb.ParseFromString(pb_str)
         assert feedback_pb.IsInitialized(), \
             "Protobuf SegmentationFeedback model not initialized after parsing Protobuf input"
+        self.pb_message_to_model(feedback_pb)
+        Feedback.save_all([self])
 
-        # Assign class fields
+    def pb_message_to_model(self, feedback_pb):
+        '''
+        Assigns the fields of an already parsed protobuf message without saving.  The structure
+        comments are kept unsaved in self.pending_comments until save_all is called.
+
+        Parameters:
+        feedback_pb - (Model_pb2.SegmentationFeedback) - parsed feedback message
+
+        Returns: none
+        '''
         self.client_information = feedback_pb.ClientInformation.SoftwareVersion
         self.segmentation_id = feedback_pb.SegmentationID
         self.segmentation_accepted = feedback_pb.SegmentationAccepted
         self.general_comments = feedback_pb.GeneralComments
         self.general_score = None if feedback_pb.GeneralScore is None else \
             feedback_pb.GeneralScore.Value
-        self.save()
-
-        # Iterate through structure comments and add to database
-        for struc_com in feedback_pb.StructureComments:
-            self.structurecomment_set.create(
+        self.pending_comments = [
+            StructureComment(
                 structure_id=struc_com.StructureID,
                 comments=struc_com.Comments,
                 score=None if struc_com.Score is None else struc_com.Score.Value
                 )
+            for struc_com in feedback_pb.StructureComments]
+
+    @staticmethod
+    def save_all(feedbacks):
+        '''
+        Saves feedback and their pending structure comments in one transaction.  Each feedback
+        needs its own INSERT to obtain a primary key, all structure comments are then inserted
+        with a single bulk_create.
+
+        Parameters:
+        feedbacks - (list of Feedback) - feedback filled in by pb_message_to_model
+
+        Returns: none
+        '''
+        with transaction.atomic():
+            comments = []
+            for feedback in feedbacks:
+                feedback.save()
+                for comment in feedback.pending_comments:
+                    comment.feedback = feedback
+                    comments.append(comment)
+                feedback.pending_comments = []
+            StructureComment.objects.bulk_create(comments)
 
 
 class StructureComment(models.Model):
@@ -219,18 +267,23 @@ class ModelFamily(models.Model):
 
         # Model Versions
         for model_version in model_family.ModelVersions:
-            # Create model version in db
-            db_mv = self.modelversion_set.create(
+            # Create model version in db.  Model version IDs are unique, so a family uploaded
+            # again takes over its existing versions, keeping their model files and type.
+            db_mv, _ = ModelVersion.objects.update_or_create(
                 model_version_id=model_version.ID,
-                model_version_desc=model_version.VersionDescription,
-                created_time=model_version.CreatedOn.ToDatetime().replace(tzinfo=pytz.utc),
-                credits_req=model_version.NumberOfCreditsRequired,
-                major_version=model_version.MajorVersion,
-                minor_version=model_version.MinorVersion,
-                language_code=model_version.LanguageCode
+                defaults=dict(
+                    model_family=self,
+                    model_version_desc=model_version.VersionDescription,
+                    created_time=model_version.CreatedOn.ToDatetime().replace(tzinfo=pytz.utc),
+                    credits_req=model_version.NumberOfCreditsRequired,
+                    major_version=model_version.MajorVersion,
+                    minor_version=model_version.MinorVersion,
+                    language_code=model_version.LanguageCode
+                    )
                 )
-            # Iterative add structures
-            for struc in model_version.Structures:
+            db_mv.structure_set.all().delete()
+            # Iterative add structures, labelled 1, 2, ... in label maps
+            for label_value, struc in enumerate(model_version.Structures, 1):
                 db_mv.structure_set.create(
                     name=struc.Name,
                     color_r=struc.Color.R,
@@ -239,7 +292,8 @@ class ModelFamily(models.Model):
                     structure_type=struc.Type,
                     FMA_code=struc.FMACode,
                     input_channel_id=struc.InputChannelID,
-                    structure_id=struc.StructureID
+                    structure_id=struc.StructureID,
+                    label_value=label_value
                     )
 
     def model_to_pb(self, filename=None): # Not implemented
@@ -514,11 +568,22 @@ class ModelVersion(models.Model):
         model_file - Localized file containing relevant model file
         model_module - Localized file containing support classes for the model
         model_type - Descriptor of ML library for the model e.g. PyTorch, Tensorflow
+        celery_queue - Optional Celery queue overriding the queue selected by model_type
         created_time - DateTime when the model was created
         credits_req - Number of credits required to execute this model
         major_version - The major version of this model
         minor_version - The minor version of this model
         language_code - The RFC5646 language code of the translation of this ModelVersion
+        profile_sample_rate - Fraction of this model's jobs profiled with cProfile
+        profile_memory - Whether profiled jobs also trace memory allocations
+        multi_structure - Whether the model outputs a label map of all its structures
+            instead of the mask of a single structure.  See Structure.label_value
+        phantom_config - JSON object of the phantom segmentation parameters of Phantom
+            model versions, empty for the fixed centered box.  See phantom.py
+        preprocess_config - JSON object of the resampling and normalization applied to
+            input channels, empty to pass the raw int16 volumes.  See preprocessing.py
+        enforce_constraints - Whether uploads are rejected when their channels do not match
+            the ModelChannelDescriptions of the model family.  See validation.py
     '''
 
     class ModelVersionType(models.IntegerChoices):
@@ -531,17 +596,39 @@ class ModelVersion(models.Model):
 
     model_family = models.ForeignKey(ModelFamily, on_delete=models.CASCADE, \
         null=True)
-    model_version_id = models.CharField(max_length=200, null=True)
+    model_version_id = models.CharField(max_length=200, null=True, unique=True)
     model_version_desc = models.CharField(max_length=200, null=True)
     model_file = models.FileField(upload_to='models/', null=True, blank=True)
     model_module = models.FileField(upload_to='models/', null=True, blank=True)
     model_type = models.IntegerField(choices=ModelVersionType.choices, \
         blank=True, null=True)
+    celery_queue = models.CharField(max_length=200, blank=True, default='', \
+        validators=[validate_celery_queue], \
+        help_text="Leave blank to use the queue configured for the model type, otherwise one " \
+        "of the queues of SEGINT_QUEUES.")
     created_time = models.DateTimeField(blank=True, null=True)
     credits_req = models.FloatField(default=0.0)
     major_version = models.IntegerField(default=0)
     minor_version = models.IntegerField(default=0)
     language_code = models.CharField(max_length=200, default='en')
+    profile_sample_rate = models.FloatField(default=0.0, \
+        help_text="Fraction of jobs profiled, e.g. 0.01.  See segint_api/profiling.py.")
+    profile_memory = models.BooleanField(default=False, \
+        help_text="Also trace memory allocations of profiled jobs (slows them down).")
+    multi_structure = models.BooleanField(default=False, \
+        help_text="The model outputs a label map that is split into one output channel per " \
+        "structure, using the structures' label values.")
+    phantom_config = models.TextField(blank=True, default='', \
+        validators=[validate_phantom_config], \
+        help_text="Phantom models only: JSON object of phantom parameters, e.g. " \
+        "{\"shape\": \"box\", \"noise\": 0.1, \"cpu_seconds\": 2}.  See segint_api/phantom.py.")
+    preprocess_config = models.TextField(blank=True, default='', \
+        validators=[validate_preprocess_config], \
+        help_text="JSON object of input preprocessing parameters, e.g. {\"resample\": true, " \
+        "\"clip\": [-1000, 1000], \"normalize\": \"window\"}.  See segint_api/preprocessing.py.")
+    enforce_constraints = models.BooleanField(default=False, \
+        help_text="Reject uploads whose channels, dimensions, spacing or orientation do not " \
+        "match the model channel descriptions of the model family.")
 
 class Structure(models.Model):
     '''
@@ -556,6 +643,8 @@ class Structure(models.Model):
             structure.
         input_channel_id - The input channel identifier this structure is linked to.
         structure_id - The unique identifier for this structure.
+        label_value - Value of the structure's voxels in the label map output by a
+            multi structure model version, unique per model version.  0 is the background.
     '''
     class StructureType(models.IntegerChoices):
         '''
@@ -576,6 +665,12 @@ class Structure(models.Model):
     FMA_code = models.IntegerField(default=0)
     input_channel_id = models.CharField(max_length=200)
     structure_id = models.CharField(max_length=200)
+    label_value = models.PositiveIntegerField(default=1, validators=[MinValueValidator(1)], \
+        help_text="Value of the structure in the label map of multi structure models, unique " \
+        "per model version.")
+
+    class Meta:
+        unique_together = ('model_version', 'label_value')
 
     def model_to_pb(self):
         '''
@@ -610,8 +705,38 @@ class SegmentationJob(models.Model):
         time_field - datetime - Generated upon job instantiation to record start date/time.
         model_ouput - File - File object representation of output protobuf message location on disk.
             Field is empty until job is completed.
+        error - str - Error message of a failed job.
+        status - enum - Scheduling state of the job.  See JobStatus
+        client_key - str - Client the job is accounted to for fair-share scheduling.
+        priority - int - Scheduling priority, higher values are dispatched first.
+        queue - str - Celery queue the job is dispatched to.
+        dispatched_time - datetime - When the job was handed to Celery.
+        started_time - datetime - When a worker started processing the job.
+        completed_time - datetime - When the job finished, successfully or not.
+        input_bytes - int - Size of the posted model input in bytes.
+        input_hash - str - Content hash of the model input.  See dedup.hash_model_input
+        stage_timings - str - JSON object of the seconds spent in queue and in each stage of
+            the segmentation schema.  See metrics.StageTimer
+        profile_requested - bool - Whether the client requested profiling of the job.
+        compression_method - int - VolumeData3D.CompressionMethods value the output volumes
+            are encoded with when downloaded, negotiated with the client.
+        crop_output - bool - Whether the client requested output volumes cropped to the
+            bounding box of their structure.
+        profile - File - Zip archive of the job's profile, empty unless the job was profiled.
+            See profiling.py
     '''
 
+    class JobStatus(models.IntegerChoices):
+        '''
+        Django field enumeration for segmentation job scheduling state.
+        '''
+        Pending = 0
+        Queued = 1
+        Running = 2
+        Completed = 3
+        Failed = 4
+        Delivered = 5
+
     # Class Fields
     segmentation_id = models.UUIDField(primary_key=True, default=uuid.uuid4)
     model_id = models.CharField(max_length=60)
@@ -620,6 +745,33 @@ class SegmentationJob(models.Model):
     model_output = models.FileField(upload_to='results/', blank=True)
     error = models.CharField(max_length=60, blank=True, null=True)
 
+    # Scheduling fields
+    status = models.IntegerField(choices=JobStatus.choices, default=JobStatus.Pending)
+    client_key = models.CharField(max_length=200, blank=True, default='')
+    priority = models.IntegerField(default=0)
+    queue = models.CharField(max_length=200, blank=True, default='')
+    dispatched_time = models.DateTimeField(blank=True, null=True)
+    started_time = models.DateTimeField(blank=True, null=True)
+    completed_time = models.DateTimeField(blank=True, null=True)
+    input_bytes = models.PositiveIntegerField(default=0)
+    input_hash = models.CharField(max_length=64, blank=True, default='', db_index=True)
+    stage_timings = models.TextField(blank=True, default='')
+    profile_requested = models.BooleanField(default=False)
+    compression_method = models.IntegerField(default=0)
+    crop_output = models.BooleanField(default=False)
+    profile = models.FileField(upload_to='results/profiles/', blank=True)
+
+    class Meta:
+        indexes = [
+            # Progress/result polls, per-model backlog and deduplication
+            models.Index(fields=['model_id', 'status'], name='segjob_model_status_idx'),
+            # Scheduler selection of pending jobs
+            models.Index(fields=['status', 'priority', 'time_field'], \
+                name='segjob_status_priority_idx'),
+            # Throughput window of admission control and pruning
+            models.Index(fields=['status', 'completed_time'], name='segjob_status_completed_idx'),
+        ]
+
     def get_task_response(self):
         '''
         Generates Segmentation Task response protobuf message from the stored Segmentation Job.
@@ -648,6 +800,11 @@ class SegmentationJob(models.Model):
             response - Model_pb2.Segmentationprogress - Protobuf Segmentation Progress object.
         '''
         response = Model_pb2.SegmentationProgress()
+        if self.status == SegmentationJob.JobStatus.Failed:
+            response.Progress = 0
+            response.Errors = self.error or "The segmentation job has encountered an error."
+            response.ErrorCode = Model_pb2.SegmentationProgress.ErrorCodes.InternalError
+            return response
         if self.model_output != "":
             # 100 progress
             response.Progress = 100
@@ -659,8 +816,94 @@ class SegmentationJob(models.Model):
         response.Errors = ""
         response.ErrorCode = 0
         return response
-    ## REMINDER: For error cases, add enum ErrorCode.Value
 
+    def mark_running(self):
+        '''
+        Records that a worker started processing the job.
+
+        Parameters: none
+
+        Returns: none
+        '''
+        self.status = SegmentationJob.JobStatus.Running
+        self.started_time = timezone.now()
+        self.save(update_fields=['status', 'started_time'])
+
+    def mark_completed(self):
+        '''
+        Records that the job finished and its model output is available.
+
+        Parameters: none
+
+        Returns: none
+        '''
+        self.status = SegmentationJob.JobStatus.Completed
+        self.completed_time = timezone.now()
+        self.save(update_fields=['status', 'completed_time', 'stage_timings'])
+
+    def mark_failed(self, error):
+        '''
+        Records that the job failed.
+
+        Parameters:
+            error - str - Error message reported through the job progress.
+
+        Returns: none
+        '''
+        self.status = SegmentationJob.JobStatus.Failed
+        self.completed_time = timezone.now()
+        self.error = error[:60]
+        self.save(update_fields=['status', 'completed_time', 'error', 'stage_timings'])
+
+    def mark_delivered(self):
+        '''
+        Records that the model output was downloaded.  The input and output files are released,
+        the job itself is kept as a throughput record for admission control until pruned.
+
+        Parameters: none
+
+        Returns: none
+        '''
+        self.status = SegmentationJob.JobStatus.Delivered
+        self.model_input = None
+        self.model_output = None
+        self.save(update_fields=['status', 'model_input', 'model_output'])
+
+
+class ResultCacheEntry(models.Model):
+    '''
+    Result cache database model for the segmentation API.  Maps the content hash of a model
+    input and the model version it was segmented with to a stored model output.
+
+    Fields:
+        input_hash - str - Content hash of the model input.  See dedup.hash_model_input
+        model_version_id - str - Model ID of the model version
+        major_version - int - Major version of the model version
+        minor_version - int - Minor version of the model version
+        crop_output - bool - Whether the output volumes are cropped to their bounding box.
+        model_output - File - Copy of the output protobuf message, within /media/results/cache
+        size_bytes - int - Size of the model output in bytes.
+        created_time - datetime - When the entry was stored.
+        last_access_time - datetime - When the entry was stored or last served.  Entries
+            accessed least recently are evicted first.
+        hits - int - Number of uploads served from the entry.
+    '''
+
+    input_hash = models.CharField(max_length=64)
+    model_version_id = models.CharField(max_length=200)
+    major_version = models.IntegerField(default=0)
+    minor_version = models.IntegerField(default=0)
+    crop_output = models.BooleanField(default=False)
+    model_output = models.FileField(upload_to='results/cache/')
+    size_bytes = models.PositiveIntegerField(default=0)
+    created_time = models.DateTimeField(default=timezone.now)
+    last_access_time = models.DateTimeField(default=timezone.now, db_index=True)
+    hits = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('input_hash', 'model_version_id', 'major_version', 'minor_version', \
+            'crop_output')
+        verbose_name_plural = "result cache entries"
 
 
 class SegmentationTelemetry(models.Model):
@@ -677,6 +920,8 @@ class SegmentationTelemetry(models.Model):
         segmentation_id - str - segmentation task ID
         client_error - enum - error enumeration for the client software
         client_error_info - str - verbose HTML info for errors
+        received_time - datetime - When the server received the telemetry
+        rolled_up - bool - Whether the record is included in TelemetryRollup
     '''
 
     # Class Fields
@@ -689,6 +934,14 @@ class SegmentationTelemetry(models.Model):
     segmentation_id = models.CharField(max_length=200)
     client_error = models.IntegerField()
     client_error_info = models.TextField()
+    received_time = models.DateTimeField(default=timezone.now)
+    rolled_up = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            # Rollup of pending records and retention pruning
+            models.Index(fields=['rolled_up', 'received_time'], name='telemetry_rollup_idx'),
+        ]
 
     def pb_to_model(self, pb_str):
         '''
@@ -704,6 +957,17 @@ class SegmentationTelemetry(models.Model):
         # Parse protobuf message
         telemetry_pb = Model_pb2.SegmentationTelemetry()
         telemetry_pb.ParseFromString(pb_str)
+        self.pb_message_to_model(telemetry_pb)
+
+    def pb_message_to_model(self, telemetry_pb):
+        '''
+        Converts a parsed protobuf message into attributes for the model.
+
+        Parameters:
+        telemetry_pb - Model_pb2.SegmentationTelemetry - parsed protobuf message
+
+        Returns: none
+        '''
         assert telemetry_pb.IsInitialized(), \
             "Protobuf SegmentationTelemetry model not initialized after parsing Protobuf input"
 
@@ -717,3 +981,38 @@ class SegmentationTelemetry(models.Model):
         self.segmentation_id = telemetry_pb.SegmentationID
         self.client_error = telemetry_pb.ClientError
         self.client_error_info = telemetry_pb.ClientErrorInformation
+
+
+class TelemetryRollup(models.Model):
+    '''
+    Hourly aggregate of segmentation telemetry per model and client software version.  Built
+    by the rollup_telemetry task, see telemetry.py
+
+    Fields:
+        hour - datetime - Start of the hour the telemetry was received in.
+        model_id - str - segmentation task model ID
+        client_software_version - str - Software version of the client
+        count - int - Number of telemetry records
+        retries_sum - int - Sum of segmentation retries
+        error_count - int - Number of records reporting a client error
+        upload_ms_sum, wait_ms_sum, down_ms_sum - int - Sums of upload, segmentation wait and
+            download times in ms
+        upload_ms_sketch, wait_ms_sketch, down_ms_sketch - str - Percentile sketches of the
+            same times.  See sketches.LogHistogram
+    '''
+
+    hour = models.DateTimeField()
+    model_id = models.CharField(max_length=200)
+    client_software_version = models.CharField(max_length=200)
+    count = models.PositiveIntegerField(default=0)
+    retries_sum = models.BigIntegerField(default=0)
+    error_count = models.PositiveIntegerField(default=0)
+    upload_ms_sum = models.BigIntegerField(default=0)
+    wait_ms_sum = models.BigIntegerField(default=0)
+    down_ms_sum = models.BigIntegerField(default=0)
+    upload_ms_sketch = models.TextField(blank=True, default='')
+    wait_ms_sketch = models.TextField(blank=True, default='')
+    down_ms_sketch = models.TextField(blank=True, default='')
+
+    class Meta:
+        unique_together = ('hour', 'model_id', 'client_software_version')
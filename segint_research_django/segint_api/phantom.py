@@ -0,0 +1,179 @@
+"""
+Copyright 2021 Varian Medical Systems, Inc.
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software 
+and associated documentation files (the "Software"), to deal in the Software without 
+restriction, including without limitation the rights to use, copy, modify, merge, publish, 
+distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the 
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or 
+substantial portions of the Software.
+The Software shall be used for non-clinical use only and shall not be used to enable, provide, 
+or support patient treatment. "Non-clinical" or "non-clinical use" means usage not involving: 
+(i) the direct observation of patients; (ii) the diagnoses of disease or other conditions in 
+humans or other animals; or (iii) the cure, mitigation, therapy, treatment, treatment planning,
+or prevention of disease in humans or other animals to affect the structure or function thereof.  
+The Software is NOT U.S. FDA 510(k) cleared for use on humans and shall not be used on humans.
+Any use of the Software outside of its intended use (“off-label”) could lead to physical harm
+or death of patients. 
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING 
+BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND 
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, 
+DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, 
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE. 
+IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY NON-CLINICAL OR OFF-LABEL 
+USE OF THE SOFTWARE AND ANY PERSON THAT USES, COPIES, MODIFIES, MERGES, PUBLISHES, DISTRIBUTES, 
+SUBLICENSES, AND/OR SELLS COPIES OF THE SOFTWARE UNDER THIS PERMISSION NOTICE HEREBY AGREES TO 
+INDEMNIFY AND HOLD HARMLESS THE AUTHORS AND COPYRIGHT HOLDERS FOR ANY LIABILITY, DEMAND, DAMAGE,
+COST OR EXPENSE ARISING FROM OR RELATING TO SUCH NON-CLINICAL OR OFF-LABEL USE OF THE SOFTWARE.
+"""
+
+"""Configurable phantom segmentation for load testing without ML frameworks"""
+
+import json
+import time
+
+import numpy as np
+from django.core.exceptions import ValidationError
+
+# Parameters of ModelVersion.phantom_config, with their defaults.
+#   shape - 'ellipsoid' or 'box', the shape family of the structures
+#   structures - number of structures drawn by single structure model versions.  Multi
+#       structure model versions draw one structure per registered Structure.
+#   size - extent of a structure as a fraction of the volume extent, before randomization
+#   noise - standard deviation of the perturbation of the structure boundaries, relative to
+#       the structure size.  Raises the size of encoded outputs.
+#   delay_seconds - simulated inference wait per input channel, e.g. on a GPU, without CPU use
+#   cpu_seconds - simulated inference compute per input channel on one core
+#   seed - seed of the random structures, None for different structures on every job
+DEFAULT_PHANTOM_CONFIG = {
+    'shape': 'ellipsoid',
+    'structures': 1,
+    'size': 0.25,
+    'noise': 0.0,
+    'delay_seconds': 0.0,
+    'cpu_seconds': 0.0,
+    'seed': None,
+}
+PHANTOM_SHAPES = ('ellipsoid', 'box')
+
+
+def is_integer(value):
+    '''
+    Whether a parsed JSON value is an integer, excluding true and false.
+    '''
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def parse_phantom_config(text):
+    '''
+    Parses and checks a phantom configuration.
+
+    Parameters:
+        text - str - JSON object overriding entries of DEFAULT_PHANTOM_CONFIG
+    Returns:
+        config - dict - Complete phantom configuration
+
+    Raises:
+        ValueError - If the text is not a JSON object of known, valid parameters.
+    '''
+    overrides = json.loads(text)
+    if not isinstance(overrides, dict):
+        raise ValueError("The phantom configuration must be a JSON object.")
+    unknown = set(overrides) - set(DEFAULT_PHANTOM_CONFIG)
+    if unknown:
+        raise ValueError("Unknown phantom parameters: {}.".format(", ".join(sorted(unknown))))
+    config = dict(DEFAULT_PHANTOM_CONFIG, **overrides)
+    if config['shape'] not in PHANTOM_SHAPES:
+        raise ValueError("shape must be one of: {}.".format(", ".join(PHANTOM_SHAPES)))
+    # JSON true and false parse to bool, a subclass of int.
+    if not is_integer(config['structures']) or config['structures'] < 1:
+        raise ValueError("structures must be a positive integer.")
+    for key in ('size', 'noise', 'delay_seconds', 'cpu_seconds'):
+        if not (is_integer(config[key]) or isinstance(config[key], float)) or config[key] < 0:
+            raise ValueError("{} must be a non-negative number.".format(key))
+    if config['seed'] is not None and not is_integer(config['seed']):
+        raise ValueError("seed must be an integer or null.")
+    return config
+
+
+def validate_phantom_config(text):
+    '''
+    Model field validator for phantom configurations.  See parse_phantom_config
+    '''
+    if not text:
+        return
+    try:
+        parse_phantom_config(text)
+    except ValueError as exc:
+        raise ValidationError(str(exc))
+
+
+def draw_structure(label_map, label_value, config, rng):
+    '''
+    Draws a randomly placed structure into a label map.  The shape is evaluated only within
+    the region the structure can reach.
+
+    Parameters:
+        label_map - ndarray - (depth, height, width) label map, modified in place
+        label_value - int - Value of the structure's voxels
+        config - dict - Phantom configuration
+        rng - numpy.random.Generator - Random generator
+    Returns: None
+    '''
+    extent = np.array(label_map.shape)
+    radii = np.maximum(extent * config['size'] / 2 * rng.uniform(0.5, 1.0, 3), 1)
+    centre = rng.uniform(np.minimum(radii, extent / 2), np.maximum(extent - radii, extent / 2))
+    # Boundary noise rarely moves voxels further than three standard deviations.
+    reach = radii * (1 + 3 * config['noise'])
+    low = np.maximum(np.floor(centre - reach), 0).astype(int)
+    high = np.minimum(np.ceil(centre + reach) + 1, extent).astype(int)
+    region = tuple(slice(start, stop) for start, stop in zip(low, high))
+    distances = [(np.abs(axis - axis_centre) / radius).astype(np.float32) \
+        for axis, axis_centre, radius in zip(np.ogrid[region], centre, radii)]
+    if config['shape'] == 'box':
+        level = np.maximum(np.maximum(distances[0], distances[1]), distances[2])
+    else:
+        level = np.sqrt(distances[0] ** 2 + distances[1] ** 2 + distances[2] ** 2)
+    if config['noise']:
+        level = level + config['noise'] * rng.standard_normal(level.shape, dtype=np.float32)
+    label_map[region][level <= 1] = label_value
+
+
+def burn_cpu(seconds):
+    '''
+    Keeps one core busy for the given wall time.
+
+    Parameters:
+        seconds - float - Time to burn
+    Returns: None
+    '''
+    block = np.ones(1 << 14)
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        np.sin(block, out=block)
+
+
+def phantom_segment(channels_data, label_values, config):
+    '''
+    Phantom segmentation function: simulates inference according to the configuration and
+    generates a label map of random structures per input channel.
+
+    Parameters:
+        channels_data - [ndarray] - List of channel data in ndarray form
+        label_values - [int] - Label value of each structure to draw
+        config - dict - Phantom configuration.  See parse_phantom_config
+    Returns:
+        segment_result - [ndarray] - List of (depth, height, width) int32 label maps
+    '''
+    rng = np.random.default_rng(config['seed'])
+    segment_result = []
+    for channel_data in channels_data:
+        time.sleep(config['delay_seconds'])
+        burn_cpu(config['cpu_seconds'])
+        label_map = np.zeros(channel_data.shape, dtype=np.int32)
+        for label_value in label_values:
+            draw_structure(label_map, label_value, config, rng)
+        segment_result.append(label_map)
+    return segment_result
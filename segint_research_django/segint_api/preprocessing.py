@@ -0,0 +1,277 @@
+"""
+Copyright 2021 Varian Medical Systems, Inc.
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software 
+and associated documentation files (the "Software"), to deal in the Software without 
+restriction, including without limitation the rights to use, copy, modify, merge, publish, 
+distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the 
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or 
+substantial portions of the Software.
+The Software shall be used for non-clinical use only and shall not be used to enable, provide, 
+or support patient treatment. "Non-clinical" or "non-clinical use" means usage not involving: 
+(i) the direct observation of patients; (ii) the diagnoses of disease or other conditions in 
+humans or other animals; or (iii) the cure, mitigation, therapy, treatment, treatment planning,
+or prevention of disease in humans or other animals to affect the structure or function thereof.  
+The Software is NOT U.S. FDA 510(k) cleared for use on humans and shall not be used on humans.
+Any use of the Software outside of its intended use (“off-label”) could lead to physical harm
+or death of patients. 
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING 
+BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND 
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, 
+DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, 
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE. 
+IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY NON-CLINICAL OR OFF-LABEL 
+USE OF THE SOFTWARE AND ANY PERSON THAT USES, COPIES, MODIFIES, MERGES, PUBLISHES, DISTRIBUTES, 
+SUBLICENSES, AND/OR SELLS COPIES OF THE SOFTWARE UNDER THIS PERMISSION NOTICE HEREBY AGREES TO 
+INDEMNIFY AND HOLD HARMLESS THE AUTHORS AND COPYRIGHT HOLDERS FOR ANY LIABILITY, DEMAND, DAMAGE,
+COST OR EXPENSE ARISING FROM OR RELATING TO SUCH NON-CLINICAL OR OFF-LABEL USE OF THE SOFTWARE.
+"""
+
+"""Resampling and intensity normalization of model inputs"""
+
+import json
+from functools import lru_cache
+
+import numpy as np
+from django.core.exceptions import ValidationError
+
+# Parameters of ModelVersion.preprocess_config, with their defaults.
+#   resample - resample input channels to the target spacing, and output masks back
+#   target_spacing - [x, y, z] spacing in mm the model expects.  None to move the input
+#       spacing into the spacing range of the channel's ModelChannelDescription instead.
+#   interpolation - 'linear' or 'nearest' interpolation of input channels.  Output masks
+#       are always resampled with nearest neighbour interpolation.
+#   clip - [min, max] window the input values are clipped to, e.g. HU, None to not clip
+#   normalize - 'window' scales the clip window to [0, 1], 'zscore' to zero mean and unit
+#       variance, None keeps the values
+DEFAULT_PREPROCESS_CONFIG = {
+    'resample': False,
+    'target_spacing': None,
+    'interpolation': 'linear',
+    'clip': None,
+    'normalize': None,
+}
+INTERPOLATIONS = ('linear', 'nearest')
+NORMALIZATIONS = (None, 'window', 'zscore')
+
+
+def is_number_list(value, length):
+    '''
+    Whether a parsed JSON value is a list of the given number of numbers.
+    '''
+    return isinstance(value, list) and len(value) == length and \
+        all(isinstance(item, (int, float)) and not isinstance(item, bool) for item in value)
+
+
+def parse_preprocess_config(text):
+    '''
+    Parses and checks a preprocessing configuration.
+
+    Parameters:
+        text - str - JSON object overriding entries of DEFAULT_PREPROCESS_CONFIG
+    Returns:
+        config - dict - Complete preprocessing configuration
+
+    Raises:
+        ValueError - If the text is not a JSON object of known, valid parameters.
+    '''
+    overrides = json.loads(text)
+    if not isinstance(overrides, dict):
+        raise ValueError("The preprocessing configuration must be a JSON object.")
+    unknown = set(overrides) - set(DEFAULT_PREPROCESS_CONFIG)
+    if unknown:
+        raise ValueError("Unknown preprocessing parameters: {}.".format( \
+            ", ".join(sorted(unknown))))
+    config = dict(DEFAULT_PREPROCESS_CONFIG, **overrides)
+    if not isinstance(config['resample'], bool):
+        raise ValueError("resample must be true or false.")
+    if config['target_spacing'] is not None and \
+            not (is_number_list(config['target_spacing'], 3) and min(config['target_spacing']) > 0):
+        raise ValueError("target_spacing must be a list of three positive numbers or null.")
+    if config['interpolation'] not in INTERPOLATIONS:
+        raise ValueError("interpolation must be one of: {}.".format(", ".join(INTERPOLATIONS)))
+    if config['clip'] is not None and \
+            not (is_number_list(config['clip'], 2) and config['clip'][0] < config['clip'][1]):
+        raise ValueError("clip must be a list [min, max] with min < max, or null.")
+    if config['normalize'] not in NORMALIZATIONS:
+        raise ValueError("normalize must be \"window\", \"zscore\" or null.")
+    if config['normalize'] == 'window' and config['clip'] is None:
+        raise ValueError("normalize \"window\" requires a clip window.")
+    return config
+
+
+def validate_preprocess_config(text):
+    '''
+    Model field validator for preprocessing configurations.  See parse_preprocess_config
+    '''
+    if not text:
+        return
+    try:
+        parse_preprocess_config(text)
+    except ValueError as exc:
+        raise ValidationError(str(exc))
+
+
+def axis_plan(in_length, out_length, linear):
+    '''
+    Interpolation indices resampling one axis, with the centres of the first and last voxels
+    of both grids aligned to the same extent.
+
+    Parameters:
+        in_length - int - Number of input voxels along the axis
+        out_length - int - Number of output voxels along the axis
+        linear - bool - Linear interpolation, otherwise nearest neighbour
+    Returns:
+        plan - (ndarray, ndarray, ndarray) - Lower input index, upper input index and weight
+            of the upper index per output voxel.  Nearest neighbour plans only hold the
+            input index.  None if the axis is not resampled.
+    '''
+    if in_length == out_length:
+        return None
+    coordinates = (np.arange(out_length) + 0.5) * (in_length / out_length) - 0.5
+    if not linear:
+        return (np.clip(np.floor(coordinates + 0.5), 0, in_length - 1).astype(np.intp),)
+    coordinates = np.clip(coordinates, 0, in_length - 1)
+    lower = np.floor(coordinates).astype(np.intp)
+    upper = np.minimum(lower + 1, in_length - 1)
+    return lower, upper, (coordinates - lower).astype(np.float32)
+
+
+@lru_cache(maxsize=128)
+def resampling_plan(in_shape, out_shape, linear):
+    '''
+    Interpolation indices resampling a volume, cached since jobs of a model mostly share a
+    few input geometries.  The arrays are read-only.
+
+    Parameters:
+        in_shape - (int, int, int) - (depth, height, width) of the input volume
+        out_shape - (int, int, int) - (depth, height, width) of the output volume
+        linear - bool - Linear interpolation, otherwise nearest neighbour
+    Returns:
+        plan - tuple - axis_plan of each axis
+    '''
+    plan = tuple(axis_plan(in_length, out_length, linear) \
+        for in_length, out_length in zip(in_shape, out_shape))
+    for entry in plan:
+        for array in entry or ():
+            array.flags.writeable = False
+    return plan
+
+
+def resample(volume, out_shape, linear=True):
+    '''
+    Resamples a volume to another shape covering the same extent, one axis at a time.
+
+    Parameters:
+        volume - ndarray - (depth, height, width) volume
+        out_shape - (int, int, int) - (depth, height, width) of the output volume
+        linear - bool - Linear interpolation into float32, otherwise nearest neighbour
+            keeping the data type, e.g. for masks and label maps
+    Returns:
+        resampled - ndarray - Resampled volume
+    '''
+    plan = resampling_plan(tuple(volume.shape), tuple(out_shape), linear)
+    if linear:
+        volume = volume.astype(np.float32, copy=False)
+    for axis, entry in enumerate(plan):
+        if entry is None:
+            continue
+        if not linear:
+            volume = np.take(volume, entry[0], axis=axis)
+            continue
+        lower, upper, weight = entry
+        weight_shape = [1, 1, 1]
+        weight_shape[axis] = -1
+        lower_values = np.take(volume, lower, axis=axis)
+        volume = lower_values + (np.take(volume, upper, axis=axis) - lower_values) * \
+            weight.reshape(weight_shape)
+    return volume
+
+
+def volume_spacing(transform_pb):
+    '''
+    Parameters:
+        transform_pb - Transform3D.pb - Transform of a calibrated volume
+    Returns:
+        spacing - (float, float, float) - (depth, height, width) voxel spacing in mm, None if
+            the transform has no voxel scaling
+    '''
+    scaling = transform_pb.VoxelScalingInMM
+    spacing = (scaling.Z, scaling.Y, scaling.X)
+    return spacing if min(spacing) > 0 else None
+
+
+def target_spacing(spacing, description, config):
+    '''
+    Spacing a channel is resampled to: the configured target spacing, otherwise the input
+    spacing moved into the spacing range of the channel description.  A bound of 0 does not
+    constrain the spacing.
+
+    Parameters:
+        spacing - (float, float, float) - (depth, height, width) input spacing in mm
+        description - django.db.ModelChannelDescription - Description of the channel, None
+            if the model has none
+        config - dict - Preprocessing configuration
+    Returns:
+        spacing - (float, float, float) - (depth, height, width) target spacing in mm
+    '''
+    if config['target_spacing'] is not None:
+        x, y, z = config['target_spacing']
+        return (z, y, x)
+    if description is None:
+        return spacing
+    target = []
+    for value, axis in zip(spacing, 'zyx'):
+        low = getattr(description, 'spacing_min_' + axis)
+        high = getattr(description, 'spacing_max_' + axis)
+        if high > 0:
+            value = min(value, high)
+        target.append(max(value, low))
+    return tuple(target)
+
+
+def normalize_intensities(volume, config):
+    '''
+    Clips and normalizes the values of a channel.
+
+    Parameters:
+        volume - ndarray - Channel data
+        config - dict - Preprocessing configuration
+    Returns:
+        volume - ndarray - float32 channel data, the input if nothing is configured
+    '''
+    if config['clip'] is None and config['normalize'] is None:
+        return volume
+    volume = volume.astype(np.float32, copy=False)
+    if config['clip'] is not None:
+        volume = np.clip(volume, *config['clip'])
+    if config['normalize'] == 'window':
+        low, high = config['clip']
+        volume = (volume - low) / (high - low)
+    elif config['normalize'] == 'zscore':
+        volume = (volume - volume.mean()) / (volume.std() or 1)
+    return volume
+
+
+def preprocess_channel(volume, spacing, description, config):
+    '''
+    Resamples and normalizes the data of an input channel for the model.
+
+    Parameters:
+        volume - ndarray - (depth, height, width) channel data
+        spacing - (float, float, float) - (depth, height, width) spacing in mm, None if
+            unknown, in which case the channel is not resampled
+        description - django.db.ModelChannelDescription - Description of the channel, None
+            if the model has none
+        config - dict - Preprocessing configuration
+    Returns:
+        volume - ndarray - Preprocessed channel data
+    '''
+    if config['resample'] and spacing is not None:
+        target = target_spacing(spacing, description, config)
+        out_shape = tuple(max(1, int(round(length * value / target_value))) \
+            for length, value, target_value in zip(volume.shape, spacing, target))
+        volume = resample(volume, out_shape, config['interpolation'] == 'linear')
+    return normalize_intensities(volume, config)
@@ -0,0 +1,132 @@
+"""
+Copyright 2021 Varian Medical Systems, Inc.
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software 
+and associated documentation files (the "Software"), to deal in the Software without 
+restriction, including without limitation the rights to use, copy, modify, merge, publish, 
+distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the 
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or 
+substantial portions of the Software.
+The Software shall be used for non-clinical use only and shall not be used to enable, provide, 
+or support patient treatment. "Non-clinical" or "non-clinical use" means usage not involving: 
+(i) the direct observation of patients; (ii) the diagnoses of disease or other conditions in 
+humans or other animals; or (iii) the cure, mitigation, therapy, treatment, treatment planning,
+or prevention of disease in humans or other animals to affect the structure or function thereof.  
+The Software is NOT U.S. FDA 510(k) cleared for use on humans and shall not be used on humans.
+Any use of the Software outside of its intended use (“off-label”) could lead to physical harm
+or death of patients. 
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING 
+BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND 
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, 
+DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, 
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE. 
+IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY NON-CLINICAL OR OFF-LABEL 
+USE OF THE SOFTWARE AND ANY PERSON THAT USES, COPIES, MODIFIES, MERGES, PUBLISHES, DISTRIBUTES, 
+SUBLICENSES, AND/OR SELLS COPIES OF THE SOFTWARE UNDER THIS PERMISSION NOTICE HEREBY AGREES TO 
+INDEMNIFY AND HOLD HARMLESS THE AUTHORS AND COPYRIGHT HOLDERS FOR ANY LIABILITY, DEMAND, DAMAGE,
+COST OR EXPENSE ARISING FROM OR RELATING TO SUCH NON-CLINICAL OR OFF-LABEL USE OF THE SOFTWARE.
+"""
+
+"""Opt-in profiling of segmentation jobs"""
+
+import io
+import pstats
+import marshal
+import random
+import zipfile
+import cProfile
+import tracemalloc
+from contextlib import contextmanager
+
+from celery.utils.log import get_task_logger
+from django.conf import settings
+from django.core.files import File
+
+logger = get_task_logger(__name__)
+
+
+def should_profile(seg_job, m_v):
+    '''
+    Decides whether a segmentation job is profiled: either the client requested it, or the job
+    is sampled at the profile_sample_rate of its model version.
+
+    Parameters:
+        seg_job - django.db.SegmentationJob - Django model for a segmentation job
+        m_v - django.db.ModelVersion - Database model entry for model version
+    Returns:
+        profile - bool
+    '''
+    if seg_job.profile_requested:
+        return True
+    return m_v.profile_sample_rate > 0 and random.random() < m_v.profile_sample_rate
+
+
+@contextmanager
+def profile_job(seg_job, m_v):
+    '''
+    Context manager capturing a cProfile, and a tracemalloc snapshot if the model version asks
+    for it, of the code run within it.  The profile is saved with the job whether or not the
+    code raises; jobs that are not selected by should_profile run unprofiled.
+
+    Parameters:
+        seg_job - django.db.SegmentationJob - Django model for a segmentation job
+        m_v - django.db.ModelVersion - Database model entry for model version
+    Returns: None
+    '''
+    if not should_profile(seg_job, m_v):
+        yield
+        return
+
+    trace_memory = m_v.profile_memory and not tracemalloc.is_tracing()
+    if trace_memory:
+        tracemalloc.start(settings.SEGINT_PROFILING['TRACEMALLOC_FRAMES'])
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        snapshot = None
+        if trace_memory:
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+        try:
+            save_profile(seg_job, profiler, snapshot)
+        except Exception:
+            logger.exception("\nSaving the profile of job {} failed".format( \
+                seg_job.segmentation_id))
+
+
+def save_profile(seg_job, profiler, snapshot=None):
+    '''
+    Stores a profile as a zip archive next to the job's result.  The archive contains
+        profile.pstats - raw cProfile statistics, e.g. for snakeviz or pstats.Stats
+        profile.txt - functions sorted by cumulative time
+        memory.txt - largest allocations by line, if a tracemalloc snapshot was taken
+
+    Parameters:
+        seg_job - django.db.SegmentationJob - Django model for a segmentation job
+        profiler - cProfile.Profile - Disabled profiler
+        snapshot - tracemalloc.Snapshot - Optional memory snapshot
+    Returns: None
+    '''
+    limit = settings.SEGINT_PROFILING['TOP_ENTRIES']
+    report = io.StringIO()
+    stats = pstats.Stats(profiler, stream=report)
+    stats.sort_stats('cumulative').print_stats(limit)
+
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, 'w', compression=zipfile.ZIP_DEFLATED) as zip_out:
+        # Same format as pstats.Stats.dump_stats
+        zip_out.writestr('profile.pstats', marshal.dumps(stats.stats))
+        zip_out.writestr('profile.txt', report.getvalue())
+        if snapshot is not None:
+            top = snapshot.statistics('lineno')[:limit]
+            zip_out.writestr('memory.txt', "\n".join(str(statistic) for statistic in top))
+
+    fname = "Profile{}.zip".format(seg_job.segmentation_id)
+    seg_job.profile.save(fname, File(archive), save=False)
+    seg_job.save(update_fields=['profile'])
+
@@ -0,0 +1,140 @@
+"""
+Copyright 2021 Varian Medical Systems, Inc.
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software 
+and associated documentation files (the "Software"), to deal in the Software without 
+restriction, including without limitation the rights to use, copy, modify, merge, publish, 
+distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the 
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or 
+substantial portions of the Software.
+The Software shall be used for non-clinical use only and shall not be used to enable, provide, 
+or support patient treatment. "Non-clinical" or "non-clinical use" means usage not involving: 
+(i) the direct observation of patients; (ii) the diagnoses of disease or other conditions in 
+humans or other animals; or (iii) the cure, mitigation, therapy, treatment, treatment planning,
+or prevention of disease in humans or other animals to affect the structure or function thereof.  
+The Software is NOT U.S. FDA 510(k) cleared for use on humans and shall not be used on humans.
+Any use of the Software outside of its intended use (“off-label”) could lead to physical harm
+or death of patients. 
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING 
+BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND 
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, 
+DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, 
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE. 
+IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY NON-CLINICAL OR OFF-LABEL 
+USE OF THE SOFTWARE AND ANY PERSON THAT USES, COPIES, MODIFIES, MERGES, PUBLISHES, DISTRIBUTES, 
+SUBLICENSES, AND/OR SELLS COPIES OF THE SOFTWARE UNDER THIS PERMISSION NOTICE HEREBY AGREES TO 
+INDEMNIFY AND HOLD HARMLESS THE AUTHORS AND COPYRIGHT HOLDERS FOR ANY LIABILITY, DEMAND, DAMAGE,
+COST OR EXPENSE ARISING FROM OR RELATING TO SUCH NON-CLINICAL OR OFF-LABEL USE OF THE SOFTWARE.
+"""
+
+"""Content-addressed cache of segmentation results"""
+
+from django.conf import settings
+from django.core.files import File
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from segint_api.models import ResultCacheEntry, ModelVersion
+from segint_api.metrics import RESULT_CACHE_LOOKUPS, RESULT_CACHE_EVICTIONS
+
+
+def get_cache_key(m_v, input_hash, crop_output):
+    '''
+    Cache key of a model input segmented with a model version.
+
+    Parameters:
+        m_v - django.db.ModelVersion - Model version of the segmentation
+        input_hash - str - Content hash of the model input
+        crop_output - bool - Whether the output volumes are cropped to their bounding box
+    Returns:
+        key - dict - Lookup arguments for ResultCacheEntry
+    '''
+    return {'input_hash': input_hash, 'model_version_id': m_v.model_version_id, \
+        'major_version': m_v.major_version, 'minor_version': m_v.minor_version, \
+        'crop_output': crop_output}
+
+
+def lookup_cached_output(m_v, input_hash, crop_output):
+    '''
+    Looks up the cached model output of a model input and records the hit or miss.
+
+    Parameters:
+        m_v - django.db.ModelVersion - Model version of the segmentation
+        input_hash - str - Content hash of the model input
+        crop_output - bool - Whether the output volumes are cropped to their bounding box
+    Returns:
+        entry - django.db.ResultCacheEntry - Cache entry, None on a miss or if caching is off
+    '''
+    if not settings.SEGINT_RESULT_CACHE['MAX_BYTES']:
+        return None
+    entry = ResultCacheEntry.objects.filter(**get_cache_key(m_v, input_hash, \
+        crop_output)).first()
+    if entry is None:
+        RESULT_CACHE_LOOKUPS.labels(result='miss').inc()
+        return None
+    RESULT_CACHE_LOOKUPS.labels(result='hit').inc()
+    ResultCacheEntry.objects.filter(pk=entry.pk).update(last_access_time=timezone.now(), \
+        hits=F('hits') + 1)
+    return entry
+
+
+def store_cached_output(seg_job):
+    '''
+    Stores a copy of the model output of a completed segmentation job in the cache, then
+    evicts entries until the cache is within its configured size.
+
+    Parameters:
+        seg_job - django.db.SegmentationJob - Completed job with input_hash set
+    Returns: None
+    '''
+    max_bytes = settings.SEGINT_RESULT_CACHE['MAX_BYTES']
+    if not max_bytes or not seg_job.input_hash or not seg_job.model_output:
+        return
+    m_v = ModelVersion.objects.filter(model_version_id=seg_job.model_id).first()
+    if m_v is None:
+        return
+    key = get_cache_key(m_v, seg_job.input_hash, seg_job.crop_output)
+    if ResultCacheEntry.objects.filter(**key).exists():
+        return
+
+    entry = ResultCacheEntry(**key)
+    with open(seg_job.model_output.path, 'rb') as file_in:
+        fname = "{}.pb".format("Cache{}".format(seg_job.input_hash))
+        entry.model_output.save(fname, File(file_in), save=False)
+    entry.size_bytes = entry.model_output.size
+    try:
+        with transaction.atomic():
+            entry.save()
+    except IntegrityError:
+        # Another worker cached the same result first.
+        entry.model_output.delete(save=False)
+        return
+    evict_cached_outputs(max_bytes)
+
+
+def evict_cached_outputs(max_bytes):
+    '''
+    Evicts the least recently accessed cache entries until the cached model outputs take up
+    at most max_bytes.  The output files are removed along with the entries.
+
+    Parameters:
+        max_bytes - int - Size limit of the cache
+    Returns:
+        evicted - int - Number of evicted entries
+    '''
+    total = ResultCacheEntry.objects.aggregate(total=Sum('size_bytes'))['total'] or 0
+    if total <= max_bytes:
+        return 0
+    evict_ids = []
+    for entry_id, size_bytes in ResultCacheEntry.objects.order_by('last_access_time') \
+            .values_list('pk', 'size_bytes').iterator():
+        if total <= max_bytes:
+            break
+        evict_ids.append(entry_id)
+        total -= size_bytes
+    ResultCacheEntry.objects.filter(pk__in=evict_ids).delete()
+    RESULT_CACHE_EVICTIONS.inc(len(evict_ids))
+    return len(evict_ids)
@@ -0,0 +1,113 @@
+"""
+Copyright 2021 Varian Medical Systems, Inc.
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software 
+and associated documentation files (the "Software"), to deal in the Software without 
+restriction, including without limitation the rights to use, copy, modify, merge, publish, 
+distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the 
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or 
+substantial portions of the Software.
+The Software shall be used for non-clinical use only and shall not be used to enable, provide, 
+or support patient treatment. "Non-clinical" or "non-clinical use" means usage not involving: 
+(i) the direct observation of patients; (ii) the diagnoses of disease or other conditions in 
+humans or other animals; or (iii) the cure, mitigation, therapy, treatment, treatment planning,
+or prevention of disease in humans or other animals to affect the structure or function thereof.  
+The Software is NOT U.S. FDA 510(k) cleared for use on humans and shall not be used on humans.
+Any use of the Software outside of its intended use (“off-label”) could lead to physical harm
+or death of patients. 
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING 
+BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND 
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, 
+DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, 
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE. 
+IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY NON-CLINICAL OR OFF-LABEL 
+USE OF THE SOFTWARE AND ANY PERSON THAT USES, COPIES, MODIFIES, MERGES, PUBLISHES, DISTRIBUTES, 
+SUBLICENSES, AND/OR SELLS COPIES OF THE SOFTWARE UNDER THIS PERMISSION NOTICE HEREBY AGREES TO 
+INDEMNIFY AND HOLD HARMLESS THE AUTHORS AND COPYRIGHT HOLDERS FOR ANY LIABILITY, DEMAND, DAMAGE,
+COST OR EXPENSE ARISING FROM OR RELATING TO SUCH NON-CLINICAL OR OFF-LABEL USE OF THE SOFTWARE.
+"""
+
+"""Celery queue routing for segmentation jobs"""
+
+import logging
+
+from django.conf import settings
+
+from segint_api.models import ModelVersion
+from segint_api.tasks import start_phantom_segmentation, \
+    start_pytorch_segmentation_single_structure, start_tensorflow_segmentation_single_structure, \
+    start_phantom_segmentation_multi_structure, start_pytorch_segmentation_multi_structure, \
+    start_tensorflow_segmentation_multi_structure
+
+logger = logging.getLogger(__name__)
+
+# Segmentation task per ML backend.  Unknown backends fall back to the phantom task.
+SEGMENTATION_TASKS = {
+    ModelVersion.ModelVersionType.Phantom: start_phantom_segmentation,
+    ModelVersion.ModelVersionType.Pytorch: start_pytorch_segmentation_single_structure,
+    ModelVersion.ModelVersionType.Tensorflow: start_tensorflow_segmentation_single_structure,
+}
+
+# Segmentation task per ML backend for model versions outputting a label map of all their
+# structures.  See ModelVersion.multi_structure
+MULTI_STRUCTURE_TASKS = {
+    ModelVersion.ModelVersionType.Phantom: start_phantom_segmentation_multi_structure,
+    ModelVersion.ModelVersionType.Pytorch: start_pytorch_segmentation_multi_structure,
+    ModelVersion.ModelVersionType.Tensorflow: start_tensorflow_segmentation_multi_structure,
+}
+
+
+def get_segmentation_task(m_v):
+    '''
+    Selects the Celery task implementing segmentation for a model version.
+
+    Parameters:
+        m_v - django.db.ModelVersion - Database model entry for model version
+    Returns:
+        task - celery.Task - Segmentation task for the model version's backend
+    '''
+    if m_v.multi_structure:
+        return MULTI_STRUCTURE_TASKS.get(m_v.model_type, \
+            start_phantom_segmentation_multi_structure)
+    return SEGMENTATION_TASKS.get(m_v.model_type, start_phantom_segmentation)
+
+
+def get_segmentation_queue(m_v):
+    '''
+    Selects the Celery queue a segmentation job for the model version is placed on.
+    A queue set on the model version takes precedence over the backend queues defined in
+    settings.SEGINT_QUEUES, unless no worker pool consumes it.
+
+    Parameters:
+        m_v - django.db.ModelVersion - Database model entry for model version
+    Returns:
+        queue - str - Name of the Celery queue
+    '''
+    if m_v.celery_queue in settings.SEGINT_QUEUES:
+        return m_v.celery_queue
+    if m_v.celery_queue:
+        logger.warning("Model version %s is routed to the unknown queue %s, using the queue of " \
+            "its model type", m_v.model_version_id, m_v.celery_queue)
+    for queue, definition in settings.SEGINT_QUEUES.items():
+        if m_v.model_type in definition['model_types']:
+            return queue
+    return settings.CELERY_DEFAULT_QUEUE
+
+
+def dispatch_segmentation(m_v, seg_job):
+    '''
+    Sends a segmentation job to its Celery queue.  Jobs without a queue assigned are placed on
+    the queue of their model version.
+
+    Parameters:
+        m_v - django.db.ModelVersion - Database model entry for model version
+        seg_job - django.db.SegmentationJob - Django model for a segmentation job.
+    Returns:
+        queue - str - Name of the Celery queue the job was placed on
+    '''
+    queue = seg_job.queue or get_segmentation_queue(m_v)
+    get_segmentation_task(m_v).apply_async( \
+        (m_v.model_version_id, seg_job.segmentation_id), queue=queue, routing_key=queue)
+    return queue
@@ -0,0 +1,280 @@
+"""
+Copyright 2021 Varian Medical Systems, Inc.
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software 
+and associated documentation files (the "Software"), to deal in the Software without 
+restriction, including without limitation the rights to use, copy, modify, merge, publish, 
+distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the 
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or 
+substantial portions of the Software.
+The Software shall be used for non-clinical use only and shall not be used to enable, provide, 
+or support patient treatment. "Non-clinical" or "non-clinical use" means usage not involving: 
+(i) the direct observation of patients; (ii) the diagnoses of disease or other conditions in 
+humans or other animals; or (iii) the cure, mitigation, therapy, treatment, treatment planning,
+or prevention of disease in humans or other animals to affect the structure or function thereof.  
+The Software is NOT U.S. FDA 510(k) cleared for use on humans and shall not be used on humans.
+Any use of the Software outside of its intended use (“off-label”) could lead to physical harm
+or death of patients. 
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING 
+BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND 
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, 
+DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, 
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE. 
+IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY NON-CLINICAL OR OFF-LABEL 
+USE OF THE SOFTWARE AND ANY PERSON THAT USES, COPIES, MODIFIES, MERGES, PUBLISHES, DISTRIBUTES, 
+SUBLICENSES, AND/OR SELLS COPIES OF THE SOFTWARE UNDER THIS PERMISSION NOTICE HEREBY AGREES TO 
+INDEMNIFY AND HOLD HARMLESS THE AUTHORS AND COPYRIGHT HOLDERS FOR ANY LIABILITY, DEMAND, DAMAGE,
+COST OR EXPENSE ARISING FROM OR RELATING TO SUCH NON-CLINICAL OR OFF-LABEL USE OF THE SOFTWARE.
+"""
+
+"""Priority and fair-share scheduling of segmentation jobs in front of Celery"""
+
+import threading
+from datetime import timedelta
+
+from celery.decorators import task
+from celery.signals import task_postrun
+from celery.utils.log import get_task_logger
+from django.conf import settings
+from django.db.models import Count, Min, Q
+from django.utils import timezone
+
+from segint_api.models import SegmentationJob, ModelVersion
+from segint_api.routing import SEGMENTATION_TASKS, MULTI_STRUCTURE_TASKS, \
+    dispatch_segmentation
+
+logger = get_task_logger(__name__)
+
+# Jobs handed to Celery that occupy a slot of their queue.
+IN_FLIGHT_STATUSES = [SegmentationJob.JobStatus.Queued, SegmentationJob.JobStatus.Running]
+
+_SCHEDULER_STATE = threading.local()
+
+STALE_JOB_ERROR = "The segmentation job did not finish in time."
+MISSING_MODEL_ERROR = "The model version of the segmentation job no longer exists."
+
+
+def get_client_weight(client_key):
+    '''
+    Fair-share weight of a client.  A client with weight 2 is granted twice as many in-flight
+    jobs as a client with weight 1.
+
+    Parameters:
+        client_key - str - Client key of a segmentation job
+    Returns:
+        weight - float - Weight of the client
+    '''
+    return float(settings.SEGINT_SCHEDULER['CLIENT_WEIGHTS'].get(client_key, 1.0))
+
+
+def get_queue_capacity(queue):
+    '''
+    Maximum number of jobs of a Celery queue that may be in flight at once.
+
+    Parameters:
+        queue - str - Name of the Celery queue
+    Returns:
+        capacity - int - Number of in-flight jobs allowed on the queue
+    '''
+    definition = settings.SEGINT_QUEUES.get(queue, {})
+    return definition.get('max_in_flight', settings.SEGINT_SCHEDULER['DEFAULT_MAX_IN_FLIGHT'])
+
+
+def select_next_job():
+    '''
+    Selects the pending job to dispatch next.  Only queues with free capacity are considered.
+    The highest pending priority is served first; within that priority the client with the
+    fewest in-flight jobs relative to its weight wins, ties going to the client waiting longest.
+    Jobs of a client are served in submission order.
+
+    Parameters: none
+    Returns:
+        seg_job - django.db.SegmentationJob - Job to dispatch, None if nothing can be dispatched
+    '''
+    in_flight = SegmentationJob.objects.filter(status__in=IN_FLIGHT_STATUSES)
+    queue_load = dict(in_flight.values_list('queue').annotate(jobs=Count('pk')))
+
+    pending = SegmentationJob.objects.filter(status=SegmentationJob.JobStatus.Pending)
+    open_queues = [queue for queue in pending.values_list('queue', flat=True).distinct() \
+        if queue_load.get(queue, 0) < get_queue_capacity(queue)]
+    if not open_queues:
+        return None
+    pending = pending.filter(queue__in=open_queues)
+
+    top_priority = pending.order_by('-priority').values_list('priority', flat=True).first()
+    if top_priority is None:
+        return None
+    pending = pending.filter(priority=top_priority)
+
+    client_load = dict(in_flight.values_list('client_key').annotate(jobs=Count('pk')))
+    waiting_since = pending.values_list('client_key').annotate(oldest=Min('time_field'))
+    client_key, _ = min(waiting_since, key=lambda client: \
+        (client_load.get(client[0], 0) / get_client_weight(client[0]), client[1]))
+    return pending.filter(client_key=client_key).order_by('time_field').first()
+
+
+def claim_and_dispatch(seg_job):
+    '''
+    Atomically moves a pending job to the queued state and sends it to Celery.  Returns False
+    if another scheduler already claimed the job, or if its model version was deleted, in
+    which case the job is marked failed.
+
+    Parameters:
+        seg_job - django.db.SegmentationJob - Pending job to dispatch
+    Returns:
+        dispatched - bool - Whether this call dispatched the job
+    '''
+    now = timezone.now()
+    m_v = ModelVersion.objects.filter(model_version_id=seg_job.model_id).first()
+    if m_v is None:
+        logger.warning("\nModel version {} of segmentation job {} no longer exists".format( \
+            seg_job.model_id, seg_job.segmentation_id))
+        SegmentationJob.objects.filter(pk=seg_job.pk, \
+            status=SegmentationJob.JobStatus.Pending).update( \
+            status=SegmentationJob.JobStatus.Failed, completed_time=now, \
+            error=MISSING_MODEL_ERROR)
+        return False
+    claimed = SegmentationJob.objects.filter(pk=seg_job.pk, \
+        status=SegmentationJob.JobStatus.Pending).update( \
+        status=SegmentationJob.JobStatus.Queued, dispatched_time=now)
+    if not claimed:
+        return False
+    seg_job.status = SegmentationJob.JobStatus.Queued
+    seg_job.dispatched_time = now
+    try:
+        dispatch_segmentation(m_v, seg_job)
+    except Exception:
+        # Return the job to the scheduler, e.g. when the broker is unavailable.
+        SegmentationJob.objects.filter(pk=seg_job.pk, \
+            status=SegmentationJob.JobStatus.Queued).update( \
+            status=SegmentationJob.JobStatus.Pending, dispatched_time=None)
+        raise
+    return True
+
+
+def schedule_segmentations():
+    '''
+    Dispatches pending segmentation jobs until every queue is at capacity or no jobs are left.
+    Safe to call from several processes; nested calls within one thread return immediately
+    since the outer call keeps dispatching (e.g. with eager Celery execution).
+
+    Parameters: none
+    Returns:
+        dispatched - int - Number of jobs dispatched by this call
+    '''
+    if getattr(_SCHEDULER_STATE, 'active', False):
+        return 0
+    _SCHEDULER_STATE.active = True
+    dispatched = 0
+    try:
+        while True:
+            seg_job = select_next_job()
+            if seg_job is None:
+                break
+            if claim_and_dispatch(seg_job):
+                dispatched += 1
+    finally:
+        _SCHEDULER_STATE.active = False
+    return dispatched
+
+
+def stale_job_filter(now=None):
+    '''
+    Filter of in-flight jobs past the timeouts of SEGINT_SCHEDULER: queued jobs not started
+    within QUEUED_TIMEOUT_SECONDS, e.g. because their Celery message was lost, and running
+    jobs not finished within RUNNING_TIMEOUT_SECONDS, e.g. because their worker was killed.
+
+    Parameters:
+        now - datetime - Reference time, the current time if None
+    Returns:
+        stale - django.db.models.Q - Filter of stale SegmentationJobs
+    '''
+    now = now or timezone.now()
+    config = settings.SEGINT_SCHEDULER
+    return Q(status=SegmentationJob.JobStatus.Queued, \
+        dispatched_time__lt=now - timedelta(seconds=config['QUEUED_TIMEOUT_SECONDS'])) | \
+        Q(status=SegmentationJob.JobStatus.Running, \
+        started_time__lt=now - timedelta(seconds=config['RUNNING_TIMEOUT_SECONDS']))
+
+
+def reclaim_stale_jobs():
+    '''
+    Frees the queue slots of stale jobs, see stale_job_filter.  Stale queued jobs are returned
+    to pending and dispatched again; a redelivered message of a job that has since started is
+    skipped by the segmentation tasks.  Stale running jobs are marked failed.
+
+    Parameters: none
+    Returns:
+        requeued - int - Number of queued jobs returned to pending
+        failed - int - Number of running jobs marked failed
+    '''
+    now = timezone.now()
+    stale = SegmentationJob.objects.filter(stale_job_filter(now))
+    requeued = stale.filter(status=SegmentationJob.JobStatus.Queued).update( \
+        status=SegmentationJob.JobStatus.Pending, dispatched_time=None)
+    failed = stale.filter(status=SegmentationJob.JobStatus.Running).update( \
+        status=SegmentationJob.JobStatus.Failed, completed_time=now, error=STALE_JOB_ERROR)
+    return requeued, failed
+
+
+def get_queue_depths():
+    '''
+    Summarizes outstanding segmentation jobs per client and per Celery queue.
+
+    Parameters: none
+    Returns:
+        depths - dict - {'clients': {client_key: {status: count}},
+                         'queues': {queue: {status: count, 'capacity': int}}}
+    '''
+    outstanding = SegmentationJob.objects.filter( \
+        status__in=[SegmentationJob.JobStatus.Pending] + IN_FLIGHT_STATUSES)
+    depths = {'clients': {}, 'queues': {}}
+    for client_key, queue, status, jobs in outstanding.values_list( \
+            'client_key', 'queue', 'status').annotate(jobs=Count('pk')):
+        label = SegmentationJob.JobStatus(status).label.lower()
+        client = depths['clients'].setdefault(client_key, {})
+        client[label] = client.get(label, 0) + jobs
+        queue_depth = depths['queues'].setdefault(queue, {'capacity': get_queue_capacity(queue)})
+        queue_depth[label] = queue_depth.get(label, 0) + jobs
+    return depths
+
+
+@task(name="schedule_segmentations")
+def schedule_segmentations_periodic():
+    '''
+    Periodic scheduling pass, run by Celery beat.  Picks up jobs left pending, e.g. when a
+    dispatch failed because the broker was unavailable.
+
+    Returns: None
+    '''
+    dispatched = schedule_segmentations()
+    if dispatched:
+        logger.info("\nScheduler dispatched {} pending segmentation jobs".format(dispatched))
+
+
+@task(name="reclaim_stale_jobs")
+def reclaim_stale_jobs_periodic():
+    '''
+    Periodic reclaiming of stale jobs, run by Celery beat.  Dispatches pending jobs into the
+    freed queue slots.
+
+    Returns: None
+    '''
+    requeued, failed = reclaim_stale_jobs()
+    if requeued or failed:
+        logger.warning("\nScheduler requeued {} and failed {} stale segmentation jobs".format( \
+            requeued, failed))
+        schedule_segmentations()
+
+
+@task_postrun.connect
+def schedule_after_segmentation(sender=None, **kwargs):
+    '''
+    Celery signal handler dispatching pending jobs once a segmentation task frees its slot.
+    '''
+    segmentation_task_names = [task_fn.name for task_fn in \
+        list(SEGMENTATION_TASKS.values()) + list(MULTI_STRUCTURE_TASKS.values())]
+    if sender is not None and sender.name in segmentation_task_names:
+        schedule_segmentations()
@@ -0,0 +1,130 @@
+"""
+Copyright 2021 Varian Medical Systems, Inc.
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software 
+and associated documentation files (the "Software"), to deal in the Software without 
+restriction, including without limitation the rights to use, copy, modify, merge, publish, 
+distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the 
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or 
+substantial portions of the Software.
+The Software shall be used for non-clinical use only and shall not be used to enable, provide, 
+or support patient treatment. "Non-clinical" or "non-clinical use" means usage not involving: 
+(i) the direct observation of patients; (ii) the diagnoses of disease or other conditions in 
+humans or other animals; or (iii) the cure, mitigation, therapy, treatment, treatment planning,
+or prevention of disease in humans or other animals to affect the structure or function thereof.  
+The Software is NOT U.S. FDA 510(k) cleared for use on humans and shall not be used on humans.
+Any use of the Software outside of its intended use (“off-label”) could lead to physical harm
+or death of patients. 
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING 
+BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND 
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, 
+DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, 
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE. 
+IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY NON-CLINICAL OR OFF-LABEL 
+USE OF THE SOFTWARE AND ANY PERSON THAT USES, COPIES, MODIFIES, MERGES, PUBLISHES, DISTRIBUTES, 
+SUBLICENSES, AND/OR SELLS COPIES OF THE SOFTWARE UNDER THIS PERMISSION NOTICE HEREBY AGREES TO 
+INDEMNIFY AND HOLD HARMLESS THE AUTHORS AND COPYRIGHT HOLDERS FOR ANY LIABILITY, DEMAND, DAMAGE,
+COST OR EXPENSE ARISING FROM OR RELATING TO SUCH NON-CLINICAL OR OFF-LABEL USE OF THE SOFTWARE.
+"""
+
+"""Mergeable percentile sketches"""
+
+import math
+import json
+
+
+class LogHistogram:
+    '''
+    Percentile sketch of non-negative values with bounded relative error, in the manner of
+    DDSketch: values are counted in logarithmically sized buckets, so quantiles are accurate
+    to within relative_accuracy and sketches of different hours or models merge by adding
+    bucket counts.  Zero values are counted separately.
+    '''
+    def __init__(self, relative_accuracy=0.01):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.buckets = {}
+        self.zero_count = 0
+        self.count = 0
+
+    def add(self, value, count=1):
+        '''
+        Counts a value.
+
+        Parameters:
+            value - float - Non-negative value; negative values are counted as zero
+            count - int - Number of occurrences
+        Returns: None
+        '''
+        self.count += count
+        if value <= 0:
+            self.zero_count += count
+            return
+        index = int(math.ceil(math.log(value) / self.log_gamma))
+        self.buckets[index] = self.buckets.get(index, 0) + count
+
+    def merge(self, other):
+        '''
+        Adds the counts of another sketch.  Buckets of a sketch with a different relative
+        accuracy, e.g. stored before SKETCH_RELATIVE_ACCURACY was changed, are re-bucketed at
+        their midpoints, so quantiles of the merged sketch are accurate to about the sum of
+        both accuracies.
+
+        Parameters:
+            other - LogHistogram - Sketch to merge into this one
+        Returns: None
+        '''
+        if other.gamma != self.gamma:
+            self.count += other.zero_count
+            self.zero_count += other.zero_count
+            for index, count in other.buckets.items():
+                self.add(2 * other.gamma ** index / (other.gamma + 1), count)
+            return
+        self.count += other.count
+        self.zero_count += other.zero_count
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+
+    def quantile(self, q):
+        '''
+        Estimates a quantile.
+
+        Parameters:
+            q - float - Quantile between 0 and 1
+        Returns:
+            value - float - Estimated value, None for an empty sketch
+        '''
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if rank < seen:
+                # Midpoint of the bucket (gamma^(index-1), gamma^index] in relative terms.
+                return 2 * self.gamma ** index / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+    def to_json(self):
+        '''
+        Serializes the sketch for storage in a text field.
+        '''
+        return json.dumps({'a': self.relative_accuracy, 'z': self.zero_count, \
+            'b': {str(index): count for index, count in self.buckets.items()}})
+
+    @classmethod
+    def from_json(cls, text):
+        '''
+        Restores a sketch serialized with to_json.
+        '''
+        data = json.loads(text)
+        sketch = cls(data['a'])
+        sketch.zero_count = data['z']
+        sketch.buckets = {int(index): count for index, count in data['b'].items()}
+        sketch.count = sketch.zero_count + sum(sketch.buckets.values())
+        return sketch
@@ -30,12 +30,9 @@ COST OR EXPENSE ARISING FROM OR RELATING TO SUCH NON-CLINICAL OR OFF-LABEL USE O
 """
 
 import io
-import os
-import sys
-import importlib
-import inspect
 import gzip
 import warnings
+from contextlib import contextmanager
 # This is a hack. Tensorflow and numpy versions disagree
 # TODO: rectify tf and np versions
 warnings.filterwarnings('ignore', category=FutureWarning)
@@ -50,7 +47,16 @@ import numpy as np
 
 # Local imports
 from protobuf import Model_pb2, Primitives3D_pb2
-from segint_api.models import SegmentationJob, ModelVersion, Structure
+from segint_api.models import SegmentationJob, ModelVersion, Structure, ModelChannelDescription
+from segint_api.loaders import load_model_module, model_pickle_module
+from segint_api.result_cache import store_cached_output
+from segint_api.metrics import StageTimer
+from segint_api.profiling import profile_job
+from segint_api.phantom import parse_phantom_config, phantom_segment
+from segint_api.preprocessing import parse_preprocess_config, preprocess_channel, \
+    volume_spacing, resample
+from segint_api.volumes import encode_mask, crop_mask, crop_transform, one_hot, \
+    CompressionMethods, STORAGE_COMPRESSION_METHOD
 
 # ML imports
 import torch
@@ -72,20 +78,29 @@ def start_pytorch_segmentation_single_structure(model_id, job_id):
     logger.info("\nStarting Pytorch with job_id {} and model_id {}".format(job_id, model_id))
 
     # Find the job
-    try:
-        seg_job = SegmentationJob.objects.get(model_id=model_id, segmentation_id=job_id)
-        m_v = ModelVersion.objects.filter(model_version_id=model_id)[0]
-        structure = Structure.objects.filter(model_version=m_v)[0]
-    except:
-        logger.info("\nCan't find job!")
+    seg_job = find_queued_job(model_id, job_id)
+    if seg_job is None:
         return
+    m_v = ModelVersion.objects.filter(model_version_id=model_id).first()
 
     # Segmentation schema.  See helper functions below for details
-    model_in = acquire_model_input(seg_job)
-    channels_data = parse_model_in(model_in)
-    segment_result = volumetric_pytorch_segment(m_v, channels_data)
-    model_out = construct_model_out(m_v, structure, segment_result)
-    save_to_disk(seg_job, model_out)
+    with track_job_status(seg_job, m_v) as timer:
+        structure = get_model_structure(m_v)
+        with timer.stage("acquire"):
+            model_in = acquire_model_input(seg_job)
+        with timer.stage("parse"):
+            channels_data = parse_model_in(model_in)
+        with timer.stage("preprocess"):
+            channels_data, input_shapes = preprocess_model_in(m_v, model_in, channels_data)
+        with timer.stage("segment"):
+            segment_result = volumetric_pytorch_segment(m_v, channels_data)
+        with timer.stage("postprocess"):
+            segment_result = postprocess_segment_result(segment_result, input_shapes)
+        with timer.stage("construct"):
+            model_out = construct_model_out(m_v, structure, segment_result, \
+                STORAGE_COMPRESSION_METHOD, get_crop_transform(seg_job, model_in))
+        with timer.stage("save"):
+            save_to_disk(seg_job, model_out)
 
 @task(name='start_tensorflow_segmentation_single_structure')
 def start_tensorflow_segmentation_single_structure(model_id, job_id):
@@ -100,26 +115,36 @@ def start_tensorflow_segmentation_single_structure(model_id, job_id):
     logger.info("\nStarting Tensorflow with job_id {} and model_id {}".format(job_id, model_id))
 
     # Find the job
-    try:
-        seg_job = SegmentationJob.objects.get(model_id=model_id, segmentation_id=job_id)
-        m_v = ModelVersion.objects.filter(model_version_id=model_id)[0]
-        structure = Structure.objects.filter(model_version=m_v)[0]
-    except:
-        logger.info("\nCan't find job!")
+    seg_job = find_queued_job(model_id, job_id)
+    if seg_job is None:
         return
+    m_v = ModelVersion.objects.filter(model_version_id=model_id).first()
 
     # Segmentation schema.  See helper functions below for details
-    model_in = acquire_model_input(seg_job)
-    channels_data = parse_model_in(model_in)
-    segment_result = volumetric_tensorflow_segment(m_v, channels_data)
-    model_out = construct_model_out(m_v, structure, segment_result)
-    save_to_disk(seg_job, model_out)
+    with track_job_status(seg_job, m_v) as timer:
+        structure = get_model_structure(m_v)
+        with timer.stage("acquire"):
+            model_in = acquire_model_input(seg_job)
+        with timer.stage("parse"):
+            channels_data = parse_model_in(model_in)
+        with timer.stage("preprocess"):
+            channels_data, input_shapes = preprocess_model_in(m_v, model_in, channels_data)
+        with timer.stage("segment"):
+            segment_result = volumetric_tensorflow_segment(m_v, channels_data)
+        with timer.stage("postprocess"):
+            segment_result = postprocess_segment_result(segment_result, input_shapes)
+        with timer.stage("construct"):
+            model_out = construct_model_out(m_v, structure, segment_result, \
+                STORAGE_COMPRESSION_METHOD, get_crop_transform(seg_job, model_in))
+        with timer.stage("save"):
+            save_to_disk(seg_job, model_out)
 
 
 @task(name="start_phantom_segmentation")
 def start_phantom_segmentation(model_id, job_id, seg_jobb=None):
     '''
-    Single structure phantom segmentation.  Generates centered rectangular prism structure.
+    Single structure phantom segmentation.  Generates centered rectangular prism structure,
+    or the structures configured by the model version's phantom_config.
 
     Parameters:
         model_id - str - Model ID to use for segmentation job
@@ -130,16 +155,151 @@ def start_phantom_segmentation(model_id, job_id, seg_jobb=None):
         model_id))
 
     # Find the job
-    seg_job = SegmentationJob.objects.get(model_id=model_id, segmentation_id=job_id)
-    m_v = ModelVersion.objects.filter(model_version_id=model_id)[0]
-    structure = Structure.objects.filter(model_version=m_v)[0]
+    seg_job = find_queued_job(model_id, job_id)
+    if seg_job is None:
+        return
+    m_v = ModelVersion.objects.filter(model_version_id=model_id).first()
+
+    # Segmentation schema.  See helper functions below for details
+    with track_job_status(seg_job, m_v) as timer:
+        structure = get_model_structure(m_v)
+        with timer.stage("acquire"):
+            model_in = acquire_model_input(seg_job)
+        with timer.stage("parse"):
+            channels_data = parse_model_in(model_in)
+        with timer.stage("preprocess"):
+            channels_data, input_shapes = preprocess_model_in(m_v, model_in, channels_data)
+        with timer.stage("segment"):
+            segment_result = volumetric_phantom_segment(m_v, channels_data)
+        with timer.stage("postprocess"):
+            segment_result = postprocess_segment_result(segment_result, input_shapes)
+        with timer.stage("construct"):
+            model_out = construct_model_out(m_v, structure, segment_result, \
+                STORAGE_COMPRESSION_METHOD, get_crop_transform(seg_job, model_in))
+        with timer.stage("save"):
+            save_to_disk(seg_job, model_out)
+
+
+@task(name="start_pytorch_segmentation_multi_structure")
+def start_pytorch_segmentation_multi_structure(model_id, job_id):
+    '''
+    Multi structure pytorch segmentation.  The model outputs a label map that is split into
+    one output channel per structure of the model version.
+
+    Parameters:
+        model_id - str - Model ID to use for segmentation job
+        job_id - str - Segmentation job ID
+    Returns: None
+    '''
+    logger.info("\nStarting multi structure Pytorch with job_id {} and model_id {}".format( \
+        job_id, model_id))
+
+    # Find the job
+    seg_job = find_queued_job(model_id, job_id)
+    if seg_job is None:
+        return
+    m_v = ModelVersion.objects.filter(model_version_id=model_id).first()
+
+    # Segmentation schema.  See helper functions below for details
+    with track_job_status(seg_job, m_v) as timer:
+        structures = get_label_structures(m_v)
+        with timer.stage("acquire"):
+            model_in = acquire_model_input(seg_job)
+        with timer.stage("parse"):
+            channels_data = parse_model_in(model_in)
+        with timer.stage("preprocess"):
+            channels_data, input_shapes = preprocess_model_in(m_v, model_in, channels_data)
+        with timer.stage("segment"):
+            segment_result = volumetric_pytorch_segment(m_v, channels_data)
+        with timer.stage("postprocess"):
+            segment_result = postprocess_segment_result(segment_result, input_shapes)
+        with timer.stage("construct"):
+            model_out = construct_multi_structure_model_out(m_v, structures, segment_result, \
+                STORAGE_COMPRESSION_METHOD, get_crop_transform(seg_job, model_in))
+        with timer.stage("save"):
+            save_to_disk(seg_job, model_out)
+
+
+@task(name="start_tensorflow_segmentation_multi_structure")
+def start_tensorflow_segmentation_multi_structure(model_id, job_id):
+    '''
+    Multi structure tensorflow segmentation.  The model outputs a label map that is split
+    into one output channel per structure of the model version.
+
+    Parameters:
+        model_id - str - Model ID to use for segmentation job
+        job_id - str - Segmentation job ID
+    Returns: None
+    '''
+    logger.info("\nStarting multi structure Tensorflow with job_id {} and model_id {}".format( \
+        job_id, model_id))
+
+    # Find the job
+    seg_job = find_queued_job(model_id, job_id)
+    if seg_job is None:
+        return
+    m_v = ModelVersion.objects.filter(model_version_id=model_id).first()
 
     # Segmentation schema.  See helper functions below for details
-    model_in = acquire_model_input(seg_job)
-    channels_data = parse_model_in(model_in)
-    segment_result = mock_segment(channels_data)
-    model_out = construct_model_out(m_v, structure, segment_result)
-    save_to_disk(seg_job, model_out)
+    with track_job_status(seg_job, m_v) as timer:
+        structures = get_label_structures(m_v)
+        with timer.stage("acquire"):
+            model_in = acquire_model_input(seg_job)
+        with timer.stage("parse"):
+            channels_data = parse_model_in(model_in)
+        with timer.stage("preprocess"):
+            channels_data, input_shapes = preprocess_model_in(m_v, model_in, channels_data)
+        with timer.stage("segment"):
+            segment_result = volumetric_tensorflow_segment(m_v, channels_data)
+        with timer.stage("postprocess"):
+            segment_result = postprocess_segment_result(segment_result, input_shapes)
+        with timer.stage("construct"):
+            model_out = construct_multi_structure_model_out(m_v, structures, segment_result, \
+                STORAGE_COMPRESSION_METHOD, get_crop_transform(seg_job, model_in))
+        with timer.stage("save"):
+            save_to_disk(seg_job, model_out)
+
+
+@task(name="start_phantom_segmentation_multi_structure")
+def start_phantom_segmentation_multi_structure(model_id, job_id):
+    '''
+    Multi structure phantom segmentation.  Generates a centered rectangular prism split into
+    one slab per structure, or the structures configured by the model version's
+    phantom_config.
+
+    Parameters:
+        model_id - str - Model ID to use for segmentation job
+        job_id - str - Segmentation job ID
+    Returns: None
+    '''
+    logger.info("\nStarting multi structure phantom segmentation with job_id {} and " \
+        "model_id {}".format(job_id, model_id))
+
+    # Find the job
+    seg_job = find_queued_job(model_id, job_id)
+    if seg_job is None:
+        return
+    m_v = ModelVersion.objects.filter(model_version_id=model_id).first()
+
+    # Segmentation schema.  See helper functions below for details
+    with track_job_status(seg_job, m_v) as timer:
+        structures = get_label_structures(m_v)
+        with timer.stage("acquire"):
+            model_in = acquire_model_input(seg_job)
+        with timer.stage("parse"):
+            channels_data = parse_model_in(model_in)
+        with timer.stage("preprocess"):
+            channels_data, input_shapes = preprocess_model_in(m_v, model_in, channels_data)
+        with timer.stage("segment"):
+            segment_result = volumetric_phantom_label_segment(m_v, channels_data, \
+                [structure.label_value for structure in structures])
+        with timer.stage("postprocess"):
+            segment_result = postprocess_segment_result(segment_result, input_shapes)
+        with timer.stage("construct"):
+            model_out = construct_multi_structure_model_out(m_v, structures, segment_result, \
+                STORAGE_COMPRESSION_METHOD, get_crop_transform(seg_job, model_in))
+        with timer.stage("save"):
+            save_to_disk(seg_job, model_out)
 
 
 # ----------------------------------------------------------------------------------
@@ -147,11 +307,113 @@ def start_phantom_segmentation(model_id, job_id, seg_jobb=None):
 # The following details a schema for all extensible segmentation tasks.
 #   1. Acquire job model input
 #   2. Parse job model_input as channel data
-#   3. Model evaluation/segmentation upon channel data
-#   4. Construct model output using segmentation results
-#   5. Save to disk.
+#   3. Preprocess channel data for the model.  See preprocessing.py
+#   4. Model evaluation/segmentation upon channel data
+#   5. Postprocess segmentation results back to the input geometry
+#   6. Construct model output using segmentation results
+#   7. Save to disk.
+# The schema runs within track_job_status, which records the job state for the scheduler,
+# times each step, profiles sampled jobs and stores the result in the result cache.
 # ----------------------------------------------------------------------------------
 
+@contextmanager
+def track_job_status(seg_job, m_v):
+    '''
+    Context manager recording the scheduling state of a segmentation job.  The job is marked
+    running on entry, completed on normal exit and failed if the schema raises, or if its
+    model version does not exist.  Completed
+    results are added to the result cache.  Yields a StageTimer for the schema steps; the
+    queue wait and stage timings are stored with the job.  Jobs selected for profiling are
+    run under profiling.profile_job.
+
+    Parameters:
+        seg_job - django.db.SegmentationJob - Django model for a segmentation
+            job.
+        m_v - django.db.ModelVersion - Database model entry for model version, None if it
+            does not exist
+    Returns:
+        timer - metrics.StageTimer - Timer of the segmentation stages
+    '''
+    seg_job.mark_running()
+    timer = StageTimer(seg_job.model_id)
+    if seg_job.time_field is not None:
+        timer.record_queue_wait((seg_job.started_time - seg_job.time_field).total_seconds())
+    try:
+        if m_v is None:
+            raise LookupError("Model version {} does not exist".format(seg_job.model_id))
+        with profile_job(seg_job, m_v):
+            yield timer
+    except Exception as exc:
+        logger.exception("\nSegmentation job {} failed".format(seg_job.segmentation_id))
+        seg_job.stage_timings = timer.to_json()
+        seg_job.mark_failed("{}: {}".format(type(exc).__name__, exc))
+        raise
+    seg_job.stage_timings = timer.to_json()
+    seg_job.mark_completed()
+    try:
+        store_cached_output(seg_job)
+    except Exception:
+        logger.exception("\nCaching the result of job {} failed".format(seg_job.segmentation_id))
+
+
+def find_queued_job(model_id, job_id):
+    '''
+    Looks up the job of a segmentation task.  Only queued jobs are processed: a job reclaimed
+    by scheduler.reclaim_stale_jobs can be delivered twice, and the later delivery finds it
+    running or finished.
+
+    Parameters:
+        model_id - str - Model ID of the segmentation job
+        job_id - str - Segmentation job ID
+    Returns:
+        seg_job - django.db.SegmentationJob - The queued job, None if there is nothing to do
+    '''
+    seg_job = SegmentationJob.objects.filter(model_id=model_id, segmentation_id=job_id).first()
+    if seg_job is None:
+        logger.info("\nCan't find job!")
+        return None
+    if seg_job.status != SegmentationJob.JobStatus.Queued:
+        logger.info("\nJob {} is no longer queued, skipping it".format(job_id))
+        return None
+    return seg_job
+
+
+def get_model_structure(m_v):
+    '''
+    Structure of a single structure model version.
+
+    Parameters:
+        m_v - django.db.ModelVersion - Database model entry for model version
+    Returns:
+        structure - django.db.Structure - First structure of the model version
+
+    Raises:
+        LookupError - If the model version has no structures.
+    '''
+    structure = Structure.objects.filter(model_version=m_v).order_by('pk').first()
+    if structure is None:
+        raise LookupError("Model version {} has no structures".format(m_v.model_version_id))
+    return structure
+
+
+def get_label_structures(m_v):
+    '''
+    Structures of a multi structure model version in output channel order.
+
+    Parameters:
+        m_v - django.db.ModelVersion - Database model entry for model version
+    Returns:
+        structures - [django.db.Structure] - Structures ordered by label value
+
+    Raises:
+        LookupError - If the model version has no structures.
+    '''
+    structures = list(Structure.objects.filter(model_version=m_v).order_by('label_value', 'pk'))
+    if not structures:
+        raise LookupError("Model version {} has no structures".format(m_v.model_version_id))
+    return structures
+
+
 def acquire_model_input(seg_job):
     '''
     Acquires the ModelInput protobuf message object from the corresponding
@@ -195,6 +457,51 @@ def parse_model_in(model_in):
     return channels_data
 
 
+def preprocess_model_in(m_v, model_in, channels_data):
+    '''
+    Resamples and normalizes channel data according to the preprocess_config of the model
+    version, using the ModelChannelDescription of each channel.
+
+    Parameters:
+        m_v - django.db.ModelVersion - Database model entry for model version
+        model_in - ModelInput.pb - Protobuf message object for the model input
+        channels_data - [ndarray] - List of channel data in ndarray form
+    Returns:
+        channels_data - [ndarray] - List of preprocessed channel data in ndarray form
+        input_shapes - [tuple] - Shapes of the channels before preprocessing, None if the
+            model version has no preprocessing configured
+    '''
+    if not m_v.preprocess_config:
+        return channels_data, None
+    config = parse_preprocess_config(m_v.preprocess_config)
+    descriptions = {description.channel_id: description for description in \
+        ModelChannelDescription.objects.filter(model_family=m_v.model_family)}
+    input_shapes = [channel_data.shape for channel_data in channels_data]
+    channels_data = [preprocess_channel(channel_data, \
+        volume_spacing(in_channel.CalibratedVolume.DataTransform), \
+        descriptions.get(in_channel.ChannelID), config) \
+        for in_channel, channel_data in zip(model_in.Channels, channels_data)]
+    return channels_data, input_shapes
+
+
+def postprocess_segment_result(segment_result, input_shapes):
+    '''
+    Resamples masks or label maps of preprocessed channels back to the shape of the input
+    channel with the same index, or of the first input channel, with nearest neighbour
+    interpolation.
+
+    Parameters:
+        segment_result - [ndarray] - List of output channel data in ndarray form
+        input_shapes - [tuple] - Shapes returned by preprocess_model_in
+    Returns:
+        segment_result - [ndarray] - List of output channel data in the input geometry
+    '''
+    if input_shapes is None:
+        return segment_result
+    return [resample(result, input_shapes[min(index, len(input_shapes) - 1)], linear=False) \
+        for index, result in enumerate(segment_result)]
+
+
 def mock_segment(channels_data):
     '''
     Mock segmentation function for generating centered rectangular prism
@@ -217,15 +524,51 @@ def mock_segment(channels_data):
     return segment_result
 
 
-def construct_model_out(m_v, structure, segment_result):
+def mock_label_segment(channels_data, label_values):
     '''
-    Construct ModelOutput protobuf message object using segmentation results.
+    Mock segmentation function generating label maps for testing purposes: the centered
+    rectangular prism of mock_segment, split along the width into one slab per label value.
+
+    Parameters:
+        channels_data - [ndarray] - List of channel data in ndarray form
+        label_values - [int] - Label values of the structures
+    Returns:
+        segment_result - [ndarray] - List of label maps in ndarray form
+    '''
+    segment_result = []
+    for box in mock_segment(channels_data):
+        label_map = np.zeros(box.shape, dtype=np.int32)
+        columns = np.flatnonzero(box.any(axis=(0, 1)))
+        for label_value, slab in zip(label_values, \
+                np.array_split(columns, len(label_values))):
+            label_map[:, :, slab] = box[:, :, slab] * label_value
+        segment_result.append(label_map)
+    return segment_result
+
+
+def get_crop_transform(seg_job, model_in):
+    '''
+    Transform of the input volume that cropped output volumes are placed relative to.
+
+    Parameters:
+        seg_job - django.db.SegmentationJob - Django model for a segmentation
+            job.
+        model_in - ModelInput.pb - Protobuf message object for the model input
+    Returns:
+        transform_pb - Transform3D.pb - Transform of the first input channel, None if the
+            client did not request cropped output
+    '''
+    if not seg_job.crop_output or not model_in.Channels:
+        return None
+    return model_in.Channels[0].CalibratedVolume.DataTransform
+
+
+def construct_model_out_header(m_v):
+    '''
+    Construct a ModelOutput protobuf message object without channels.
 
     Parameters:
         m_v - django.db.ModelVersion - Database model entry for model version
-        structure - django.db.Structure - Databse model entry for the structure
-            corresponding to the model version.
-        segment_result - [ndarray] - List of output channel data in ndarray form
     Returns:
         model_out - ModelOutput.pb - Protobuf message object for the model output
     '''
@@ -234,29 +577,104 @@ def construct_model_out(m_v, structure, segment_result):
     model_out.ProcesserVersion = "{}.{}".format(m_v.major_version, \
         m_v.minor_version)
     model_out.LanguageCode = m_v.language_code
+    return model_out
+
+
+def construct_model_out_channel(structure_pb, mask, compression_method, \
+        crop_transform_pb=None):
+    '''
+    Construct ModelOutputChannel protobuf message object for the mask of a structure.
+
+    Parameters:
+        structure_pb - Structure.pb - Protobuf message object for the structure
+        mask - ndarray - (depth, height, width) mask of the structure
+        compression_method - int - VolumeData3D.CompressionMethods value to encode the
+            output volume with.  See volumes.encode_mask
+        crop_transform_pb - Transform3D.pb - Transform of the input volume.  If given, the
+            output volume is cropped to the bounding box of the structure before it is
+            encoded.  See volumes.crop_mask
+    Returns:
+        out_channel - ModelOutputChannel.pb - Protobuf message object for the output channel
+    '''
+    out_channel = Model_pb2.ModelOutputChannel()
+    out_channel.Structure.CopyFrom(structure_pb)
+    if crop_transform_pb is not None:
+        mask, offset = crop_mask(mask)
+        out_channel.DataTransform.CopyFrom(crop_transform(crop_transform_pb, offset))
+        out_channel.VoxelOffset.Z, out_channel.VoxelOffset.Y, \
+            out_channel.VoxelOffset.X = offset
+    depth, height, width = mask.shape
+    out_channel.Volume.Width = width
+    out_channel.Volume.Height = height
+    out_channel.Volume.Depth = depth
+    out_channel.Volume.Data = encode_mask(mask, compression_method)
+    out_channel.Volume.DataType = Primitives3D_pb2.VolumeData3D.DataTypes.Byte
+    out_channel.Volume.CompressionMethod = compression_method
+    return out_channel
+
+
+def construct_model_out(m_v, structure, segment_result, \
+        compression_method=CompressionMethods.Gzip, crop_transform_pb=None):
+    '''
+    Construct ModelOutput protobuf message object using segmentation results.
+
+    Parameters:
+        m_v - django.db.ModelVersion - Database model entry for model version
+        structure - django.db.Structure - Databse model entry for the structure
+            corresponding to the model version.
+        segment_result - [ndarray] - List of output channel data in ndarray form
+        compression_method - int - VolumeData3D.CompressionMethods value to encode the
+            output volumes with.  See volumes.encode_mask
+        crop_transform_pb - Transform3D.pb - Transform of the input volume.  If given, each
+            output volume is cropped to the bounding box of its structure before it is
+            encoded.  See volumes.crop_mask
+    Returns:
+        model_out - ModelOutput.pb - Protobuf message object for the model output
+    '''
+    model_out = construct_model_out_header(m_v)
     structure_pb = structure.model_to_pb()
     for result in segment_result:
-        out_channel = Model_pb2.ModelOutputChannel()
-        out_channel.Structure.CopyFrom(structure_pb)
-        depth, height, width = result.shape
-        out_channel.Volume.Width = width
-        out_channel.Volume.Height = height
-        out_channel.Volume.Depth = depth
-        result_bytes = result.tobytes()
-        out = BytesIO()
-        with gzip.GzipFile(fileobj=out, mode='w') as file_out:
-            file_out.write(result_bytes)
-        out_channel.Volume.Data = out.getvalue()
-        out_channel.Volume.DataType = Primitives3D_pb2.VolumeData3D.DataTypes.Byte
-        out_channel.Volume.CompressionMethod = 0
-        model_out.Channels.append(out_channel)
+        model_out.Channels.append(construct_model_out_channel(structure_pb, result, \
+            compression_method, crop_transform_pb))
+    return model_out
+
+
+def construct_multi_structure_model_out(m_v, structures, segment_result, \
+        compression_method=CompressionMethods.Gzip, crop_transform_pb=None):
+    '''
+    Construct ModelOutput protobuf message object from label maps.  Each label map is split
+    into one output channel per structure, holding the voxels labelled with the structure's
+    label_value.
+
+    Parameters:
+        m_v - django.db.ModelVersion - Database model entry for model version
+        structures - [django.db.Structure] - Database model entries for the structures of
+            the model version, in output channel order
+        segment_result - [ndarray] - List of (depth, height, width) label maps
+        compression_method - int - VolumeData3D.CompressionMethods value to encode the
+            output volumes with.  See volumes.encode_mask
+        crop_transform_pb - Transform3D.pb - Transform of the input volume.  See
+            construct_model_out
+    Returns:
+        model_out - ModelOutput.pb - Protobuf message object for the model output
+    '''
+    model_out = construct_model_out_header(m_v)
+    structure_pbs = [structure.model_to_pb() for structure in structures]
+    label_values = [structure.label_value for structure in structures]
+    for label_map in segment_result:
+        masks = one_hot(label_map, label_values)
+        for structure_pb, mask in zip(structure_pbs, masks):
+            model_out.Channels.append(construct_model_out_channel(structure_pb, mask, \
+                compression_method, crop_transform_pb))
     return model_out
 
 
 def save_to_disk(seg_job, model_out):
     '''
     Converts segmentation job object into serialized protobuf message, stores on disk,
-    and saves database entry model output to point to disk location.
+    and saves database entry model output to point to disk location.  Output volumes should
+    be encoded with volumes.STORAGE_COMPRESSION_METHOD; they are re-encoded with the job's
+    compression method when the result is downloaded.
 
     Parameters:
         seg_job - django.db.SegmentationJob - Django model for a segmentation
@@ -275,6 +693,40 @@ def save_to_disk(seg_job, model_out):
 # Segmentation Library Functions
 # ----------------------------------------------------------------------------------
 
+def volumetric_phantom_segment(m_v, channels_data):
+    '''
+    Volumetric segmentation helper function for single structure phantom models.  Model
+    versions without a phantom configuration output the centered box of mock_segment.
+
+    Parameters:
+        m_v - django.db.ModelVersion - Database model entry for model version
+        channels_data - [ndarray] - List of channel data in ndarray form
+    Returns:
+        segment_result - [ndarray] - List of output channel data in ndarray form
+    '''
+    if not m_v.phantom_config:
+        return mock_segment(channels_data)
+    config = parse_phantom_config(m_v.phantom_config)
+    label_maps = phantom_segment(channels_data, range(1, config['structures'] + 1), config)
+    return [(label_map != 0).view(np.uint8) for label_map in label_maps]
+
+def volumetric_phantom_label_segment(m_v, channels_data, label_values):
+    '''
+    Volumetric segmentation helper function for multi structure phantom models.  Model
+    versions without a phantom configuration output the slabs of mock_label_segment.
+
+    Parameters:
+        m_v - django.db.ModelVersion - Database model entry for model version
+        channels_data - [ndarray] - List of channel data in ndarray form
+        label_values - [int] - Label values of the structures
+    Returns:
+        segment_result - [ndarray] - List of label maps in ndarray form
+    '''
+    if not m_v.phantom_config:
+        return mock_label_segment(channels_data, label_values)
+    return phantom_segment(channels_data, label_values, \
+        parse_phantom_config(m_v.phantom_config))
+
 def volumetric_pytorch_segment(m_v, channels_data):
     '''
     Volumetric segmentation helper function for pytorch volumetric neural
@@ -286,17 +738,9 @@ def volumetric_pytorch_segment(m_v, channels_data):
     Returns:
         segment_result - [ndarray] - List of output channel data in ndarray form
     '''
-    folder, module_name = os.path.split(m_v.model_module.path)
-    module_name = module_name.split(".")[0]
-
-    sys.path.append(folder+"/")
-    mymodule = importlib.import_module(module_name)
-    for i in dir(mymodule):
-        attribute = getattr(mymodule, i)
-        if inspect.isclass(attribute) or inspect.isfunction(attribute):
-            setattr(sys.modules[__name__], i, attribute)
-
-    torch_model = torch.load(m_v.model_file.path)
+    model_module = load_model_module(m_v.model_module.path)
+    torch_model = torch.load(m_v.model_file.path, \
+        pickle_module=model_pickle_module(model_module))
     torch_model.eval()
     segment_result = []
     for channel_data in channels_data:
@@ -0,0 +1,306 @@
+"""
+Copyright 2021 Varian Medical Systems, Inc.
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software 
+and associated documentation files (the "Software"), to deal in the Software without 
+restriction, including without limitation the rights to use, copy, modify, merge, publish, 
+distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the 
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or 
+substantial portions of the Software.
+The Software shall be used for non-clinical use only and shall not be used to enable, provide, 
+or support patient treatment. "Non-clinical" or "non-clinical use" means usage not involving: 
+(i) the direct observation of patients; (ii) the diagnoses of disease or other conditions in 
+humans or other animals; or (iii) the cure, mitigation, therapy, treatment, treatment planning,
+or prevention of disease in humans or other animals to affect the structure or function thereof.  
+The Software is NOT U.S. FDA 510(k) cleared for use on humans and shall not be used on humans.
+Any use of the Software outside of its intended use (“off-label”) could lead to physical harm
+or death of patients. 
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING 
+BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND 
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, 
+DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, 
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE. 
+IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY NON-CLINICAL OR OFF-LABEL 
+USE OF THE SOFTWARE AND ANY PERSON THAT USES, COPIES, MODIFIES, MERGES, PUBLISHES, DISTRIBUTES, 
+SUBLICENSES, AND/OR SELLS COPIES OF THE SOFTWARE UNDER THIS PERMISSION NOTICE HEREBY AGREES TO 
+INDEMNIFY AND HOLD HARMLESS THE AUTHORS AND COPYRIGHT HOLDERS FOR ANY LIABILITY, DEMAND, DAMAGE,
+COST OR EXPENSE ARISING FROM OR RELATING TO SUCH NON-CLINICAL OR OFF-LABEL USE OF THE SOFTWARE.
+"""
+
+"""Telemetry ingestion and rollups"""
+
+import atexit
+import threading
+from datetime import timedelta
+
+from celery.decorators import task
+from celery.utils.log import get_task_logger
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from segint_api.models import SegmentationTelemetry, TelemetryRollup
+from segint_api.db import coalesced_write
+from segint_api.sketches import LogHistogram
+
+logger = get_task_logger(__name__)
+
+# Dimensions of TelemetryRollup rows, rollups can be queried grouped by any subset.
+ROLLUP_DIMENSIONS = ('hour', 'model_id', 'client_software_version')
+# Telemetry time fields and the TelemetryRollup field prefix of their sums and sketches.
+TIMING_FIELDS = (('upload_time_ms', 'upload_ms'), ('segmentation_wait_ms', 'wait_ms'), \
+    ('segmentation_down_ms', 'down_ms'))
+# Raw records folded into the rollups per transaction.
+ROLLUP_BATCH_SIZE = 5000
+
+
+class TelemetryBuffer:
+    '''
+    In-process buffer of validated telemetry records, written with one bulk_create once
+    FLUSH_RECORDS records are buffered or FLUSH_SECONDS after the first buffered record,
+    whichever comes first.  Buffered records are also flushed at interpreter exit; records
+    still buffered when a process is killed are lost, which is accepted for telemetry.
+    '''
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._records = []
+        self._timer = None
+
+    def add(self, records):
+        '''
+        Buffers telemetry records, flushing if the buffer is full.
+
+        Parameters:
+            records - [django.db.SegmentationTelemetry] - Unsaved telemetry records
+        Returns: None
+        '''
+        config = settings.SEGINT_TELEMETRY
+        with self._lock:
+            self._records.extend(records)
+            full = len(self._records) >= config['FLUSH_RECORDS']
+        if full:
+            self.flush()
+        with self._lock:
+            if self._records and self._timer is None:
+                self._timer = threading.Timer(config['FLUSH_SECONDS'], self._flush_on_timer)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        '''
+        Writes all buffered records.
+
+        Parameters: none
+        Returns:
+            flushed - int - Number of records written
+        '''
+        with self._lock:
+            records, self._records = self._records, []
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if not records:
+            return 0
+        try:
+            SegmentationTelemetry.objects.bulk_create(records, batch_size=500)
+        except Exception:
+            logger.exception("Writing %d buffered telemetry records failed", len(records))
+            return 0
+        return len(records)
+
+    def _flush_on_timer(self):
+        try:
+            self.flush()
+        finally:
+            # The timer thread opened its own database connection.
+            connection.close()
+
+
+TELEMETRY_BUFFER = TelemetryBuffer()
+atexit.register(TELEMETRY_BUFFER.flush)
+
+
+def ingest_telemetry(records):
+    '''
+    Stores telemetry records, through TELEMETRY_BUFFER if SEGINT_TELEMETRY['BUFFERED'] is set
+    and otherwise with a coalesced bulk insert before returning.
+
+    Parameters:
+        records - [django.db.SegmentationTelemetry] - Unsaved, validated telemetry records
+    Returns: None
+    '''
+    if settings.SEGINT_TELEMETRY['BUFFERED']:
+        TELEMETRY_BUFFER.add(records)
+    else:
+        coalesced_write(lambda: SegmentationTelemetry.objects.bulk_create(records, \
+            batch_size=500))
+
+
+class TelemetryAggregate:
+    '''
+    Counts, sums and percentile sketches of a group of telemetry records or rollups.
+    '''
+    def __init__(self):
+        accuracy = settings.SEGINT_TELEMETRY['SKETCH_RELATIVE_ACCURACY']
+        self.count = 0
+        self.retries_sum = 0
+        self.error_count = 0
+        self.sums = {prefix: 0 for _, prefix in TIMING_FIELDS}
+        self.sketches = {prefix: LogHistogram(accuracy) for _, prefix in TIMING_FIELDS}
+
+    def add_record(self, record):
+        '''
+        Adds a raw telemetry record, as a dict of SegmentationTelemetry field values.
+        '''
+        self.count += 1
+        self.retries_sum += record['segmentation_retries']
+        self.error_count += 1 if record['client_error'] else 0
+        for field, prefix in TIMING_FIELDS:
+            self.sums[prefix] += record[field]
+            self.sketches[prefix].add(record[field])
+
+    def add_rollup(self, rollup):
+        '''
+        Adds a stored TelemetryRollup.
+        '''
+        self.count += rollup.count
+        self.retries_sum += rollup.retries_sum
+        self.error_count += rollup.error_count
+        for _, prefix in TIMING_FIELDS:
+            self.sums[prefix] += getattr(rollup, prefix + '_sum')
+            sketch = getattr(rollup, prefix + '_sketch')
+            if sketch:
+                self.sketches[prefix].merge(LogHistogram.from_json(sketch))
+
+    def store(self, rollup):
+        '''
+        Writes the aggregate to a TelemetryRollup, replacing its values.
+        '''
+        rollup.count = self.count
+        rollup.retries_sum = self.retries_sum
+        rollup.error_count = self.error_count
+        for _, prefix in TIMING_FIELDS:
+            setattr(rollup, prefix + '_sum', self.sums[prefix])
+            setattr(rollup, prefix + '_sketch', self.sketches[prefix].to_json())
+
+    def summary(self):
+        '''
+        Summary statistics for the rollup query endpoint.
+        '''
+        summary = {
+            'count': self.count,
+            'retries_mean': self.retries_sum / self.count if self.count else None,
+            'error_rate': self.error_count / self.count if self.count else None,
+        }
+        for field, prefix in TIMING_FIELDS:
+            sketch = self.sketches[prefix]
+            summary[field] = {
+                'mean': self.sums[prefix] / self.count if self.count else None,
+                'p50': sketch.quantile(0.5),
+                'p90': sketch.quantile(0.9),
+                'p99': sketch.quantile(0.99),
+            }
+        return summary
+
+
+def rollup_telemetry_records(before=None):
+    '''
+    Folds telemetry records received before the given time into the hourly TelemetryRollup
+    rows and marks them rolled up.  Records arriving late for an hour that was already rolled
+    up are merged into its existing rollup.
+
+    Parameters:
+        before - datetime - Upper bound of received_time, the start of the current hour if None
+    Returns:
+        rolled_up - int - Number of records folded into the rollups
+    '''
+    if before is None:
+        before = timezone.now().replace(minute=0, second=0, microsecond=0)
+    pending = SegmentationTelemetry.objects.filter(rolled_up=False, received_time__lt=before) \
+        .order_by('pk')
+    rolled_up = 0
+    while True:
+        records = list(pending.values('pk', 'received_time', 'segmentation_model_id', \
+            'client_software_version', 'segmentation_retries', 'client_error', \
+            *[field for field, _ in TIMING_FIELDS])[:ROLLUP_BATCH_SIZE])
+        if not records:
+            return rolled_up
+
+        groups = {}
+        for record in records:
+            hour = record['received_time'].replace(minute=0, second=0, microsecond=0)
+            key = (hour, record['segmentation_model_id'], record['client_software_version'])
+            groups.setdefault(key, TelemetryAggregate()).add_record(record)
+
+        with transaction.atomic():
+            for (hour, model_id, client_version), aggregate in groups.items():
+                rollup, _ = TelemetryRollup.objects.select_for_update().get_or_create( \
+                    hour=hour, model_id=model_id, client_software_version=client_version)
+                aggregate.add_rollup(rollup)
+                aggregate.store(rollup)
+                rollup.save()
+            SegmentationTelemetry.objects.filter(pk__in=[record['pk'] for record in records]) \
+                .update(rolled_up=True)
+        rolled_up += len(records)
+
+
+def prune_telemetry_records():
+    '''
+    Deletes rolled up telemetry records older than SEGINT_TELEMETRY['RAW_RETENTION_DAYS'].
+
+    Parameters: none
+    Returns:
+        pruned - int - Number of deleted records
+    '''
+    retention = timedelta(days=settings.SEGINT_TELEMETRY['RAW_RETENTION_DAYS'])
+    pruned, _ = SegmentationTelemetry.objects.filter(rolled_up=True, \
+        received_time__lt=timezone.now() - retention).delete()
+    return pruned
+
+
+def query_rollups(group_by=ROLLUP_DIMENSIONS, start=None, end=None, **filters):
+    '''
+    Aggregates telemetry rollups without reading raw telemetry.
+
+    Parameters:
+        group_by - [str] - Subset of ROLLUP_DIMENSIONS to group by
+        start, end - datetime - Range of rollup hours, start inclusive and end exclusive
+        filters - Exact match filters on model_id and client_software_version
+    Returns:
+        rows - [dict] - One summary per group, see TelemetryAggregate.summary
+    '''
+    rollups = TelemetryRollup.objects.filter(**filters)
+    if start is not None:
+        rollups = rollups.filter(hour__gte=start)
+    if end is not None:
+        rollups = rollups.filter(hour__lt=end)
+
+    groups = {}
+    for rollup in rollups.order_by(*ROLLUP_DIMENSIONS).iterator():
+        key = tuple(getattr(rollup, dimension) for dimension in group_by)
+        groups.setdefault(key, TelemetryAggregate()).add_rollup(rollup)
+
+    rows = []
+    for key, aggregate in groups.items():
+        row = dict(zip(group_by, key))
+        if 'hour' in row:
+            row['hour'] = row['hour'].isoformat()
+        row.update(aggregate.summary())
+        rows.append(row)
+    return rows
+
+
+@task(name="rollup_telemetry")
+def rollup_telemetry():
+    '''
+    Periodic telemetry maintenance, run by Celery beat: folds completed hours into the
+    rollups, then prunes raw records past their retention.
+
+    Returns: None
+    '''
+    rolled_up = rollup_telemetry_records()
+    pruned = prune_telemetry_records()
+    if rolled_up or pruned:
+        logger.info("\nRolled up {} and pruned {} telemetry records".format(rolled_up, pruned))
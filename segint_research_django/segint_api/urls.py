@@ -42,6 +42,9 @@ urlpatterns = [
     path('v2/Feedback/segmentation',
          views.post_feedback,
          name="feedback"),
+    path('v2/Feedback/segmentation/batch',
+         views.post_feedback_batch,
+         name="feedback_batch"),
     path('v2/Model/',
          views.get_models,
          name="get_models"),
@@ -60,4 +63,13 @@ urlpatterns = [
     path('v2/Telemetry/segmentation',
          views.post_telemetry,
          name="post_telemetry"),
+    path('v2/Telemetry/segmentation/batch',
+         views.post_telemetry_batch,
+         name="post_telemetry_batch"),
+    path('v2/Telemetry/rollups',
+         views.get_telemetry_rollups,
+         name="get_telemetry_rollups"),
+    path('scheduler/queues',
+         views.get_scheduler_queues,
+         name="get_scheduler_queues"),
 ]
@@ -0,0 +1,233 @@
+"""
+Copyright 2021 Varian Medical Systems, Inc.
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software 
+and associated documentation files (the "Software"), to deal in the Software without 
+restriction, including without limitation the rights to use, copy, modify, merge, publish, 
+distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the 
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or 
+substantial portions of the Software.
+The Software shall be used for non-clinical use only and shall not be used to enable, provide, 
+or support patient treatment. "Non-clinical" or "non-clinical use" means usage not involving: 
+(i) the direct observation of patients; (ii) the diagnoses of disease or other conditions in 
+humans or other animals; or (iii) the cure, mitigation, therapy, treatment, treatment planning,
+or prevention of disease in humans or other animals to affect the structure or function thereof.  
+The Software is NOT U.S. FDA 510(k) cleared for use on humans and shall not be used on humans.
+Any use of the Software outside of its intended use (“off-label”) could lead to physical harm
+or death of patients. 
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING 
+BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND 
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, 
+DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, 
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE. 
+IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY NON-CLINICAL OR OFF-LABEL 
+USE OF THE SOFTWARE AND ANY PERSON THAT USES, COPIES, MODIFIES, MERGES, PUBLISHES, DISTRIBUTES, 
+SUBLICENSES, AND/OR SELLS COPIES OF THE SOFTWARE UNDER THIS PERMISSION NOTICE HEREBY AGREES TO 
+INDEMNIFY AND HOLD HARMLESS THE AUTHORS AND COPYRIGHT HOLDERS FOR ANY LIABILITY, DEMAND, DAMAGE,
+COST OR EXPENSE ARISING FROM OR RELATING TO SUCH NON-CLINICAL OR OFF-LABEL USE OF THE SOFTWARE.
+"""
+
+"""Validation of segmentation uploads against the input constraints of the model"""
+
+import time
+import threading
+
+from django.conf import settings
+
+from protobuf import Primitives3D_pb2
+from segint_api.models import ModelChannelDescription
+from segint_api.metrics import INVALID_INPUTS
+from segint_api.preprocessing import parse_preprocess_config
+
+DataTypes = Primitives3D_pb2.VolumeData3D.DataTypes
+CompressionMethods = Primitives3D_pb2.VolumeData3D.CompressionMethods
+
+# Relative tolerance of spacing constraints, for spacings rounded by the client.
+SPACING_TOLERANCE = 1e-3
+# Minimum |cos| between the Z axis of an axial volume and the patient Z axis (about 8 degrees).
+AXIAL_COSINE = 0.99
+
+CONSTRAINT_FIELDS = ('channel_id', 'is_axial') + tuple("{}_{}_{}".format(kind, bound, axis) \
+    for kind in ('spacing', 'dimensions') for bound in ('min', 'max') for axis in 'xyz')
+
+_CONSTRAINT_CACHE = {}
+_CONSTRAINT_CACHE_LOCK = threading.Lock()
+
+
+class InvalidModelInput(Exception):
+    '''
+    Raised when a model input cannot be processed by the requested model.
+
+    Attributes:
+        check - str - Name of the failed check, e.g. "dimensions"
+        details - str - Explanation reported to the client.
+    '''
+    def __init__(self, check, details):
+        super().__init__(details)
+        self.check = check
+        self.details = details
+
+
+def get_channel_constraints(model_family_id):
+    '''
+    Input channel constraints of a model family, cached for CONSTRAINT_CACHE_SECONDS of
+    SEGINT_INPUT_VALIDATION.  Edits in this process clear the cache immediately, see
+    clear_constraint_cache.
+
+    Parameters:
+        model_family_id - int - Primary key of the model family
+    Returns:
+        constraints - dict - ModelChannelDescription field values by channel ID
+    '''
+    now = time.monotonic()
+    with _CONSTRAINT_CACHE_LOCK:
+        cached = _CONSTRAINT_CACHE.get(model_family_id)
+    if cached is not None and cached[0] > now:
+        return cached[1]
+    constraints = {description['channel_id']: description for description in \
+        ModelChannelDescription.objects.filter(model_family_id=model_family_id) \
+        .values(*CONSTRAINT_FIELDS)}
+    expiry = now + settings.SEGINT_INPUT_VALIDATION['CONSTRAINT_CACHE_SECONDS']
+    with _CONSTRAINT_CACHE_LOCK:
+        _CONSTRAINT_CACHE[model_family_id] = (expiry, constraints)
+    return constraints
+
+
+def clear_constraint_cache(**kwargs):
+    '''
+    Signal handler clearing the cached channel constraints when a ModelChannelDescription is
+    saved or deleted.
+    '''
+    with _CONSTRAINT_CACHE_LOCK:
+        _CONSTRAINT_CACHE.clear()
+
+
+def gzip_size(data):
+    '''
+    Uncompressed size recorded in the trailer of gzip data, modulo 2**32.
+
+    Parameters:
+        data - bytes - Gzip data
+    Returns:
+        size - int - Uncompressed size, None if the data is not gzip data
+    '''
+    if len(data) < 18 or data[:2] != b'\x1f\x8b':
+        return None
+    return int.from_bytes(data[-4:], 'little')
+
+
+def check_volume(channel_id, volume_pb):
+    '''
+    Checks that the volume of an input channel can be decoded by parse_model_in, using only its
+    header fields and the gzip trailer.
+
+    Parameters:
+        channel_id - str - Channel ID for error messages
+        volume_pb - VolumeData3D.pb - Volume of the input channel
+    Returns: None
+
+    Raises:
+        InvalidModelInput - If the volume cannot be decoded.
+    '''
+    if not (volume_pb.Width and volume_pb.Height and volume_pb.Depth):
+        raise InvalidModelInput('dimensions', \
+            "Channel {} has an empty volume.".format(channel_id))
+    if volume_pb.DataType != DataTypes.LittleEndianSignedInt16 or \
+            volume_pb.CompressionMethod != CompressionMethods.Gzip:
+        raise InvalidModelInput('encoding', "Channel {} must hold gzip compressed " \
+            "LittleEndianSignedInt16 data.".format(channel_id))
+    expected = volume_pb.Width * volume_pb.Height * volume_pb.Depth * 2
+    if gzip_size(volume_pb.Data) != expected % (1 << 32):
+        raise InvalidModelInput('encoding', "The data of channel {} does not match its " \
+            "dimensions {}x{}x{}.".format(channel_id, volume_pb.Width, volume_pb.Height, \
+            volume_pb.Depth))
+
+
+def check_range(check, channel_id, name, values, constraints, kind, tolerance=0):
+    '''
+    Checks X, Y and Z values against the min and max constraints of a channel.  Bounds of 0
+    do not constrain the value.
+
+    Raises:
+        InvalidModelInput - If a value is out of range.
+    '''
+    for axis, value in zip('xyz', values):
+        low = constraints['{}_min_{}'.format(kind, axis)]
+        high = constraints['{}_max_{}'.format(kind, axis)]
+        if (low and value < low * (1 - tolerance)) or (high and value > high * (1 + tolerance)):
+            raise InvalidModelInput(check, "The {} {} of channel {} along {} is outside of " \
+                "[{}, {}].".format(name, value, channel_id, axis.upper(), low, high or "any"))
+
+
+def check_constraints(channel_pb, constraints, check_geometry):
+    '''
+    Checks an input channel against the ModelChannelDescription of its channel ID.
+
+    Parameters:
+        channel_pb - ModelInputChannel.pb - Input channel
+        constraints - dict - ModelChannelDescription field values of the channel
+        check_geometry - bool - Whether dimensions and spacing are checked.  Not checked for
+            model versions resampling their inputs.
+    Returns: None
+
+    Raises:
+        InvalidModelInput - If the channel violates a constraint.
+    '''
+    volume_pb = channel_pb.CalibratedVolume.Volume
+    transform_pb = channel_pb.CalibratedVolume.DataTransform
+    if check_geometry:
+        check_range('dimensions', channel_pb.ChannelID, "dimension", \
+            (volume_pb.Width, volume_pb.Height, volume_pb.Depth), constraints, 'dimensions')
+        scaling = transform_pb.VoxelScalingInMM
+        spacing = (scaling.X, scaling.Y, scaling.Z)
+        if any(constraints['spacing_{}_{}'.format(bound, axis)] for bound in ('min', 'max') \
+                for axis in 'xyz'):
+            if min(spacing) <= 0:
+                raise InvalidModelInput('spacing', "Channel {} has no voxel spacing.".format( \
+                    channel_pb.ChannelID))
+            check_range('spacing', channel_pb.ChannelID, "spacing", spacing, constraints, \
+                'spacing', SPACING_TOLERANCE)
+    z_axis = transform_pb.ZAxisDirection
+    if constraints['is_axial'] and (z_axis.X or z_axis.Y or z_axis.Z) and \
+            abs(z_axis.Z) < AXIAL_COSINE * (z_axis.X ** 2 + z_axis.Y ** 2 + z_axis.Z ** 2) ** 0.5:
+        raise InvalidModelInput('axial', "Channel {} is not axial.".format(channel_pb.ChannelID))
+
+
+def validate_model_input(m_v, model_in):
+    '''
+    Validates a parsed model input before the job is stored and queued, using only header
+    fields of the channels.  Every input is checked to be decodable; inputs of model versions
+    enforcing their constraints are also checked against the ModelChannelDescription of
+    each channel.  Accepted modalities cannot be checked, model inputs do not state them.
+
+    Parameters:
+        m_v - django.db.ModelVersion - Model version of the segmentation
+        model_in - ModelInput.pb - Parsed model input
+    Returns: None
+
+    Raises:
+        InvalidModelInput - If the model cannot process the input.
+    '''
+    try:
+        if not model_in.Channels:
+            raise InvalidModelInput('channels', "The model input has no channels.")
+        for channel_pb in model_in.Channels:
+            check_volume(channel_pb.ChannelID, channel_pb.CalibratedVolume.Volume)
+        if not m_v.enforce_constraints:
+            return
+        constraints = get_channel_constraints(m_v.model_family_id)
+        channel_ids = [channel_pb.ChannelID for channel_pb in model_in.Channels]
+        missing = sorted(set(constraints) - set(channel_ids))
+        unknown = sorted(set(channel_ids) - set(constraints))
+        if missing or unknown or len(set(channel_ids)) != len(channel_ids):
+            raise InvalidModelInput('channels', "The model expects the channels {}, the " \
+                "input has {}.".format(", ".join(sorted(constraints)), ", ".join(channel_ids)))
+        resampled = bool(m_v.preprocess_config) and \
+            parse_preprocess_config(m_v.preprocess_config)['resample']
+        for channel_pb in model_in.Channels:
+            check_constraints(channel_pb, constraints[channel_pb.ChannelID], not resampled)
+    except InvalidModelInput as invalid:
+        INVALID_INPUTS.labels(check=invalid.check).inc()
+        raise
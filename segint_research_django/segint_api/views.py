@@ -40,10 +40,23 @@ from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from django.core.files import File
 from django.utils import timezone
+from django.conf import settings
+from django.utils.dateparse import parse_datetime
 
 # Model imports
 from segint_api.models import *
 from segint_api.tasks import *
+from segint_api.routing import get_segmentation_queue
+from segint_api.scheduler import schedule_segmentations, get_queue_depths
+from segint_api.admission import check_admission, AdmissionRejected
+from segint_api.validation import validate_model_input, InvalidModelInput
+from segint_api.dedup import hash_model_input, find_outstanding_duplicate, \
+    find_completed_duplicate, reuse_model_output
+from segint_api.result_cache import lookup_cached_output
+from segint_api.volumes import CompressionMethods, STORAGE_COMPRESSION_METHOD, encode_model_output
+from segint_api.db import coalesced_write
+from segint_api.telemetry import ingest_telemetry, query_rollups, ROLLUP_DIMENSIONS
+from segint_api.delimited import parse_delimited
 
 # Protobuf imports
 from protobuf import Model_pb2, Primitives3D_pb2
@@ -55,8 +68,18 @@ import io
 import uuid
 import pytz
 import socket
+import logging
 from base64 import decodestring
 
+logger = logging.getLogger(__name__)
+
+# Optional scheduling headers for segmentation requests
+CLIENT_HEADER = 'X-Segint-Client'
+PRIORITY_HEADER = 'X-Segint-Priority'
+PROFILE_HEADER = 'X-Segint-Profile'
+COMPRESSION_HEADER = 'X-Segint-Compression'
+CROP_HEADER = 'X-Segint-Crop'
+
 # Version-control
 GROUP_VERSION = '0'
 MAJOR_VERSION = '0.'
@@ -130,6 +153,95 @@ def enforce_protobuf(func):
         return func(*args, **kwargs)
     return wrapper
 
+def get_request_priority(request):
+    '''
+    Helper method reading the scheduling priority of a segmentation request from the
+    PRIORITY_HEADER header.
+
+    Parameters:
+        request - The original request
+
+    Returns:
+        priority - int - Requested priority, the configured default if the header is absent.
+
+    Raises:
+        ValueError - If the header is not an integer within the allowed range.
+    '''
+    header = request.headers.get(PRIORITY_HEADER)
+    if header is None:
+        return settings.SEGINT_SCHEDULER['DEFAULT_PRIORITY']
+    priority = int(header)
+    if not 0 <= priority <= settings.SEGINT_SCHEDULER['MAX_PRIORITY']:
+        raise ValueError("Priority {} out of range".format(priority))
+    return priority
+
+def get_request_profile(request):
+    '''
+    Helper method reading whether the client asked for the job to be profiled with the
+    PROFILE_HEADER header.  Ignored unless SEGINT_PROFILING['ALLOW_HEADER'] is set.
+
+    Parameters:
+        request - The original request
+
+    Returns:
+        profile_requested - bool
+    '''
+    if not settings.SEGINT_PROFILING['ALLOW_HEADER']:
+        return False
+    return request.headers.get(PROFILE_HEADER, '').lower() in ('1', 'true', 'yes')
+
+def get_request_compression(request):
+    '''
+    Helper method reading the compression method the client accepts for the output volumes
+    from the COMPRESSION_HEADER header, a VolumeData3D.CompressionMethods name such as
+    "RunLength".
+
+    Parameters:
+        request - The original request
+
+    Returns:
+        compression_method - int - CompressionMethods value, Gzip if the header is absent.
+
+    Raises:
+        ValueError - If the header is not a known compression method.
+    '''
+    header = request.headers.get(COMPRESSION_HEADER)
+    if header is None:
+        return CompressionMethods.Gzip
+    return CompressionMethods.Value(header)
+
+def get_request_crop(request):
+    '''
+    Helper method reading whether the client accepts output volumes cropped to the bounding
+    box of their structure from the CROP_HEADER header.
+
+    Parameters:
+        request - The original request
+
+    Returns:
+        crop_output - bool
+    '''
+    return request.headers.get(CROP_HEADER, '').lower() in ('1', 'true', 'yes')
+
+def get_request_client_key(request, model_in):
+    '''
+    Helper method identifying the client a segmentation request is accounted to for fair-share
+    scheduling.  Uses the CLIENT_HEADER header if present, otherwise the client software version
+    and remote address.
+
+    Parameters:
+        request - The original request
+        model_in - ModelInput.pb - Parsed model input of the request
+
+    Returns:
+        client_key - str - Client key, at most 200 characters.
+    '''
+    client_key = request.headers.get(CLIENT_HEADER)
+    if not client_key:
+        client_key = "{}@{}".format(model_in.ClientInformation.SoftwareVersion, \
+            request.META.get('REMOTE_ADDR', ''))
+    return client_key[:200]
+
 def bad_request_helper(request, msg, details, status):
     '''
     Helper method for generating bad request responses.
@@ -216,8 +328,7 @@ def post_feedback(request):
     # Tries to construct feedback in database, returning error if fields are empty.
     try:
         new_feedback = Feedback()
-        new_feedback.pb_to_model(request.body)
-        new_feedback.save()
+        coalesced_write(lambda: new_feedback.pb_to_model(request.body))
         return HttpResponse("POST successful.", status=200)
 
     # On exception, returns invalid request error message pb.
@@ -228,6 +339,43 @@ def post_feedback(request):
         return bad_request_helper(request, msg, details, 400)
 
 
+# /api/v2/Feedback/segmentation/batch
+@csrf_exempt
+@post_check
+@enforce_protobuf
+def post_feedback_batch(request):
+    '''
+    Endpoint for API POST requests of many Segmentation Feedback messages at once, e.g. from
+    offline reviewers.  The body is a stream of SegmentationFeedback messages, each preceded
+    by its length as a varint (writeDelimitedTo).  Either all messages are stored or, if any
+    is invalid, none.
+
+    Returns:
+        1. Protobuf message if "accept" header is "application/x-protobuf"
+        2. JSON response otherwise
+    '''
+    try:
+        feedback_pbs = parse_delimited(request.body, Model_pb2.SegmentationFeedback, \
+            settings.SEGINT_FEEDBACK['MAX_BATCH_MESSAGES'])
+        feedbacks = []
+        for feedback_pb in feedback_pbs:
+            if not feedback_pb.IsInitialized():
+                raise ValueError("Segmentation feedback is missing required fields.")
+            new_feedback = Feedback()
+            new_feedback.pb_message_to_model(feedback_pb)
+            feedbacks.append(new_feedback)
+        coalesced_write(lambda: Feedback.save_all(feedbacks))
+        return HttpResponse("POST successful.", status=200)
+
+    # On exception, returns invalid request error message pb.
+    except:
+        msg = "Invalid request."
+        details = "The posted segmentation feedback stream is not valid. "+\
+        	"It must contain at most {} length-delimited messages.".format( \
+            settings.SEGINT_FEEDBACK['MAX_BATCH_MESSAGES'])
+        return bad_request_helper(request, msg, details, 400)
+
+
 # /api/v2/Model/
 @csrf_exempt
 @get_check
@@ -296,6 +444,40 @@ def post_segmentation(request, model_id):
         2. JSON response otherwise
     '''
 
+    # Model version the job will be processed with.
+    m_v = ModelVersion.objects.filter(model_version_id=model_id).first()
+    if m_v is None:
+        msg = "Invalid request."
+        details = "The requested model does not exist."
+        return bad_request_helper(request, msg, details, 400)
+
+    # Scheduling priority requested by the client.
+    try:
+        priority = get_request_priority(request)
+    except ValueError:
+        msg = "Invalid request."
+        details = "The {} header must be an integer between 0 and {}.".format( \
+            PRIORITY_HEADER, settings.SEGINT_SCHEDULER['MAX_PRIORITY'])
+        return bad_request_helper(request, msg, details, 400)
+
+    # Compression method of the output volumes accepted by the client.
+    try:
+        compression_method = get_request_compression(request)
+    except ValueError:
+        msg = "Invalid request."
+        details = "The {} header must be one of: {}.".format(COMPRESSION_HEADER, \
+            ", ".join(CompressionMethods.keys()))
+        return bad_request_helper(request, msg, details, 400)
+
+    # Reject work the server cannot finish before the upload is read.
+    try:
+        check_admission(model_id, int(request.META.get('CONTENT_LENGTH') or 0))
+    except AdmissionRejected as rejection:
+        response = bad_request_helper(request, "Server busy.", rejection.details, \
+            rejection.status)
+        response['Retry-After'] = str(rejection.retry_after)
+        return response
+
     # Tries to create a segmentation task entry in the database.
     seg_job = SegmentationJob()
     try:
@@ -308,12 +490,39 @@ def post_segmentation(request, model_id):
         # Check valid model input
         seg_pb = Model_pb2.ModelInput()
         seg_pb.ParseFromString(request_data)
+        # Reject inputs the model cannot process before they are stored and queued.
+        validate_model_input(m_v, seg_pb)
+        # Scheduling information
+        seg_job.client_key = get_request_client_key(request, seg_pb)
+        seg_job.priority = priority
+        seg_job.profile_requested = get_request_profile(request)
+        seg_job.compression_method = compression_method
+        seg_job.crop_output = get_request_crop(request)
+        seg_job.queue = get_segmentation_queue(m_v)
+        seg_job.input_bytes = len(request_data)
+        seg_job.input_hash = hash_model_input(model_id, seg_pb)
+        # Retried uploads are answered by the job already processing the same input.
+        duplicate = find_outstanding_duplicate(seg_job)
+        if duplicate is not None:
+            return format_and_send_response(request, duplicate.get_task_response())
+        # Reuse the output of a recently completed job with the same input, unless it was
+        # delivered and released in the meantime.
+        duplicate = find_completed_duplicate(seg_job)
+        if duplicate is not None and reuse_model_output(seg_job, duplicate.model_output):
+            return format_and_send_response(request, seg_job.get_task_response())
+        # Reuse the output of an earlier segmentation with the same model version.  An entry
+        # evicted by another worker in the meantime counts as a miss.
+        cache_entry = lookup_cached_output(m_v, seg_job.input_hash, seg_job.crop_output)
+        if cache_entry is not None and reuse_model_output(seg_job, cache_entry.model_output):
+            return format_and_send_response(request, seg_job.get_task_response())
         # Save model input
         file_io = io.BytesIO(request_data)
         fname = "{}.pb".format("Segmentation_{}".format(seg_job.segmentation_id))
         seg_job.model_input.save(fname, File(file_io))
         seg_job.save()
 
+    except InvalidModelInput as invalid:
+        return bad_request_helper(request, "Invalid model input.", invalid.details, 400)
     except:
         seg_job.delete()
         msg = "Invalid request."
@@ -321,17 +530,12 @@ def post_segmentation(request, model_id):
         	"It might have empty fields that are required."
         return bad_request_helper(request, msg, details, 400)
 
-    # Start asynchronous segmentation with state machine
-
-    m_v = ModelVersion.objects.filter(model_version_id=model_id)[0]
-    if m_v.model_type == ModelVersion.ModelVersionType.Phantom:
-        start_phantom_segmentation.delay(model_id, seg_job.segmentation_id)
-    elif m_v.model_type == ModelVersion.ModelVersionType.Pytorch:
-        start_pytorch_segmentation_single_structure.delay(model_id, seg_job.segmentation_id)
-    elif m_v.model_type == ModelVersion.ModelVersionType.Tensorflow:
-        start_phantom_segmentation.delay(model_id, seg_job.segmentation_id)
-    else:
-        start_phantom_segmentation.delay(model_id, seg_job.segmentation_id)
+    # Hand pending jobs to Celery in priority and fair-share order.
+    try:
+        schedule_segmentations()
+    except Exception:
+        # The job stays pending and is dispatched by the periodic scheduler.
+        logger.exception("Scheduling segmentation job %s failed", seg_job.segmentation_id)
 
     # Construct SegmentationTask response.
     response = seg_job.get_task_response()
@@ -356,7 +560,8 @@ def get_segmentation_progress(request, model_id, segmentation_id):
 
     # Database query for segmentation job with segmentation_id parameter.
     try:
-        seg_job = SegmentationJob.objects.get(model_id=model_id, segmentation_id=segmentation_id)
+        seg_job = SegmentationJob.objects.exclude(status=SegmentationJob.JobStatus.Delivered) \
+            .get(model_id=model_id, segmentation_id=segmentation_id)
     except:
         msg = "Invalid request."
         details = "The segmentation job does not exist."
@@ -385,7 +590,8 @@ def get_segmentation_result(request, model_id, segmentation_id):
 
     # Database query for segmentation job with segmentation_id parameter.
     try:
-        seg_job = SegmentationJob.objects.get(model_id=model_id, segmentation_id=segmentation_id)
+        seg_job = SegmentationJob.objects.exclude(status=SegmentationJob.JobStatus.Delivered) \
+            .get(model_id=model_id, segmentation_id=segmentation_id)
     except:
         msg = "Invalid request."
         details = "The segmentation job does not exist."
@@ -406,13 +612,17 @@ def get_segmentation_result(request, model_id, segmentation_id):
         model_out = f_in.read()
         f_in.close()
 
-        if request.headers["accept"] == "application/x-protobuf":
-            seg_job.delete()
+        protobuf_requested = request.headers["accept"] == "application/x-protobuf"
+        if protobuf_requested and seg_job.compression_method == STORAGE_COMPRESSION_METHOD:
+            seg_job.mark_delivered()
             return HttpResponse(model_out, status=200)
-        # Else
+        # Expand the stored output to the compression method negotiated with the client.
         response = Model_pb2.ModelOutput()
         response.ParseFromString(model_out)
-        seg_job.delete()
+        encode_model_output(response, seg_job.compression_method)
+        seg_job.mark_delivered()
+        if protobuf_requested:
+            return HttpResponse(response.SerializeToString(), status=200)
         return JsonResponse(json_format.MessageToDict(response), status=200)
     except:
         msg = "Invalid request."
@@ -420,6 +630,20 @@ def get_segmentation_result(request, model_id, segmentation_id):
         return bad_request_helper(request, msg, details, 400)
 
 
+# /api/scheduler/queues
+@csrf_exempt
+@get_check
+def get_scheduler_queues(request):
+    '''
+    Endpoint for GET requests of the segmentation scheduler state.  Reports the number of
+    pending, queued and running segmentation jobs per client and per Celery queue.
+
+    Returns:
+        JSON response
+    '''
+    return JsonResponse(get_queue_depths(), status=200)
+
+
 # /api/v2/Telemetry/segmentation/
 @csrf_exempt
 @post_check
@@ -441,7 +665,7 @@ def post_telemetry(request):
     try:
         new_telemetry = SegmentationTelemetry()
         new_telemetry.pb_to_model(request.body)
-        new_telemetry.save()
+        ingest_telemetry([new_telemetry])
         return HttpResponse("POST successful.", status = 200)
 
     # On exception, returns invalid request error message pb.
@@ -451,6 +675,74 @@ def post_telemetry(request):
         	"It might have empty fields that are required."
         return bad_request_helper(request, msg, details, 400)
 
+# /api/v2/Telemetry/segmentation/batch
+@csrf_exempt
+@post_check
+@enforce_protobuf
+def post_telemetry_batch(request):
+    '''
+    Endpoint for API POST requests of many Segmentation Telemetry messages at once.  The body
+    is a stream of SegmentationTelemetry messages, each preceded by its length as a varint
+    (writeDelimitedTo).  Either all messages are stored or, if any is invalid, none.
+
+    Returns:
+        1. Protobuf message if "accept" header is "application/x-protobuf"
+        2. JSON response otherwise
+    '''
+    try:
+        telemetry_pbs = parse_delimited(request.body, Model_pb2.SegmentationTelemetry, \
+            settings.SEGINT_TELEMETRY['MAX_BATCH_MESSAGES'])
+        records = []
+        for telemetry_pb in telemetry_pbs:
+            new_telemetry = SegmentationTelemetry()
+            new_telemetry.pb_message_to_model(telemetry_pb)
+            records.append(new_telemetry)
+        ingest_telemetry(records)
+        return HttpResponse("POST successful.", status = 200)
+
+    # On exception, returns invalid request error message pb.
+    except:
+        msg = "Invalid request."
+        details = "The posted segmentation telemetry stream is not valid. "+\
+        	"It must contain at most {} length-delimited messages.".format( \
+            settings.SEGINT_TELEMETRY['MAX_BATCH_MESSAGES'])
+        return bad_request_helper(request, msg, details, 400)
+
+# /api/v2/Telemetry/rollups
+@csrf_exempt
+@get_check
+def get_telemetry_rollups(request):
+    '''
+    Endpoint for GET requests of aggregated segmentation telemetry.  Reads only the hourly
+    rollups, see telemetry.py.  Optional query parameters:
+        model_id, client_software_version - exact match filters
+        start, end - ISO 8601 datetimes bounding the rollup hours
+        group_by - comma-separated subset of hour, model_id, client_software_version;
+            all three by default
+
+    Returns:
+        JSON response
+    '''
+    try:
+        group_by = request.GET.get('group_by')
+        group_by = tuple(group_by.split(',')) if group_by else ROLLUP_DIMENSIONS
+        assert set(group_by) <= set(ROLLUP_DIMENSIONS)
+        bounds = {}
+        for bound in ('start', 'end'):
+            if request.GET.get(bound):
+                bounds[bound] = parse_datetime(request.GET[bound])
+                assert bounds[bound] is not None
+        filters = {field: request.GET[field] for field in \
+            ('model_id', 'client_software_version') if field in request.GET}
+    except (AssertionError, ValueError):
+        msg = "Invalid request."
+        details = "The rollup query parameters are not valid."
+        return bad_request_helper(request, msg, details, 400)
+
+    rollups = query_rollups(group_by, **bounds, **filters)
+    return JsonResponse({'Rollups': rollups}, status=200)
+
+
 # /api/v2/VendorStatus/
 @csrf_exempt
 @get_check
@@ -0,0 +1,244 @@
+"""
+Copyright 2021 Varian Medical Systems, Inc.
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software 
+and associated documentation files (the "Software"), to deal in the Software without 
+restriction, including without limitation the rights to use, copy, modify, merge, publish, 
+distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the 
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or 
+substantial portions of the Software.
+The Software shall be used for non-clinical use only and shall not be used to enable, provide, 
+or support patient treatment. "Non-clinical" or "non-clinical use" means usage not involving: 
+(i) the direct observation of patients; (ii) the diagnoses of disease or other conditions in 
+humans or other animals; or (iii) the cure, mitigation, therapy, treatment, treatment planning,
+or prevention of disease in humans or other animals to affect the structure or function thereof.  
+The Software is NOT U.S. FDA 510(k) cleared for use on humans and shall not be used on humans.
+Any use of the Software outside of its intended use (“off-label”) could lead to physical harm
+or death of patients. 
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING 
+BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND 
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, 
+DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, 
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE. 
+IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY NON-CLINICAL OR OFF-LABEL 
+USE OF THE SOFTWARE AND ANY PERSON THAT USES, COPIES, MODIFIES, MERGES, PUBLISHES, DISTRIBUTES, 
+SUBLICENSES, AND/OR SELLS COPIES OF THE SOFTWARE UNDER THIS PERMISSION NOTICE HEREBY AGREES TO 
+INDEMNIFY AND HOLD HARMLESS THE AUTHORS AND COPYRIGHT HOLDERS FOR ANY LIABILITY, DEMAND, DAMAGE,
+COST OR EXPENSE ARISING FROM OR RELATING TO SUCH NON-CLINICAL OR OFF-LABEL USE OF THE SOFTWARE.
+"""
+
+"""Encoding and decoding of VolumeData3D voxel data"""
+
+import gzip
+
+import numpy as np
+
+from protobuf import Primitives3D_pb2
+
+DataTypes = Primitives3D_pb2.VolumeData3D.DataTypes
+CompressionMethods = Primitives3D_pb2.VolumeData3D.CompressionMethods
+
+# Compression method of the model outputs stored in results/.  Outputs are encoded with the
+# method negotiated with the client when they are downloaded.  See encode_model_output
+STORAGE_COMPRESSION_METHOD = CompressionMethods.BitPacked
+
+
+def run_length_encode(mask):
+    '''
+    Run-length encodes a binary mask as little endian uint32 lengths of alternating runs of
+    0 and 1 in C order, starting with a run of 0 that may be empty.  Any nonzero voxel counts
+    as 1.
+
+    Parameters:
+        mask - ndarray - Mask of any shape
+    Returns:
+        data - bytes - Encoded runs
+    '''
+    flat = mask.ravel() != 0
+    if flat.size == 0:
+        return b''
+    # Run boundaries are where consecutive voxels differ.
+    boundaries = np.flatnonzero(flat[1:] != flat[:-1]) + 1
+    runs = np.diff(np.concatenate(([0], boundaries, [flat.size])))
+    if flat[0]:
+        runs = np.concatenate(([0], runs))
+    return runs.astype('<u4').tobytes()
+
+
+def run_length_decode(data, shape):
+    '''
+    Decodes the output of run_length_encode.
+
+    Parameters:
+        data - bytes - Encoded runs
+        shape - tuple - Shape of the mask, e.g. (depth, height, width)
+    Returns:
+        mask - ndarray - uint8 mask of 0 and 1
+
+    Raises:
+        ValueError - If the runs do not cover exactly the voxels of the shape.
+    '''
+    runs = np.frombuffer(data, dtype='<u4')
+    if int(runs.sum(dtype=np.uint64)) != int(np.prod(shape)):
+        raise ValueError("Run lengths do not add up to a volume of shape {}".format(shape))
+    values = (np.arange(runs.size) % 2).astype(np.uint8)
+    return np.repeat(values, runs).reshape(shape)
+
+
+def encode_mask(mask, compression_method=CompressionMethods.Gzip):
+    '''
+    Encodes a mask as VolumeData3D data of the Byte data type.
+
+    Parameters:
+        mask - ndarray - (depth, height, width) mask with one byte per voxel
+        compression_method - int - VolumeData3D.CompressionMethods value
+    Returns:
+        data - bytes - Value for VolumeData3D.Data
+    '''
+    if compression_method == CompressionMethods.RunLength:
+        return run_length_encode(mask)
+    if compression_method == CompressionMethods.BitPacked:
+        return gzip.compress(np.packbits(mask != 0).tobytes())
+    return gzip.compress(mask.tobytes())
+
+
+def decode_volume(volume_pb):
+    '''
+    Decodes the voxel data of a VolumeData3D message, e.g. of a ModelOutputChannel.  Intended
+    for clients and tests as the reference decoder of every compression method.
+
+    Parameters:
+        volume_pb - VolumeData3D.pb - Volume message
+    Returns:
+        volume - ndarray - (depth, height, width) array, int16 for LittleEndianSignedInt16
+            and uint8 for Byte data
+    '''
+    shape = (volume_pb.Depth, volume_pb.Height, volume_pb.Width)
+    if volume_pb.CompressionMethod == CompressionMethods.RunLength:
+        return run_length_decode(volume_pb.Data, shape)
+    if volume_pb.CompressionMethod == CompressionMethods.BitPacked:
+        packed = np.frombuffer(gzip.decompress(volume_pb.Data), dtype=np.uint8)
+        return np.unpackbits(packed, count=int(np.prod(shape))).reshape(shape)
+    dtype = np.dtype('<i2') if volume_pb.DataType == DataTypes.LittleEndianSignedInt16 \
+        else np.uint8
+    return np.frombuffer(gzip.decompress(volume_pb.Data), dtype=dtype).reshape(shape)
+
+
+def encode_model_output(model_out, compression_method):
+    '''
+    Re-encodes the output volumes of a ModelOutput message with another compression method.
+    Volumes already encoded with the method are left untouched.
+
+    Parameters:
+        model_out - ModelOutput.pb - Model output, modified in place
+        compression_method - int - VolumeData3D.CompressionMethods value
+    Returns:
+        model_out - ModelOutput.pb - The same model output
+    '''
+    for channel in model_out.Channels:
+        if channel.Volume.CompressionMethod == compression_method:
+            continue
+        channel.Volume.Data = encode_mask(decode_volume(channel.Volume), compression_method)
+        channel.Volume.CompressionMethod = compression_method
+    return model_out
+
+
+def one_hot(label_map, label_values):
+    '''
+    Splits a label map into one mask per label value with a single broadcast comparison.
+
+    Parameters:
+        label_map - ndarray - (depth, height, width) label map
+        label_values - [int] - Label value of each mask
+    Returns:
+        masks - ndarray - (len(label_values), depth, height, width) uint8 masks
+    '''
+    values = np.asarray(label_values).reshape(-1, 1, 1, 1)
+    return (label_map[np.newaxis] == values).view(np.uint8)
+
+
+def bounding_box(mask):
+    '''
+    Computes the bounding box of the nonzero voxels of a mask.  Each axis is reduced with a
+    single any() over the other two axes, restricted to the extent found on the previous axes.
+
+    Parameters:
+        mask - ndarray - (depth, height, width) mask
+    Returns:
+        box - (slice, slice, slice) - Slices of the bounding box in (depth, height, width)
+            order, None if the mask is empty
+    '''
+    nonzero = mask != 0
+    z = np.flatnonzero(nonzero.any(axis=(1, 2)))
+    if z.size == 0:
+        return None
+    nonzero = nonzero[z[0]:z[-1] + 1]
+    y = np.flatnonzero(nonzero.any(axis=(0, 2)))
+    x = np.flatnonzero(nonzero[:, y[0]:y[-1] + 1].any(axis=(0, 1)))
+    return (slice(z[0], z[-1] + 1), slice(y[0], y[-1] + 1), slice(x[0], x[-1] + 1))
+
+
+def crop_mask(mask):
+    '''
+    Crops a mask to the bounding box of its nonzero voxels.  An empty mask is cropped to an
+    empty volume at the origin.
+
+    Parameters:
+        mask - ndarray - (depth, height, width) mask
+    Returns:
+        cropped - ndarray - View of the bounding box of the mask
+        offset - (int, int, int) - Index of the first voxel of the bounding box in
+            (depth, height, width) order
+    '''
+    box = bounding_box(mask)
+    if box is None:
+        return mask[:0, :0, :0], (0, 0, 0)
+    return mask[box], tuple(int(axis.start) for axis in box)
+
+
+def crop_transform(transform_pb, offset):
+    '''
+    Computes the transform of a cropped volume: the transform of the full volume with its
+    origin moved to the first voxel of the crop.
+
+    Parameters:
+        transform_pb - Transform3D.pb - Transform of the full volume
+        offset - (int, int, int) - Offset of the crop in (depth, height, width) order
+    Returns:
+        cropped_pb - Transform3D.pb - Transform of the cropped volume
+    '''
+    cropped_pb = Primitives3D_pb2.Transform3D()
+    cropped_pb.CopyFrom(transform_pb)
+    scaling = transform_pb.VoxelScalingInMM
+    z, y, x = offset
+    for axis, steps in ((transform_pb.XAxisDirection, x * scaling.X), \
+            (transform_pb.YAxisDirection, y * scaling.Y), \
+            (transform_pb.ZAxisDirection, z * scaling.Z)):
+        cropped_pb.Origin.X += axis.X * steps
+        cropped_pb.Origin.Y += axis.Y * steps
+        cropped_pb.Origin.Z += axis.Z * steps
+    return cropped_pb
+
+
+def decode_output_channel(channel_pb, shape):
+    '''
+    Decodes the mask of a ModelOutputChannel into the shape of the input volume, pasting
+    cropped output at its VoxelOffset.
+
+    Parameters:
+        channel_pb - ModelOutputChannel.pb - Output channel
+        shape - tuple - (depth, height, width) of the input volume
+    Returns:
+        mask - ndarray - uint8 mask of the input volume's shape
+    '''
+    volume = decode_volume(channel_pb.Volume)
+    if not channel_pb.HasField('VoxelOffset'):
+        return volume
+    offset = channel_pb.VoxelOffset
+    z, y, x = int(offset.Z), int(offset.Y), int(offset.X)
+    mask = np.zeros(shape, dtype=volume.dtype)
+    depth, height, width = volume.shape
+    mask[z:z + depth, y:y + height, x:x + width] = volume
+    return mask
@@ -32,7 +32,9 @@ COST OR EXPENSE ARISING FROM OR RELATING TO SUCH NON-CLINICAL OR OFF-LABEL USE O
 from __future__ import absolute_import, unicode_literals
 import os
 from celery import Celery
+from celery.signals import worker_process_shutdown
 from django.conf import settings
+from prometheus_client import multiprocess
 
 
 # Set the default Django settings module for the 'celery' program
@@ -56,3 +58,13 @@ def ping():
     # type: () -> str
     """Simple task that just returns 'pong'."""
     return 'pong'
+
+
+@worker_process_shutdown.connect
+def mark_metrics_process_dead(pid=None, **kwargs):
+    '''
+    Removes the live metrics of an exiting worker process from the shared
+    prometheus_multiproc_dir.
+    '''
+    if 'prometheus_multiproc_dir' in os.environ:
+        multiprocess.mark_process_dead(pid or os.getpid())
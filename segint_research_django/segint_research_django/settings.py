@@ -44,6 +44,8 @@ https://docs.djangoproject.com/en/3.0/ref/settings/
 import os
 import socket
 
+from kombu import Queue
+
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -88,6 +90,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'segint_api.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware', #add whitenoise
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -121,12 +124,48 @@ WSGI_APPLICATION = 'segint_research_django.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/3.0/ref/settings/#databases
-
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+# SQLite by default.  Set SEGINT_DB_ENGINE=postgresql to use PostgreSQL, configured by
+# SEGINT_DB_NAME, SEGINT_DB_USER, SEGINT_DB_PASSWORD, SEGINT_DB_HOST and SEGINT_DB_PORT.
+# Web and Celery processes keep their PostgreSQL connections open for SEGINT_DB_CONN_MAX_AGE
+# seconds instead of reconnecting for every request and task.
+
+if os.environ.get('SEGINT_DB_ENGINE') == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('SEGINT_DB_NAME', 'segint'),
+            'USER': os.environ.get('SEGINT_DB_USER', 'segint'),
+            'PASSWORD': os.environ.get('SEGINT_DB_PASSWORD', ''),
+            'HOST': os.environ.get('SEGINT_DB_HOST', 'localhost'),
+            'PORT': os.environ.get('SEGINT_DB_PORT', '5432'),
+            'CONN_MAX_AGE': int(os.environ.get('SEGINT_DB_CONN_MAX_AGE', 600)),
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        }
     }
+
+# Pragmas applied to every SQLite connection, see segint_api/db.py.  WAL lets polls read while
+# the web server and Celery workers write; writers wait up to busy_timeout milliseconds for
+# the lock.  synchronous=NORMAL is durable across application crashes with WAL.
+SEGINT_SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 20000,
+    'temp_store': 'MEMORY',
+}
+
+# Group commit of concurrent telemetry and feedback writes, see segint_api/db.py.
+#   MAX_BATCH - writes committed per transaction
+#   MAX_DELAY_SECONDS - time the first writer waits for others to join its transaction
+SEGINT_WRITE_COALESCING = {
+    'ENABLED': True,
+    'MAX_BATCH': 64,
+    'MAX_DELAY_SECONDS': 0.002,
 }
 
 
@@ -182,3 +221,178 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'UTC'
 CELERY_ALWAYS_EAGER = False
+
+# Segmentation queues
+# Every queue is consumed by its own Celery worker pool (see segint_api/launcher.py), so heavy
+# and light backends can be scaled independently.  A ModelVersion with 'celery_queue' set to one
+# of these queues is routed to it instead.
+#   model_types - ModelVersion.ModelVersionType values routed to the queue
+#   concurrency - number of worker processes consuming the queue
+#   prefetch_multiplier - number of jobs reserved ahead by each worker process
+SEGINT_QUEUES = {
+    'segmentation_phantom': {
+        'model_types': [0],
+        'concurrency': 2,
+        'prefetch_multiplier': 4,
+    },
+    'segmentation_pytorch': {
+        'model_types': [1],
+        'concurrency': 1,
+        'prefetch_multiplier': 1,
+    },
+    'segmentation_tensorflow': {
+        'model_types': [2],
+        'concurrency': 1,
+        'prefetch_multiplier': 1,
+    },
+}
+CELERY_DEFAULT_QUEUE = 'celery'
+CELERY_QUEUES = tuple(Queue(name, routing_key=name) for name in \
+    [CELERY_DEFAULT_QUEUE] + list(SEGINT_QUEUES))
+
+# Production launcher, see "python manage.py segint_serve" and segint_api/launcher.py
+#   BIND - address of the web server
+#   WORKER_CLASS - 'asgi' serves the ASGI application with uvicorn workers, 'wsgi' the WSGI
+#       application with threaded workers
+#   WORKERS - web server processes, 0 derives them from the CPU cores up to MAX_WORKERS
+#   THREADS - view threads per web server process
+#   SHUTDOWN_TIMEOUT_SECONDS - time open requests and running Celery tasks get to finish at
+#       shutdown before their processes are killed
+#   PID_FILE - process ID of the launcher, used by "segint_serve --stop"
+#   METRICS_DIR - directory the processes share their Prometheus metrics through, cleared at
+#       startup; the prometheus_multiproc_dir environment variable takes precedence
+SEGINT_SERVER = {
+    'BIND': '0.0.0.0:8000',
+    'WORKER_CLASS': 'asgi',
+    'WORKERS': 0,
+    'MAX_WORKERS': 8,
+    'THREADS': 8,
+    'SHUTDOWN_TIMEOUT_SECONDS': 120,
+    'PID_FILE': os.path.join(BASE_DIR, 'segint.pid'),
+    'METRICS_DIR': os.path.join(BASE_DIR, 'prometheus'),
+}
+
+# Segmentation scheduler
+# Jobs wait in the database until the scheduler hands them to Celery, so that no client can
+# fill the queues ahead of everyone else.
+#   DEFAULT_MAX_IN_FLIGHT - jobs per queue handed to Celery at once, unless the queue in
+#       SEGINT_QUEUES defines 'max_in_flight'
+#   DEFAULT_PRIORITY, MAX_PRIORITY - priority range of the X-Segint-Priority header
+#   CLIENT_WEIGHTS - fair-share weight per client key, 1 if absent
+#   INTERVAL_SECONDS - period of the Celery beat scheduling pass
+#   QUEUED_TIMEOUT_SECONDS - queued jobs not started within this time, e.g. because their
+#       Celery message was lost, are returned to pending and dispatched again
+#   RUNNING_TIMEOUT_SECONDS - running jobs not finished within this time, e.g. because their
+#       worker was killed, are marked failed
+#   RECLAIM_INTERVAL_SECONDS - period of the Celery beat task reclaiming such stale jobs
+SEGINT_SCHEDULER = {
+    'DEFAULT_MAX_IN_FLIGHT': 4,
+    'DEFAULT_PRIORITY': 0,
+    'MAX_PRIORITY': 9,
+    'CLIENT_WEIGHTS': {},
+    'INTERVAL_SECONDS': 5,
+    'QUEUED_TIMEOUT_SECONDS': 3600,
+    'RUNNING_TIMEOUT_SECONDS': 7200,
+    'RECLAIM_INTERVAL_SECONDS': 60,
+}
+
+# Segmentation admission control
+# New jobs are rejected with a Retry-After header once a limit is reached, 503 for the
+# server-wide limits and 429 for the backlog of a single model.  None disables a limit.
+#   MAX_QUEUED_JOBS - pending, queued and running jobs, except those stale by the timeouts of
+#       SEGINT_SCHEDULER
+#   MAX_PENDING_BYTES - model input bytes of those jobs
+#   MAX_MODEL_BACKLOG - pending, queued and running jobs per model
+#   THROUGHPUT_WINDOW_SECONDS - window of finished jobs Retry-After is estimated from;
+#       delivered jobs are kept for this long
+#   RESULT_RETENTION_SECONDS - failed jobs and completed jobs that were never downloaded are
+#       deleted with their files after this long
+#   MIN_RETRY_AFTER_SECONDS, MAX_RETRY_AFTER_SECONDS - bounds of Retry-After
+SEGINT_ADMISSION = {
+    'MAX_QUEUED_JOBS': 200,
+    'MAX_PENDING_BYTES': 2 * 1024 ** 3,
+    'MAX_MODEL_BACKLOG': 50,
+    'THROUGHPUT_WINDOW_SECONDS': 900,
+    'RESULT_RETENTION_SECONDS': 7 * 24 * 3600,
+    'MIN_RETRY_AFTER_SECONDS': 5,
+    'MAX_RETRY_AFTER_SECONDS': 600,
+}
+
+# Segmentation deduplication
+# Uploads with the same model input as an outstanding job of the same client return that
+# job.  Otherwise the output of a job completed within REUSE_WINDOW_SECONDS is reused;
+# 0 disables reuse.
+SEGINT_DEDUP = {
+    'REUSE_WINDOW_SECONDS': 600,
+}
+
+# Validation of segmentation uploads, see segint_api/validation.py.  Channel constraints of
+# model families are cached for CONSTRAINT_CACHE_SECONDS; edits in the admin panel apply
+# immediately in the editing process and after this delay in the others.
+SEGINT_INPUT_VALIDATION = {
+    'CONSTRAINT_CACHE_SECONDS': 60,
+}
+
+# Segmentation result cache
+# Model outputs are cached by input content hash and model version in media/results/cache.
+# Entries accessed least recently are evicted once MAX_BYTES is exceeded; 0 disables caching.
+SEGINT_RESULT_CACHE = {
+    'MAX_BYTES': 1024 ** 3,
+}
+
+# Telemetry ingestion, see segint_api/telemetry.py
+#   BUFFERED - buffer telemetry in each server process and write it in bulk, instead of
+#       writing it before responding.  Records buffered when a process is killed are lost.
+#   FLUSH_RECORDS, FLUSH_SECONDS - buffer size and age at which buffered records are written
+#   MAX_BATCH_MESSAGES - messages accepted by /api/v2/Telemetry/segmentation/batch
+#   ROLLUP_SECONDS - period of the Celery beat task folding completed hours into the hourly
+#       rollups served at /api/v2/Telemetry/rollups
+#   SKETCH_RELATIVE_ACCURACY - relative error of the rollup percentiles; rollups stored with
+#       another accuracy are re-bucketed when merged
+#   RAW_RETENTION_DAYS - age at which rolled up raw telemetry records are deleted
+SEGINT_TELEMETRY = {
+    'BUFFERED': False,
+    'FLUSH_RECORDS': 500,
+    'FLUSH_SECONDS': 2.0,
+    'MAX_BATCH_MESSAGES': 10000,
+    'ROLLUP_SECONDS': 600,
+    'SKETCH_RELATIVE_ACCURACY': 0.01,
+    'RAW_RETENTION_DAYS': 30,
+}
+
+# Opt-in profiling of segmentation jobs, see segint_api/profiling.py.  Jobs are sampled at
+# ModelVersion.profile_sample_rate, set in the admin panel.
+#   ALLOW_HEADER - let clients request profiling of single jobs with X-Segint-Profile: 1
+#   TOP_ENTRIES - functions and allocation sites listed in the text reports
+#   TRACEMALLOC_FRAMES - stack depth of traced allocations
+SEGINT_PROFILING = {
+    'ALLOW_HEADER': False,
+    'TOP_ENTRIES': 50,
+    'TRACEMALLOC_FRAMES': 10,
+}
+
+# Feedback ingestion
+#   MAX_BATCH_MESSAGES - messages accepted by /api/v2/Feedback/segmentation/batch
+SEGINT_FEEDBACK = {
+    'MAX_BATCH_MESSAGES': 10000,
+}
+
+CELERY_IMPORTS = ('segint_api.scheduler', 'segint_api.admission', 'segint_api.telemetry')
+CELERYBEAT_SCHEDULE = {
+    'schedule-segmentations': {
+        'task': 'schedule_segmentations',
+        'schedule': SEGINT_SCHEDULER['INTERVAL_SECONDS'],
+    },
+    'reclaim-stale-jobs': {
+        'task': 'reclaim_stale_jobs',
+        'schedule': SEGINT_SCHEDULER['RECLAIM_INTERVAL_SECONDS'],
+    },
+    'prune-finished-jobs': {
+        'task': 'prune_finished_jobs',
+        'schedule': 300,
+    },
+    'rollup-telemetry': {
+        'task': 'rollup_telemetry',
+        'schedule': SEGINT_TELEMETRY['ROLLUP_SECONDS'],
+    },
+}
@@ -30,14 +30,61 @@ COST OR EXPENSE ARISING FROM OR RELATING TO SUCH NON-CLINICAL OR OFF-LABEL USE O
 """
 
 import io
+import json
+import marshal
+import pickle
+import zipfile
+import gzip
 import time
 import os
-
-from django.test import TestCase, TransactionTestCase
+import sys
+import tempfile
+import signal
+import threading
+import subprocess
+import asyncio
+from datetime import timedelta
+from urllib.parse import unquote
+from unittest import mock
+
+import numpy as np
+
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.core.handlers.asgi import ASGIHandler
 from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+from django.conf import settings
+from django.contrib.auth.models import User
 from segint_api.models import *
+from segint_api.loaders import load_model_module, model_pickle_module
+from segint_api.routing import get_segmentation_queue, get_segmentation_task
+from segint_api.scheduler import select_next_job, reclaim_stale_jobs, schedule_segmentations, \
+    MISSING_MODEL_ERROR
+from segint_api.admission import check_admission, prune_finished_jobs
+from segint_api.tasks import start_phantom_segmentation
+from segint_api.dedup import hash_model_input
+from segint_api.result_cache import evict_cached_outputs
+from segint_api.db import WriteCoalescer, PendingWrite
+from segint_api.delimited import serialize_delimited
+from segint_api.launcher import Launcher, web_worker_count, web_server_command, \
+    celery_commands, prepare_metrics_dir
+from segint_api.metrics import render_metrics
+from segint_api.validation import validate_model_input, clear_constraint_cache, \
+    InvalidModelInput
+from segint_api.volumes import run_length_encode, run_length_decode, decode_volume, \
+    encode_mask, crop_mask, decode_output_channel, one_hot
+from segint_api.phantom import parse_phantom_config, phantom_segment
+from segint_api.preprocessing import DEFAULT_PREPROCESS_CONFIG, parse_preprocess_config, \
+    preprocess_channel, resample, resampling_plan, target_spacing
+from segint_api.telemetry import TelemetryBuffer, rollup_telemetry_records, \
+    prune_telemetry_records
 from protobuf import Model_pb2, Primitives3D_pb2
 from celery.contrib.testing.worker import start_worker
+from asgiref.testing import ApplicationCommunicator
+from prometheus_client import REGISTRY
 from segint_research_django.celery import app
 
 #----------------------------------------------------------------------------------------------
@@ -48,6 +95,27 @@ from segint_research_django.celery import app
 # to run synchronously:  Change variable 'CELERY_ALWAYS_EAGER' in 'settings.py' to 'True'.
 #----------------------------------------------------------------------------------------------
 
+def build_model_input(shape=(8, 64, 64), seed=0):
+    '''
+    Builds a single channel ModelInput protobuf message with a random int16 volume.
+
+    Parameters:
+        shape - (int, int, int) - Depth, height and width of the volume
+        seed - int - Seed of the random volume
+    Returns:
+        model_in - ModelInput.pb - Model input message
+    '''
+    model_in = Model_pb2.ModelInput()
+    model_in.ClientInformation.SoftwareVersion = "test"
+    channel = model_in.Channels.add()
+    channel.ChannelID = "CT"
+    volume = channel.CalibratedVolume.Volume
+    volume.Depth, volume.Height, volume.Width = shape
+    data = np.random.RandomState(seed).randint(-1000, 1000, size=shape).astype(np.int16)
+    volume.Data = gzip.compress(data.tobytes())
+    return model_in
+
+
 class PingTestCase(TestCase):
     '''
     End-to-end testing for endpoints:
@@ -110,6 +178,20 @@ class PingTestCase(TestCase):
         self.assertNotEqual(response_pb.Version, None, \
             msg='/api/ping endpoint did not return proper Protobuf message.')
 
+    def test_request_metrics(self):
+        '''
+        Requests are counted per URL name and status code by RequestMetricsMiddleware.
+        '''
+        labels = {'view': 'ping', 'method': 'GET', 'status': '200'}
+        before = REGISTRY.get_sample_value('segint_http_requests_total', labels) or 0
+        self.client.get('/api/ping', **{'HTTP_ACCEPT':'application/json'})
+        self.client.get('/api/ping', **{'HTTP_ACCEPT':'application/json'})
+        self.assertEqual(REGISTRY.get_sample_value('segint_http_requests_total', labels), \
+            before + 2, msg='Request metrics middleware did not count /api/ping requests.')
+        response = self.client.get('/metrics')
+        self.assertIn('segint_http_request_seconds_bucket{le="0.001",method="GET",view="ping"}', \
+            response.content.decode(), msg='/metrics endpoint did not export request latency.')
+
 
 class GetCreditsTestCase(TestCase):
     '''
@@ -370,6 +452,57 @@ class PostFeedbackTestCase(TestCase):
             msg='/api/v2/Feedback/segmentation endpoint did not return 400 status code' + \
             ' for invalid feedback protobuf message.')
 
+    def test_post_feedback_batch(self):
+        '''
+        Test for endpoint: /api/v2/Feedback/segmentation/batch
+        Post a length-delimited stream of feedback messages
+        '''
+        feedback_pb = Model_pb2.SegmentationFeedback()
+        feedback_pb.ParseFromString(self.feedback_message)
+        response = self.client.post('/api/v2/Feedback/segmentation/batch', \
+            serialize_delimited([feedback_pb] * 3), \
+            content_type='application/x-protobuf', \
+            **{'HTTP_ACCEPT':'application/x-protobuf'})
+        self.assertEqual(response.status_code, 200, \
+            msg='/api/v2/Feedback/segmentation/batch endpoint did not return 200 status code.')
+        self.assertEqual(Feedback.objects.count(), 3, \
+            msg='/api/v2/Feedback/segmentation/batch endpoint did not store every message.')
+        self.assertEqual(StructureComment.objects.count(), \
+            3 * len(feedback_pb.StructureComments), \
+            msg='/api/v2/Feedback/segmentation/batch endpoint did not store structure comments.')
+        for feedback in Feedback.objects.all():
+            self.assertEqual(feedback.structurecomment_set.count(), \
+                len(feedback_pb.StructureComments), \
+                msg='Structure comments were not attached to their feedback.')
+
+    def test_post_feedback_batch_content_type_json(self):
+        '''
+        Test for endpoint: /api/v2/Feedback/segmentation/batch
+        With content-type "application/json"
+        '''
+        response = self.client.post('/api/v2/Feedback/segmentation/batch', \
+            self.feedback_message, \
+            content_type='application/json', \
+            **{'HTTP_ACCEPT':'application/x-protobuf'})
+        self.assertEqual(response.status_code, 415, \
+            msg='/api/v2/Feedback/segmentation/batch endpoint did not return 415 status code.')
+
+    def test_post_feedback_batch_truncated(self):
+        '''
+        Test for endpoint: /api/v2/Feedback/segmentation/batch
+        Post a truncated stream: nothing is stored
+        '''
+        feedback_pb = Model_pb2.SegmentationFeedback()
+        feedback_pb.ParseFromString(self.feedback_message)
+        response = self.client.post('/api/v2/Feedback/segmentation/batch', \
+            serialize_delimited([feedback_pb] * 2)[:-1], \
+            content_type='application/x-protobuf', \
+            **{'HTTP_ACCEPT':'application/x-protobuf'})
+        self.assertEqual(response.status_code, 400, \
+            msg='/api/v2/Feedback/segmentation/batch endpoint accepted a truncated stream.')
+        self.assertEqual(Feedback.objects.count(), 0, \
+            msg='/api/v2/Feedback/segmentation/batch endpoint stored a truncated stream.')
+
 
 class PostTelemetryTestCase(TestCase):
     '''
@@ -433,6 +566,57 @@ class PostTelemetryTestCase(TestCase):
         self.assertEqual(response.status_code, 400, \
             msg='/api/v2/Telemetry/segmentation endpoint did not return 400 status code.')
 
+    def test_post_telemetry_batch(self):
+        '''
+        Test for endpoint: /api/v2/Telemetry/segmentation/batch
+        Post a length-delimited stream of telemetry messages
+        '''
+        telemetry_pb = Model_pb2.SegmentationTelemetry()
+        telemetry_pb.ParseFromString(self.telemetry)
+        response = self.client.post('/api/v2/Telemetry/segmentation/batch', \
+            serialize_delimited([telemetry_pb] * 3), \
+            content_type='application/x-protobuf', \
+            **{'HTTP_ACCEPT':'application/x-protobuf'})
+        self.assertEqual(response.status_code, 200, \
+            msg='/api/v2/Telemetry/segmentation/batch endpoint did not return 200 status code.')
+        self.assertEqual(SegmentationTelemetry.objects.count(), 3, \
+            msg='/api/v2/Telemetry/segmentation/batch endpoint did not store every message.')
+
+    def test_post_telemetry_batch_truncated(self):
+        '''
+        Test for endpoint: /api/v2/Telemetry/segmentation/batch
+        Post a truncated stream: nothing is stored
+        '''
+        telemetry_pb = Model_pb2.SegmentationTelemetry()
+        telemetry_pb.ParseFromString(self.telemetry)
+        response = self.client.post('/api/v2/Telemetry/segmentation/batch', \
+            serialize_delimited([telemetry_pb] * 2)[:-1], \
+            content_type='application/x-protobuf', \
+            **{'HTTP_ACCEPT':'application/x-protobuf'})
+        self.assertEqual(response.status_code, 400, \
+            msg='/api/v2/Telemetry/segmentation/batch endpoint accepted a truncated stream.')
+        self.assertEqual(SegmentationTelemetry.objects.count(), 0, \
+            msg='/api/v2/Telemetry/segmentation/batch endpoint stored a truncated stream.')
+
+    @override_settings(SEGINT_TELEMETRY={'BUFFERED': True, 'FLUSH_RECORDS': 4, \
+        'FLUSH_SECONDS': 60, 'MAX_BATCH_MESSAGES': 10})
+    def test_telemetry_buffer(self):
+        '''
+        Buffered telemetry is written in bulk once the buffer is full.
+        '''
+        buffer = TelemetryBuffer()
+        records = []
+        for _ in range(4):
+            record = SegmentationTelemetry()
+            record.pb_to_model(self.telemetry)
+            records.append(record)
+        buffer.add(records[:3])
+        self.assertEqual(SegmentationTelemetry.objects.count(), 0, \
+            msg='Telemetry buffer wrote records before it was full.')
+        buffer.add(records[3:])
+        self.assertEqual(SegmentationTelemetry.objects.count(), 4, \
+            msg='Telemetry buffer did not write records once full.')
+
 
 class GetVendorStatusTestCase(TestCase):
     '''
@@ -515,6 +699,8 @@ class PostSegmentationTestCase(TestCase):
         protect against data loss.  For testing purposes, we will need to keep track of files
         created and delete them on testcase class teardown.
         '''
+        for entry in ResultCacheEntry.objects.all():
+            self.path_list.append(entry.model_output.path)
         for path in self.path_list:
             os.remove(path)
 
@@ -630,6 +816,80 @@ class PostSegmentationTestCase(TestCase):
             msg='/api/v2/Model/{}/segmentation/{}/result endpoint did not fetch correct result.'\
             .format(model_id, seg_id))
 
+    def test_stage_timings(self):
+        '''
+        Test for endpoint: /metrics
+        Segmentation stages are timed per job and exported as histograms.
+        '''
+        model_id = PostSegmentationTestCase.model_version.model_version_id
+        post_response = self.client.post('/api/v2/Model/{}/segmentation'.format( \
+            model_id.replace(" ", "%20")), \
+            self.seg_job, \
+            content_type='application/x-protobuf', \
+            **{'HTTP_ACCEPT':'application/x-protobuf'})
+        self.assertEqual(post_response.status_code, 200, \
+            msg='Segmentation job was not accepted.')
+        db_seg_job = SegmentationJob.objects.all()[0]
+        self.path_list += [db_seg_job.model_input.path, db_seg_job.model_output.path]
+        timings = json.loads(db_seg_job.stage_timings)
+        self.assertEqual(set(timings), \
+            {'queue_wait', 'acquire', 'parse', 'preprocess', 'segment', 'postprocess', \
+            'construct', 'save'}, \
+            msg='Segmentation job did not record the timing of every stage.')
+        metrics_response = self.client.get('/metrics')
+        self.assertEqual(metrics_response.status_code, 200, \
+            msg='/metrics endpoint did not return 200 status code.')
+        self.assertIn('segint_segmentation_stage_seconds_count{{model_version_id="{}",' \
+            'stage="segment"}}'.format(model_id), metrics_response.content.decode(), \
+            msg='/metrics endpoint did not export the stage histogram.')
+
+    def post_profiled_job(self, **headers):
+        '''
+        Posts the test job and returns the profile archive of the processed job.
+        '''
+        model_id = PostSegmentationTestCase.model_version.model_version_id.replace(" ", "%20")
+        post_response = self.client.post('/api/v2/Model/{}/segmentation'.format(model_id), \
+            self.seg_job, \
+            content_type='application/x-protobuf', \
+            **dict(headers, HTTP_ACCEPT='application/x-protobuf'))
+        self.assertEqual(post_response.status_code, 200, \
+            msg='Segmentation job was not accepted.')
+        db_seg_job = SegmentationJob.objects.all()[0]
+        self.path_list += [db_seg_job.model_input.path, db_seg_job.model_output.path]
+        self.assertTrue(db_seg_job.profile, msg='Segmentation job was not profiled.')
+        self.path_list.append(db_seg_job.profile.path)
+        return db_seg_job, zipfile.ZipFile(db_seg_job.profile.path)
+
+    @override_settings(SEGINT_PROFILING=dict(settings.SEGINT_PROFILING, ALLOW_HEADER=True))
+    def test_profile_requested(self):
+        '''
+        Jobs posted with the X-Segint-Profile header are profiled.
+        '''
+        _, archive = self.post_profiled_job(HTTP_X_SEGINT_PROFILE='1')
+        self.assertEqual(sorted(archive.namelist()), ['profile.pstats', 'profile.txt'], \
+            msg='Profile archive does not contain the cProfile statistics.')
+        stats = marshal.loads(archive.read('profile.pstats'))
+        self.assertIn('mock_segment', [function for _, _, function in stats], \
+            msg='Profile does not cover the segmentation stage.')
+
+    def test_profile_sampled(self):
+        '''
+        Jobs of a model version sampled at rate 1 are profiled, with memory traces if enabled,
+        and their profile is downloadable from the admin.
+        '''
+        ModelVersion.objects.filter(pk=PostSegmentationTestCase.model_version.pk).update( \
+            profile_sample_rate=1.0, profile_memory=True)
+        db_seg_job, archive = self.post_profiled_job()
+        self.assertIn('memory.txt', archive.namelist(), \
+            msg='Profile archive does not contain the memory trace.')
+        admin_user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(admin_user)
+        response = self.client.get('/admin/segint_api/segmentationjob/{}/profile/'.format( \
+            db_seg_job.pk))
+        self.assertEqual(response.status_code, 200, \
+            msg='Admin did not serve the profile archive.')
+        response.close()
+
     def test_post_job_retrieve_results_json(self):
         '''
         Test for endpoints:
@@ -696,3 +956,1194 @@ class PostSegmentationTestCase(TestCase):
         self.assertEqual(seg_result['ModelID'], model_id.replace("%20"," "), \
             msg='/api/v2/Model/{}/segmentation/{}/result endpoint did not fetch correct result.'\
             .format(model_id, seg_id))
+
+
+class AsgiHandlerTestCase(TransactionTestCase):
+    '''
+    End-to-end testing of the segmentation endpoints served by the ASGI application, see
+    segint_research_django/asgi.py.  Request bodies arrive in several messages and the views run
+    on executor threads.
+    '''
+
+    def setUp(self):
+        '''
+        Loads a phantom ModelFamily into the testing database.
+        '''
+        with open('staticfiles/testing/Centered_Square.pb', 'rb') as file_opened:
+            pb_bytes = file_opened.read()
+        self.model_family = ModelFamily.objects.create()
+        self.model_family.pb.save('Centered_Square.pb', File(io.BytesIO(pb_bytes)))
+        self.model_family.pb_to_model(pb_bytes)
+        self.model_family.save()
+        self.model_version = self.model_family.modelversion_set.all()[0]
+        self.model_version.model_type = ModelVersion.ModelVersionType.Phantom
+        self.model_version.save()
+        with open('staticfiles/testing/test_segmentation.pb', 'rb') as file_opened:
+            self.seg_job = file_opened.read()
+
+    def tearDown(self):
+        '''
+        Removes the media files orphaned by the database flush.
+        '''
+        paths = [self.model_family.pb.path]
+        for job in SegmentationJob.objects.all():
+            paths += [field.path for field in (job.model_input, job.model_output) if field]
+        paths += [entry.model_output.path for entry in ResultCacheEntry.objects.all()]
+        for path in set(paths):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def request(self, method, path, body=b'', chunk_size=4096):
+        '''
+        Sends a request to the ASGI application.
+
+        Parameters:
+            method - str - HTTP method
+            path - str - Quoted request path
+            body - bytes - Request body, sent in chunk_size messages
+            chunk_size - int - Bytes per http.request message
+        Returns:
+            status - int - Response status code
+            content - bytes - Response body
+        '''
+        scope = {'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', \
+            'method': method, 'scheme': 'http', 'path': unquote(path), 'raw_path': path.encode(), \
+            'query_string': b'', 'root_path': '', 'client': ('127.0.0.1', 50000), \
+            'server': ('testserver', 80), 'headers': [(b'host', b'testserver'), \
+            (b'accept', b'application/x-protobuf'), \
+            (b'content-type', b'application/x-protobuf'), \
+            (b'content-length', str(len(body)).encode())]}
+
+        async def communicate():
+            communicator = ApplicationCommunicator(ASGIHandler(), scope)
+            chunks = [body[offset:offset + chunk_size] \
+                for offset in range(0, len(body), chunk_size)] or [b'']
+            for index, chunk in enumerate(chunks):
+                await communicator.send_input({'type': 'http.request', 'body': chunk, \
+                    'more_body': index < len(chunks) - 1})
+            start = await communicator.receive_output(10)
+            content = b''
+            more_body = True
+            while more_body:
+                message = await communicator.receive_output(10)
+                content += message.get('body', b'')
+                more_body = message.get('more_body', False)
+            await communicator.wait()
+            return start['status'], content
+
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(communicate())
+        finally:
+            loop.close()
+
+    def test_segmentation(self):
+        '''
+        A model input uploaded in several messages is segmented and its result downloaded.
+        '''
+        status, _ = self.request('GET', '/api/ping')
+        self.assertEqual(status, 200, msg='/api/ping did not return 200 status code.')
+        model_id = self.model_version.model_version_id.replace(" ", "%20")
+        status, content = self.request('POST', \
+            '/api/v2/Model/{}/segmentation'.format(model_id), self.seg_job)
+        self.assertEqual(status, 200, msg='Segmentation upload did not return 200 status code.')
+        seg_task = Model_pb2.SegmentationTask()
+        seg_task.ParseFromString(content)
+        status, content = self.request('GET', '/api/v2/Model/{}/segmentation/{}'.format( \
+            model_id, seg_task.SegmentationID))
+        progress = Model_pb2.SegmentationProgress()
+        progress.ParseFromString(content)
+        self.assertEqual((status, progress.Progress), (200, 100), \
+            msg='Segmentation progress was not complete.')
+        status, content = self.request('GET', '/api/v2/Model/{}/segmentation/{}/result'.format( \
+            model_id, seg_task.SegmentationID))
+        seg_result = Model_pb2.ModelOutput()
+        seg_result.ParseFromString(content)
+        self.assertEqual((status, seg_result.ModelID), (200, self.model_version.model_version_id), \
+            msg='Segmentation result was not downloaded.')
+
+
+class ModelModuleLoaderTestCase(TestCase):
+    '''
+    Unit testing for the cached model support module loader.
+    '''
+
+    def setUp(self):
+        '''
+        Writes a temporary model support module to disk.
+        '''
+        self.module_path = os.path.join(tempfile.mkdtemp(), 'support_module.py')
+        with open(self.module_path, 'w') as file_out:
+            file_out.write("import dataclasses\n\n@dataclasses.dataclass\nclass Network:\n" \
+                "    depth: int = 1\n")
+
+    def tearDown(self):
+        '''
+        Removes the temporary model support module.
+        '''
+        os.remove(self.module_path)
+
+    def test_load_model_module_cached(self):
+        '''
+        Repeated loads of an unchanged file return the same module without touching sys.path.
+        '''
+        path_length = len(sys.path)
+        module = load_model_module(self.module_path)
+        self.assertIs(load_model_module(self.module_path), module, \
+            msg='Model module was not served from the cache.')
+        self.assertEqual(len(sys.path), path_length, \
+            msg='Loading a model module modified sys.path.')
+        self.assertNotIn('support_module', sys.modules, \
+            msg='Model module leaked into sys.modules.')
+        self.assertIs(sys.modules[module.__name__], module, \
+            msg='Model module was not registered under its unique name.')
+        self.assertEqual(pickle.loads(pickle.dumps(module.Network(2))).depth, 2, \
+            msg='Classes of the model module cannot be pickled.')
+
+    def test_model_pickle_module_resolves_namespace(self):
+        '''
+        Pickled objects referencing '__main__' resolve against the loaded model module.
+        '''
+        module = load_model_module(self.module_path)
+        # GLOBAL '__main__ Network', EMPTY_TUPLE, NEWOBJ, STOP
+        pickled = b'c__main__\nNetwork\n)\x81.'
+        loaded = model_pickle_module(module).load(io.BytesIO(pickled))
+        self.assertIsInstance(loaded, module.Network, \
+            msg='Unpickler did not resolve class from the model module namespace.')
+
+
+class SegmentationRoutingTestCase(TestCase):
+    '''
+    Unit testing for Celery queue routing of segmentation jobs.
+    '''
+
+    @classmethod
+    def setUpTestData(cls):
+        '''
+        Creates a bare model version for routing.
+        '''
+        cls.model_version = ModelVersion.objects.create(model_version_id="Routing Model", \
+            model_type=ModelVersion.ModelVersionType.Pytorch)
+
+    def test_queue_from_model_type(self):
+        '''
+        Model versions are routed to the queue configured for their model type.
+        '''
+        self.assertEqual(get_segmentation_queue(self.model_version), 'segmentation_pytorch', \
+            msg='Pytorch model version was not routed to the pytorch queue.')
+        self.assertEqual(get_segmentation_task(self.model_version).name, \
+            'start_pytorch_segmentation_single_structure', \
+            msg='Pytorch model version was not routed to the pytorch task.')
+        self.model_version.multi_structure = True
+        self.assertEqual(get_segmentation_task(self.model_version).name, \
+            'start_pytorch_segmentation_multi_structure', \
+            msg='Multi structure model version was not routed to the multi structure task.')
+
+    def test_model_version_id_unique(self):
+        '''
+        Model version IDs identify the model of a segmentation job and must be unique.
+        '''
+        with self.assertRaises(IntegrityError, msg='Duplicate model version ID was accepted.'):
+            ModelVersion.objects.create(model_version_id="Routing Model")
+
+    def test_queue_model_override(self):
+        '''
+        A queue set on the model version overrides the model type queue.
+        '''
+        self.model_version.celery_queue = 'segmentation_phantom'
+        self.assertEqual(get_segmentation_queue(self.model_version), 'segmentation_phantom', \
+            msg='Model version queue override was ignored.')
+
+    def test_unknown_queue_override(self):
+        '''
+        Queues without a worker pool are rejected and ignored by routing.
+        '''
+        self.model_version.celery_queue = 'dedicated_model_queue'
+        with self.assertRaises(ValidationError, msg='Unknown queue was accepted.'):
+            self.model_version.full_clean(exclude=['model_family', 'model_version_desc'])
+        self.assertEqual(get_segmentation_queue(self.model_version), 'segmentation_pytorch', \
+            msg='Unknown queue override was used.')
+
+
+class SegmentationSchedulerTestCase(TestCase):
+    '''
+    Unit testing for priority and fair-share selection of pending segmentation jobs.
+    Also tests endpoint:
+        /api/scheduler/queues
+    '''
+
+    def create_job(self, client_key, status=SegmentationJob.JobStatus.Pending, priority=0):
+        '''
+        Creates a segmentation job on the pytorch queue.
+        '''
+        self.job_count += 1
+        return SegmentationJob.objects.create(model_id="Scheduler Model", client_key=client_key, \
+            status=status, priority=priority, queue='segmentation_pytorch', \
+            time_field=timezone.now() + timedelta(seconds=self.job_count))
+
+    def setUp(self):
+        '''
+        Client 'busy' has two jobs in flight and the oldest pending job.
+        '''
+        self.job_count = 0
+        self.create_job('busy', status=SegmentationJob.JobStatus.Queued)
+        self.create_job('busy', status=SegmentationJob.JobStatus.Running)
+        self.busy_pending = self.create_job('busy')
+        self.idle_pending = self.create_job('idle')
+
+    def test_fair_share_selection(self):
+        '''
+        The client with fewer in-flight jobs is served first.
+        '''
+        self.assertEqual(select_next_job(), self.idle_pending, \
+            msg='Scheduler did not select the job of the least loaded client.')
+
+    def test_priority_selection(self):
+        '''
+        Higher priority jobs are served before fair-share is considered.
+        '''
+        self.busy_pending.priority = 5
+        self.busy_pending.save()
+        self.assertEqual(select_next_job(), self.busy_pending, \
+            msg='Scheduler did not select the highest priority job.')
+
+    def test_get_scheduler_queues(self):
+        '''
+        Test for endpoint: /api/scheduler/queues
+        '''
+        response = self.client.get('/api/scheduler/queues')
+        self.assertEqual(response.status_code, 200, \
+            msg='/api/scheduler/queues endpoint did not return 200 status code.')
+        depths = response.json()
+        self.assertEqual(depths['clients']['busy'], {'queued': 1, 'running': 1, 'pending': 1}, \
+            msg='/api/scheduler/queues endpoint did not report client depths.')
+        self.assertEqual(depths['queues']['segmentation_pytorch']['pending'], 2, \
+            msg='/api/scheduler/queues endpoint did not report queue depths.')
+
+    def test_reclaim_stale_jobs(self):
+        '''
+        Jobs queued or running past their timeouts free their queue slots.
+        '''
+        config = settings.SEGINT_SCHEDULER
+        queued = self.create_job('lost', status=SegmentationJob.JobStatus.Queued)
+        running = self.create_job('lost', status=SegmentationJob.JobStatus.Running)
+        SegmentationJob.objects.filter(pk=queued.pk).update(dispatched_time=timezone.now() - \
+            timedelta(seconds=config['QUEUED_TIMEOUT_SECONDS'] + 1))
+        SegmentationJob.objects.filter(pk=running.pk).update(started_time=timezone.now() - \
+            timedelta(seconds=config['RUNNING_TIMEOUT_SECONDS'] + 1))
+        self.assertEqual(reclaim_stale_jobs(), (1, 1), msg='Stale jobs were not reclaimed.')
+        queued.refresh_from_db()
+        running.refresh_from_db()
+        self.assertEqual(queued.status, SegmentationJob.JobStatus.Pending, \
+            msg='Stale queued job was not returned to pending.')
+        self.assertEqual(running.status, SegmentationJob.JobStatus.Failed, \
+            msg='Stale running job was not marked failed.')
+        self.assertEqual(running.get_job_progress().ErrorCode, \
+            Model_pb2.SegmentationProgress.ErrorCodes.InternalError)
+        self.assertEqual(reclaim_stale_jobs(), (0, 0), msg='Recent jobs were reclaimed.')
+
+    def test_deleted_model_version(self):
+        '''
+        Pending jobs whose model version was deleted are marked failed and do not stop the
+        scheduling pass.
+        '''
+        SegmentationJob.objects.filter(pk__in=[self.busy_pending.pk, self.idle_pending.pk]) \
+            .update(queue='segmentation_phantom')
+        self.assertEqual(schedule_segmentations(), 0, msg='Job without a model was dispatched.')
+        for seg_job in (self.busy_pending, self.idle_pending):
+            seg_job.refresh_from_db()
+            self.assertEqual(seg_job.status, SegmentationJob.JobStatus.Failed, \
+                msg='Job without a model version was not marked failed.')
+            self.assertEqual(seg_job.error, MISSING_MODEL_ERROR)
+
+    def test_missing_structures_fail_job(self):
+        '''
+        A job whose model version has no structures is marked failed instead of staying
+        queued, and a job no longer queued is skipped.
+        '''
+        ModelVersion.objects.create(model_version_id="Scheduler Model", \
+            model_type=ModelVersion.ModelVersionType.Phantom)
+        seg_job = self.create_job('broken', status=SegmentationJob.JobStatus.Queued)
+        with self.assertRaises(LookupError):
+            start_phantom_segmentation("Scheduler Model", seg_job.segmentation_id)
+        seg_job.refresh_from_db()
+        self.assertEqual(seg_job.status, SegmentationJob.JobStatus.Failed, \
+            msg='Job without structures was not marked failed.')
+        start_phantom_segmentation("Scheduler Model", seg_job.segmentation_id)
+        seg_job.refresh_from_db()
+        self.assertEqual(seg_job.status, SegmentationJob.JobStatus.Failed, \
+            msg='Job no longer queued was processed again.')
+
+
+ADMISSION_TEST_SETTINGS = {
+    'MAX_QUEUED_JOBS': 3,
+    'MAX_PENDING_BYTES': None,
+    'MAX_MODEL_BACKLOG': 2,
+    'THROUGHPUT_WINDOW_SECONDS': 900,
+    'RESULT_RETENTION_SECONDS': 3600,
+    'MIN_RETRY_AFTER_SECONDS': 5,
+    'MAX_RETRY_AFTER_SECONDS': 600,
+}
+
+@override_settings(SEGINT_ADMISSION=ADMISSION_TEST_SETTINGS)
+class AdmissionControlTestCase(TestCase):
+    '''
+    End-to-end testing of admission control for endpoint:
+        /api/v2/Model/{modelId}/segmentation
+    '''
+
+    @classmethod
+    def setUpTestData(cls):
+        '''
+        Creates a bare model version with two running jobs, filling its backlog.
+        '''
+        ModelVersion.objects.create(model_version_id="Admission", \
+            model_type=ModelVersion.ModelVersionType.Phantom)
+        for offset in range(2):
+            SegmentationJob.objects.create(model_id="Admission", \
+                status=SegmentationJob.JobStatus.Running, \
+                time_field=timezone.now() - timedelta(seconds=offset))
+
+    def post_job(self):
+        '''
+        Posts an (unparsed) segmentation job to the admission model.
+        '''
+        return self.client.post('/api/v2/Model/Admission/segmentation', b'model input', \
+            content_type='application/x-protobuf', **{'HTTP_ACCEPT':'application/json'})
+
+    def test_model_backlog_rejected(self):
+        '''
+        A full model backlog is rejected with 429 and the maximum Retry-After, since no
+        throughput has been observed.
+        '''
+        response = self.post_job()
+        self.assertEqual(response.status_code, 429, \
+            msg='Full model backlog did not return 429 status code.')
+        self.assertEqual(response['Retry-After'], '600', \
+            msg='Retry-After without observed throughput was not the maximum.')
+
+    def test_queued_jobs_rejected(self):
+        '''
+        Exceeding the global job limit is rejected with 503 and a Retry-After estimated from
+        the jobs finished within the throughput window.
+        '''
+        SegmentationJob.objects.create(model_id="Other", status=SegmentationJob.JobStatus.Pending, \
+            time_field=timezone.now() + timedelta(seconds=1))
+        for offset in range(3):
+            SegmentationJob.objects.create(model_id="Other", \
+                status=SegmentationJob.JobStatus.Delivered, completed_time=timezone.now(), \
+                time_field=timezone.now() - timedelta(seconds=10 + offset))
+        response = self.post_job()
+        self.assertEqual(response.status_code, 503, \
+            msg='Full server did not return 503 status code.')
+        # 3 jobs per 900 s leave one job above the limit processed in 300 s.
+        self.assertEqual(response['Retry-After'], '300', \
+            msg='Retry-After was not derived from the observed throughput.')
+
+    def test_stale_jobs_not_counted(self):
+        '''
+        Jobs running past the running timeout do not fill the model backlog.
+        '''
+        SegmentationJob.objects.filter(model_id="Admission").update( \
+            started_time=timezone.now() - timedelta( \
+            seconds=settings.SEGINT_SCHEDULER['RUNNING_TIMEOUT_SECONDS'] + 1))
+        check_admission("Admission", 0)
+
+    def test_prune_finished_jobs(self):
+        '''
+        Failed and undelivered jobs are deleted after the retention period.
+        '''
+        old = timezone.now() - timedelta(seconds=3601)
+        expired = SegmentationJob(model_id="Other", status=SegmentationJob.JobStatus.Completed, \
+            time_field=old, completed_time=old)
+        expired.model_output.save("Result{}.pb".format(expired.segmentation_id), \
+            ContentFile(b"output"))
+        path = expired.model_output.path
+        SegmentationJob.objects.create(model_id="Other", status=SegmentationJob.JobStatus.Failed, \
+            time_field=old - timedelta(seconds=1), completed_time=old)
+        recent = SegmentationJob.objects.create(model_id="Other", \
+            status=SegmentationJob.JobStatus.Failed, time_field=timezone.now(), \
+            completed_time=timezone.now())
+        try:
+            prune_finished_jobs()
+        finally:
+            # The file is deleted by django_cleanup when the transaction commits.
+            os.remove(path)
+        self.assertEqual(list(SegmentationJob.objects.filter(model_id="Other")), [recent], \
+            msg='Expired jobs were not pruned.')
+
+
+class InputValidationTestCase(TestCase):
+    '''
+    Testing of the validation of model inputs at endpoint:
+        /api/v2/Model/{modelId}/segmentation
+    '''
+
+    @classmethod
+    def setUpTestData(cls):
+        '''
+        Creates a model version constrained to axial CT channels of 32 to 128 voxels in X and Y.
+        '''
+        cls.model_family = ModelFamily.objects.create()
+        cls.model_version = ModelVersion.objects.create(model_version_id="Validation", \
+            model_family=cls.model_family, model_type=ModelVersion.ModelVersionType.Phantom, \
+            enforce_constraints=True)
+        ModelChannelDescription.objects.create(model_family=cls.model_family, channel_id="CT", \
+            is_axial=True, dimensions_min_x=32, dimensions_min_y=32, dimensions_max_x=128, \
+            dimensions_max_y=128)
+
+    def setUp(self):
+        '''
+        Drops constraints cached by earlier tests, whose database changes were rolled back.
+        '''
+        clear_constraint_cache()
+
+    def post_job(self, model_in):
+        '''
+        Posts a model input to the validation model.
+        '''
+        return self.client.post('/api/v2/Model/Validation/segmentation', \
+            model_in.SerializeToString(), content_type='application/x-protobuf', \
+            **{'HTTP_ACCEPT':'application/json'})
+
+    def assert_rejected(self, model_in, text):
+        '''
+        Asserts that a model input is rejected with 400 before a job is created.
+        '''
+        response = self.post_job(model_in)
+        self.assertEqual(response.status_code, 400, msg='Invalid input was not rejected.')
+        self.assertIn(text, response.json()['ExceptionDetails'], \
+            msg='Rejection did not explain itself.')
+        self.assertFalse(SegmentationJob.objects.exists(), msg='Invalid input created a job.')
+
+    def test_undecodable_volume(self):
+        '''
+        Volumes with an unsupported encoding or truncated data are rejected.
+        '''
+        model_in = build_model_input()
+        model_in.Channels[0].CalibratedVolume.Volume.DataType = \
+            Primitives3D_pb2.VolumeData3D.DataTypes.Byte
+        self.assert_rejected(model_in, "LittleEndianSignedInt16")
+        model_in = build_model_input()
+        model_in.Channels[0].CalibratedVolume.Volume.Depth = 9
+        self.assert_rejected(model_in, "does not match its dimensions")
+
+    def test_constraints(self):
+        '''
+        Channels violating the model channel descriptions are rejected unless the model
+        version resamples its inputs or does not enforce its constraints.
+        '''
+        model_in = build_model_input(shape=(8, 16, 64))
+        self.assert_rejected(model_in, "dimension 16 of channel CT along Y")
+        model_in.Channels[0].CalibratedVolume.DataTransform.ZAxisDirection.X = 1
+        model_in.Channels[0].CalibratedVolume.Volume.Height = 64
+        model_in.Channels[0].CalibratedVolume.Volume.Data = \
+            gzip.compress(bytes(8 * 64 * 64 * 2))
+        self.assert_rejected(model_in, "not axial")
+        model_in.Channels[0].ChannelID = "MR"
+        self.assert_rejected(model_in, "expects the channels CT")
+        validate_model_input(ModelVersion(enforce_constraints=False), model_in)
+        validate_model_input(ModelVersion(model_family=self.model_family, \
+            enforce_constraints=True, preprocess_config='{"resample": true}'), \
+            build_model_input(shape=(8, 16, 64)))
+
+    def test_constraint_cache_cleared(self):
+        '''
+        Edited channel descriptions apply to the next upload.
+        '''
+        model_in = build_model_input(shape=(8, 16, 64))
+        with self.assertRaises(InvalidModelInput):
+            validate_model_input(self.model_version, model_in)
+        ModelChannelDescription.objects.filter(model_family=self.model_family) \
+            .update(dimensions_min_y=0)
+        with self.assertRaises(InvalidModelInput):
+            validate_model_input(self.model_version, model_in)
+        description = ModelChannelDescription.objects.get(model_family=self.model_family)
+        description.save()
+        validate_model_input(self.model_version, model_in)
+
+
+class SegmentationDedupTestCase(TestCase):
+    '''
+    End-to-end testing of duplicate uploads for endpoint:
+        /api/v2/Model/{modelId}/segmentation
+    '''
+
+    @classmethod
+    def setUpTestData(cls):
+        '''
+        Sets up temporary database objects for a phantom model family.
+        '''
+        with open('staticfiles/testing/Centered_Square.pb', 'rb') as file_in:
+            pb_bytes = file_in.read()
+        cls.model_family = ModelFamily.objects.create()
+        cls.model_family.pb.save('Centered_Square.pb', File(io.BytesIO(pb_bytes)))
+        cls.model_family.pb_to_model(pb_bytes)
+        cls.model_version = cls.model_family.modelversion_set.all()[0]
+        cls.model_version.model_type = ModelVersion.ModelVersionType.Phantom
+        cls.model_version.save()
+
+    @classmethod
+    def tearDownClass(cls):
+        '''
+        Removes the orphaned model family file.
+        '''
+        super().tearDownClass()
+        os.remove(cls.model_family.pb.path)
+
+    def setUp(self):
+        self.model_in = build_model_input()
+        self.model_id = self.model_version.model_version_id
+        self.path_list = []
+
+    def tearDown(self):
+        '''
+        Removes orphaned segmentation input, output and result cache files.
+        '''
+        for seg_job in SegmentationJob.objects.all():
+            for field in (seg_job.model_input, seg_job.model_output):
+                if field:
+                    self.path_list.append(field.path)
+        for entry in ResultCacheEntry.objects.exclude(model_output=''):
+            self.path_list.append(entry.model_output.path)
+        for path in self.path_list:
+            os.remove(path)
+
+    def post_job(self, **headers):
+        '''
+        Posts the test model input and returns the segmentation ID.
+        '''
+        response = self.client.post('/api/v2/Model/{}/segmentation'.format( \
+            self.model_id.replace(" ", "%20")), self.model_in.SerializeToString(), \
+            content_type='application/x-protobuf', \
+            **dict(headers, HTTP_ACCEPT='application/json', HTTP_X_SEGINT_CLIENT='dedup'))
+        self.assertEqual(response.status_code, 200, \
+            msg='Segmentation endpoint did not return 200 status code.')
+        return response.json()['SegmentationID']
+
+    def test_outstanding_duplicate(self):
+        '''
+        A retried upload returns the job still processing the same input.
+        '''
+        outstanding = SegmentationJob.objects.create(model_id=self.model_id, \
+            client_key='dedup', status=SegmentationJob.JobStatus.Queued, \
+            time_field=timezone.now(), input_hash=hash_model_input(self.model_id, self.model_in))
+        self.assertEqual(self.post_job(), str(outstanding.segmentation_id), \
+            msg='Retried upload did not return the outstanding job.')
+        self.assertEqual(SegmentationJob.objects.count(), 1, \
+            msg='Retried upload created a new job.')
+
+    def test_completed_duplicate(self):
+        '''
+        An upload matching a recently completed job reuses its model output.
+        '''
+        first_id = self.post_job()
+        second_id = self.post_job()
+        self.assertNotEqual(first_id, second_id, \
+            msg='Completed duplicate did not get its own job.')
+        second_job = SegmentationJob.objects.get(segmentation_id=second_id)
+        self.assertFalse(second_job.model_input, \
+            msg='Completed duplicate stored its model input.')
+        with open(second_job.model_output.path, 'rb') as file_in:
+            model_out = Model_pb2.ModelOutput()
+            model_out.ParseFromString(file_in.read())
+        self.assertEqual(model_out.ModelID, self.model_id, \
+            msg='Completed duplicate did not reuse the model output.')
+
+    @override_settings(SEGINT_RESULT_CACHE=dict(settings.SEGINT_RESULT_CACHE, MAX_BYTES=0))
+    def test_released_duplicate(self):
+        '''
+        An upload matching a completed job whose output was released meanwhile is processed.
+        '''
+        first_job = SegmentationJob.objects.get(segmentation_id=self.post_job())
+        os.remove(first_job.model_output.path)
+        second_job = SegmentationJob.objects.get(segmentation_id=self.post_job())
+        self.assertTrue(second_job.model_input, msg='Upload was not processed.')
+        self.assertEqual(second_job.status, SegmentationJob.JobStatus.Completed, \
+            msg='Upload was not segmented.')
+        SegmentationJob.objects.filter(pk=first_job.pk).update(model_output='')
+
+    def test_result_cache(self):
+        '''
+        A downloaded result is served from the result cache when the input is uploaded again.
+        '''
+        first_id = self.post_job()
+        # Files of delivered jobs are only removed once the transaction commits.
+        first_job = SegmentationJob.objects.get(segmentation_id=first_id)
+        self.path_list += [first_job.model_input.path, first_job.model_output.path]
+        response = self.client.get('/api/v2/Model/{}/segmentation/{}/result'.format( \
+            self.model_id.replace(" ", "%20"), first_id), **{'HTTP_ACCEPT':'application/json'})
+        self.assertEqual(response.status_code, 200, \
+            msg='Result endpoint did not return 200 status code.')
+        second_id = self.post_job()
+        second_job = SegmentationJob.objects.get(segmentation_id=second_id)
+        self.assertEqual(second_job.status, SegmentationJob.JobStatus.Completed, \
+            msg='Upload was not served from the result cache.')
+        self.assertEqual(ResultCacheEntry.objects.get().hits, 1, \
+            msg='Result cache hit was not recorded.')
+
+    def test_evicted_cache_entry(self):
+        '''
+        An upload whose cached output was evicted meanwhile is processed.
+        '''
+        first_id = self.post_job()
+        self.get_result(first_id)
+        entry = ResultCacheEntry.objects.get()
+        os.remove(entry.model_output.path)
+        ResultCacheEntry.objects.filter(pk=entry.pk).update(model_output='')
+        with mock.patch('segint_api.views.lookup_cached_output', return_value=entry):
+            second_job = SegmentationJob.objects.get(segmentation_id=self.post_job())
+        self.assertTrue(second_job.model_input, msg='Upload was not processed.')
+        self.assertEqual(second_job.status, SegmentationJob.JobStatus.Completed, \
+            msg='Upload was not segmented.')
+
+    def get_result(self, seg_id):
+        '''
+        Downloads the protobuf result of a segmentation job.  The released files of the
+        delivered job are removed on tearDown.
+        '''
+        seg_job = SegmentationJob.objects.get(segmentation_id=seg_id)
+        self.path_list += [field.path for field in (seg_job.model_input, seg_job.model_output) \
+            if field]
+        response = self.client.get('/api/v2/Model/{}/segmentation/{}/result'.format( \
+            self.model_id.replace(" ", "%20"), seg_id), \
+            **{'HTTP_ACCEPT':'application/x-protobuf'})
+        self.assertEqual(response.status_code, 200, \
+            msg='Result endpoint did not return 200 status code.')
+        return Model_pb2.ModelOutput.FromString(response.content)
+
+    def test_run_length_output(self):
+        '''
+        Outputs are stored bit-packed and downloaded with the compression method of the job,
+        and all encodings decode to the same masks.
+        '''
+        compression_methods = Primitives3D_pb2.VolumeData3D.CompressionMethods
+        gzip_id = self.post_job()
+        run_length_id = self.post_job(HTTP_X_SEGINT_COMPRESSION='RunLength')
+        bit_packed_id = self.post_job(HTTP_X_SEGINT_COMPRESSION='BitPacked')
+        with open(SegmentationJob.objects.get(segmentation_id=gzip_id).model_output.path, \
+                'rb') as file_in:
+            stored = Model_pb2.ModelOutput.FromString(file_in.read()).Channels[0].Volume
+        self.assertEqual(stored.CompressionMethod, compression_methods.BitPacked, \
+            msg='Output was not stored bit-packed.')
+        masks = [decode_volume(stored)]
+        for seg_id, compression_method in ((gzip_id, compression_methods.Gzip), \
+                (run_length_id, compression_methods.RunLength), \
+                (bit_packed_id, compression_methods.BitPacked)):
+            volume = self.get_result(seg_id).Channels[0].Volume
+            self.assertEqual(volume.CompressionMethod, compression_method, \
+                msg='Output was not encoded with the compression method of the job.')
+            masks.append(decode_volume(volume))
+        self.assertTrue(masks[0].any() and all(np.array_equal(masks[0], mask) \
+            for mask in masks[1:]), msg='Encoded outputs do not match the stored output.')
+
+    def test_cropped_output(self):
+        '''
+        Cropped output only holds the bounding box of the structure and pastes back into the
+        uncropped output.
+        '''
+        transform = self.model_in.Channels[0].CalibratedVolume.DataTransform
+        transform.XAxisDirection.X = transform.YAxisDirection.Y = transform.ZAxisDirection.Z = 1
+        transform.VoxelScalingInMM.X = transform.VoxelScalingInMM.Y = 0.5
+        transform.VoxelScalingInMM.Z = 2
+        transform.Origin.X = -100
+        full_id = self.post_job()
+        cropped_id = self.post_job(HTTP_X_SEGINT_CROP='1')
+        channels = []
+        for seg_id in (full_id, cropped_id):
+            with open(SegmentationJob.objects.get(segmentation_id=seg_id).model_output.path, \
+                    'rb') as file_in:
+                channels.append(Model_pb2.ModelOutput.FromString(file_in.read()).Channels[0])
+        full_mask = decode_volume(channels[0].Volume)
+        cropped = channels[1]
+        self.assertFalse(channels[0].HasField('VoxelOffset'), \
+            msg='Uncropped output has a voxel offset.')
+        self.assertEqual(decode_volume(cropped.Volume).size, int(full_mask.sum()), \
+            msg='Cropped output is not the bounding box of the box structure.')
+        self.assertTrue(np.array_equal(decode_output_channel(cropped, full_mask.shape), \
+            full_mask), msg='Cropped output does not match the uncropped output.')
+        self.assertEqual((cropped.DataTransform.Origin.X, cropped.DataTransform.Origin.Z), \
+            (-100 + cropped.VoxelOffset.X * 0.5, cropped.VoxelOffset.Z * 2), \
+            msg='Cropped transform origin is not the first voxel of the crop.')
+
+    def test_multi_structure_output(self):
+        '''
+        Multi structure model versions output one channel per structure from a single label
+        map, each holding the voxels of the structure's label value.
+        '''
+        structure = self.model_version.structure_set.all()[0]
+        Structure.objects.create(model_version=self.model_version, name="Second", \
+            structure_type=Structure.StructureType.Organ, structure_id="Second", \
+            input_channel_id=structure.input_channel_id, label_value=3)
+        ModelVersion.objects.filter(pk=self.model_version.pk).update(multi_structure=True)
+        with open(SegmentationJob.objects.get(segmentation_id=self.post_job()) \
+                .model_output.path, 'rb') as file_in:
+            channels = Model_pb2.ModelOutput.FromString(file_in.read()).Channels
+        self.assertEqual([channel.Structure.StructureID for channel in channels], \
+            [structure.structure_id, "Second"], \
+            msg='Output channels do not follow the structures in label value order.')
+        masks = [decode_volume(channel.Volume) for channel in channels]
+        self.assertTrue(masks[0].any() and masks[1].any() and not (masks[0] & masks[1]).any(), \
+            msg='Label map was not split into disjoint structure masks.')
+
+    def test_unique_label_values(self):
+        '''
+        Structures are labelled in order, and label values are unique per model version.
+        '''
+        structure = self.model_version.structure_set.all()[0]
+        self.assertEqual(structure.label_value, 1, msg='Structure was not labelled 1.')
+        duplicate = Structure(model_version=self.model_version, name="Duplicate", \
+            structure_id="Duplicate", input_channel_id=structure.input_channel_id, \
+            label_value=structure.label_value)
+        with self.assertRaises(ValidationError, msg='Duplicate label value was accepted.'):
+            duplicate.full_clean()
+        duplicate.label_value = 0
+        with self.assertRaises(ValidationError, msg='Background label value was accepted.'):
+            duplicate.full_clean()
+        duplicate.label_value = structure.label_value
+        with self.assertRaises(IntegrityError, msg='Duplicate label value was stored.'), \
+                transaction.atomic():
+            duplicate.save()
+
+    def test_preprocessed_output(self):
+        '''
+        Channels are segmented at the target spacing of the model and the output is
+        resampled back to the input geometry.
+        '''
+        ModelVersion.objects.filter(pk=self.model_version.pk).update( \
+            preprocess_config='{"resample": true, "target_spacing": [1, 1, 1]}')
+        self.model_in.Channels[0].CalibratedVolume.DataTransform.VoxelScalingInMM.Z = 2
+        self.model_in.Channels[0].CalibratedVolume.DataTransform.VoxelScalingInMM.Y = 2
+        self.model_in.Channels[0].CalibratedVolume.DataTransform.VoxelScalingInMM.X = 2
+        seg_job = SegmentationJob.objects.get(segmentation_id=self.post_job())
+        with open(seg_job.model_output.path, 'rb') as file_in:
+            mask = decode_volume(Model_pb2.ModelOutput.FromString(file_in.read()) \
+                .Channels[0].Volume)
+        self.assertEqual(mask.shape, (8, 64, 64), \
+            msg='Output was not resampled to the input geometry.')
+        # The centered box of the phantom is 60 voxels wide at the 1mm target spacing.
+        self.assertEqual(int(mask.any(axis=(0, 1)).sum()), 30, \
+            msg='Channel was not segmented at the target spacing.')
+        self.assertIn('preprocess', json.loads(seg_job.stage_timings), \
+            msg='Preprocessing stage was not timed.')
+
+    def test_invalid_compression(self):
+        '''
+        Unknown compression methods are rejected.
+        '''
+        response = self.client.post('/api/v2/Model/{}/segmentation'.format( \
+            self.model_id.replace(" ", "%20")), self.model_in.SerializeToString(), \
+            content_type='application/x-protobuf', \
+            **{'HTTP_ACCEPT':'application/json', 'HTTP_X_SEGINT_COMPRESSION':'Zstd'})
+        self.assertEqual(response.status_code, 400, \
+            msg='Segmentation endpoint accepted an unknown compression method.')
+
+    def test_result_cache_eviction(self):
+        '''
+        Entries accessed least recently are evicted first.
+        '''
+        for index in range(3):
+            ResultCacheEntry.objects.create(input_hash=str(index), model_version_id=self.model_id, \
+                size_bytes=100, last_access_time=timezone.now() + timedelta(seconds=index))
+        self.assertEqual(evict_cached_outputs(150), 2, \
+            msg='Result cache did not evict down to its size limit.')
+        self.assertEqual(ResultCacheEntry.objects.get().input_hash, '2', \
+            msg='Result cache did not keep the most recently accessed entry.')
+
+
+class VolumeEncodingTestCase(TestCase):
+    '''
+    Unit testing for the encoding of output volumes in segint_api/volumes.py
+    '''
+
+    def test_run_length_round_trip(self):
+        '''
+        Masks survive run-length encoding, including masks starting inside a structure.
+        '''
+        random_mask = (np.random.RandomState(0).rand(4, 16, 16) > 0.7).astype(np.uint8)
+        for mask in (random_mask, np.ones((2, 3, 4), dtype=np.uint8), \
+                np.zeros((2, 3, 4), dtype=np.uint8)):
+            decoded = run_length_decode(run_length_encode(mask), mask.shape)
+            self.assertTrue(np.array_equal(decoded, mask), \
+                msg='Run-length decoding did not restore the mask.')
+
+    def test_run_length_size(self):
+        '''
+        A box mask takes one pair of runs per row of the box.
+        '''
+        mask = np.zeros((8, 64, 64), dtype=np.uint8)
+        mask[2:4, 10:20, 30:40] = 1
+        self.assertEqual(len(run_length_encode(mask)), (2 * 10 * 2 + 1) * 4, \
+            msg='Run-length encoding does not scale with the structure.')
+        with self.assertRaises(ValueError, msg='Truncated runs were decoded.'):
+            run_length_decode(run_length_encode(mask)[:-4], mask.shape)
+
+    def test_bit_packed_round_trip(self):
+        '''
+        Bit-packed volumes whose voxel count is not a multiple of 8 decode to the mask.
+        '''
+        mask = (np.random.RandomState(0).rand(3, 5, 7) > 0.5).astype(np.uint8)
+        volume = Primitives3D_pb2.VolumeData3D(Depth=3, Height=5, Width=7, \
+            CompressionMethod=Primitives3D_pb2.VolumeData3D.CompressionMethods.BitPacked, \
+            Data=encode_mask(mask, Primitives3D_pb2.VolumeData3D.CompressionMethods.BitPacked))
+        self.assertTrue(np.array_equal(decode_volume(volume), mask), \
+            msg='Bit-packed decoding did not restore the mask.')
+
+    def test_bit_packed_layout(self):
+        '''
+        Bit-packed voxels follow the client format of Primitives3D.proto: 8 voxels per byte,
+        most significant bit first, the last byte padded with 0 bits.
+        '''
+        volume = Primitives3D_pb2.VolumeData3D(Depth=1, Height=2, Width=5, \
+            CompressionMethod=Primitives3D_pb2.VolumeData3D.CompressionMethods.BitPacked, \
+            Data=gzip.compress(bytes([0b10000011, 0b01000000])))
+        self.assertEqual(decode_volume(volume).tolist(), [[[1, 0, 0, 0, 0], [0, 1, 1, 0, 1]]], \
+            msg='Bit-packed voxels were not decoded most significant bit first.')
+        self.assertEqual(gzip.decompress(encode_mask(decode_volume(volume), \
+            Primitives3D_pb2.VolumeData3D.CompressionMethods.BitPacked)), \
+            bytes([0b10000011, 0b01000000]), msg='Bit-packed voxels were not encoded in order.')
+
+    def test_one_hot(self):
+        '''
+        Label maps are split into one mask per label value.
+        '''
+        label_map = np.array([[[0, 1, 2, 2, 5]]])
+        self.assertEqual(one_hot(label_map, [2, 1, 4]).tolist(), \
+            [[[[0, 0, 1, 1, 0]]], [[[0, 1, 0, 0, 0]]], [[[0, 0, 0, 0, 0]]]], \
+            msg='Label map was not split by label value.')
+
+    def test_bounding_box(self):
+        '''
+        Masks are cropped to the bounding box of their nonzero voxels.
+        '''
+        mask = np.zeros((8, 64, 64), dtype=np.uint8)
+        mask[2, 10, 30] = mask[3, 19, 39] = 1
+        cropped, offset = crop_mask(mask)
+        self.assertEqual((cropped.shape, offset), ((2, 10, 10), (2, 10, 30)), \
+            msg='Mask was not cropped to its bounding box.')
+        cropped, offset = crop_mask(np.zeros_like(mask))
+        self.assertEqual(cropped.size, 0, msg='Empty mask was not cropped to nothing.')
+
+
+class PhantomTestCase(TestCase):
+    '''
+    Unit testing for the configurable phantom segmentation in segint_api/phantom.py
+    '''
+
+    def test_phantom_segment(self):
+        '''
+        Phantom label maps hold the requested structures, seeded phantoms are reproducible and
+        boundary noise makes the output harder to compress.
+        '''
+        channels_data = [np.zeros((16, 64, 64), dtype=np.int16)]
+        config = parse_phantom_config('{"structures": 3, "seed": 1}')
+        label_map = phantom_segment(channels_data, [1, 2, 3], config)[0]
+        self.assertEqual(set(np.unique(label_map)), {0, 1, 2, 3}, \
+            msg='Phantom label map does not hold every structure.')
+        self.assertTrue(np.array_equal(label_map, \
+            phantom_segment(channels_data, [1, 2, 3], config)[0]), \
+            msg='Seeded phantom is not reproducible.')
+        noisy = phantom_segment(channels_data, [1, 2, 3], dict(config, noise=0.3))[0]
+        self.assertGreater(len(gzip.compress(noisy.tobytes())), \
+            len(gzip.compress(label_map.tobytes())), msg='Noise did not roughen the structures.')
+
+    def test_invalid_phantom_config(self):
+        '''
+        Unknown and invalid phantom parameters are rejected by the model version validation.
+        '''
+        exclude = ['model_family', 'model_version_desc']
+        for text in ('[]', '{"shape": "torus"}', '{"noise": -1}', '{"gpus": 1}', \
+                '{"structures": true}', '{"noise": false}', '{"seed": true}'):
+            m_v = ModelVersion(model_version_id="Phantom", phantom_config=text)
+            with self.assertRaises(ValidationError, msg='Accepted phantom config ' + text):
+                m_v.full_clean(exclude=exclude)
+        ModelVersion(model_version_id="Phantom", phantom_config='{"shape": "box"}') \
+            .full_clean(exclude=exclude)
+
+
+class PreprocessingTestCase(TestCase):
+    '''
+    Unit testing for the resampling and normalization of model inputs in
+    segint_api/preprocessing.py
+    '''
+
+    def test_resample(self):
+        '''
+        Nearest neighbour resampling by integer factors round trips, linear resampling
+        interpolates between voxel centres and plans are reused for the same geometry.
+        '''
+        label_map = np.random.RandomState(0).randint(0, 4, size=(4, 6, 8)).astype(np.uint8)
+        upsampled = resample(label_map, (8, 12, 16), linear=False)
+        self.assertEqual(upsampled.dtype, np.uint8, msg='Nearest resampling changed the type.')
+        self.assertTrue(np.array_equal(resample(upsampled, (4, 6, 8), linear=False), \
+            label_map), msg='Nearest resampling did not round trip.')
+        ramp = np.tile(np.arange(4, dtype=np.int16), (1, 1, 1))
+        self.assertEqual(resample(ramp, (1, 1, 8)).ravel().tolist(), \
+            [0, 0.25, 0.75, 1.25, 1.75, 2.25, 2.75, 3], msg='Linear resampling is off.')
+        hits = resampling_plan.cache_info().hits
+        resample(label_map, (8, 12, 16), linear=False)
+        self.assertEqual(resampling_plan.cache_info().hits, hits + 1, \
+            msg='Interpolation indices were not reused.')
+
+    def test_preprocess_channel(self):
+        '''
+        Channels are resampled into the spacing range of their description and clipped to
+        the normalization window.
+        '''
+        description = ModelChannelDescription(spacing_min_x=1, spacing_max_x=1, \
+            spacing_min_y=1, spacing_max_y=1, spacing_min_z=2, spacing_max_z=0)
+        self.assertEqual(target_spacing((1, 0.5, 2), description, DEFAULT_PREPROCESS_CONFIG), \
+            (2, 1, 1), msg='Spacing was not moved into the spacing range.')
+        config = parse_preprocess_config( \
+            '{"resample": true, "clip": [-1000, 1000], "normalize": "window"}')
+        volume = np.full((4, 16, 8), 3000, dtype=np.int16)
+        preprocessed = preprocess_channel(volume, (1, 0.5, 2), description, config)
+        self.assertEqual(preprocessed.shape, (2, 8, 16), \
+            msg='Channel was not resampled to the target spacing.')
+        self.assertTrue(np.all(preprocessed == 1), msg='Channel was not clipped and normalized.')
+        with self.assertRaises(ValueError, msg='Boolean clip window was accepted.'):
+            parse_preprocess_config('{"clip": [false, 1000]}')
+
+
+class LauncherTestCase(TestCase):
+    '''
+    Testing of the production launcher, see segint_api/launcher.py
+    '''
+
+    def test_commands(self):
+        '''
+        Web server workers follow the CPU cores, and every queue gets its Celery worker pool.
+        '''
+        self.assertEqual(web_worker_count('asgi', 4), 4, msg='ASGI workers differ from cores.')
+        self.assertEqual(web_worker_count('wsgi', 4), 8, msg='WSGI workers were not capped.')
+        command = web_server_command(dict(settings.SEGINT_SERVER, WORKER_CLASS='wsgi'), 3)
+        self.assertIn('segint_research_django.wsgi:application', command)
+        self.assertIn('--preload', command, msg='The application is not preloaded.')
+        self.assertEqual(command[command.index('--config') + 1], \
+            'python:segint_api.gunicorn_config', msg='Server hooks are not loaded.')
+        self.assertEqual(command[command.index('--workers') + 1], '3')
+        commands = celery_commands()
+        self.assertEqual([name for name, _ in commands], ["celery celery"] + \
+            ["celery {}".format(queue) for queue in settings.SEGINT_QUEUES] + ["celery beat"])
+        worker = commands[1][1]
+        self.assertEqual(worker[worker.index('-c') + 1], str(list( \
+            settings.SEGINT_QUEUES.values())[0]['concurrency']))
+
+    def test_shutdown_on_exit(self):
+        '''
+        The exit of one process shuts down the others.
+        '''
+        launcher = Launcher([("sleeper", [sys.executable, '-c', 'import time; time.sleep(60)']), \
+            ("failing", [sys.executable, '-c', 'raise SystemExit(3)'])], shutdown_timeout=10)
+        started = time.monotonic()
+        self.assertEqual(launcher.run(), 1, msg='Exited process was not reported.')
+        self.assertLess(time.monotonic() - started, 10, msg='Shutdown was not graceful.')
+        self.assertEqual(launcher.processes[0][1].returncode, -signal.SIGTERM, \
+            msg='Remaining process was not terminated.')
+
+    def test_shutdown_process_groups(self):
+        '''
+        Children of the processes are shut down with them, and killed if ignoring SIGTERM.
+        '''
+        with tempfile.TemporaryDirectory() as pid_dir:
+            pid_file = os.path.join(pid_dir, 'child.pid')
+            child = "import os, signal, time; signal.signal(signal.SIGTERM, signal.SIG_IGN); " \
+                "open({!r}, 'w').write(str(os.getpid())); time.sleep(60)".format(pid_file)
+            parent = "import subprocess, sys, time; subprocess.Popen([sys.executable, '-c', " \
+                "{!r}]); time.sleep(60)".format(child)
+            exiting = "import os, time\nwhile not os.path.exists({!r}): time.sleep(0.05)" \
+                .format(pid_file)
+            launcher = Launcher([("parent", [sys.executable, '-c', parent]), \
+                ("exiting", [sys.executable, '-c', exiting])], shutdown_timeout=1)
+            self.assertEqual(launcher.run(), 1, msg='Exited process was not reported.')
+            time.sleep(0.2)
+            with open(pid_file) as file_in:
+                child_pid = int(file_in.read())
+        try:
+            with open('/proc/{}/stat'.format(child_pid)) as file_in:
+                state = file_in.read().rsplit(')', 1)[1].split()[0]
+        except FileNotFoundError:
+            state = 'gone'
+        self.assertIn(state, ('gone', 'Z'), msg='Child process survived the shutdown.')
+
+    def test_shared_metrics(self):
+        '''
+        Stage timings observed by a worker process are served by render_metrics.
+        '''
+        with tempfile.TemporaryDirectory() as metrics_dir:
+            open(os.path.join(metrics_dir, 'counter_1.db'), 'wb').close()
+            prepare_metrics_dir(metrics_dir)
+            self.assertEqual(os.listdir(metrics_dir), [], msg='Stale metrics were not removed.')
+            subprocess.run([sys.executable, '-c', "from segint_api.metrics import " \
+                "SEGMENTATION_STAGE_SECONDS; " \
+                "SEGMENTATION_STAGE_SECONDS.labels('worker-model', 'segment').observe(0.5)"], \
+                env=dict(os.environ, prometheus_multiproc_dir=metrics_dir), \
+                cwd=settings.BASE_DIR, check=True)
+            with mock.patch.dict(os.environ, prometheus_multiproc_dir=metrics_dir):
+                body, _ = render_metrics()
+        self.assertIn(b'segint_segmentation_stage_seconds_count{model_version_id="worker-model",' \
+            b'stage="segment"} 1.0', body, msg='Worker metrics were not merged.')
+
+
+class DatabaseSetupTestCase(TransactionTestCase):
+    '''
+    Unit testing for SQLite connection setup and coalesced writes from concurrent threads.
+    '''
+
+    def test_sqlite_pragmas(self):
+        '''
+        New SQLite connections wait for the database lock instead of failing.
+        '''
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA busy_timeout")
+            self.assertEqual(cursor.fetchone()[0], 20000, \
+                msg='busy_timeout pragma was not applied to the connection.')
+
+    def test_coalesced_writes(self):
+        '''
+        Concurrent writes are committed, and a failing write only fails its own thread.
+        '''
+        coalescer = WriteCoalescer()
+        errors = []
+
+        def write(index):
+            def create_telemetry():
+                if index == 0:
+                    raise ValueError("Invalid telemetry")
+                SegmentationTelemetry.objects.create(client_software_version=str(index), \
+                    upload_time_ms=0, segmentation_wait_ms=0, segmentation_down_ms=0, \
+                    segmentation_retries=0, segmentation_model_id="", segmentation_id="", \
+                    client_error=0, client_error_info="")
+            try:
+                coalescer.submit(create_telemetry)
+            except ValueError as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=write, args=(index,)) for index in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(SegmentationTelemetry.objects.count(), 7, \
+            msg='Coalesced writes were not all committed.')
+        self.assertEqual(len(errors), 1, \
+            msg='Failing write was not reported to its thread only.')
+
+    @override_settings(SEGINT_WRITE_COALESCING=dict(settings.SEGINT_WRITE_COALESCING, \
+        ENABLED=True, MAX_DELAY_SECONDS=0))
+    def test_interrupted_leader(self):
+        '''
+        A leader interrupted by SystemExit fails its batch and gives up leadership.
+        '''
+        coalescer = WriteCoalescer()
+        # A write of another thread waiting behind the leader's.
+        waiting = PendingWrite(lambda: 1)
+        coalescer._pending.append(waiting)
+
+        def interrupt():
+            raise SystemExit()
+        with self.assertRaises(SystemExit):
+            coalescer.submit(interrupt)
+        self.assertTrue(waiting.done.is_set(), msg='Waiting write was not released.')
+        self.assertIsInstance(waiting.error, RuntimeError, msg='Waiting write did not fail.')
+        self.assertEqual(coalescer.submit(lambda: 1), 1, \
+            msg='Coalescer did not recover from an interrupted leader.')
+
+
+class TelemetryRollupTestCase(TestCase):
+    '''
+    Unit testing for telemetry rollups and endpoint:
+        /api/v2/Telemetry/rollups
+    '''
+
+    def create_telemetry(self, received_time, upload_time_ms, model_id="Model A"):
+        '''
+        Creates a raw telemetry record.
+        '''
+        return SegmentationTelemetry.objects.create(client_software_version="1.0", \
+            upload_time_ms=upload_time_ms, segmentation_wait_ms=1000, segmentation_down_ms=0, \
+            segmentation_retries=1, segmentation_model_id=model_id, segmentation_id="", \
+            client_error=0, client_error_info="", received_time=received_time)
+
+    def setUp(self):
+        '''
+        Telemetry of two models in the previous hour and one record in the current hour.
+        '''
+        self.current_hour = timezone.now().replace(minute=0, second=0, microsecond=0)
+        previous_hour = self.current_hour - timedelta(hours=1)
+        for index in range(1, 101):
+            self.create_telemetry(previous_hour + timedelta(seconds=index), index * 10)
+        self.create_telemetry(previous_hour, 5000, model_id="Model B")
+        self.create_telemetry(self.current_hour, 5000)
+
+    def test_rollup(self):
+        '''
+        Only completed hours are rolled up, late records are merged into existing rollups.
+        '''
+        self.assertEqual(rollup_telemetry_records(), 101, \
+            msg='Rollup did not fold exactly the records of completed hours.')
+        self.assertEqual(TelemetryRollup.objects.count(), 2, \
+            msg='Rollup did not create one row per hour and model.')
+        self.create_telemetry(self.current_hour - timedelta(minutes=1), 10)
+        rollup_telemetry_records()
+        rollup = TelemetryRollup.objects.get(model_id="Model A")
+        self.assertEqual((rollup.count, rollup.upload_ms_sum), (101, 50510), \
+            msg='Late telemetry was not merged into the existing rollup.')
+
+    def test_get_rollups(self):
+        '''
+        Test for endpoint: /api/v2/Telemetry/rollups
+        '''
+        rollup_telemetry_records()
+        response = self.client.get('/api/v2/Telemetry/rollups', \
+            {'group_by': 'model_id', 'model_id': 'Model A'}, **{'HTTP_ACCEPT':'application/json'})
+        self.assertEqual(response.status_code, 200, \
+            msg='/api/v2/Telemetry/rollups endpoint did not return 200 status code.')
+        rollups = response.json()['Rollups']
+        self.assertEqual(len(rollups), 1, \
+            msg='/api/v2/Telemetry/rollups endpoint did not filter by model.')
+        self.assertEqual(rollups[0]['count'], 100, \
+            msg='/api/v2/Telemetry/rollups endpoint returned wrong count.')
+        self.assertAlmostEqual(rollups[0]['upload_time_ms']['p50'], 500, delta=10, \
+            msg='/api/v2/Telemetry/rollups endpoint returned inaccurate median.')
+
+    def test_changed_sketch_accuracy(self):
+        '''
+        Rollups stored with another sketch accuracy are merged after the setting changes.
+        '''
+        rollup_telemetry_records()
+        self.create_telemetry(self.current_hour - timedelta(minutes=1), 500)
+        with self.settings(SEGINT_TELEMETRY=dict(settings.SEGINT_TELEMETRY, \
+                SKETCH_RELATIVE_ACCURACY=0.02)):
+            self.assertEqual(rollup_telemetry_records(), 1, \
+                msg='Late telemetry was not rolled up with the changed accuracy.')
+            response = self.client.get('/api/v2/Telemetry/rollups', \
+                {'group_by': 'model_id', 'model_id': 'Model A'}, \
+                **{'HTTP_ACCEPT':'application/json'})
+        self.assertEqual(response.status_code, 200, \
+            msg='/api/v2/Telemetry/rollups endpoint did not return 200 status code.')
+        self.assertEqual(response.json()['Rollups'][0]['count'], 101, \
+            msg='/api/v2/Telemetry/rollups endpoint returned wrong count.')
+        self.assertAlmostEqual(response.json()['Rollups'][0]['upload_time_ms']['p50'], 500, \
+            delta=20, msg='/api/v2/Telemetry/rollups endpoint returned inaccurate median.')
+
+    def test_get_rollups_invalid(self):
+        '''
+        Test for endpoint: /api/v2/Telemetry/rollups
+        With an unknown group_by dimension
+        '''
+        response = self.client.get('/api/v2/Telemetry/rollups', {'group_by': 'segmentation_id'}, \
+            **{'HTTP_ACCEPT':'application/json'})
+        self.assertEqual(response.status_code, 400, \
+            msg='/api/v2/Telemetry/rollups endpoint did not return 400 status code.')
+
+    @override_settings(SEGINT_TELEMETRY=dict(settings.SEGINT_TELEMETRY, RAW_RETENTION_DAYS=0))
+    def test_prune(self):
+        '''
+        Only rolled up telemetry is pruned.
+        '''
+        rollup_telemetry_records()
+        self.assertEqual(prune_telemetry_records(), 101, \
+            msg='Pruning did not delete exactly the rolled up records.')
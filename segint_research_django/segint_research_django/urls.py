@@ -51,5 +51,6 @@ from segint_research_django import views
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('ping', views.ping, name="ping"),
+    path('metrics', views.metrics, name="metrics"),
     path('api/', include('segint_api.urls')),
 ]
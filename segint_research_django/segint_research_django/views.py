@@ -39,6 +39,7 @@ from django.utils.decorators import method_decorator
 
 # API imports
 from segint_api import views as api_views
+from segint_api.metrics import render_metrics
 
 # Protobuf imports
 from protobuf import Model_pb2
@@ -51,4 +52,16 @@ def ping(request):
 		1. Protobuf-serialized response if "accept" header is "application/x-protobuf"
 		2. JSON response otherwise 
 	'''
-	return api_views.ping(request)
\ No newline at end of file
+	return api_views.ping(request)
+
+
+@api_views.get_check
+def metrics(request):
+	'''
+	Endpoint for Prometheus scrapes of the server metrics.
+
+	Returns:
+		Metrics in the Prometheus text exposition format
+	'''
+	body, content_type = render_metrics()
+	return HttpResponse(body, content_type=content_type)